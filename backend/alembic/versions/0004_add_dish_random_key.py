@@ -0,0 +1,73 @@
+"""add indexed random sampling key to dishes
+
+Revision ID: 0004_add_dish_random_key
+Revises: 0003_add_user_auth_and_profiles
+Create Date: 2026-10-17 00:00:00
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004_add_dish_random_key"
+down_revision = "0003_add_user_auth_and_profiles"
+branch_labels = None
+depends_on = None
+
+
+def _column_names(inspector: sa.Inspector, table_name: str) -> set[str]:
+    try:
+        return {item["name"] for item in inspector.get_columns(table_name)}
+    except Exception:
+        return set()
+
+
+def _index_names(inspector: sa.Inspector, table_name: str) -> set[str]:
+    try:
+        return {item["name"] for item in inspector.get_indexes(table_name)}
+    except Exception:
+        return set()
+
+
+def _random_expression(dialect_name: str) -> str:
+    if dialect_name == "postgresql":
+        return "random()"
+    # SQLite random() returns a signed 64-bit integer; fold it into [0, 1).
+    return "(abs(random()) % 1000000000) / 1000000000.0"
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    if "dishes" not in tables:
+        return
+
+    columns = _column_names(inspector, "dishes")
+    if "random_key" not in columns:
+        op.add_column(
+            "dishes",
+            sa.Column("random_key", sa.Float(), nullable=False, server_default=sa.text("0")),
+        )
+        op.execute(f"UPDATE dishes SET random_key = {_random_expression(bind.dialect.name)}")
+
+    indexes = _index_names(inspector, "dishes")
+    if "ix_dishes_status_random_key" not in indexes:
+        op.create_index("ix_dishes_status_random_key", "dishes", ["status", "random_key"], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    if "dishes" not in tables:
+        return
+
+    indexes = _index_names(inspector, "dishes")
+    if "ix_dishes_status_random_key" in indexes:
+        op.drop_index("ix_dishes_status_random_key", table_name="dishes")
+
+    columns = _column_names(inspector, "dishes")
+    if "random_key" in columns:
+        op.drop_column("dishes", "random_key")
@@ -0,0 +1,53 @@
+"""add catalog version state
+
+Revision ID: 0005_add_catalog_state
+Revises: 0004_add_dish_random_key
+Create Date: 2026-10-17 00:00:00
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005_add_catalog_state"
+down_revision = "0004_add_dish_random_key"
+branch_labels = None
+depends_on = None
+
+
+def _table_names(inspector: sa.Inspector) -> set[str]:
+    try:
+        return set(inspector.get_table_names())
+    except Exception:
+        return set()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = _table_names(inspector)
+
+    if "catalog_state" not in tables:
+        catalog_state = op.create_table(
+            "catalog_state",
+            sa.Column("key", sa.String(length=40), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint("key"),
+        )
+        op.bulk_insert(
+            catalog_state,
+            [{"key": "dishes", "version": 1, "updated_at": datetime.now(timezone.utc)}],
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = _table_names(inspector)
+
+    if "catalog_state" in tables:
+        op.drop_table("catalog_state")
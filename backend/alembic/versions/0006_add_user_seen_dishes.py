@@ -0,0 +1,94 @@
+"""add dish ordinals and per-user seen bitmaps
+
+Revision ID: 0006_add_user_seen_dishes
+Revises: 0005_add_catalog_state
+Create Date: 2026-10-17 00:00:00
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006_add_user_seen_dishes"
+down_revision = "0005_add_catalog_state"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _table_names(inspector: sa.Inspector) -> set[str]:
+    try:
+        return set(inspector.get_table_names())
+    except Exception:
+        return set()
+
+
+def _column_names(inspector: sa.Inspector, table_name: str) -> set[str]:
+    try:
+        return {item["name"] for item in inspector.get_columns(table_name)}
+    except Exception:
+        return set()
+
+
+def _index_names(inspector: sa.Inspector, table_name: str) -> set[str]:
+    try:
+        return {item["name"] for item in inspector.get_indexes(table_name)}
+    except Exception:
+        return set()
+
+
+def _backfill_dish_ordinals(bind: sa.Connection) -> None:
+    dish_ids = [
+        row[0]
+        for row in bind.execute(
+            sa.text("SELECT id FROM dishes WHERE ordinal IS NULL ORDER BY created_at, id")
+        )
+    ]
+    start = int(bind.execute(sa.text("SELECT COALESCE(MAX(ordinal), -1) FROM dishes")).scalar() or -1) + 1
+    for offset in range(0, len(dish_ids), BACKFILL_BATCH_SIZE):
+        batch = dish_ids[offset : offset + BACKFILL_BATCH_SIZE]
+        bind.execute(
+            sa.text("UPDATE dishes SET ordinal = :ordinal WHERE id = :id"),
+            [{"ordinal": start + offset + index, "id": dish_id} for index, dish_id in enumerate(batch)],
+        )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = _table_names(inspector)
+
+    if "dishes" in tables:
+        if "ordinal" not in _column_names(inspector, "dishes"):
+            op.add_column("dishes", sa.Column("ordinal", sa.Integer(), nullable=True))
+        _backfill_dish_ordinals(bind)
+        if "ix_dishes_ordinal" not in _index_names(inspector, "dishes"):
+            op.create_index("ix_dishes_ordinal", "dishes", ["ordinal"], unique=True)
+
+    if "user_seen_dishes" not in tables:
+        op.create_table(
+            "user_seen_dishes",
+            sa.Column("user_id", sa.String(length=36), nullable=False),
+            sa.Column("bitmap", sa.LargeBinary(), nullable=False),
+            sa.Column("seen_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("user_id"),
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = _table_names(inspector)
+
+    if "user_seen_dishes" in tables:
+        op.drop_table("user_seen_dishes")
+
+    if "dishes" in tables:
+        if "ix_dishes_ordinal" in _index_names(inspector, "dishes"):
+            op.drop_index("ix_dishes_ordinal", table_name="dishes")
+        if "ordinal" in _column_names(inspector, "dishes"):
+            op.drop_column("dishes", "ordinal")
@@ -0,0 +1,66 @@
+"""add dish image renditions
+
+Revision ID: 0007_add_dish_image_renditions
+Revises: 0006_add_user_seen_dishes
+Create Date: 2026-10-17 00:00:00
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007_add_dish_image_renditions"
+down_revision = "0006_add_user_seen_dishes"
+branch_labels = None
+depends_on = None
+
+
+def _table_names(inspector: sa.Inspector) -> set[str]:
+    try:
+        return set(inspector.get_table_names())
+    except Exception:
+        return set()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if "dish_image_renditions" not in _table_names(inspector):
+        op.create_table(
+            "dish_image_renditions",
+            sa.Column("id", sa.String(length=36), nullable=False),
+            sa.Column("image_id", sa.String(length=36), nullable=False),
+            sa.Column("name", sa.String(length=20), nullable=False),
+            sa.Column("format", sa.String(length=10), nullable=False),
+            sa.Column("mime_type", sa.String(length=50), nullable=False),
+            sa.Column("width", sa.Integer(), nullable=False),
+            sa.Column("height", sa.Integer(), nullable=False),
+            sa.Column("data_url", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.ForeignKeyConstraint(["image_id"], ["dish_images.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ix_dish_image_renditions_image_id",
+            "dish_image_renditions",
+            ["image_id"],
+            unique=False,
+        )
+        op.create_index(
+            "ix_dish_image_renditions_image_name_format",
+            "dish_image_renditions",
+            ["image_id", "name", "format"],
+            unique=True,
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if "dish_image_renditions" in _table_names(inspector):
+        op.drop_index("ix_dish_image_renditions_image_name_format", table_name="dish_image_renditions")
+        op.drop_index("ix_dish_image_renditions_image_id", table_name="dish_image_renditions")
+        op.drop_table("dish_image_renditions")
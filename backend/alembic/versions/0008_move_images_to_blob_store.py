@@ -0,0 +1,122 @@
+"""move image bytes into the content-addressed blob store
+
+Revision ID: 0008_move_images_to_blob_store
+Revises: 0007_add_dish_image_renditions
+Create Date: 2026-10-17 00:00:00
+"""
+from __future__ import annotations
+
+import base64
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.blob_store import blob_store_from_env
+from app.images import decode_data_url
+
+
+revision = "0008_move_images_to_blob_store"
+down_revision = "0007_add_dish_image_renditions"
+branch_labels = None
+depends_on = None
+
+IMAGE_TABLES = ("dish_images", "dish_image_renditions")
+BATCH_SIZE = max(1, int(os.getenv("BLOB_MIGRATION_BATCH_SIZE", "200")))
+
+
+def _table_names(inspector: sa.Inspector) -> set[str]:
+    try:
+        return set(inspector.get_table_names())
+    except Exception:
+        return set()
+
+
+def _column_names(inspector: sa.Inspector, table_name: str) -> set[str]:
+    try:
+        return {item["name"] for item in inspector.get_columns(table_name)}
+    except Exception:
+        return set()
+
+
+def _move_data_urls_to_blobs(bind: sa.Connection, table_name: str) -> None:
+    store = blob_store_from_env()
+    select_batch = sa.text(
+        f"SELECT id, mime_type, data_url FROM {table_name} WHERE blob_sha256 IS NULL ORDER BY id LIMIT :limit"
+    )
+    update_row = sa.text(
+        f"UPDATE {table_name} SET blob_sha256 = :sha256, size_bytes = :size, mime_type = :mime_type WHERE id = :id"
+    )
+    while True:
+        rows = bind.execute(select_batch, {"limit": BATCH_SIZE}).all()
+        if not rows:
+            return
+        updates = []
+        for row_id, mime_type, data_url in rows:
+            try:
+                decoded_mime, body = decode_data_url(data_url, fallback_mime=mime_type or "image/png")
+            except ValueError as exc:
+                raise RuntimeError(f"{table_name}.{row_id} holds an unreadable data URL: {exc}") from exc
+            ref = store.put(body)
+            updates.append({"id": row_id, "sha256": ref.sha256, "size": ref.size, "mime_type": decoded_mime})
+        bind.execute(update_row, updates)
+
+
+def _restore_data_urls_from_blobs(bind: sa.Connection, table_name: str) -> None:
+    store = blob_store_from_env()
+    select_batch = sa.text(
+        f"SELECT id, mime_type, blob_sha256 FROM {table_name} WHERE data_url IS NULL ORDER BY id LIMIT :limit"
+    )
+    update_row = sa.text(f"UPDATE {table_name} SET data_url = :data_url WHERE id = :id")
+    while True:
+        rows = bind.execute(select_batch, {"limit": BATCH_SIZE}).all()
+        if not rows:
+            return
+        updates = []
+        for row_id, mime_type, digest in rows:
+            encoded = base64.b64encode(store.read(digest)).decode("ascii")
+            updates.append({"id": row_id, "data_url": f"data:{mime_type};base64,{encoded}"})
+        bind.execute(update_row, updates)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = _table_names(inspector)
+
+    for table_name in IMAGE_TABLES:
+        if table_name not in tables:
+            continue
+        columns = _column_names(inspector, table_name)
+        if "blob_sha256" not in columns:
+            op.add_column(table_name, sa.Column("blob_sha256", sa.String(length=64), nullable=True))
+        if "size_bytes" not in columns:
+            op.add_column(
+                table_name,
+                sa.Column("size_bytes", sa.Integer(), nullable=False, server_default="0"),
+            )
+        if "data_url" not in columns:
+            continue
+
+        _move_data_urls_to_blobs(bind, table_name)
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column("blob_sha256", existing_type=sa.String(length=64), nullable=False)
+            batch_op.drop_column("data_url")
+            batch_op.create_index(f"ix_{table_name}_blob_sha256", ["blob_sha256"], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = _table_names(inspector)
+
+    for table_name in IMAGE_TABLES:
+        if table_name not in tables or "blob_sha256" not in _column_names(inspector, table_name):
+            continue
+        op.add_column(table_name, sa.Column("data_url", sa.Text(), nullable=True))
+        _restore_data_urls_from_blobs(bind, table_name)
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_index(f"ix_{table_name}_blob_sha256")
+            batch_op.alter_column("data_url", existing_type=sa.Text(), nullable=False)
+            batch_op.drop_column("size_bytes")
+            batch_op.drop_column("blob_sha256")
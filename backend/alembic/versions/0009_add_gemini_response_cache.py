@@ -0,0 +1,55 @@
+"""add gemini response cache
+
+Revision ID: 0009_add_gemini_response_cache
+Revises: 0008_move_images_to_blob_store
+Create Date: 2026-10-17 00:00:00
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009_add_gemini_response_cache"
+down_revision = "0008_move_images_to_blob_store"
+branch_labels = None
+depends_on = None
+
+
+def _table_names(inspector: sa.Inspector) -> set[str]:
+    try:
+        return set(inspector.get_table_names())
+    except Exception:
+        return set()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if "gemini_response_cache" not in _table_names(inspector):
+        op.create_table(
+            "gemini_response_cache",
+            sa.Column("key", sa.String(length=64), nullable=False),
+            sa.Column("model", sa.String(length=80), nullable=False),
+            sa.Column("response_json", sa.JSON(), nullable=False),
+            sa.Column("latency_ms", sa.Float(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint("key"),
+        )
+        op.create_index(
+            "ix_gemini_response_cache_expires_at",
+            "gemini_response_cache",
+            ["expires_at"],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if "gemini_response_cache" in _table_names(inspector):
+        op.drop_index("ix_gemini_response_cache_expires_at", table_name="gemini_response_cache")
+        op.drop_table("gemini_response_cache")
@@ -0,0 +1,46 @@
+"""add details to generation jobs
+
+Revision ID: 0010_add_generation_job_details
+Revises: 0009_add_gemini_response_cache
+Create Date: 2026-10-17 00:00:00
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010_add_generation_job_details"
+down_revision = "0009_add_gemini_response_cache"
+branch_labels = None
+depends_on = None
+
+
+def _column_names(inspector: sa.Inspector, table_name: str) -> set[str]:
+    try:
+        return {item["name"] for item in inspector.get_columns(table_name)}
+    except Exception:
+        return set()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "generation_jobs" not in set(inspector.get_table_names()):
+        return
+
+    if "details_json" not in _column_names(inspector, "generation_jobs"):
+        op.add_column(
+            "generation_jobs",
+            sa.Column("details_json", sa.JSON(), nullable=False, server_default=sa.text("'{}'")),
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "generation_jobs" not in set(inspector.get_table_names()):
+        return
+
+    if "details_json" in _column_names(inspector, "generation_jobs"):
+        op.drop_column("generation_jobs", "details_json")
@@ -0,0 +1,91 @@
+"""add gemini usage accounting
+
+Revision ID: 0011_add_gemini_usage
+Revises: 0010_add_generation_job_details
+Create Date: 2026-10-17 00:00:00
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0011_add_gemini_usage"
+down_revision = "0010_add_generation_job_details"
+branch_labels = None
+depends_on = None
+
+
+def _table_names(inspector: sa.Inspector) -> set[str]:
+    try:
+        return set(inspector.get_table_names())
+    except Exception:
+        return set()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    table_names = _table_names(inspector)
+
+    if "gemini_usage_events" not in table_names:
+        op.create_table(
+            "gemini_usage_events",
+            sa.Column("id", sa.String(length=36), nullable=False),
+            sa.Column("model", sa.String(length=80), nullable=False),
+            sa.Column("caller", sa.String(length=80), nullable=False),
+            sa.Column("streamed", sa.Boolean(), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("latency_ms", sa.Float(), nullable=False),
+            sa.Column("status_code", sa.Integer(), nullable=False),
+            sa.Column("ok", sa.Boolean(), nullable=False),
+            sa.Column("prompt_tokens", sa.Integer(), nullable=False),
+            sa.Column("candidate_tokens", sa.Integer(), nullable=False),
+            sa.Column("image_tokens", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ix_gemini_usage_events_created_at",
+            "gemini_usage_events",
+            ["created_at"],
+            unique=False,
+        )
+
+    if "gemini_usage_hourly" not in table_names:
+        op.create_table(
+            "gemini_usage_hourly",
+            sa.Column("id", sa.String(length=36), nullable=False),
+            sa.Column("hour", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("model", sa.String(length=80), nullable=False),
+            sa.Column("caller", sa.String(length=80), nullable=False),
+            sa.Column("calls", sa.Integer(), nullable=False),
+            sa.Column("errors", sa.Integer(), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("latency_ms_sum", sa.Float(), nullable=False),
+            sa.Column("latency_ms_max", sa.Float(), nullable=False),
+            sa.Column("prompt_tokens", sa.Integer(), nullable=False),
+            sa.Column("candidate_tokens", sa.Integer(), nullable=False),
+            sa.Column("image_tokens", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ix_gemini_usage_hourly_hour_model_caller",
+            "gemini_usage_hourly",
+            ["hour", "model", "caller"],
+            unique=True,
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    table_names = _table_names(inspector)
+
+    if "gemini_usage_hourly" in table_names:
+        op.drop_index("ix_gemini_usage_hourly_hour_model_caller", table_name="gemini_usage_hourly")
+        op.drop_table("gemini_usage_hourly")
+    if "gemini_usage_events" in table_names:
+        op.drop_index("ix_gemini_usage_events_created_at", table_name="gemini_usage_events")
+        op.drop_table("gemini_usage_events")
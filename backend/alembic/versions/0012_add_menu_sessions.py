@@ -0,0 +1,57 @@
+"""add menu sessions
+
+Revision ID: 0012_add_menu_sessions
+Revises: 0011_add_gemini_usage
+Create Date: 2026-10-17 00:00:00
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0012_add_menu_sessions"
+down_revision = "0011_add_gemini_usage"
+branch_labels = None
+depends_on = None
+
+
+def _table_names(inspector: sa.Inspector) -> set[str]:
+    try:
+        return set(inspector.get_table_names())
+    except Exception:
+        return set()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    table_names = _table_names(inspector)
+
+    if "menu_sessions" not in table_names:
+        op.create_table(
+            "menu_sessions",
+            sa.Column("id", sa.String(length=36), nullable=False),
+            sa.Column("device_id", sa.String(length=64), nullable=False),
+            sa.Column("images_json", sa.JSON(), nullable=False),
+            sa.Column("dishes_json", sa.JSON(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ix_menu_sessions_expires_at",
+            "menu_sessions",
+            ["expires_at"],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    table_names = _table_names(inspector)
+
+    if "menu_sessions" in table_names:
+        op.drop_index("ix_menu_sessions_expires_at", table_name="menu_sessions")
+        op.drop_table("menu_sessions")
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+try:
+    import boto3
+except Exception:  # pragma: no cover - optional dependency
+    boto3 = None
+
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobNotFoundError(KeyError):
+    pass
+
+
+@dataclass(frozen=True)
+class BlobRef:
+    sha256: str
+    size: int
+
+
+def blob_digest(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def _checked_digest(digest: str) -> str:
+    value = str(digest or "").strip().lower()
+    if not SHA256_PATTERN.match(value):
+        raise ValueError(f"invalid blob digest: {digest!r}")
+    return value
+
+
+class LocalBlobStore:
+    kind = "local"
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def path_for(self, digest: str) -> Path:
+        value = _checked_digest(digest)
+        return self.root / value[:2] / value[2:4] / value
+
+    def local_path(self, digest: str) -> Path | None:
+        path = self.path_for(digest)
+        return path if path.is_file() else None
+
+    def put(self, body: bytes) -> BlobRef:
+        ref = BlobRef(sha256=blob_digest(body), size=len(body))
+        path = self.path_for(ref.sha256)
+        if path.is_file():
+            return ref
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a sibling temp file and rename so readers never see a
+        # partially written blob, even with concurrent writers of the same hash.
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(body)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        return ref
+
+    def read(self, digest: str) -> bytes:
+        try:
+            return self.path_for(digest).read_bytes()
+        except FileNotFoundError as exc:
+            raise BlobNotFoundError(digest) from exc
+
+    def exists(self, digest: str) -> bool:
+        return self.path_for(digest).is_file()
+
+    def delete(self, digest: str) -> None:
+        self.path_for(digest).unlink(missing_ok=True)
+
+
+def _is_missing_object(exc: Exception) -> bool:
+    if isinstance(exc, (FileNotFoundError, BlobNotFoundError)):
+        return True
+    code = str(getattr(exc, "response", {}).get("Error", {}).get("Code", ""))
+    return code in {"404", "NoSuchKey", "NotFound"}
+
+
+class S3BlobStore:
+    kind = "s3"
+
+    def __init__(self, client: Any, *, bucket: str, prefix: str = "blobs/") -> None:
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def key_for(self, digest: str) -> str:
+        value = _checked_digest(digest)
+        return f"{self.prefix}{value[:2]}/{value}"
+
+    def local_path(self, digest: str) -> Path | None:
+        return None
+
+    def put(self, body: bytes) -> BlobRef:
+        ref = BlobRef(sha256=blob_digest(body), size=len(body))
+        if not self.exists(ref.sha256):
+            self.client.put_object(Bucket=self.bucket, Key=self.key_for(ref.sha256), Body=body)
+        return ref
+
+    def read(self, digest: str) -> bytes:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key_for(digest))
+        except Exception as exc:
+            if _is_missing_object(exc):
+                raise BlobNotFoundError(digest) from exc
+            raise
+        return response["Body"].read()
+
+    def exists(self, digest: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key_for(digest))
+        except Exception as exc:
+            if _is_missing_object(exc):
+                return False
+            raise
+        return True
+
+    def delete(self, digest: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.key_for(digest))
+
+
+class DirectoryS3Client:
+    # Stand-in for the subset of the boto3 S3 client the blob store uses, backed
+    # by a local directory. Lets dev and tests exercise the S3 code path
+    # without a bucket.
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def _path(self, bucket: str, key: str) -> Path:
+        path = (self.root / bucket / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"key escapes bucket: {key!r}")
+        return path
+
+    def put_object(self, *, Bucket: str, Key: str, Body: bytes, **_: Any) -> dict[str, Any]:
+        path = self._path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(Body)
+        return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}
+
+    def get_object(self, *, Bucket: str, Key: str) -> dict[str, Any]:
+        body = self._path(Bucket, Key).read_bytes()
+        return {"Body": io.BytesIO(body), "ContentLength": len(body)}
+
+    def head_object(self, *, Bucket: str, Key: str) -> dict[str, Any]:
+        return {"ContentLength": self._path(Bucket, Key).stat().st_size}
+
+    def delete_object(self, *, Bucket: str, Key: str) -> dict[str, Any]:
+        self._path(Bucket, Key).unlink(missing_ok=True)
+        return {}
+
+
+BlobStore = LocalBlobStore | S3BlobStore
+
+
+def build_blob_store(
+    *,
+    backend: str = "local",
+    local_dir: str = "./blob_store",
+    s3_bucket: str = "",
+    s3_endpoint_url: str = "",
+    s3_prefix: str = "blobs/",
+) -> BlobStore:
+    if backend == "local":
+        return LocalBlobStore(local_dir)
+    if backend != "s3":
+        raise ValueError(f"unknown blob store backend: {backend}")
+    if not s3_bucket:
+        raise ValueError("BLOB_S3_BUCKET is required for the s3 blob store")
+    if s3_endpoint_url.startswith("file://"):
+        client: Any = DirectoryS3Client(s3_endpoint_url[len("file://"):])
+    else:
+        if boto3 is None:
+            raise RuntimeError("boto3 is required for the s3 blob store")
+        client = boto3.client("s3", endpoint_url=s3_endpoint_url or None)
+    return S3BlobStore(client, bucket=s3_bucket, prefix=s3_prefix)
+
+
+def blob_store_from_env() -> BlobStore:
+    return build_blob_store(
+        backend=os.getenv("BLOB_STORE_BACKEND", "local").strip().lower(),
+        local_dir=os.getenv("BLOB_STORE_DIR", "./blob_store").strip(),
+        s3_bucket=os.getenv("BLOB_S3_BUCKET", "").strip(),
+        s3_endpoint_url=os.getenv("BLOB_S3_ENDPOINT_URL", "").strip(),
+        s3_prefix=os.getenv("BLOB_S3_PREFIX", "blobs/").strip(),
+    )
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Collection
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import CatalogState, Dish
+from .tagging import DishTags, normalize_tags_payload, tags_from_legacy_fields
+
+if TYPE_CHECKING:
+    from .seen_set import SeenSet
+
+CATALOG_STATE_KEY = "dishes"
+# Its `version` is the next free dish ordinal. Ordinals are never reused, even
+# after dishes are deleted, so a stored seen-set bit can only ever mean the
+# dish it was set for.
+ORDINAL_STATE_KEY = "dish_ordinals"
+
+
+@dataclass(frozen=True)
+class CatalogRecord:
+    id: str
+    name: str
+    subtitle: str
+    tags: DishTags
+    image_id: str | None
+    ordinal: int | None = None
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    records: tuple[CatalogRecord, ...]
+    built_at: float
+    rebuild_ms: float
+
+    def sample(
+        self,
+        *,
+        count: int,
+        avoid_names: Collection[str] = (),
+        seen: SeenSet | None = None,
+        rng: random.Random | None = None,
+    ) -> list[CatalogRecord]:
+        if count <= 0 or not self.records:
+            return []
+        rng = rng or random
+        seen_count = len(seen) if seen is not None else 0
+
+        def allowed(record: CatalogRecord) -> bool:
+            if record.name in avoid_names:
+                return False
+            return not (seen_count and record.ordinal in seen)
+
+        size = len(self.records)
+        if (len(avoid_names) + seen_count) * 2 >= size:
+            # Mostly excluded catalog: filtering once beats repeated rejections.
+            survivors = [record for record in self.records if allowed(record)]
+            return rng.sample(survivors, min(count, len(survivors)))
+
+        # At least half the catalog is eligible, so rejection sampling needs
+        # about 2 * count draws on average regardless of how much was excluded.
+        picked: list[CatalogRecord] = []
+        tried: set[int] = set()
+        while len(picked) < count and len(tried) < size:
+            position = rng.randrange(size)
+            if position in tried:
+                continue
+            tried.add(position)
+            record = self.records[position]
+            if allowed(record):
+                picked.append(record)
+        return picked
+
+
+@dataclass
+class CatalogCacheStats:
+    hits: int = 0
+    misses: int = 0
+    rebuilds: int = 0
+    last_rebuild_ms: float = 0.0
+    total_rebuild_ms: float = 0.0
+
+    def as_dict(self) -> dict[str, float | int]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "rebuilds": self.rebuilds,
+            "last_rebuild_ms": round(self.last_rebuild_ms, 3),
+            "total_rebuild_ms": round(self.total_rebuild_ms, 3),
+        }
+
+
+def normalized_dish_tags(row: Any) -> DishTags:
+    if isinstance(row.tags_json, dict) and row.tags_json:
+        tags, _, _ = normalize_tags_payload(row.tags_json, raw_candidates=row.candidate_tags_json)
+        return tags
+    return tags_from_legacy_fields(row.category_tags, row.signals)
+
+
+def catalog_record_from_dish(row: Any) -> CatalogRecord:
+    return CatalogRecord(
+        id=row.id,
+        name=row.name,
+        subtitle=row.subtitle,
+        tags=normalized_dish_tags(row),
+        image_id=row.image_id,
+        ordinal=row.ordinal,
+    )
+
+
+def read_catalog_version(session: Session) -> int:
+    value = session.scalar(select(CatalogState.version).where(CatalogState.key == CATALOG_STATE_KEY))
+    return int(value or 0)
+
+
+def _lock_ordinal_state(session: Session) -> CatalogState:
+    # SELECT ... FOR UPDATE on the high-water mark row serializes concurrent
+    # assigners until the holder commits.
+    state = session.get(CatalogState, ORDINAL_STATE_KEY, with_for_update=True)
+    if state is not None:
+        return state
+    # First assignment since the high-water mark was introduced.
+    start = int(session.scalar(select(func.max(Dish.ordinal))) or -1) + 1
+    state = CatalogState(key=ORDINAL_STATE_KEY, version=start, updated_at=datetime.now(timezone.utc))
+    try:
+        with session.begin_nested():
+            session.add(state)
+    except IntegrityError:
+        # Another writer created it first; wait for its lock instead.
+        state = session.get(CatalogState, ORDINAL_STATE_KEY, with_for_update=True, populate_existing=True)
+    return state
+
+
+def assign_dish_ordinals(session: Session) -> int:
+    session.flush()
+    if session.scalar(select(func.count()).select_from(Dish).where(Dish.ordinal.is_(None))) == 0:
+        return 0
+    state = _lock_ordinal_state(session)
+    # Read the dishes still missing an ordinal only once the lock is held, so
+    # two writers never number the same dish or hand out the same ordinal.
+    missing = session.scalars(
+        select(Dish).where(Dish.ordinal.is_(None)).order_by(Dish.created_at, Dish.id)
+    ).all()
+    if not missing:
+        return 0
+    next_ordinal = int(state.version)
+    for offset, dish in enumerate(missing):
+        dish.ordinal = next_ordinal + offset
+    state.version = next_ordinal + len(missing)
+    state.updated_at = datetime.now(timezone.utc)
+    session.flush()
+    return len(missing)
+
+
+def bump_catalog_version(session: Session) -> None:
+    assign_dish_ordinals(session)
+    now = datetime.now(timezone.utc)
+    result = session.execute(
+        update(CatalogState)
+        .where(CatalogState.key == CATALOG_STATE_KEY)
+        .values(version=CatalogState.version + 1, updated_at=now)
+    )
+    if not result.rowcount:
+        session.add(CatalogState(key=CATALOG_STATE_KEY, version=1, updated_at=now))
+        session.flush()
+
+
+class CatalogCache:
+    def __init__(self, *, max_age_seconds: float = 300.0) -> None:
+        self.max_age_seconds = max_age_seconds
+        self.stats = CatalogCacheStats()
+        self._snapshot: CatalogSnapshot | None = None
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+
+    def snapshot(self, session: Session) -> CatalogSnapshot:
+        version = read_catalog_version(session)
+        current = self._snapshot
+        if (
+            current is not None
+            and current.version == version
+            and time.monotonic() - current.built_at < self.max_age_seconds
+        ):
+            self.stats.hits += 1
+            return current
+
+        self.stats.misses += 1
+        rebuilt = self._rebuild(session, version)
+        self._snapshot = rebuilt
+        return rebuilt
+
+    def _rebuild(self, session: Session, version: int) -> CatalogSnapshot:
+        started = time.perf_counter()
+        rows = session.execute(
+            select(
+                Dish.id,
+                Dish.name,
+                Dish.subtitle,
+                Dish.tags_json,
+                Dish.candidate_tags_json,
+                Dish.category_tags,
+                Dish.signals,
+                Dish.image_id,
+                Dish.ordinal,
+            )
+            .where(Dish.status == "ready")
+            .order_by(Dish.random_key)
+        ).all()
+        records = tuple(catalog_record_from_dish(row) for row in rows)
+        rebuild_ms = (time.perf_counter() - started) * 1000.0
+        self.stats.rebuilds += 1
+        self.stats.last_rebuild_ms = rebuild_ms
+        self.stats.total_rebuild_ms += rebuild_ms
+        return CatalogSnapshot(
+            version=version,
+            records=records,
+            built_at=time.monotonic(),
+            rebuild_ms=rebuild_ms,
+        )
+
+    def describe(self) -> dict[str, float | int]:
+        payload = self.stats.as_dict()
+        current = self._snapshot
+        payload["version"] = current.version if current else 0
+        payload["records"] = len(current.records) if current else 0
+        return payload
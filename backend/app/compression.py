@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except Exception:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except Exception:  # pragma: no cover - optional dependency
+    zstandard = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 6
+
+# Only text-like bodies are worth the CPU; images are already compressed.
+COMPRESSIBLE_PREFIXES = ("application/json", "application/x-ndjson", "text/")
+
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def available_encoders() -> Dict[str, Callable[[bytes], bytes]]:
+    encoders: Dict[str, Callable[[bytes], bytes]] = {}
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        encoders["zstd"] = compressor.compress
+    if brotli is not None:
+        encoders["br"] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+    encoders["gzip"] = _gzip
+    return encoders
+
+
+def parse_accept_encoding(value: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in value.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, raw = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(raw)
+                except ValueError:
+                    quality = 0.0
+        accepted[token] = quality
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: str, available: Dict[str, Callable[[bytes], bytes]]) -> Optional[str]:
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best: Optional[str] = None
+    best_quality = 0.0
+    # `available` is ordered by server preference, which breaks quality ties.
+    for encoding in available:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionBudget:
+    # Token bucket of compression milliseconds, refilled at `ms_per_second`.
+    def __init__(self, ms_per_second: float, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.ms_per_second = max(0.0, ms_per_second)
+        self._clock = clock
+        self._tokens = self.ms_per_second
+        self._updated = clock()
+
+    def available(self) -> bool:
+        now = self._clock()
+        self._tokens = min(self.ms_per_second, self._tokens + (now - self._updated) * self.ms_per_second)
+        self._updated = now
+        return self._tokens > 0
+
+    def spend(self, elapsed_ms: float) -> None:
+        self._tokens -= elapsed_ms
+
+
+class CompressedBodyCache:
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max(0, max_bytes)
+        self._entries: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._total_bytes = 0
+
+    def get(self, key: tuple[str, str]) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def put(self, key: tuple[str, str], body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._total_bytes -= len(previous)
+        self._entries[key] = body
+        self._total_bytes += len(body)
+        while self._total_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= len(evicted)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._total_bytes = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@dataclass
+class RouteCompressionStats:
+    responses: int = 0
+    compressed: int = 0
+    cache_hits: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    compress_ms: float = 0.0
+    skipped_small: int = 0
+    skipped_encoded: int = 0
+    skipped_type: int = 0
+    skipped_budget: int = 0
+    skipped_streaming: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "responses": self.responses,
+            "compressed": self.compressed,
+            "cache_hits": self.cache_hits,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "compress_ms": round(self.compress_ms, 3),
+            "skipped": {
+                "below_threshold": self.skipped_small,
+                "already_encoded": self.skipped_encoded,
+                "not_compressible": self.skipped_type,
+                "cpu_budget": self.skipped_budget,
+                "streaming": self.skipped_streaming,
+            },
+        }
+
+
+class CompressionStats:
+    def __init__(self) -> None:
+        self.routes: defaultdict[str, RouteCompressionStats] = defaultdict(RouteCompressionStats)
+
+    def route(self, name: str) -> RouteCompressionStats:
+        return self.routes[name]
+
+    def reset(self) -> None:
+        self.routes.clear()
+
+    def describe(self) -> dict[str, Any]:
+        return {name: stats.as_dict() for name, stats in sorted(self.routes.items())}
+
+
+def _route_name(scope: Scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return f"{scope.get('method', 'GET')} {path or scope.get('path', '')}"
+
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.lower().startswith(COMPRESSIBLE_PREFIXES)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        minimum_size: int = 1024,
+        cpu_budget_ms_per_second: float = 250.0,
+        cache_max_bytes: int = 16 * 1024 * 1024,
+        stats: CompressionStats | None = None,
+    ) -> None:
+        self.app = app
+        self.minimum_size = max(0, minimum_size)
+        self.encoders = available_encoders()
+        self.budget = CompressionBudget(cpu_budget_ms_per_second)
+        self.cache = CompressedBodyCache(cache_max_bytes)
+        self.stats = stats or CompressionStats()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encoders)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self, scope, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, scope: Scope, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self._send = send
+        self._start: Message | None = None
+        self._passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if self._passthrough:
+            await self._send(message)
+            return
+        if message["type"] == "http.response.start":
+            self._start = message
+            return
+        if message["type"] != "http.response.body" or self._start is None:
+            await self._send(message)
+            return
+
+        stats = self.middleware.stats.route(_route_name(self.scope))
+        body: bytes = message.get("body", b"")
+        if message.get("more_body", False):
+            # Streaming responses flush incrementally; buffering them to
+            # compress would defeat the point.
+            stats.responses += 1
+            stats.skipped_streaming += 1
+            self._passthrough = True
+            await self._send(self._start)
+            await self._send(message)
+            return
+
+        await self._finish(stats, body)
+
+    async def _finish(self, stats: RouteCompressionStats, body: bytes) -> None:
+        assert self._start is not None
+        start = self._start
+        headers = MutableHeaders(scope=start)
+        stats.responses += 1
+        stats.bytes_in += len(body)
+
+        skip = None
+        if "content-encoding" in headers:
+            skip = "encoded"
+        elif not _is_compressible(headers.get("content-type", "")):
+            skip = "type"
+        elif len(body) < self.middleware.minimum_size:
+            skip = "small"
+        if skip is None:
+            encoded = self._encode(stats, body, headers)
+            if encoded is not None:
+                headers["Content-Encoding"] = self.encoding
+                headers["Content-Length"] = str(len(encoded))
+                headers.add_vary_header("Accept-Encoding")
+                stats.bytes_out += len(encoded)
+                await self._send(start)
+                await self._send({"type": "http.response.body", "body": encoded})
+                return
+            skip = "budget"
+
+        if skip == "encoded":
+            stats.skipped_encoded += 1
+        elif skip == "type":
+            stats.skipped_type += 1
+        elif skip == "small":
+            stats.skipped_small += 1
+        else:
+            stats.skipped_budget += 1
+        if skip in {"small", "budget"}:
+            headers.add_vary_header("Accept-Encoding")
+        stats.bytes_out += len(body)
+        await self._send(start)
+        await self._send({"type": "http.response.body", "body": body})
+
+    def _cache_key(self, body: bytes, headers: MutableHeaders) -> tuple[str, str] | None:
+        # Only safe, successful GETs are worth remembering; deck POSTs are
+        # random per request and would just churn the cache.
+        if self.scope.get("method") != "GET" or self._start is None or self._start.get("status") != 200:
+            return None
+        if "no-store" in headers.get("cache-control", "").lower():
+            return None
+        validator = headers.get("etag") or hashlib.blake2b(body, digest_size=16).hexdigest()
+        return self.encoding, validator
+
+    def _encode(self, stats: RouteCompressionStats, body: bytes, headers: MutableHeaders) -> bytes | None:
+        middleware = self.middleware
+        key = self._cache_key(body, headers)
+        if key is not None:
+            cached = middleware.cache.get(key)
+            if cached is not None:
+                stats.cache_hits += 1
+                stats.compressed += 1
+                return cached
+
+        if not middleware.budget.available():
+            return None
+        started = time.perf_counter()
+        encoded = middleware.encoders[self.encoding](body)
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        middleware.budget.spend(elapsed_ms)
+        stats.compress_ms += elapsed_ms
+        stats.compressed += 1
+        if key is not None:
+            middleware.cache.put(key, encoded)
+        return encoded
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import tempfile
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Sequence
+
+from .gemini_client import GeminiHttpClient
+
+BATCH_PENDING = "pending"
+BATCH_RUNNING = "running"
+BATCH_SUCCEEDED = "succeeded"
+BATCH_FAILED = "failed"
+BATCH_CANCELLED = "cancelled"
+BATCH_EXPIRED = "expired"
+FINISHED_BATCH_STATES = {BATCH_SUCCEEDED, BATCH_FAILED, BATCH_CANCELLED, BATCH_EXPIRED}
+
+# batches.get reports BATCH_STATE_*; older responses used JOB_STATE_*.
+_UPSTREAM_STATES = {
+    "PENDING": BATCH_PENDING,
+    "RUNNING": BATCH_RUNNING,
+    "SUCCEEDED": BATCH_SUCCEEDED,
+    "FAILED": BATCH_FAILED,
+    "CANCELLED": BATCH_CANCELLED,
+    "EXPIRED": BATCH_EXPIRED,
+}
+
+BatchResponder = Callable[[str, dict], Awaitable[dict]]
+
+
+@dataclass(frozen=True)
+class BatchRequest:
+    key: str
+    model: str
+    request: dict
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    key: str
+    response: dict | None = None
+    error: str = ""
+
+
+@dataclass(frozen=True)
+class BatchStatus:
+    name: str
+    state: str
+    error: str = ""
+
+    @property
+    def done(self) -> bool:
+        return self.state in FINISHED_BATCH_STATES
+
+
+@dataclass
+class BatchJobFile:
+    # Everything batch-collect needs to ingest a submitted job, written next
+    # to the operator's shell rather than kept only in the database.
+    generation_job_id: str
+    backend: str
+    entries: list[dict[str, str]]
+    requests: list[BatchRequest]
+    batches: dict[str, str] = field(default_factory=dict)
+    source: str = "batch_seed"
+    version: int = 1
+
+    def to_json(self) -> dict[str, Any]:
+        payload = asdict(self)
+        payload["requests"] = [asdict(item) for item in self.requests]
+        return payload
+
+    @classmethod
+    def from_json(cls, payload: dict[str, Any]) -> "BatchJobFile":
+        version = int(payload.get("version", 1))
+        if version != 1:
+            raise ValueError(f"unsupported batch job file version: {version}")
+        return cls(
+            generation_job_id=str(payload["generation_job_id"]),
+            backend=str(payload["backend"]),
+            entries=list(payload.get("entries") or []),
+            requests=[BatchRequest(**item) for item in payload.get("requests") or []],
+            batches=dict(payload.get("batches") or {}),
+            source=str(payload.get("source") or "batch_seed"),
+            version=version,
+        )
+
+    def requests_by_model(self) -> dict[str, list[BatchRequest]]:
+        grouped: dict[str, list[BatchRequest]] = {}
+        for item in self.requests:
+            grouped.setdefault(item.model, []).append(item)
+        return grouped
+
+
+def write_batch_job_file(path: str | Path, job: BatchJobFile) -> None:
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(job.to_json(), handle, ensure_ascii=False)
+        os.replace(tmp_name, target)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def read_batch_job_file(path: str | Path) -> BatchJobFile:
+    with Path(path).open(encoding="utf-8") as handle:
+        return BatchJobFile.from_json(json.load(handle))
+
+
+def _error_message(error: object) -> str:
+    if isinstance(error, dict):
+        return str(error.get("message") or json.dumps(error, ensure_ascii=False))
+    return str(error or "")
+
+
+class LocalBatchBackend:
+    # File-based stand-in for the Gemini batch API. Each submitted batch is a
+    # directory holding input.jsonl and state.json. The first poll of a
+    # pending batch answers every line through `responder`, when one is set,
+    # and writes output.jsonl; without one the batch stays pending until
+    # something else writes the output.
+    kind = "local"
+
+    def __init__(self, root: str | Path, *, responder: BatchResponder | None = None, concurrency: int = 4) -> None:
+        self.root = Path(root)
+        self.responder = responder
+        self.concurrency = max(1, concurrency)
+
+    def _dir(self, name: str) -> Path:
+        batch_id = name.split("/", 1)[-1]
+        if not batch_id or "/" in batch_id or batch_id.startswith("."):
+            raise ValueError(f"invalid local batch name: {name!r}")
+        return self.root / batch_id
+
+    def _write_state(self, name: str, state: str, error: str = "") -> None:
+        (self._dir(name) / "state.json").write_text(json.dumps({"state": state, "error": error}), encoding="utf-8")
+
+    async def submit(self, *, model: str, requests: Sequence[BatchRequest], display_name: str) -> str:
+        name = f"batches/local-{uuid.uuid4().hex}"
+        directory = self._dir(name)
+        directory.mkdir(parents=True)
+        with (directory / "input.jsonl").open("w", encoding="utf-8") as handle:
+            for item in requests:
+                handle.write(json.dumps({"key": item.key, "request": item.request}, ensure_ascii=False) + "\n")
+        (directory / "batch.json").write_text(
+            json.dumps({"model": model, "display_name": display_name}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        self._write_state(name, BATCH_PENDING)
+        return name
+
+    async def status(self, name: str) -> BatchStatus:
+        directory = self._dir(name)
+        state = json.loads((directory / "state.json").read_text(encoding="utf-8"))
+        if state["state"] == BATCH_PENDING and self.responder is not None:
+            await self._run(name)
+            state = json.loads((directory / "state.json").read_text(encoding="utf-8"))
+        return BatchStatus(name=name, state=state["state"], error=state.get("error", ""))
+
+    async def _run(self, name: str) -> None:
+        assert self.responder is not None
+        directory = self._dir(name)
+        model = json.loads((directory / "batch.json").read_text(encoding="utf-8"))["model"]
+        lines = [json.loads(line) for line in (directory / "input.jsonl").read_text(encoding="utf-8").splitlines() if line]
+        self._write_state(name, BATCH_RUNNING)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def answer(line: dict) -> dict:
+            async with semaphore:
+                try:
+                    return {"key": line["key"], "response": await self.responder(model, line["request"])}
+                except Exception as exc:
+                    return {"key": line["key"], "error": {"message": str(exc)}}
+
+        outputs = await asyncio.gather(*(answer(line) for line in lines))
+        with (directory / "output.jsonl").open("w", encoding="utf-8") as handle:
+            for output in outputs:
+                handle.write(json.dumps(output, ensure_ascii=False) + "\n")
+        self._write_state(name, BATCH_SUCCEEDED)
+
+    async def results(self, name: str) -> list[BatchResult]:
+        output = self._dir(name) / "output.jsonl"
+        results: list[BatchResult] = []
+        for line in output.read_text(encoding="utf-8").splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            results.append(
+                BatchResult(key=str(item["key"]), response=item.get("response"), error=_error_message(item.get("error")))
+            )
+        return results
+
+
+class GeminiBatchBackend:
+    # Gemini batch mode (models/{model}:batchGenerateContent) with inline
+    # requests, which keeps prompt-only jobs clear of the Files API.
+    kind = "gemini"
+
+    def __init__(self, client: GeminiHttpClient, *, api_key: str) -> None:
+        self.client = client
+        self.api_key = api_key
+
+    def _headers(self) -> dict[str, str]:
+        if not self.api_key:
+            raise RuntimeError("GEMINI_API_KEY is not set")
+        return {"Content-Type": "application/json", "x-goog-api-key": self.api_key}
+
+    async def submit(self, *, model: str, requests: Sequence[BatchRequest], display_name: str) -> str:
+        body = {
+            "batch": {
+                "display_name": display_name,
+                "input_config": {
+                    "requests": {
+                        "requests": [{"request": item.request, "metadata": {"key": item.key}} for item in requests]
+                    }
+                },
+            }
+        }
+        resp = await self.client.open().post(
+            f"/v1beta/models/{model}:batchGenerateContent",
+            headers=self._headers(),
+            json=body,
+        )
+        if resp.status_code >= 400:
+            raise RuntimeError(f"Gemini batch submit HTTP {resp.status_code} model={model}: {resp.text[:1200]}")
+        name = str(resp.json().get("name") or "")
+        if not name:
+            raise RuntimeError("Gemini batch submit returned no batch name")
+        return name
+
+    async def _get(self, name: str) -> dict:
+        resp = await self.client.open().get(f"/v1beta/{name}", headers=self._headers())
+        if resp.status_code >= 400:
+            raise RuntimeError(f"Gemini batch get HTTP {resp.status_code} name={name}: {resp.text[:1200]}")
+        return resp.json()
+
+    async def status(self, name: str) -> BatchStatus:
+        payload = await self._get(name)
+        raw_state = str((payload.get("metadata") or {}).get("state") or payload.get("state") or "")
+        state = _UPSTREAM_STATES.get(raw_state.rsplit("_", 1)[-1], BATCH_PENDING)
+        if payload.get("done") and state not in FINISHED_BATCH_STATES:
+            state = BATCH_FAILED if payload.get("error") else BATCH_SUCCEEDED
+        return BatchStatus(name=name, state=state, error=_error_message(payload.get("error")))
+
+    async def results(self, name: str) -> list[BatchResult]:
+        payload = await self._get(name)
+        container = payload.get("response") or (payload.get("metadata") or {}).get("output") or {}
+        inlined = container.get("inlinedResponses") or {}
+        if isinstance(inlined, dict):
+            inlined = inlined.get("inlinedResponses") or []
+        results: list[BatchResult] = []
+        for item in inlined:
+            key = str((item.get("metadata") or {}).get("key") or "")
+            results.append(BatchResult(key=key, response=item.get("response"), error=_error_message(item.get("error"))))
+        return results
+
+
+BatchBackend = LocalBatchBackend | GeminiBatchBackend
+
+
+def build_batch_backend(
+    kind: str,
+    *,
+    local_dir: str | Path = "./batch_jobs",
+    client: GeminiHttpClient | None = None,
+    api_key: str = "",
+    responder: BatchResponder | None = None,
+) -> BatchBackend:
+    if kind == "local":
+        return LocalBatchBackend(local_dir, responder=responder)
+    if kind != "gemini":
+        raise ValueError(f"unknown batch backend: {kind}")
+    if client is None:
+        raise ValueError("the gemini batch backend needs a GeminiHttpClient")
+    return GeminiBatchBackend(client, api_key=api_key)
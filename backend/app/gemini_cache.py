@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import GeminiResponseCacheEntry
+
+logger = logging.getLogger("readytoorder.backend")
+
+
+def gemini_cache_key(model: str, payload: dict) -> str:
+    # Canonical JSON so key order in the payload does not split the cache.
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(canonical.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def payload_temperature(payload: dict) -> float:
+    config = payload.get("generationConfig") or {}
+    try:
+        return float(config.get("temperature", 1.0))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def is_complete_response(payload: dict, response: dict) -> bool:
+    # Only remember answers a retry would not try to improve on: a finished
+    # candidate with text, which must parse when JSON output was requested.
+    candidates = response.get("candidates") or []
+    if not candidates or not isinstance(candidates[0], dict):
+        return False
+    candidate = candidates[0]
+    if candidate.get("finishReason") not in (None, "STOP"):
+        return False
+    parts = (candidate.get("content") or {}).get("parts") or []
+    text = "".join(str(part.get("text", "")) for part in parts if isinstance(part, dict))
+    if not text.strip():
+        return False
+    config = payload.get("generationConfig") or {}
+    if config.get("responseMimeType") == "application/json":
+        try:
+            json.loads(text)
+        except ValueError:
+            return False
+    return True
+
+
+@dataclass
+class _Entry:
+    response: dict
+    latency_ms: float
+    expires_at: float
+    size: int
+
+
+@dataclass
+class GeminiCacheStats:
+    lookups: int = 0
+    memory_hits: int = 0
+    db_hits: int = 0
+    stores: int = 0
+    bypassed: int = 0
+    write_errors: int = 0
+    saved_latency_ms: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        hits = self.memory_hits + self.db_hits
+        return {
+            "lookups": self.lookups,
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.lookups - hits,
+            "hit_ratio": round(hits / self.lookups, 4) if self.lookups else 0.0,
+            "stores": self.stores,
+            "bypassed": self.bypassed,
+            "write_errors": self.write_errors,
+            "saved_latency_ms": round(self.saved_latency_ms, 1),
+        }
+
+
+class GeminiResponseCache:
+    def __init__(
+        self,
+        *,
+        max_bytes: int,
+        ttl_seconds: float,
+        session_factory: Callable[[], Session] | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_bytes = max(0, max_bytes)
+        self.ttl_seconds = max(0.0, ttl_seconds)
+        self.session_factory = session_factory
+        self._clock = clock
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._total_bytes = 0
+        self._pending: set[asyncio.Future] = set()
+        self.stats = GeminiCacheStats()
+
+    def _remember(self, key: str, response: dict, *, latency_ms: float, expires_at: float) -> None:
+        size = len(json.dumps(response, ensure_ascii=False))
+        if size > self.max_bytes:
+            return
+        self._forget(key)
+        self._entries[key] = _Entry(response=response, latency_ms=latency_ms, expires_at=expires_at, size=size)
+        self._total_bytes += size
+        while self._total_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= evicted.size
+
+    def _forget(self, key: str) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._total_bytes -= previous.size
+
+    async def _load_persisted(self, key: str, now: float) -> _Entry | None:
+        # The SELECT runs off the event loop; an expired row is simply a miss
+        # and is left for the cleanup job to delete.
+        if self.session_factory is None:
+            return None
+        try:
+            entry = await asyncio.to_thread(self._read, key)
+        except Exception:
+            logger.exception("gemini cache read failed key=%s", key[:12])
+            return None
+        if entry is None or entry.expires_at <= now:
+            return None
+        return entry
+
+    def _read(self, key: str) -> _Entry | None:
+        assert self.session_factory is not None
+        with self.session_factory() as session:
+            row = session.get(GeminiResponseCacheEntry, key)
+            if row is None:
+                return None
+            expires_at = _as_utc(row.expires_at).timestamp()
+            return _Entry(response=row.response_json, latency_ms=row.latency_ms, expires_at=expires_at, size=0)
+
+    async def get(self, key: str) -> dict | None:
+        self.stats.lookups += 1
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            self._forget(key)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats.memory_hits += 1
+        else:
+            entry = await self._load_persisted(key, now)
+            if entry is None:
+                return None
+            self.stats.db_hits += 1
+            self._remember(key, entry.response, latency_ms=entry.latency_ms, expires_at=entry.expires_at)
+        self.stats.saved_latency_ms += entry.latency_ms
+        return entry.response
+
+    def put(self, key: str, *, model: str, response: dict, latency_ms: float) -> None:
+        now = self._clock()
+        expires_at = now + self.ttl_seconds
+        self._remember(key, response, latency_ms=latency_ms, expires_at=expires_at)
+        self.stats.stores += 1
+        if self.session_factory is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._persist(key, model, response, latency_ms, now, expires_at)
+            return
+        # The memory copy already serves hits; the table write happens off the
+        # event loop so a slow or failing database never holds up the caller.
+        future = loop.run_in_executor(None, self._persist, key, model, response, latency_ms, now, expires_at)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+
+    async def flush(self) -> None:
+        if self._pending:
+            await asyncio.gather(*list(self._pending))
+
+    def _persist(self, key: str, model: str, response: dict, latency_ms: float, now: float, expires_at: float) -> None:
+        assert self.session_factory is not None
+        try:
+            for attempt in (1, 2):
+                with self.session_factory() as session:
+                    row = session.get(GeminiResponseCacheEntry, key)
+                    if row is None:
+                        row = GeminiResponseCacheEntry(key=key)
+                        session.add(row)
+                    row.model = model
+                    row.response_json = response
+                    row.latency_ms = latency_ms
+                    row.created_at = datetime.fromtimestamp(now, timezone.utc)
+                    row.expires_at = datetime.fromtimestamp(expires_at, timezone.utc)
+                    try:
+                        session.commit()
+                        return
+                    except IntegrityError:
+                        # A concurrent miss stored the same key first; the
+                        # second pass finds its row and overwrites it.
+                        session.rollback()
+                        if attempt == 2:
+                            raise
+        except Exception:
+            self.stats.write_errors += 1
+            logger.exception("gemini cache write failed key=%s", key[:12])
+
+    def bypass(self) -> None:
+        self.stats.bypassed += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._total_bytes = 0
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            **self.stats.as_dict(),
+        }
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes even for timezone-aware columns.
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def purge_expired_gemini_cache(session: Session, *, now: datetime | None = None) -> int:
+    cutoff = now or datetime.now(timezone.utc)
+    result = session.execute(delete(GeminiResponseCacheEntry).where(GeminiResponseCacheEntry.expires_at < cutoff))
+    return int(result.rowcount or 0)
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Mapping
+
+import httpx
+
+try:
+    import h2
+except Exception:  # pragma: no cover - optional dependency
+    h2 = None
+
+logger = logging.getLogger("readytoorder.backend")
+
+
+@dataclass(frozen=True)
+class GeminiTimeout:
+    connect: float
+    read: float
+    write: float = 30.0
+    pool: float = 30.0
+
+    def as_httpx(self) -> httpx.Timeout:
+        return httpx.Timeout(connect=self.connect, read=self.read, write=self.write, pool=self.pool)
+
+
+def parse_model_timeouts(raw: str, *, default: GeminiTimeout) -> dict[str, GeminiTimeout]:
+    # "model=read_seconds[,connect_seconds]" entries separated by ";".
+    profiles: dict[str, GeminiTimeout] = {}
+    for entry in raw.split(";"):
+        model, sep, values = entry.partition("=")
+        model = model.strip()
+        if not model or not sep:
+            continue
+        parts = [item.strip() for item in values.split(",") if item.strip()]
+        try:
+            read = float(parts[0])
+            connect = float(parts[1]) if len(parts) > 1 else default.connect
+        except (IndexError, ValueError):
+            logger.warning("ignoring malformed Gemini timeout profile: %r", entry)
+            continue
+        profiles[model] = GeminiTimeout(connect=connect, read=read, write=default.write, pool=default.pool)
+    return profiles
+
+
+@dataclass
+class ModelPoolStats:
+    requests: int = 0
+    new_connections: int = 0
+    reused_connections: int = 0
+    checkout_wait_ms: float = 0.0
+    max_checkout_wait_ms: float = 0.0
+    errors: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        connections = self.new_connections + self.reused_connections
+        checkouts = max(1, connections)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_rate": round(self.reused_connections / connections, 4) if connections else 0.0,
+            "checkout_wait_ms_avg": round(self.checkout_wait_ms / checkouts, 3),
+            "checkout_wait_ms_max": round(self.max_checkout_wait_ms, 3),
+            "errors": self.errors,
+        }
+
+
+class _ConnectionTrace:
+    # httpcore reports connection events through the "trace" extension. The
+    # first event after the request is queued marks the pool checkout: either
+    # a new TCP connect or headers going out on a kept-alive connection.
+    def __init__(self, stats: ModelPoolStats) -> None:
+        self.stats = stats
+        self.started = time.perf_counter()
+        self.checked_out = False
+
+    def _checkout(self, *, reused: bool) -> None:
+        if self.checked_out:
+            return
+        self.checked_out = True
+        wait_ms = (time.perf_counter() - self.started) * 1000.0
+        self.stats.checkout_wait_ms += wait_ms
+        self.stats.max_checkout_wait_ms = max(self.stats.max_checkout_wait_ms, wait_ms)
+        if reused:
+            self.stats.reused_connections += 1
+        else:
+            self.stats.new_connections += 1
+
+    async def __call__(self, event_name: str, info: Mapping[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.started":
+            self._checkout(reused=False)
+        elif event_name.endswith(".send_request_headers.started"):
+            self._checkout(reused=True)
+
+
+class GeminiHttpClient:
+    # One pooled client for every Gemini call so requests reuse TCP/TLS
+    # connections instead of paying a handshake each time.
+    def __init__(
+        self,
+        *,
+        base_url: str,
+        default_timeout: GeminiTimeout,
+        model_timeouts: Mapping[str, GeminiTimeout] | None = None,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.default_timeout = default_timeout
+        self.model_timeouts = dict(model_timeouts or {})
+        self.limits = httpx.Limits(
+            max_connections=max(1, max_connections),
+            max_keepalive_connections=max(0, max_keepalive_connections),
+            keepalive_expiry=max(0.0, keepalive_expiry),
+        )
+        if http2 and h2 is None:
+            logger.warning("GEMINI_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+        self.http2 = bool(http2 and h2 is not None)
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self.stats: defaultdict[str, ModelPoolStats] = defaultdict(ModelPoolStats)
+
+    def timeout_for(self, model: str) -> GeminiTimeout:
+        return self.model_timeouts.get(model, self.default_timeout)
+
+    def open(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                http2=self.http2,
+                timeout=self.default_timeout.as_httpx(),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    async def post(self, path: str, *, model: str, headers: Mapping[str, str], json: Any) -> httpx.Response:
+        client = self.open()
+        stats = self.stats[model]
+        stats.requests += 1
+        trace = _ConnectionTrace(stats)
+        try:
+            return await client.post(
+                path,
+                headers=headers,
+                json=json,
+                timeout=self.timeout_for(model).as_httpx(),
+                extensions={"trace": trace},
+            )
+        except httpx.RequestError:
+            stats.errors += 1
+            raise
+
+    async def post_stream(self, path: str, *, model: str, headers: Mapping[str, str], json: Any) -> httpx.Response:
+        # Returns once the response headers arrive; the caller reads the body
+        # incrementally and must aclose() the response.
+        client = self.open()
+        stats = self.stats[model]
+        stats.requests += 1
+        request = client.build_request(
+            "POST",
+            path,
+            headers=headers,
+            json=json,
+            timeout=self.timeout_for(model).as_httpx(),
+            extensions={"trace": _ConnectionTrace(stats)},
+        )
+        try:
+            return await client.send(request, stream=True)
+        except httpx.RequestError:
+            stats.errors += 1
+            raise
+
+    def reset_stats(self) -> None:
+        self.stats.clear()
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "open": self._client is not None and not self._client.is_closed,
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry_seconds": self.limits.keepalive_expiry,
+            "models": {model: stats.as_dict() for model, stats in sorted(self.stats.items())},
+        }
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger("readytoorder.backend")
+
+# (model, prefix, ttl_seconds) -> upstream cachedContents name.
+CreateCachedContent = Callable[[str, "StaticPrefix", float], Awaitable[str]]
+DeleteCachedContent = Callable[[str], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class StaticPrefix:
+    # A prompt prefix that never changes between calls, sent as the
+    # payload's systemInstruction. `key` names it for humans (display name,
+    # /health); lookups go by the digest of the exact text.
+    key: str
+    text: str
+
+    @property
+    def digest(self) -> str:
+        return text_digest(self.text)
+
+
+@dataclass
+class _Entry:
+    name: str = ""
+    expires_at: float = 0.0
+    retry_at: float = 0.0
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def system_instruction_text(payload: dict) -> str | None:
+    instruction = payload.get("systemInstruction")
+    if not isinstance(instruction, dict):
+        return None
+    parts = instruction.get("parts") or []
+    if len(parts) != 1 or not isinstance(parts[0], dict) or set(parts[0]) != {"text"}:
+        return None
+    return str(parts[0]["text"])
+
+
+def is_cached_content_miss(status_code: int, body: str) -> bool:
+    # Gemini answers a reference to expired or evicted cached content with a
+    # NOT_FOUND naming it. Any other 4xx is about the request itself, and
+    # resending it inline would fail the same way.
+    if status_code not in {400, 403, 404}:
+        return False
+    text = body.lower()
+    if "cachedcontent" not in text and "cached content" not in text:
+        return False
+    return any(marker in text for marker in ("not_found", "not found", "expired"))
+
+
+class GeminiContextCache:
+    # Registers static prompt prefixes as upstream cached content, one per
+    # (model, prefix), and rewrites payloads whose systemInstruction is a
+    # registered prefix to reference it instead, so only the per-call part
+    # is uploaded. Anything that goes wrong (upstream refuses a prefix below
+    # its minimum size, quota, an evicted entry) falls back to sending the
+    # full payload; a refused prefix is not retried for `retry_seconds`.
+    def __init__(
+        self,
+        *,
+        create: CreateCachedContent,
+        delete: DeleteCachedContent | None = None,
+        ttl_seconds: float = 3600.0,
+        refresh_margin_seconds: float = 300.0,
+        retry_seconds: float = 600.0,
+        enabled: bool = True,
+    ) -> None:
+        self.create = create
+        self.delete = delete
+        self.ttl_seconds = max(60.0, ttl_seconds)
+        self.refresh_margin_seconds = min(max(0.0, refresh_margin_seconds), self.ttl_seconds / 2)
+        self.retry_seconds = max(0.0, retry_seconds)
+        self.enabled = enabled
+        self._prefixes: dict[str, StaticPrefix] = {}
+        self._entries: dict[tuple[str, str], _Entry] = {}
+        self._locks: dict[tuple[str, str], asyncio.Lock] = {}
+        self.hits = 0
+        self.fallbacks = 0
+        self.created = 0
+        self.create_failures = 0
+        self.invalidated = 0
+        self.chars_saved = 0
+
+    def register(self, key: str, text: str) -> StaticPrefix:
+        prefix = StaticPrefix(key=key, text=text)
+        self._prefixes[prefix.digest] = prefix
+        return prefix
+
+    def prefix_for(self, payload: dict) -> StaticPrefix | None:
+        text = system_instruction_text(payload)
+        if text is None or "cachedContent" in payload:
+            return None
+        return self._prefixes.get(text_digest(text))
+
+    async def apply(self, payload: dict, *, model: str) -> dict:
+        # Returns the payload to put on the wire: either `payload` itself or
+        # a copy with systemInstruction swapped for cachedContent.
+        if not self.enabled:
+            return payload
+        prefix = self.prefix_for(payload)
+        if prefix is None:
+            return payload
+        name = await self._ensure(model, prefix)
+        if not name:
+            self.fallbacks += 1
+            return payload
+        self.hits += 1
+        self.chars_saved += len(prefix.text)
+        wire = {key: value for key, value in payload.items() if key != "systemInstruction"}
+        wire["cachedContent"] = name
+        return wire
+
+    async def _ensure(self, model: str, prefix: StaticPrefix) -> str:
+        slot = (model, prefix.digest)
+        entry = self._entries.get(slot)
+        now = time.monotonic()
+        if entry is not None and entry.name and now < entry.expires_at - self.refresh_margin_seconds:
+            return entry.name
+        if entry is not None and not entry.name and now < entry.retry_at:
+            return ""
+        lock = self._locks.setdefault(slot, asyncio.Lock())
+        async with lock:
+            entry = self._entries.setdefault(slot, _Entry())
+            now = time.monotonic()
+            if entry.name and now < entry.expires_at - self.refresh_margin_seconds:
+                return entry.name
+            try:
+                name = await self.create(model, prefix, self.ttl_seconds)
+            except Exception as exc:
+                self.create_failures += 1
+                entry.name = ""
+                entry.retry_at = time.monotonic() + self.retry_seconds
+                logger.warning("gemini context cache create failed model=%s prefix=%s: %s", model, prefix.key, exc)
+                return ""
+            # The previous entry, if any, simply expires upstream.
+            self.created += 1
+            entry.name = name
+            entry.expires_at = now + self.ttl_seconds
+            logger.info("gemini context cache created model=%s prefix=%s name=%s", model, prefix.key, name)
+            return name
+
+    def invalidate(self, model: str, wire_payload: dict) -> None:
+        # Called when Gemini rejects a call that referenced cached content;
+        # the next call registers the prefix again.
+        name = wire_payload.get("cachedContent")
+        for (entry_model, digest), entry in self._entries.items():
+            if entry_model == model and entry.name and entry.name == name:
+                entry.name = ""
+                entry.expires_at = 0.0
+                self.invalidated += 1
+                # The call goes out again with the prefix inline.
+                if digest in self._prefixes:
+                    self.chars_saved -= len(self._prefixes[digest].text)
+
+    async def aclose(self) -> None:
+        # Cached content is billed per hour of storage; drop ours on shutdown
+        # rather than waiting for the TTL.
+        names = [entry.name for entry in self._entries.values() if entry.name]
+        self._entries.clear()
+        if self.delete is None:
+            return
+        for name in names:
+            try:
+                await self.delete(name)
+            except Exception as exc:
+                logger.warning("gemini context cache delete failed name=%s: %s", name, exc)
+
+    def describe(self) -> dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "prefixes": {prefix.key: {"chars": len(prefix.text)} for prefix in self._prefixes.values()},
+            "entries": [
+                {
+                    "model": model,
+                    "prefix": self._prefixes[digest].key if digest in self._prefixes else digest[:12],
+                    "name": entry.name,
+                    "expires_in_seconds": round(max(0.0, entry.expires_at - now), 1) if entry.name else 0.0,
+                }
+                for (model, digest), entry in self._entries.items()
+            ],
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "created": self.created,
+            "create_failures": self.create_failures,
+            "invalidated": self.invalidated,
+            "chars_saved": self.chars_saved,
+        }
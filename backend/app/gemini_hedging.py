@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class HedgeConfig:
+    percentile: float = 0.95
+    min_samples: int = 20
+    window: int = 200
+    budget_per_minute: int = 10
+    min_delay_seconds: float = 0.5
+
+
+class LatencyWindow:
+    # The most recent successful call latencies for one model and endpoint.
+    def __init__(self, size: int) -> None:
+        self._samples: deque[float] = deque(maxlen=max(1, size))
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+
+class HedgeBudget:
+    # At most `per_minute` hedges in any sliding 60 s window.
+    def __init__(self, per_minute: int, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.per_minute = max(0, per_minute)
+        self._clock = clock
+        self._spent: deque[float] = deque()
+
+    def _trim(self, now: float) -> None:
+        while self._spent and self._spent[0] <= now - 60.0:
+            self._spent.popleft()
+
+    def try_spend(self) -> bool:
+        now = self._clock()
+        self._trim(now)
+        if len(self._spent) >= self.per_minute:
+            return False
+        self._spent.append(now)
+        return True
+
+    def remaining(self) -> int:
+        self._trim(self._clock())
+        return max(0, self.per_minute - len(self._spent))
+
+
+@dataclass
+class HedgeStats:
+    calls: int = 0
+    hedged: int = 0
+    hedge_wins: int = 0
+    budget_denied: int = 0
+    cold: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.calls, 4) if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "win_rate": round(self.hedge_wins / self.hedged, 4) if self.hedged else 0.0,
+            "budget_denied": self.budget_denied,
+            "cold": self.cold,
+        }
+
+
+def _consume_result(task: asyncio.Future) -> None:
+    # A cancelled loser may still finish with an error; retrieve it so asyncio
+    # does not log it as unhandled.
+    if not task.cancelled():
+        task.exception()
+
+
+class GeminiHedger:
+    # If the primary call has not answered within the learned latency
+    # percentile, an identical second call is started; whichever succeeds
+    # first wins and the other is cancelled. Percentiles are learned per
+    # (endpoint, model) because a menu turn with photos and a text-only
+    # analysis have very different latency on the same model.
+    def __init__(self, config: HedgeConfig, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.config = config
+        self._clock = clock
+        self.budget = HedgeBudget(config.budget_per_minute, clock=clock)
+        self._latencies: dict[tuple[str, str], LatencyWindow] = {}
+        self.stats: defaultdict[str, HedgeStats] = defaultdict(HedgeStats)
+
+    def _window(self, endpoint: str, model: str) -> LatencyWindow:
+        key = (endpoint, model)
+        window = self._latencies.get(key)
+        if window is None:
+            window = LatencyWindow(self.config.window)
+            self._latencies[key] = window
+        return window
+
+    def delay_for(self, endpoint: str, model: str) -> float | None:
+        window = self._window(endpoint, model)
+        if len(window) < self.config.min_samples:
+            return None
+        threshold = window.percentile(self.config.percentile)
+        if threshold is None:
+            return None
+        return max(self.config.min_delay_seconds, threshold)
+
+    def _observe(self, endpoint: str, model: str, started: float) -> None:
+        self._window(endpoint, model).add(self._clock() - started)
+
+    async def run(self, *, endpoint: str, model: str, factory: Callable[[], Awaitable[T]]) -> T:
+        stats = self.stats[endpoint]
+        stats.calls += 1
+        delay = self.delay_for(endpoint, model)
+        started = self._clock()
+        primary = asyncio.ensure_future(factory())
+        if delay is None:
+            stats.cold += 1
+            result = await primary
+            self._observe(endpoint, model, started)
+            return result
+
+        try:
+            await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if primary.done() or not self.budget.try_spend():
+            if not primary.done():
+                stats.budget_denied += 1
+            result = await primary
+            self._observe(endpoint, model, started)
+            return result
+
+        stats.hedged += 1
+        hedge = asyncio.ensure_future(factory())
+        pending: set[asyncio.Future] = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in (primary, hedge):
+                    if task in done and not task.cancelled() and task.exception() is None:
+                        if task is hedge:
+                            stats.hedge_wins += 1
+                        # The window learns what an unhedged call costs: the
+                        # primary's full time, or at least its time so far
+                        # when it is about to be cancelled.
+                        if task is primary or not primary.done():
+                            self._observe(endpoint, model, started)
+                        return task.result()
+            # Both failed: surface the primary's error, as an unhedged call would.
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_consume_result)
+            for task in (primary, hedge):
+                if task.done():
+                    _consume_result(task)
+
+    def reset(self) -> None:
+        self._latencies.clear()
+        self.stats.clear()
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "percentile": self.config.percentile,
+            "budget_per_minute": self.budget.per_minute,
+            "budget_remaining": self.budget.remaining(),
+            "endpoints": {endpoint: stats.as_dict() for endpoint, stats in sorted(self.stats.items())},
+            "delays_ms": {
+                f"{endpoint}:{model}": round(delay * 1000.0, 1)
+                for (endpoint, model) in sorted(self._latencies)
+                if (delay := self.delay_for(endpoint, model)) is not None
+            },
+        }
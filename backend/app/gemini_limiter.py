@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Callable
+
+
+class GeminiPriority(IntEnum):
+    # Lower value is served first.
+    INTERACTIVE = 0
+    ANALYSIS = 1
+    BULK = 2
+
+
+class CallOutcome:
+    OK = "ok"
+    THROTTLED = "throttled"
+    ERROR = "error"
+
+
+@dataclass
+class LimiterConfig:
+    initial: float = 8.0
+    minimum: float = 1.0
+    maximum: float = 32.0
+    decrease_factor: float = 0.5
+    latency_tolerance: float = 3.0
+    latency_warmup: int = 10
+    latency_alpha: float = 0.1
+
+
+@dataclass
+class _PriorityStats:
+    acquired: int = 0
+    waited: int = 0
+    wait_ms: float = 0.0
+    max_wait_ms: float = 0.0
+    cancelled: int = 0
+
+    def as_dict(self, queued: int) -> dict[str, Any]:
+        return {
+            "queued": queued,
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "wait_ms_avg": round(self.wait_ms / self.acquired, 3) if self.acquired else 0.0,
+            "wait_ms_max": round(self.max_wait_ms, 3),
+            "cancelled": self.cancelled,
+        }
+
+
+@dataclass
+class LimiterSlot:
+    priority: GeminiPriority
+    started_at: float
+    released: bool = False
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    enqueued_at: float = field(compare=False)
+    future: asyncio.Future[LimiterSlot] = field(compare=False)
+
+
+class AdaptiveLimiter:
+    # AIMD concurrency window for one Gemini model. Each successful call
+    # widens the window by 1/limit (about +1 per full window); a 429/5xx or a
+    # latency spike well above the running average halves it, at most once per
+    # window so a burst of failures from the same window counts once.
+    def __init__(self, name: str, config: LimiterConfig, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.name = name
+        self.config = config
+        self._clock = clock
+        self.limit = min(config.maximum, max(config.minimum, config.initial))
+        self.in_flight = 0
+        self._queue: list[_Waiter] = []
+        self._sequence = itertools.count()
+        self._last_decrease_at = float("-inf")
+        self._latency_ewma_ms: float | None = None
+        self._latency_samples = 0
+        self.increases = 0
+        self.decreases = 0
+        self.throttled = 0
+        self.errors = 0
+        self.priority_stats = {priority: _PriorityStats() for priority in GeminiPriority}
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def _grant(self, priority: GeminiPriority, enqueued_at: float) -> LimiterSlot:
+        now = self._clock()
+        self.in_flight += 1
+        stats = self.priority_stats[priority]
+        wait_ms = (now - enqueued_at) * 1000.0
+        stats.acquired += 1
+        stats.wait_ms += wait_ms
+        stats.max_wait_ms = max(stats.max_wait_ms, wait_ms)
+        return LimiterSlot(priority=priority, started_at=now)
+
+    async def acquire(self, priority: GeminiPriority = GeminiPriority.BULK) -> LimiterSlot:
+        enqueued_at = self._clock()
+        if self._has_capacity() and not self._queue:
+            return self._grant(priority, enqueued_at)
+
+        future: asyncio.Future[LimiterSlot] = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(int(priority), next(self._sequence), enqueued_at, future)
+        heapq.heappush(self._queue, waiter)
+        self.priority_stats[priority].waited += 1
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller gave up.
+                self.release(future.result(), outcome=None)
+            elif waiter in self._queue:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+            self.priority_stats[priority].cancelled += 1
+            raise
+
+    def _dispatch(self) -> None:
+        while self._queue and self._has_capacity():
+            waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                continue
+            waiter.future.set_result(self._grant(GeminiPriority(waiter.priority), waiter.enqueued_at))
+
+    def _decrease(self, slot: LimiterSlot) -> None:
+        if slot.started_at < self._last_decrease_at:
+            return
+        self.limit = max(self.config.minimum, self.limit * self.config.decrease_factor)
+        self._last_decrease_at = self._clock()
+        self.decreases += 1
+
+    def _observe_latency(self, latency_ms: float) -> bool:
+        spike = (
+            self._latency_ewma_ms is not None
+            and self._latency_samples >= self.config.latency_warmup
+            and latency_ms > self._latency_ewma_ms * self.config.latency_tolerance
+        )
+        alpha = self.config.latency_alpha
+        if self._latency_ewma_ms is None:
+            self._latency_ewma_ms = latency_ms
+        else:
+            self._latency_ewma_ms += alpha * (latency_ms - self._latency_ewma_ms)
+        self._latency_samples += 1
+        return spike
+
+    def release(self, slot: LimiterSlot, *, outcome: str | None, latency_ms: float | None = None) -> None:
+        if slot.released:
+            return
+        slot.released = True
+        self.in_flight -= 1
+        if outcome == CallOutcome.THROTTLED:
+            self.throttled += 1
+            self._decrease(slot)
+        elif outcome == CallOutcome.ERROR:
+            self.errors += 1
+        elif outcome == CallOutcome.OK:
+            if latency_ms is not None and self._observe_latency(latency_ms):
+                self._decrease(slot)
+            elif self.limit < self.config.maximum:
+                self.limit = min(self.config.maximum, self.limit + 1.0 / self.limit)
+                self.increases += 1
+        self._dispatch()
+
+    def queue_depth(self, priority: GeminiPriority | None = None) -> int:
+        return sum(
+            1
+            for waiter in self._queue
+            if not waiter.future.done() and (priority is None or waiter.priority == priority)
+        )
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth(),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "latency_ewma_ms": round(self._latency_ewma_ms, 1) if self._latency_ewma_ms is not None else None,
+            "priorities": {
+                priority.name.lower(): stats.as_dict(self.queue_depth(priority))
+                for priority, stats in self.priority_stats.items()
+            },
+        }
+
+
+class GeminiLimiters:
+    def __init__(
+        self,
+        default: LimiterConfig,
+        overrides: dict[str, LimiterConfig] | None = None,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.default = default
+        self.overrides = dict(overrides or {})
+        self._clock = clock
+        self._limiters: dict[str, AdaptiveLimiter] = {}
+
+    def for_model(self, model: str) -> AdaptiveLimiter:
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limiter = AdaptiveLimiter(model, self.overrides.get(model, self.default), clock=self._clock)
+            self._limiters[model] = limiter
+        return limiter
+
+    def reset(self) -> None:
+        self._limiters.clear()
+
+    def describe(self) -> dict[str, Any]:
+        return {model: limiter.describe() for model, limiter in sorted(self._limiters.items())}
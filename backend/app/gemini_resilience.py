@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, model: str, retry_after: float) -> None:
+        super().__init__(f"Gemini circuit open model={model}; retry after {retry_after:.1f}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+@dataclass
+class BreakerConfig:
+    window_seconds: float = 60.0
+    min_requests: int = 8
+    failure_rate: float = 0.5
+    open_seconds: float = 30.0
+    half_open_probes: int = 1
+
+
+class CircuitBreaker:
+    # Closed: calls flow and outcomes land in a sliding window. Once the window
+    # holds enough calls and the failure rate crosses the threshold, the
+    # breaker opens and fails fast. After open_seconds it lets a few probes
+    # through (half-open); a probe success closes it, a failure reopens it.
+    def __init__(self, name: str, config: BreakerConfig, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.name = name
+        self.config = config
+        self._clock = clock
+        self.state = CLOSED
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._open_for = config.open_seconds
+        self._probes_in_flight = 0
+        self.opened = 0
+        self.rejected = 0
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self.config.window_seconds
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def failure_rate(self) -> float:
+        self._trim(self._clock())
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, failed in self._outcomes if failed) / len(self._outcomes)
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self._open_for - self._clock())
+
+    def before_call(self) -> None:
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.retry_after())
+            self.state = HALF_OPEN
+            self._probes_in_flight = 0
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.config.half_open_probes:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, max(1.0, self.config.open_seconds / 10))
+            self._probes_in_flight += 1
+
+    def _open(self, now: float, *, retry_after: float | None) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self._open_for = max(self.config.open_seconds, retry_after or 0.0)
+        self._outcomes.clear()
+        self.opened += 1
+
+    def record(self, *, failed: bool, retry_after: float | None = None) -> None:
+        now = self._clock()
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if failed:
+                self._open(now, retry_after=retry_after)
+            else:
+                self.state = CLOSED
+                self._outcomes.clear()
+            return
+        if self.state == OPEN:
+            return
+        self._outcomes.append((now, failed))
+        self._trim(now)
+        if (
+            failed
+            and len(self._outcomes) >= self.config.min_requests
+            and self.failure_rate() >= self.config.failure_rate
+        ):
+            self._open(now, retry_after=retry_after)
+
+    def release_probe(self) -> None:
+        # A half-open probe that ended without an upstream verdict (cancelled).
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "failure_rate": round(self.failure_rate(), 4),
+            "window_calls": len(self._outcomes),
+            "retry_after_seconds": round(self.retry_after(), 1) if self.state == OPEN else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class GeminiBreakers:
+    def __init__(self, config: BreakerConfig, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.config = config
+        self._clock = clock
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def for_model(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(model, self.config, clock=self._clock)
+            self._breakers[model] = breaker
+        return breaker
+
+    def reset(self) -> None:
+        self._breakers.clear()
+
+    def describe(self) -> dict[str, Any]:
+        return {model: breaker.describe() for model, breaker in sorted(self._breakers.items())}
+
+
+def decorrelated_jitter(previous: float, *, base: float, cap: float, rng: random.Random | None = None) -> float:
+    # "Decorrelated jitter": each delay is drawn between the base and three
+    # times the previous one, so concurrent retries spread out instead of
+    # synchronizing.
+    source = rng or random
+    return min(cap, source.uniform(base, max(base, previous * 3)))
+
+
+def parse_retry_after(value: str | None, *, now: datetime | None = None) -> float | None:
+    if not value:
+        return None
+    raw = value.strip()
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(raw)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    current = now or datetime.now(timezone.utc)
+    return max(0.0, (when - current).total_seconds())
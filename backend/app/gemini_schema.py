@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, Iterable, Mapping
+
+from pydantic import BaseModel
+
+# The subset of OpenAPI 3.0 Schema that generationConfig.responseSchema
+# accepts; everything else pydantic emits (title, default, $defs) is dropped.
+_SCHEMA_KEYS = {"description", "enum", "format", "maxItems", "maximum", "minItems", "minimum", "nullable"}
+_TYPES = {"string": "STRING", "integer": "INTEGER", "number": "NUMBER", "boolean": "BOOLEAN", "array": "ARRAY", "object": "OBJECT"}
+
+
+def response_schema(
+    model: type[BaseModel],
+    *,
+    exclude: Iterable[str] = (),
+    enums: Mapping[str, list[str]] | None = None,
+) -> dict[str, Any]:
+    # Gemini responseSchema for a pydantic model. `exclude` drops top-level
+    # fields the server fills in itself (e.g. AnalyzeResponse.source).
+    # `enums` restricts the items of list fields of any nested model to the
+    # given values, by field name. Properties keep the model's field order
+    # through propertyOrdering; Gemini would otherwise emit them
+    # alphabetically, which breaks streaming the reply field first.
+    raw = model.model_json_schema()
+    schema = _convert(raw, raw.get("$defs") or {}, enums or {})
+    excluded = set(exclude)
+    if excluded:
+        schema["properties"] = {key: value for key, value in schema["properties"].items() if key not in excluded}
+        schema["propertyOrdering"] = [key for key in schema["propertyOrdering"] if key not in excluded]
+        schema["required"] = [key for key in schema["required"] if key not in excluded]
+    return schema
+
+
+def _convert(node: dict, defs: dict, enums: Mapping[str, list[str]]) -> dict[str, Any]:
+    if "$ref" in node:
+        return _convert(defs[node["$ref"].rsplit("/", 1)[-1]], defs, enums)
+    variants = node.get("anyOf")
+    if variants:
+        # Optional[X] comes through as anyOf [X, null].
+        concrete = [item for item in variants if item.get("type") != "null"]
+        if len(concrete) == 1:
+            converted = _convert(concrete[0], defs, enums)
+        else:
+            converted = {"anyOf": [_convert(item, defs, enums) for item in concrete]}
+        if len(concrete) < len(variants):
+            converted["nullable"] = True
+        return converted
+
+    out: dict[str, Any] = {key: node[key] for key in _SCHEMA_KEYS if key in node}
+    if "type" in node:
+        out["type"] = _TYPES[node["type"]]
+    elif "enum" in node:
+        out["type"] = "STRING"
+    if "const" in node:
+        out["type"], out["enum"] = "STRING", [node["const"]]
+    if "items" in node:
+        out["items"] = _convert(node["items"], defs, enums)
+    if "properties" in node:
+        properties: dict[str, Any] = {}
+        for name, child in node["properties"].items():
+            converted = _convert(child, defs, enums)
+            if name in enums and converted.get("type") == "ARRAY":
+                converted["items"] = {"type": "STRING", "enum": list(enums[name])}
+            properties[name] = converted
+        out["properties"] = properties
+        out["propertyOrdering"] = list(node["properties"])
+        # Fields with pydantic defaults are still required in the answer, so
+        # validation never has to guess a missing style or score.
+        out["required"] = list(node["properties"])
+    return out
+
+
+class FormatRetryStats:
+    # How often a structured answer still failed validation and cost another
+    # upstream round trip, per route. A repair is a cheap follow-up for just
+    # the missing part of an answer; a retry repeats the whole call. Each
+    # follow-up's latency and prompt tokens are kept per kind so the two can
+    # be compared.
+    def __init__(self) -> None:
+        self._calls: defaultdict[str, int] = defaultdict(int)
+        self._retries: defaultdict[str, int] = defaultdict(int)
+        self._repairs: defaultdict[str, int] = defaultdict(int)
+        self._followups: defaultdict[tuple[str, str], list[float]] = defaultdict(lambda: [0, 0.0, 0])
+
+    def record(self, route: str, *, retries: int = 0, repairs: int = 0) -> None:
+        self._calls[route] += 1
+        self._retries[route] += max(0, retries)
+        self._repairs[route] += max(0, repairs)
+
+    def record_followup(self, route: str, *, kind: str, latency_ms: float, prompt_tokens: int) -> None:
+        totals = self._followups[(route, kind)]
+        totals[0] += 1
+        totals[1] += max(0.0, latency_ms)
+        totals[2] += max(0, prompt_tokens)
+
+    def _describe_followups(self, route: str) -> dict[str, Any]:
+        return {
+            kind: {
+                "calls": int(count),
+                "avg_latency_ms": round(latency / count, 1),
+                "avg_prompt_tokens": round(tokens / count, 1),
+            }
+            for (entry_route, kind), (count, latency, tokens) in sorted(self._followups.items())
+            if entry_route == route and count
+        }
+
+    def describe(self) -> dict[str, Any]:
+        out: dict[str, Any] = {}
+        for route, calls in sorted(self._calls.items()):
+            out[route] = {
+                "calls": calls,
+                "retries": self._retries[route],
+                "retry_rate": round(self._retries[route] / calls, 4) if calls else 0.0,
+            }
+            if self._repairs[route]:
+                out[route]["repairs"] = self._repairs[route]
+            followups = self._describe_followups(route)
+            if followups:
+                out[route]["followups"] = followups
+        return out
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import json
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable
+
+
+async def iter_sse_json(lines: AsyncIterable[str]) -> AsyncIterator[dict]:
+    # streamGenerateContent?alt=sse sends one GenerateContentResponse per
+    # event as "data:" lines; a blank line ends the event.
+    data: list[str] = []
+    async for line in lines:
+        if not line.strip():
+            if data:
+                yield _decode_event(data)
+                data = []
+            continue
+        if line.startswith("data:"):
+            data.append(line[5:].lstrip())
+    if data:
+        yield _decode_event(data)
+
+
+def _decode_event(data: list[str]) -> dict:
+    chunk = json.loads("\n".join(data))
+    if not isinstance(chunk, dict):
+        raise ValueError("Gemini stream event is not a JSON object")
+    if "error" in chunk:
+        raise RuntimeError(f"Gemini stream error: {json.dumps(chunk['error'], ensure_ascii=False)[:1200]}")
+    return chunk
+
+
+def chunk_text(chunk: dict) -> str:
+    candidates = chunk.get("candidates") or []
+    if not candidates or not isinstance(candidates[0], dict):
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(str(part.get("text", "")) for part in parts if isinstance(part, dict))
+
+
+def chunk_finish_reason(chunk: dict) -> str | None:
+    candidates = chunk.get("candidates") or []
+    if not candidates or not isinstance(candidates[0], dict):
+        return None
+    return candidates[0].get("finishReason")
+
+
+class GeminiTextStream:
+    # Text deltas of one streamed Gemini answer. Once the upstream stream has
+    # been drained, response() rebuilds the equivalent generateContent body so
+    # it can be parsed and cached like a non-streamed answer.
+    def __init__(
+        self,
+        chunks: AsyncIterator[dict],
+        *,
+        close: Callable[[], Awaitable[Any]] | None = None,
+        on_complete: Callable[[dict], None] | None = None,
+    ) -> None:
+        self._chunks = chunks
+        self._close = close
+        self._on_complete = on_complete
+        self._parts: list[str] = []
+        self.finish_reason: str | None = None
+        self.usage: dict | None = None
+        self.completed = False
+
+    @classmethod
+    def from_response(cls, response: dict) -> "GeminiTextStream":
+        async def replay() -> AsyncIterator[dict]:
+            yield response
+
+        return cls(replay())
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        async for chunk in self._chunks:
+            reason = chunk_finish_reason(chunk)
+            if reason:
+                self.finish_reason = reason
+            if isinstance(chunk.get("usageMetadata"), dict):
+                self.usage = chunk["usageMetadata"]
+            text = chunk_text(chunk)
+            if text:
+                self._parts.append(text)
+                yield text
+        self.completed = True
+        if self._on_complete is not None:
+            self._on_complete(self.response())
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def response(self) -> dict:
+        candidate: dict[str, Any] = {"content": {"role": "model", "parts": [{"text": self.text}]}}
+        if self.finish_reason:
+            candidate["finishReason"] = self.finish_reason
+        response: dict[str, Any] = {"candidates": [candidate]}
+        if self.usage is not None:
+            response["usageMetadata"] = self.usage
+        return response
+
+    async def aclose(self) -> None:
+        close, self._close = self._close, None
+        if close is not None:
+            await close()
+
+
+class JsonFieldStreamer:
+    # Pulls the values of selected top-level string fields out of a JSON
+    # object that arrives in arbitrary fragments, so "reply" text can be
+    # forwarded before the object (or even the string) is complete.
+    def __init__(self, fields: Iterable[str]) -> None:
+        self.fields = set(fields)
+        self._depth = 0
+        self._in_string = False
+        self._string_is_key = False
+        self._expect_key = False
+        self._escape = False
+        self._unicode: str | None = None
+        self._high_surrogate: int | None = None
+        self._key: list[str] = []
+        self._last_key = ""
+        self._active: str | None = None
+
+    def feed(self, fragment: str) -> list[tuple[str, str]]:
+        deltas: list[tuple[str, str]] = []
+        for char in fragment:
+            if self._in_string:
+                self._feed_string(char, deltas)
+            elif char == '"':
+                self._in_string = True
+                self._string_is_key = self._depth == 1 and self._expect_key
+                if self._string_is_key:
+                    self._key = []
+                else:
+                    self._active = self._last_key if self._depth == 1 and self._last_key in self.fields else None
+            elif char in "{[":
+                self._depth += 1
+                self._expect_key = char == "{" and self._depth == 1
+            elif char in "}]":
+                self._depth -= 1
+            elif self._depth == 1 and char == ",":
+                self._expect_key = True
+                self._last_key = ""
+        return _merge_deltas(deltas)
+
+    def _emit(self, text: str, deltas: list[tuple[str, str]]) -> None:
+        if self._string_is_key:
+            self._key.append(text)
+        elif self._active is not None:
+            deltas.append((self._active, text))
+
+    def _feed_string(self, char: str, deltas: list[tuple[str, str]]) -> None:
+        if self._unicode is not None:
+            self._unicode += char
+            if len(self._unicode) == 4:
+                self._emit_code_point(int(self._unicode, 16), deltas)
+                self._unicode = None
+            return
+        if self._escape:
+            self._escape = False
+            if char == "u":
+                self._unicode = ""
+                return
+            self._emit(_JSON_ESCAPES.get(char, char), deltas)
+            return
+        if char == "\\":
+            self._escape = True
+        elif char == '"':
+            self._in_string = False
+            if self._string_is_key:
+                self._last_key = "".join(self._key)
+                self._expect_key = False
+            self._active = None
+        else:
+            self._emit(char, deltas)
+
+    def _emit_code_point(self, code: int, deltas: list[tuple[str, str]]) -> None:
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        self._emit(chr(code), deltas)
+
+
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def _merge_deltas(deltas: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    merged: list[tuple[str, str]] = []
+    for field, text in deltas:
+        if merged and merged[-1][0] == field:
+            merged[-1] = (field, merged[-1][1] + text)
+        else:
+            merged.append((field, text))
+    return merged
+
+
+def sse_event(event: str, payload: dict[str, Any]) -> bytes:
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return f"event: {event}\ndata: {data}\n\n".encode("utf-8")
+
+
+@dataclass
+class _RouteStreamStats:
+    streams: int = 0
+    completed: int = 0
+    failed: int = 0
+    first_token: int = 0
+    ttft_ms: float = 0.0
+    max_ttft_ms: float = 0.0
+    total_ms: float = 0.0
+    max_total_ms: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "streams": self.streams,
+            "completed": self.completed,
+            "failed": self.failed,
+            "ttft_ms_avg": round(self.ttft_ms / self.first_token, 1) if self.first_token else 0.0,
+            "ttft_ms_max": round(self.max_ttft_ms, 1),
+            "total_ms_avg": round(self.total_ms / self.streams, 1) if self.streams else 0.0,
+            "total_ms_max": round(self.max_total_ms, 1),
+        }
+
+
+class StreamTimer:
+    # Time to first forwarded token and total stream time for one response.
+    def __init__(self, clock: Callable[[], float] = time.perf_counter) -> None:
+        self._clock = clock
+        self.started = clock()
+        self.ttft_ms: float | None = None
+
+    def first_token(self) -> None:
+        if self.ttft_ms is None:
+            self.ttft_ms = (self._clock() - self.started) * 1000.0
+
+    def elapsed_ms(self) -> float:
+        return (self._clock() - self.started) * 1000.0
+
+
+class StreamingStats:
+    def __init__(self) -> None:
+        self._routes: defaultdict[str, _RouteStreamStats] = defaultdict(_RouteStreamStats)
+
+    def record(self, route: str, *, ttft_ms: float | None, total_ms: float, ok: bool) -> None:
+        stats = self._routes[route]
+        stats.streams += 1
+        if ok:
+            stats.completed += 1
+        else:
+            stats.failed += 1
+        if ttft_ms is not None:
+            stats.first_token += 1
+            stats.ttft_ms += ttft_ms
+            stats.max_ttft_ms = max(stats.max_ttft_ms, ttft_ms)
+        stats.total_ms += total_ms
+        stats.max_total_ms = max(stats.max_total_ms, total_ms)
+
+    def reset(self) -> None:
+        self._routes.clear()
+
+    def describe(self) -> dict[str, Any]:
+        return {route: stats.as_dict() for route, stats in sorted(self._routes.items())}
@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Iterator
+
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import GeminiUsageEvent, GeminiUsageHourly
+
+logger = logging.getLogger("readytoorder.backend")
+
+# Who is spending Gemini calls: the request middleware sets the route path,
+# admin commands set "admin:<command>". Background tasks inherit it.
+GEMINI_CALLER: ContextVar[str] = ContextVar("gemini_caller", default="unknown")
+
+
+@contextmanager
+def gemini_caller(name: str) -> Iterator[None]:
+    token = GEMINI_CALLER.set(name[:80])
+    try:
+        yield
+    finally:
+        GEMINI_CALLER.reset(token)
+
+
+def usage_token_counts(usage: dict | None) -> tuple[int, int, int]:
+    # (prompt, candidate, image) tokens from usageMetadata. Image tokens are
+    # the IMAGE-modality share of both sides: menu photos going in and
+    # generated dish photos coming out.
+    if not isinstance(usage, dict):
+        return 0, 0, 0
+    image_tokens = 0
+    for details_key in ("promptTokensDetails", "candidatesTokensDetails"):
+        for detail in usage.get(details_key) or []:
+            if isinstance(detail, dict) and detail.get("modality") == "IMAGE":
+                image_tokens += _as_int(detail.get("tokenCount"))
+    return _as_int(usage.get("promptTokenCount")), _as_int(usage.get("candidatesTokenCount")), image_tokens
+
+
+def _as_int(value: object) -> int:
+    try:
+        return max(0, int(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass(frozen=True)
+class GeminiUsageRecord:
+    model: str
+    caller: str
+    streamed: bool
+    attempts: int
+    latency_ms: float
+    status_code: int
+    ok: bool
+    prompt_tokens: int
+    candidate_tokens: int
+    image_tokens: int
+    created_at: datetime
+
+
+@dataclass
+class GeminiCallTrace:
+    # Filled in by the retry loop while one logical call runs; status_code 0
+    # means no HTTP response (timeout, connection error, cancellation).
+    model: str
+    streamed: bool = False
+    caller: str = field(default_factory=GEMINI_CALLER.get)
+    attempts: int = 0
+    status_code: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    finished: bool = False
+
+    def finish(self, *, ok: bool, usage: dict | None = None) -> GeminiUsageRecord | None:
+        # Calls that never reached Gemini (open breaker, no API key) cost
+        # nothing and are not recorded.
+        if self.finished or self.attempts == 0:
+            return None
+        self.finished = True
+        prompt_tokens, candidate_tokens, image_tokens = usage_token_counts(usage)
+        return GeminiUsageRecord(
+            model=self.model,
+            caller=self.caller,
+            streamed=self.streamed,
+            attempts=self.attempts,
+            latency_ms=(time.perf_counter() - self.started) * 1000.0,
+            status_code=self.status_code,
+            ok=ok,
+            prompt_tokens=prompt_tokens,
+            candidate_tokens=candidate_tokens,
+            image_tokens=image_tokens,
+            created_at=datetime.now(timezone.utc),
+        )
+
+
+def hour_bucket(value: datetime) -> datetime:
+    value = _as_utc(value)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes even for timezone-aware columns.
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+@dataclass
+class _Rollup:
+    calls: int = 0
+    errors: int = 0
+    attempts: int = 0
+    latency_ms_sum: float = 0.0
+    latency_ms_max: float = 0.0
+    prompt_tokens: int = 0
+    candidate_tokens: int = 0
+    image_tokens: int = 0
+
+    def add(self, record: GeminiUsageRecord) -> None:
+        self.calls += 1
+        self.errors += 0 if record.ok else 1
+        self.attempts += record.attempts
+        self.latency_ms_sum += record.latency_ms
+        self.latency_ms_max = max(self.latency_ms_max, record.latency_ms)
+        self.prompt_tokens += record.prompt_tokens
+        self.candidate_tokens += record.candidate_tokens
+        self.image_tokens += record.image_tokens
+
+
+def write_usage_records(session: Session, records: list[GeminiUsageRecord]) -> None:
+    # Raw rows plus an in-place update of each touched (hour, model, caller)
+    # rollup, in the same transaction so the two never disagree.
+    rollups: dict[tuple[datetime, str, str], _Rollup] = {}
+    for record in records:
+        session.add(
+            GeminiUsageEvent(
+                model=record.model,
+                caller=record.caller,
+                streamed=record.streamed,
+                attempts=record.attempts,
+                latency_ms=record.latency_ms,
+                status_code=record.status_code,
+                ok=record.ok,
+                prompt_tokens=record.prompt_tokens,
+                candidate_tokens=record.candidate_tokens,
+                image_tokens=record.image_tokens,
+                created_at=record.created_at,
+            )
+        )
+        rollups.setdefault((hour_bucket(record.created_at), record.model, record.caller), _Rollup()).add(record)
+
+    now = datetime.now(timezone.utc)
+    hourly = GeminiUsageHourly
+    for (hour, model, caller), rollup in rollups.items():
+        # Add to the counters in SQL: other workers and the admin script
+        # flush into the same buckets, and a read-modify-write here would
+        # drop their increments.
+        result = session.execute(
+            update(hourly)
+            .where(hourly.hour == hour, hourly.model == model, hourly.caller == caller)
+            .values(
+                calls=hourly.calls + rollup.calls,
+                errors=hourly.errors + rollup.errors,
+                attempts=hourly.attempts + rollup.attempts,
+                latency_ms_sum=hourly.latency_ms_sum + rollup.latency_ms_sum,
+                latency_ms_max=case(
+                    (hourly.latency_ms_max < rollup.latency_ms_max, rollup.latency_ms_max),
+                    else_=hourly.latency_ms_max,
+                ),
+                prompt_tokens=hourly.prompt_tokens + rollup.prompt_tokens,
+                candidate_tokens=hourly.candidate_tokens + rollup.candidate_tokens,
+                image_tokens=hourly.image_tokens + rollup.image_tokens,
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            continue
+        # A concurrent first insert of the bucket fails the commit on the
+        # unique index; the caller retries and the UPDATE then matches.
+        session.add(
+            GeminiUsageHourly(
+                hour=hour,
+                model=model,
+                caller=caller,
+                calls=rollup.calls,
+                errors=rollup.errors,
+                attempts=rollup.attempts,
+                latency_ms_sum=rollup.latency_ms_sum,
+                latency_ms_max=rollup.latency_ms_max,
+                prompt_tokens=rollup.prompt_tokens,
+                candidate_tokens=rollup.candidate_tokens,
+                image_tokens=rollup.image_tokens,
+                updated_at=now,
+            )
+        )
+
+
+class GeminiUsageRecorder:
+    # record() only appends to an in-memory buffer, so the Gemini call path
+    # never waits on the database. A background task writes the buffer in
+    # batches every `flush_interval_seconds`, or sooner once `batch_size`
+    # records are waiting. Past `max_buffer` the oldest records are dropped
+    # and counted rather than growing without bound while the DB is down.
+    def __init__(
+        self,
+        *,
+        session_factory: Callable[[], Session] | None,
+        flush_interval_seconds: float = 5.0,
+        batch_size: int = 200,
+        max_buffer: int = 10_000,
+    ) -> None:
+        self.session_factory = session_factory
+        self.flush_interval_seconds = max(0.05, flush_interval_seconds)
+        self.batch_size = max(1, batch_size)
+        self.max_buffer = max(1, max_buffer)
+        self._buffer: deque[GeminiUsageRecord] = deque()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    def record(self, record: GeminiUsageRecord | None) -> None:
+        if record is None or self.session_factory is None:
+            return
+        if len(self._buffer) >= self.max_buffer:
+            self._buffer.popleft()
+            self.dropped += 1
+        self._buffer.append(record)
+        self.recorded += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            written = 0
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                try:
+                    await asyncio.to_thread(self._write, batch)
+                except Exception:
+                    self.write_errors += 1
+                    logger.exception("gemini usage flush failed records=%s", len(batch))
+                    self._requeue(batch)
+                    break
+                written += len(batch)
+            self.written += written
+            return written
+
+    def _requeue(self, batch: list[GeminiUsageRecord]) -> None:
+        # The failed batch goes back in front, ahead of newer records, so the
+        # next flush retries it. The buffer cap still applies, oldest first.
+        self._buffer.extendleft(reversed(batch))
+        while len(self._buffer) > self.max_buffer:
+            self._buffer.popleft()
+            self.dropped += 1
+
+    def _write(self, records: list[GeminiUsageRecord]) -> None:
+        assert self.session_factory is not None
+        for attempt in (1, 2):
+            with self.session_factory() as session:
+                write_usage_records(session, records)
+                try:
+                    session.commit()
+                    return
+                except IntegrityError:
+                    # Another process created the same hourly row first; the
+                    # second pass finds it and adds to it.
+                    session.rollback()
+                    if attempt == 2:
+                        raise
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self.session_factory is not None and (self._task is None or self._task.done()):
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+        }
+
+
+USAGE_GROUP_COLUMNS = {"model": GeminiUsageHourly.model, "caller": GeminiUsageHourly.caller}
+
+
+def usage_summary(
+    session: Session,
+    *,
+    since: datetime,
+    until: datetime | None = None,
+    group_by: list[str],
+    by_hour: bool = False,
+) -> dict[str, Any]:
+    # Reads only the hourly rollups, so the cost scales with hours x models x
+    # callers in the window rather than with the number of calls.
+    since = hour_bucket(since)
+    until = _as_utc(until or datetime.now(timezone.utc))
+    keys = [GeminiUsageHourly.hour] if by_hour else []
+    keys += [USAGE_GROUP_COLUMNS[name] for name in group_by]
+    metrics = [
+        func.sum(GeminiUsageHourly.calls),
+        func.sum(GeminiUsageHourly.errors),
+        func.sum(GeminiUsageHourly.attempts),
+        func.sum(GeminiUsageHourly.latency_ms_sum),
+        func.max(GeminiUsageHourly.latency_ms_max),
+        func.sum(GeminiUsageHourly.prompt_tokens),
+        func.sum(GeminiUsageHourly.candidate_tokens),
+        func.sum(GeminiUsageHourly.image_tokens),
+    ]
+    stmt = (
+        select(*keys, *metrics)
+        .where(GeminiUsageHourly.hour >= since, GeminiUsageHourly.hour <= until)
+        .group_by(*keys)
+        .order_by(*keys)
+    )
+    names = (["hour"] if by_hour else []) + list(group_by)
+    groups = []
+    totals = _summary_metrics((0, 0, 0, 0.0, 0.0, 0, 0, 0))
+    for row in session.execute(stmt):
+        group = dict(zip(names, row[: len(names)]))
+        if "hour" in group:
+            group["hour"] = _as_utc(group["hour"]).isoformat()
+        metrics_row = _summary_metrics(row[len(names) :])
+        groups.append({**group, **metrics_row})
+        _accumulate(totals, metrics_row)
+    totals["avg_latency_ms"] = round(totals["latency_ms_sum"] / totals["calls"], 1) if totals["calls"] else 0.0
+    for item in [*groups, totals]:
+        item.pop("latency_ms_sum")
+    return {
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "group_by": names,
+        "groups": groups,
+        "totals": totals,
+    }
+
+
+def _summary_metrics(row) -> dict[str, Any]:
+    calls, errors, attempts, latency_sum, latency_max, prompt, candidates, images = (value or 0 for value in row)
+    return {
+        "calls": int(calls),
+        "errors": int(errors),
+        "error_rate": round(errors / calls, 4) if calls else 0.0,
+        "attempts": int(attempts),
+        "latency_ms_sum": float(latency_sum),
+        "avg_latency_ms": round(latency_sum / calls, 1) if calls else 0.0,
+        "max_latency_ms": round(float(latency_max), 1),
+        "prompt_tokens": int(prompt),
+        "candidate_tokens": int(candidates),
+        "image_tokens": int(images),
+    }
+
+
+def _accumulate(totals: dict[str, Any], metrics: dict[str, Any]) -> None:
+    for key in ("calls", "errors", "attempts", "latency_ms_sum", "prompt_tokens", "candidate_tokens", "image_tokens"):
+        totals[key] += metrics[key]
+    totals["max_latency_ms"] = max(totals["max_latency_ms"], metrics["max_latency_ms"])
+    totals["error_rate"] = round(totals["errors"] / totals["calls"], 4) if totals["calls"] else 0.0
+
+
+def purge_gemini_usage_events(session: Session, *, before: datetime) -> int:
+    # Raw rows are for debugging recent calls; the hourly rollups are kept.
+    result = session.execute(delete(GeminiUsageEvent).where(GeminiUsageEvent.created_at < before))
+    return int(result.rowcount or 0)
+
+
+def usage_window(hours: int, *, now: datetime | None = None) -> datetime:
+    return (now or datetime.now(timezone.utc)) - timedelta(hours=max(1, hours) - 1)
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import math
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Iterable, Sequence
+
+from PIL import Image, ImageOps
+
+ORIGINAL_RENDITION = "original"
+RENDITION_FORMATS: dict[str, str] = {"webp": "image/webp", "jpeg": "image/jpeg"}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+# Decoded pixels a menu photo may have; a 48 MP phone sensor fits, a
+# decompression bomb does not.
+MENU_IMAGE_MAX_PIXELS = 50_000_000
+
+
+@dataclass(frozen=True)
+class RenditionSpec:
+    name: str
+    width: int
+    height: int
+
+
+# Both sizes keep the 2:3 portrait ratio the image prompt asks Gemini for.
+RENDITION_SPECS: tuple[RenditionSpec, ...] = (
+    RenditionSpec(name="card", width=720, height=1080),
+    RenditionSpec(name="thumb", width=240, height=360),
+)
+RENDITION_NAMES = tuple(spec.name for spec in RENDITION_SPECS)
+
+
+@dataclass(frozen=True)
+class RenderedImage:
+    name: str
+    format: str
+    mime_type: str
+    width: int
+    height: int
+    body: bytes
+
+
+def _target_size(source: tuple[int, int], spec: RenditionSpec) -> tuple[int, int]:
+    # Never upscale: shrink the target box until the source can fill it.
+    scale = min(1.0, source[0] / spec.width, source[1] / spec.height)
+    return max(1, round(spec.width * scale)), max(1, round(spec.height * scale))
+
+
+def render_renditions(
+    body: bytes,
+    *,
+    specs: Sequence[RenditionSpec] = RENDITION_SPECS,
+    formats: Iterable[str] = tuple(RENDITION_FORMATS),
+) -> list[RenderedImage]:
+    with Image.open(io.BytesIO(body)) as opened:
+        source = ImageOps.exif_transpose(opened).convert("RGB")
+
+    rendered: list[RenderedImage] = []
+    formats = tuple(formats)
+    for spec in specs:
+        size = _target_size(source.size, spec)
+        # Food sits in the lower two thirds of generated images, so crop
+        # slightly below center when the aspect ratio does not match.
+        resized = ImageOps.fit(source, size, method=Image.Resampling.LANCZOS, centering=(0.5, 0.6))
+        for image_format in formats:
+            buffer = io.BytesIO()
+            if image_format == "webp":
+                resized.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+            elif image_format == "jpeg":
+                resized.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            else:
+                raise ValueError(f"unsupported rendition format: {image_format}")
+            rendered.append(
+                RenderedImage(
+                    name=spec.name,
+                    format=image_format,
+                    mime_type=RENDITION_FORMATS[image_format],
+                    width=size[0],
+                    height=size[1],
+                    body=buffer.getvalue(),
+                )
+            )
+    return rendered
+
+
+class MenuImageTooLargeError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class NormalizedImage:
+    mime_type: str
+    width: int
+    height: int
+    body: bytes
+
+
+def normalize_menu_image(
+    body: bytes,
+    *,
+    long_edge: int,
+    quality: int,
+    max_pixels: int = MENU_IMAGE_MAX_PIXELS,
+) -> NormalizedImage:
+    # Upright (EXIF orientation applied), no larger than `long_edge` on its
+    # longest side, re-encoded as JPEG. Saving without exif/icc_profile drops
+    # the metadata, GPS position included. Raises MenuImageTooLargeError for
+    # an image over `max_pixels` after any reduced-scale JPEG decode, and
+    # PIL's UnidentifiedImageError for a format Pillow cannot read.
+    try:
+        opened = Image.open(io.BytesIO(body))
+    except Image.DecompressionBombError as exc:
+        raise MenuImageTooLargeError(str(exc)) from exc
+    with opened:
+        scale = long_edge / max(opened.size) if long_edge > 0 else 1.0
+        if scale < 1.0 and opened.format == "JPEG":
+            # libjpeg decodes at 1/2, 1/4 or 1/8 scale for a fraction of the
+            # work, as long as the result still covers the target size.
+            opened.draft("RGB", (math.ceil(opened.width * scale), math.ceil(opened.height * scale)))
+        if max_pixels > 0 and opened.width * opened.height > max_pixels:
+            raise MenuImageTooLargeError(f"menu image too large: {opened.width}x{opened.height}")
+        if scale < 1.0 and opened.mode not in {"1", "P"}:
+            # Shrink first so the transpose and mode conversion copy the
+            # small image, not the full-size one. Palette images would only
+            # get nearest-neighbour resampling, so they wait until after.
+            opened.thumbnail((long_edge, long_edge), Image.Resampling.LANCZOS)
+        image = ImageOps.exif_transpose(opened)
+        if image.mode in {"RGBA", "LA", "P"}:
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+    if max(image.size) > long_edge > 0:
+        image.thumbnail((long_edge, long_edge), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return NormalizedImage(mime_type="image/jpeg", width=image.width, height=image.height, body=buffer.getvalue())
+
+
+class NormalizeStats:
+    # What menu photo normalization saves upstream and what it costs. Photos
+    # Pillow cannot decode (e.g. HEIC without a plugin) pass through as sent.
+    def __init__(self) -> None:
+        self.images = 0
+        self.passthrough = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, *, bytes_in: int, bytes_out: int, elapsed_ms: float, normalized: bool) -> None:
+        self.images += 1
+        self.passthrough += int(not normalized)
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "images": self.images,
+            "passthrough": self.passthrough,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "avg_ms": round(self.total_ms / self.images, 1) if self.images else 0.0,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+def pick_rendition_name(rendition: str | None, *, width_hint: int | None = None) -> str:
+    if rendition in RENDITION_NAMES or rendition == ORIGINAL_RENDITION:
+        return rendition
+    if width_hint and width_hint > 0:
+        for spec in sorted(RENDITION_SPECS, key=lambda item: item.width):
+            if spec.width >= width_hint:
+                return spec.name
+    return ORIGINAL_RENDITION
+
+
+def pick_rendition_format(image_format: str | None, *, accept: str = "") -> str:
+    if image_format in RENDITION_FORMATS:
+        return image_format
+    return "webp" if "image/webp" in accept.lower() else "jpeg"
+
+
+class ImagePipeline:
+    # Transcoding is CPU bound; a process pool keeps it off the event loop and
+    # lets several dishes transcode in parallel. workers=0 runs inline.
+    def __init__(self, *, workers: int) -> None:
+        self.workers = max(0, workers)
+        self._executor: Executor | None = None
+
+    def _get_executor(self) -> Executor | None:
+        if self.workers == 0:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def render(self, body: bytes) -> list[RenderedImage]:
+        executor = self._get_executor()
+        if executor is None:
+            return render_renditions(body)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, render_renditions, body)
+
+    async def normalize_menu(
+        self,
+        body: bytes,
+        *,
+        long_edge: int,
+        quality: int,
+        max_pixels: int = MENU_IMAGE_MAX_PIXELS,
+    ) -> NormalizedImage:
+        normalize = partial(normalize_menu_image, long_edge=long_edge, quality=quality, max_pixels=max_pixels)
+        executor = self._get_executor()
+        if executor is None:
+            return normalize(body)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, normalize, body)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import base64
+from collections import OrderedDict
+from dataclasses import dataclass
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@dataclass(frozen=True)
+class ImagePayload:
+    mime_type: str
+    body: bytes
+    etag: str
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+def decode_data_url(data_url: str, *, fallback_mime: str = "image/png") -> tuple[str, bytes]:
+    raw = str(data_url or "").strip()
+    if not raw.startswith("data:"):
+        raise ValueError("not a data URL")
+    header, sep, data = raw.partition(",")
+    if not sep:
+        raise ValueError("data URL has no payload")
+    meta = header[len("data:"):]
+    if not meta.endswith(";base64"):
+        raise ValueError("data URL is not base64 encoded")
+    mime_type = meta[: -len(";base64")].strip() or fallback_mime
+    try:
+        body = base64.b64decode(data, validate=True)
+    except Exception as exc:
+        raise ValueError("invalid base64 image payload") from exc
+    return mime_type, body
+
+
+def data_url_from_bytes(mime_type: str, body: bytes) -> str:
+    return f"data:{mime_type};base64,{base64.b64encode(body).decode('ascii')}"
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        value = candidate.strip()
+        if value == "*" or value == etag:
+            return True
+    return False
+
+
+def image_url_for(image_id: str, *, rendition: str | None = None, image_format: str | None = None) -> str:
+    url = f"/v1/images/{image_id}"
+    if rendition and rendition != "original":
+        url += f"?rendition={rendition}"
+        if image_format:
+            url += f"&format={image_format}"
+    return url
+
+
+class ImagePayloadCache:
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max(0, max_bytes)
+        self._entries: OrderedDict[str, ImagePayload] = OrderedDict()
+        self._total_bytes = 0
+
+    def get(self, key: str) -> ImagePayload | None:
+        payload = self._entries.get(key)
+        if payload is not None:
+            self._entries.move_to_end(key)
+        return payload
+
+    def put(self, key: str, payload: ImagePayload) -> None:
+        if payload.size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._total_bytes -= previous.size
+        self._entries[key] = payload
+        self._total_bytes += payload.size
+        while self._total_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= evicted.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._total_bytes = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,46 +1,127 @@
 import asyncio
 import base64
+import copy
+import hmac
 import json
 import logging
+import math
 import os
-import random
 import re
+import time
 import uuid
-from collections import defaultdict, deque
+from collections import Counter, defaultdict, deque
+from contextlib import AsyncExitStack
 from datetime import datetime, timedelta, timezone
-from typing import Any, Deque, Dict, List, Literal, Sequence
+from typing import Any, AsyncIterator, Deque, Dict, List, Literal, Sequence
 
 import httpx
 import jwt
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
+from PIL import UnidentifiedImageError
 from sqlalchemy import delete, func, select
 from sqlalchemy.orm import Session
 
+from .blob_store import BlobNotFoundError, BlobRef, blob_digest, blob_store_from_env
+from .catalog_cache import (
+    CatalogCache,
+    CatalogRecord,
+    bump_catalog_version,
+    catalog_record_from_dish,
+)
+from .compression import CompressionMiddleware, CompressionStats
 from .db import SessionLocal, init_db
+from .gemini_cache import (
+    GeminiResponseCache,
+    gemini_cache_key,
+    is_complete_response,
+    payload_temperature,
+    purge_expired_gemini_cache,
+)
+from .gemini_schema import FormatRetryStats, response_schema
+from .gemini_context_cache import GeminiContextCache, StaticPrefix, is_cached_content_miss
+from .gemini_client import GeminiHttpClient, GeminiTimeout, parse_model_timeouts
+from .gemini_hedging import GeminiHedger, HedgeConfig
+from .gemini_limiter import CallOutcome, GeminiLimiters, GeminiPriority, LimiterConfig
+from .gemini_resilience import (
+    BreakerConfig,
+    CircuitOpenError,
+    GeminiBreakers,
+    decorrelated_jitter,
+    parse_retry_after,
+)
+from .gemini_usage import (
+    GEMINI_CALLER,
+    GeminiCallTrace,
+    GeminiUsageRecorder,
+    purge_gemini_usage_events,
+    usage_summary,
+    usage_token_counts,
+    usage_window,
+)
+from .gemini_stream import (
+    GeminiTextStream,
+    JsonFieldStreamer,
+    StreamingStats,
+    StreamTimer,
+    iter_sse_json,
+    sse_event,
+)
+from .image_pipeline import (
+    ORIGINAL_RENDITION,
+    ImagePipeline,
+    MenuImageTooLargeError,
+    NormalizeStats,
+    RenderedImage,
+    pick_rendition_format,
+    pick_rendition_name,
+)
+from .images import (
+    IMMUTABLE_CACHE_CONTROL,
+    ImagePayload,
+    ImagePayloadCache,
+    data_url_from_bytes,
+    decode_data_url,
+    etag_matches,
+    image_url_for,
+)
 from .models import (
     ClientErrorEvent,
     Dish,
     DishImage,
+    DishImageRendition,
     GenerationJob,
+    MenuSession,
     User,
     UserProfile,
     UserSwipeEvent,
 )
+from .ranking import RankingConfig, RankingIndexCache, preference_weights, rank_deck
+from .sampling import sample_ready_dishes
+from .seen_set import SeenSet, load_seen_set, record_seen_names
+from .single_flight import SingleFlight
 from .tagging import (
+    CANONICAL_TAGS,
     TAGGING_VERSION,
+    BatchTaggingAnswer,
     CandidateTag,
     DishTags,
+    build_batch_tagging_suffix,
     build_subtitle,
-    build_tagging_prompt,
+    build_tagging_suffix,
     display_label_for_tag,
     legacy_category_tags_from_tags,
     normalize_tag_key,
     normalize_tags_payload,
+    parse_batch_tagging_item,
     parse_tag_id,
+    TaggingAnswer,
+    tagging_prefix,
+    tagging_prefix_key,
     tags_from_legacy_fields,
 )
 
@@ -80,12 +161,75 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 GEMINI_READ_TIMEOUT_SECONDS = float(os.getenv("GEMINI_READ_TIMEOUT_SECONDS", "70"))
 GEMINI_CONNECT_TIMEOUT_SECONDS = float(os.getenv("GEMINI_CONNECT_TIMEOUT_SECONDS", "12"))
 GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_CALL_BUDGET_SECONDS = float(os.getenv("GEMINI_CALL_BUDGET_SECONDS", "120"))
+GEMINI_BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "0.5"))
+GEMINI_BACKOFF_CAP_SECONDS = float(os.getenv("GEMINI_BACKOFF_CAP_SECONDS", "8"))
+GEMINI_BREAKER_WINDOW_SECONDS = float(os.getenv("GEMINI_BREAKER_WINDOW_SECONDS", "60"))
+GEMINI_BREAKER_MIN_REQUESTS = int(os.getenv("GEMINI_BREAKER_MIN_REQUESTS", "8"))
+GEMINI_BREAKER_FAILURE_RATE = float(os.getenv("GEMINI_BREAKER_FAILURE_RATE", "0.5"))
+GEMINI_BREAKER_OPEN_SECONDS = float(os.getenv("GEMINI_BREAKER_OPEN_SECONDS", "30"))
 GEMINI_IMAGE_MAX_BYTES = int(os.getenv("GEMINI_IMAGE_MAX_BYTES", "5242880"))
+GEMINI_WRITE_TIMEOUT_SECONDS = float(os.getenv("GEMINI_WRITE_TIMEOUT_SECONDS", "30"))
+GEMINI_POOL_TIMEOUT_SECONDS = float(os.getenv("GEMINI_POOL_TIMEOUT_SECONDS", "30"))
+GEMINI_MODEL_TIMEOUTS = os.getenv("GEMINI_MODEL_TIMEOUTS", "")
+GEMINI_POOL_MAX_CONNECTIONS = int(os.getenv("GEMINI_POOL_MAX_CONNECTIONS", "20"))
+GEMINI_POOL_MAX_KEEPALIVE = int(os.getenv("GEMINI_POOL_MAX_KEEPALIVE", "10"))
+GEMINI_POOL_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("GEMINI_POOL_KEEPALIVE_EXPIRY_SECONDS", "60"))
+GEMINI_HTTP2 = os.getenv("GEMINI_HTTP2", "0").strip().lower() in {"1", "true", "yes", "on"}
+GEMINI_CACHE_ENABLED = os.getenv("GEMINI_CACHE_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"}
+GEMINI_CACHE_MAX_TEMPERATURE = float(os.getenv("GEMINI_CACHE_MAX_TEMPERATURE", "0.3"))
+GEMINI_CACHE_MAX_BYTES = int(os.getenv("GEMINI_CACHE_MAX_BYTES", "16777216"))
+GEMINI_CACHE_TTL_SECONDS = float(os.getenv("GEMINI_CACHE_TTL_SECONDS", "604800"))
+GEMINI_SINGLE_FLIGHT_ENABLED = os.getenv("GEMINI_SINGLE_FLIGHT_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"}
+GEMINI_CACHE_PERSIST = os.getenv("GEMINI_CACHE_PERSIST", "1").strip().lower() not in {"0", "false", "no", "off"}
 IMAGE_GENERATION_CONCURRENCY = int(os.getenv("IMAGE_GENERATION_CONCURRENCY", "4"))
+GEMINI_LIMIT_INITIAL = float(os.getenv("GEMINI_LIMIT_INITIAL", "8"))
+GEMINI_LIMIT_MIN = float(os.getenv("GEMINI_LIMIT_MIN", "1"))
+GEMINI_LIMIT_MAX = float(os.getenv("GEMINI_LIMIT_MAX", "32"))
+GEMINI_IMAGE_LIMIT_MAX = float(os.getenv("GEMINI_IMAGE_LIMIT_MAX", "8"))
+GEMINI_LIMIT_LATENCY_TOLERANCE = float(os.getenv("GEMINI_LIMIT_LATENCY_TOLERANCE", "3"))
+GEMINI_HEDGE_ENABLED = os.getenv("GEMINI_HEDGE_ENABLED", "0").strip().lower() not in {"0", "false", "no", "off"}
+GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "0.95"))
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+GEMINI_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("GEMINI_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+GEMINI_HEDGE_BUDGET_PER_MINUTE = int(os.getenv("GEMINI_HEDGE_BUDGET_PER_MINUTE", "10"))
+GEMINI_BATCH_BACKEND = os.getenv("GEMINI_BATCH_BACKEND", "gemini").strip().lower()
+GEMINI_BATCH_LOCAL_DIR = os.getenv("GEMINI_BATCH_LOCAL_DIR", "./batch_jobs")
+GEMINI_CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"}
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "3600"))
+GEMINI_USAGE_ENABLED = os.getenv("GEMINI_USAGE_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"}
+GEMINI_USAGE_FLUSH_SECONDS = float(os.getenv("GEMINI_USAGE_FLUSH_SECONDS", "5"))
+GEMINI_USAGE_RETENTION_DAYS = int(os.getenv("GEMINI_USAGE_RETENTION_DAYS", "7"))
+DECK_SAMPLE_OVERSAMPLE = int(os.getenv("DECK_SAMPLE_OVERSAMPLE", "3"))
+IMAGE_PIPELINE_WORKERS = int(os.getenv("IMAGE_PIPELINE_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_PAYLOAD_CACHE_MAX_BYTES = int(os.getenv("IMAGE_PAYLOAD_CACHE_MAX_BYTES", "67108864"))
+CATALOG_CACHE_ENABLED = os.getenv("CATALOG_CACHE_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"}
+CATALOG_CACHE_MAX_AGE_SECONDS = float(os.getenv("CATALOG_CACHE_MAX_AGE_SECONDS", "300"))
+DECK_SEEN_SET_ENABLED = os.getenv("DECK_SEEN_SET_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"}
+RESPONSE_COMPRESSION_ENABLED = os.getenv("RESPONSE_COMPRESSION_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"}
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+RESPONSE_COMPRESSION_CPU_BUDGET_MS = float(os.getenv("RESPONSE_COMPRESSION_CPU_BUDGET_MS", "250"))
+RESPONSE_COMPRESSION_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_COMPRESSION_CACHE_MAX_BYTES", "16777216"))
+DECK_RANKING_CONFIG = RankingConfig(
+    exploration=float(os.getenv("DECK_RANKING_EXPLORATION", "0.2")),
+    novelty_bonus=float(os.getenv("DECK_RANKING_NOVELTY_BONUS", "0.1")),
+    temperature=float(os.getenv("DECK_RANKING_TEMPERATURE", "0.25")),
+)
 
 MENU_MAX_IMAGES = int(os.getenv("MENU_MAX_IMAGES", "6"))
 MENU_MAX_IMAGE_BYTES = int(os.getenv("MENU_MAX_IMAGE_BYTES", "3145728"))
 MENU_CHAT_HISTORY_LIMIT = int(os.getenv("MENU_CHAT_HISTORY_LIMIT", "16"))
+MENU_REPAIR_ENABLED = os.getenv("MENU_REPAIR_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"}
+MENU_REPAIR_MAX_MISSING = int(os.getenv("MENU_REPAIR_MAX_MISSING", "2"))
+MENU_SESSION_TTL_SECONDS = int(os.getenv("MENU_SESSION_TTL_SECONDS", "1800"))
+MENU_SESSION_EXTRACT_CONTEXT = os.getenv("MENU_SESSION_EXTRACT_CONTEXT", "1").strip().lower() not in {"0", "false", "no", "off"}
+MENU_SESSION_TEXT_CHAT = os.getenv("MENU_SESSION_TEXT_CHAT", "1").strip().lower() not in {"0", "false", "no", "off"}
+MENU_SESSION_MAX_DISHES = int(os.getenv("MENU_SESSION_MAX_DISHES", "120"))
+MENU_IMAGE_CACHE_MAX_BYTES = int(os.getenv("MENU_IMAGE_CACHE_MAX_BYTES", "67108864"))
+MENU_IMAGE_NORMALIZE_ENABLED = os.getenv("MENU_IMAGE_NORMALIZE_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"}
+MENU_IMAGE_LONG_EDGE = int(os.getenv("MENU_IMAGE_LONG_EDGE", "1536"))
+MENU_IMAGE_JPEG_QUALITY = int(os.getenv("MENU_IMAGE_JPEG_QUALITY", "80"))
+MENU_IMAGE_MAX_PIXELS = int(os.getenv("MENU_IMAGE_MAX_PIXELS", "50000000"))
 APP_ENV = os.getenv("APP_ENV", "development").strip().lower()
 REQUEST_ID_HEADER = "X-Request-ID"
 DEVICE_ID_HEADER = "X-Device-ID"
@@ -100,6 +244,7 @@ CLIENT_ERROR_RETENTION_DAYS = int(os.getenv("CLIENT_ERROR_RETENTION_DAYS", "30")
 CLEANUP_INTERVAL_SECONDS = int(os.getenv("CLEANUP_INTERVAL_SECONDS", "3600"))
 CORS_ALLOW_ORIGINS = [item.strip() for item in os.getenv("CORS_ALLOW_ORIGINS", "").split(",") if item.strip()]
 BACKEND_API_KEY = os.getenv("READYTOORDER_API_KEY", "").strip()
+ADMIN_API_KEY = os.getenv("READYTOORDER_ADMIN_API_KEY", "").strip()
 SENTRY_DSN = os.getenv("SENTRY_DSN", "").strip()
 APPLE_KEYS_URL = os.getenv("APPLE_KEYS_URL", "https://appleid.apple.com/auth/keys").strip()
 APPLE_ISSUER = os.getenv("APPLE_ISSUER", "https://appleid.apple.com").strip()
@@ -113,6 +258,82 @@ SEMVER_PATTERN = re.compile(r"^\d+\.\d+\.\d+([\-+][0-9A-Za-z\.-]+)?$")
 CLEANUP_TASK: asyncio.Task | None = None
 RATE_LIMIT_LOCK = asyncio.Lock()
 RATE_LIMIT_BUCKETS: Dict[str, Deque[float]] = defaultdict(deque)
+IMAGE_PAYLOAD_CACHE = ImagePayloadCache(IMAGE_PAYLOAD_CACHE_MAX_BYTES)
+# Menu session images by sha256, held already base64-encoded (the body is the
+# ASCII text) so a chat turn never re-encodes them.
+MENU_IMAGE_CACHE = ImagePayloadCache(MENU_IMAGE_CACHE_MAX_BYTES)
+MENU_IMAGE_STATS = NormalizeStats()
+IMAGE_PIPELINE = ImagePipeline(workers=IMAGE_PIPELINE_WORKERS)
+BLOB_STORE = blob_store_from_env()
+CATALOG_CACHE = CatalogCache(max_age_seconds=CATALOG_CACHE_MAX_AGE_SECONDS)
+RANKING_INDEX_CACHE = RankingIndexCache()
+COMPRESSION_STATS = CompressionStats()
+GEMINI_DEFAULT_TIMEOUT = GeminiTimeout(
+    connect=GEMINI_CONNECT_TIMEOUT_SECONDS,
+    read=GEMINI_READ_TIMEOUT_SECONDS,
+    write=GEMINI_WRITE_TIMEOUT_SECONDS,
+    pool=GEMINI_POOL_TIMEOUT_SECONDS,
+)
+GEMINI_HTTP_CLIENT = GeminiHttpClient(
+    base_url=GEMINI_API_BASE,
+    default_timeout=GEMINI_DEFAULT_TIMEOUT,
+    model_timeouts=parse_model_timeouts(GEMINI_MODEL_TIMEOUTS, default=GEMINI_DEFAULT_TIMEOUT),
+    max_connections=GEMINI_POOL_MAX_CONNECTIONS,
+    max_keepalive_connections=GEMINI_POOL_MAX_KEEPALIVE,
+    keepalive_expiry=GEMINI_POOL_KEEPALIVE_EXPIRY_SECONDS,
+    http2=GEMINI_HTTP2,
+)
+GEMINI_RESPONSE_CACHE = GeminiResponseCache(
+    max_bytes=GEMINI_CACHE_MAX_BYTES,
+    ttl_seconds=GEMINI_CACHE_TTL_SECONDS,
+    session_factory=SessionLocal if GEMINI_CACHE_PERSIST else None,
+)
+GEMINI_SINGLE_FLIGHT: SingleFlight[dict] = SingleFlight()
+GEMINI_BREAKERS = GeminiBreakers(
+    BreakerConfig(
+        window_seconds=GEMINI_BREAKER_WINDOW_SECONDS,
+        min_requests=GEMINI_BREAKER_MIN_REQUESTS,
+        failure_rate=GEMINI_BREAKER_FAILURE_RATE,
+        open_seconds=GEMINI_BREAKER_OPEN_SECONDS,
+    )
+)
+GEMINI_LIMITERS = GeminiLimiters(
+    LimiterConfig(
+        initial=GEMINI_LIMIT_INITIAL,
+        minimum=GEMINI_LIMIT_MIN,
+        maximum=GEMINI_LIMIT_MAX,
+        latency_tolerance=GEMINI_LIMIT_LATENCY_TOLERANCE,
+    ),
+    {
+        GEMINI_IMAGE_MODEL: LimiterConfig(
+            initial=IMAGE_GENERATION_CONCURRENCY,
+            minimum=GEMINI_LIMIT_MIN,
+            maximum=max(GEMINI_IMAGE_LIMIT_MAX, IMAGE_GENERATION_CONCURRENCY),
+            latency_tolerance=GEMINI_LIMIT_LATENCY_TOLERANCE,
+        ),
+    },
+)
+GEMINI_STREAM_STATS = StreamingStats()
+GEMINI_FORMAT_RETRIES = FormatRetryStats()
+GEMINI_HEDGER = GeminiHedger(
+    HedgeConfig(
+        percentile=GEMINI_HEDGE_PERCENTILE,
+        min_samples=GEMINI_HEDGE_MIN_SAMPLES,
+        budget_per_minute=GEMINI_HEDGE_BUDGET_PER_MINUTE,
+        min_delay_seconds=GEMINI_HEDGE_MIN_DELAY_SECONDS,
+    )
+)
+GEMINI_CONTEXT_CACHE = GeminiContextCache(
+    create=lambda model, prefix, ttl: _create_gemini_cached_content(model, prefix, ttl),
+    delete=lambda name: _delete_gemini_cached_content(name),
+    ttl_seconds=GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+    enabled=GEMINI_CONTEXT_CACHE_ENABLED,
+)
+TAGGING_PREFIX = GEMINI_CONTEXT_CACHE.register(tagging_prefix_key(), tagging_prefix())
+GEMINI_USAGE = GeminiUsageRecorder(
+    session_factory=SessionLocal if GEMINI_USAGE_ENABLED else None,
+    flush_interval_seconds=GEMINI_USAGE_FLUSH_SECONDS,
+)
 logger = logging.getLogger("readytoorder.backend")
 APPLE_JWKS_CLIENT = jwt.PyJWKClient(APPLE_KEYS_URL)
 
@@ -136,6 +357,11 @@ class DeckRequest(BaseModel):
     recent_likes: List[str] = Field(default_factory=list)
     avoid_names: List[str] = Field(default_factory=list)
     locale: str = "zh-CN"
+    image_mode: Literal["data_url", "url"] = "data_url"
+    image_rendition: Literal["original", "card", "thumb"] = "original"
+    image_format: Literal["webp", "jpeg"] = "webp"
+    ranking: Literal["random", "personalized"] = "random"
+    stream: bool = False
 
 
 class DeckCategoryTags(BaseModel):
@@ -149,6 +375,8 @@ class DeckDish(BaseModel):
     subtitle: str
     tags: DishTags = Field(default_factory=DishTags)
     image_data_url: str | None = None
+    image_id: str | None = None
+    image_url: str | None = None
 
 
 class DeckResponse(BaseModel):
@@ -161,6 +389,7 @@ class AnalyzeRequest(BaseModel):
     top_positive: List[FeatureScore] = Field(default_factory=list)
     top_negative: List[FeatureScore] = Field(default_factory=list)
     recent_events: List[RecentEvent] = Field(default_factory=list)
+    stream: bool = False
 
 
 class AnalyzeResponse(BaseModel):
@@ -192,6 +421,8 @@ class MenuChatRequest(BaseModel):
     mode: Literal["chat", "recommend"] = "chat"
     message: str = ""
     images: List[MenuImageInput] = Field(default_factory=list)
+    # A menu session from POST /v1/menu/sessions, instead of `images`.
+    menu_id: str | None = None
     chat_history: List[MenuChatTurn] = Field(default_factory=list)
     total_swipes: int = 0
     top_positive: List[FeatureScore] = Field(default_factory=list)
@@ -199,6 +430,34 @@ class MenuChatRequest(BaseModel):
     recent_likes: List[str] = Field(default_factory=list)
     params: MenuDetailParams | None = None
     locale: str = "zh-CN"
+    stream: bool = False
+
+
+class MenuSessionCreateRequest(BaseModel):
+    images: List[MenuImageInput] = Field(default_factory=list)
+    extract_context: bool = True
+
+
+class MenuSessionResponse(BaseModel):
+    menu_id: str
+    expires_at: datetime
+    ttl_seconds: int
+    image_count: int
+    image_bytes: int
+    duplicate_images: int = 0
+    context_dishes: int = 0
+
+
+class MenuContextDish(BaseModel):
+    name: str
+    original_name: str = ""
+    price: str = ""
+
+
+class MenuSessionContext(BaseModel):
+    menu_id: str = ""  # empty for images sent inline with the turn
+    images: List[MenuImageInput]
+    dishes: List[MenuContextDish] = Field(default_factory=list)
 
 
 class MenuRecommendation(BaseModel):
@@ -216,6 +475,44 @@ class MenuChatResponse(BaseModel):
     source: str = "gemini"
 
 
+# Shapes Gemini is asked to answer in (generationConfig.responseSchema).
+class MenuChatAnswer(BaseModel):
+    reply: str
+
+
+class MenuRecommendAnswer(BaseModel):
+    reply: str
+    recommendations: List[MenuRecommendation] = Field(min_length=5, max_length=5)
+
+
+class MenuRepairAnswer(BaseModel):
+    recommendations: List[MenuRecommendation] = Field(min_length=1, max_length=5)
+
+
+class MenuContextAnswer(BaseModel):
+    dishes: List[MenuContextDish]
+
+
+class DeckAnswerDish(BaseModel):
+    name: str
+    subtitle: str
+    tags: DishTags
+
+
+class DeckAnswer(BaseModel):
+    dishes: List[DeckAnswerDish]
+
+
+MENU_CHAT_SCHEMA = response_schema(MenuChatAnswer)
+MENU_RECOMMEND_SCHEMA = response_schema(MenuRecommendAnswer)
+MENU_REPAIR_SCHEMA = response_schema(MenuRepairAnswer)
+MENU_CONTEXT_SCHEMA = response_schema(MenuContextAnswer)
+ANALYZE_SCHEMA = response_schema(AnalyzeResponse, exclude=["source"])
+DECK_SCHEMA = response_schema(DeckAnswer, enums=CANONICAL_TAGS)
+TAGGING_SCHEMA = response_schema(TaggingAnswer, enums=CANONICAL_TAGS)
+BATCH_TAGGING_SCHEMA = response_schema(BatchTaggingAnswer, enums=CANONICAL_TAGS)
+
+
 class ClientErrorEventRequest(BaseModel):
     scope: str = ""
     code: str = ""
@@ -301,6 +598,15 @@ if CORS_ALLOW_ORIGINS:
         allow_headers=["*"],
     )
 
+if RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=RESPONSE_COMPRESSION_MIN_BYTES,
+        cpu_budget_ms_per_second=RESPONSE_COMPRESSION_CPU_BUDGET_MS,
+        cache_max_bytes=RESPONSE_COMPRESSION_CACHE_MAX_BYTES,
+        stats=COMPRESSION_STATS,
+    )
+
 
 def utc_now() -> datetime:
     return datetime.now(timezone.utc)
@@ -335,7 +641,14 @@ def _status_code_to_error_code(status_code: int) -> str:
     return "internal_error" if status_code >= 500 else "request_error"
 
 
-def _error_response(*, request: Request, status_code: int, code: str, message: str) -> JSONResponse:
+def _error_response(
+    *,
+    request: Request,
+    status_code: int,
+    code: str,
+    message: str,
+    headers: dict[str, str] | None = None,
+) -> JSONResponse:
     request_id = _request_id_from_request(request)
     body = {
         "code": code,
@@ -345,7 +658,7 @@ def _error_response(*, request: Request, status_code: int, code: str, message: s
     return JSONResponse(
         status_code=status_code,
         content=body,
-        headers={REQUEST_ID_HEADER: request_id},
+        headers={**(headers or {}), REQUEST_ID_HEADER: request_id},
     )
 
 
@@ -429,6 +742,8 @@ def _init_monitoring() -> None:
 async def request_context_middleware(request: Request, call_next):
     request_id = request.headers.get(REQUEST_ID_HEADER, "").strip() or str(uuid.uuid4())
     request.state.request_id = request_id
+    # Gemini usage rows are attributed to the route that triggered them.
+    GEMINI_CALLER.set(request.url.path[:80])
 
     if request.url.path.startswith("/v1/"):
         validation_error = _validate_client_headers(request)
@@ -474,6 +789,7 @@ async def http_exception_handler(request: Request, exc: HTTPException) -> JSONRe
         status_code=status_code,
         code=code,
         message=message,
+        headers=exc.headers,
     )
 
 
@@ -604,6 +920,18 @@ def _current_user_from_request(request: Request, session: Session) -> User:
     return user
 
 
+def _optional_session_user_id(request: Request) -> str | None:
+    # Public endpoints personalize for signed-in users but must keep working
+    # for anonymous devices and expired sessions.
+    if not request.headers.get(AUTHORIZATION_HEADER, "").strip():
+        return None
+    try:
+        payload = _decode_session_token(_bearer_token_from_request(request))
+    except SessionAuthError:
+        return None
+    return str(payload["sub"])
+
+
 def _serialize_user(user: User) -> AuthUserResponse:
     return AuthUserResponse(
         id=user.id,
@@ -839,6 +1167,15 @@ def _extract_first_text(resp: dict) -> str:
 
 
 def _extract_json(raw: str) -> dict:
+    # Schema-constrained answers are plain JSON; the fishing below is for
+    # older cached answers and free-form prompts.
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        pass
+    else:
+        if isinstance(data, dict):
+            return data
     fenced = re.search(r"```json\s*(\{.*\})\s*```", raw, re.DOTALL)
     if fenced:
         return json.loads(fenced.group(1))
@@ -895,7 +1232,26 @@ def _format_menu_history(chat_history: Sequence[MenuChatTurn]) -> str:
     return "\n".join(lines) if lines else "无"
 
 
-def _build_menu_prompt(req: MenuChatRequest) -> str:
+def _format_menu_dishes(dishes: Sequence[MenuContextDish]) -> str:
+    lines: List[str] = []
+    for dish in dishes:
+        line = f"- {dish.name}"
+        if dish.original_name:
+            line += f"（{dish.original_name}）"
+        if dish.price:
+            line += f" {dish.price}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _build_menu_prompt(
+    req: MenuChatRequest,
+    *,
+    dishes: Sequence[MenuContextDish] = (),
+    with_images: bool = True,
+) -> str:
+    # `dishes` is the menu transcript of a menu session. A chat turn may be
+    # sent with the transcript alone (with_images=False).
     params = req.params or MenuDetailParams()
     params_block = [
         f"- diners: {params.diners if params.diners is not None else '未设置'}",
@@ -912,6 +1268,8 @@ def _build_menu_prompt(req: MenuChatRequest) -> str:
     ]
     user_message = _safe_text(req.message, max_len=400, fallback="请按当前模式处理。")
     history_block = _format_menu_history(req.chat_history)
+    menu_source = "菜单图片" if with_images else "菜单文字稿"
+    dishes_block = f"\n\n菜单文字稿（从菜单图片整理）：\n{_format_menu_dishes(dishes)}" if dishes else ""
 
     if req.mode == "recommend":
         return f"""
@@ -945,7 +1303,7 @@ def _build_menu_prompt(req: MenuChatRequest) -> str:
 {chr(10).join(taste_block)}
 
 就餐参数：
-{chr(10).join(params_block)}
+{chr(10).join(params_block)}{dishes_block}
 
 聊天上下文：
 {history_block}
@@ -955,7 +1313,7 @@ def _build_menu_prompt(req: MenuChatRequest) -> str:
 """.strip()
 
     return f"""
-你是中文点菜助手。你会看到用户上传的菜单图片与用户口味画像。
+你是中文点菜助手。你会看到用户上传的{menu_source}与用户口味画像。
 目标：按用户问题进行普通问答，简洁回答即可。
 
 输出要求：
@@ -966,7 +1324,7 @@ def _build_menu_prompt(req: MenuChatRequest) -> str:
 }}
 
 规则：
-- 如果问题涉及菜品，优先参考菜单图片中的菜名与信息。
+- 如果问题涉及菜品，优先参考{menu_source}中的菜名与信息。
 - 不要主动输出推荐清单，除非用户明确要求推荐。
 - 回答保持简洁、可执行。
 
@@ -974,7 +1332,7 @@ def _build_menu_prompt(req: MenuChatRequest) -> str:
 {chr(10).join(taste_block)}
 
 就餐参数：
-{chr(10).join(params_block)}
+{chr(10).join(params_block)}{dishes_block}
 
 聊天上下文：
 {history_block}
@@ -984,16 +1342,17 @@ def _build_menu_prompt(req: MenuChatRequest) -> str:
 """.strip()
 
 
-def _build_menu_parts(req: MenuChatRequest, prompt: str) -> list[dict]:
-    if len(req.images) > MENU_MAX_IMAGES:
-        raise ValueError(f"too many images: {len(req.images)} > {MENU_MAX_IMAGES}")
+def _menu_image_mime(value: object) -> str:
+    mime_type = _safe_text(value, max_len=80, fallback="image/jpeg")
+    return mime_type if mime_type.startswith("image/") else "image/jpeg"
 
-    parts: list[dict] = [{"text": prompt}]
-    for image in req.images:
-        mime_type = _safe_text(image.mime_type, max_len=80, fallback="image/jpeg")
-        if not mime_type.startswith("image/"):
-            mime_type = "image/jpeg"
 
+def _decode_menu_images(images: Sequence[MenuImageInput]) -> list[tuple[str, bytes]]:
+    if len(images) > MENU_MAX_IMAGES:
+        raise ValueError(f"too many images: {len(images)} > {MENU_MAX_IMAGES}")
+
+    decoded: list[tuple[str, bytes]] = []
+    for image in images:
         try:
             raw_bytes = base64.b64decode(image.data_base64, validate=True)
         except Exception as exc:
@@ -1001,16 +1360,75 @@ def _build_menu_parts(req: MenuChatRequest, prompt: str) -> list[dict]:
 
         if len(raw_bytes) > MENU_MAX_IMAGE_BYTES:
             raise ValueError(f"image too large: {len(raw_bytes)} > {MENU_MAX_IMAGE_BYTES}")
+        decoded.append((_menu_image_mime(image.mime_type), raw_bytes))
+    return decoded
 
+
+async def _normalize_menu_image(mime_type: str, body: bytes) -> tuple[str, bytes]:
+    started = time.perf_counter()
+    try:
+        image = await IMAGE_PIPELINE.normalize_menu(
+            body,
+            long_edge=MENU_IMAGE_LONG_EDGE,
+            quality=MENU_IMAGE_JPEG_QUALITY,
+            max_pixels=MENU_IMAGE_MAX_PIXELS,
+        )
+    except MenuImageTooLargeError as exc:
+        # Over MENU_IMAGE_MAX_PIXELS, or a decompression bomb: never sent on.
+        raise HTTPException(
+            status_code=413,
+            detail={"code": "menu_image_too_large", "message": f"Menu photo is too large: {exc}"},
+        ) from exc
+    except UnidentifiedImageError as exc:
+        # Gemini may still read what Pillow cannot (HEIC without a plugin).
+        logger.warning("menu image format not recognized, sending as is: %s", exc)
+        mime_type, output, normalized = mime_type, body, False
+    except Exception as exc:
+        # Pillow knows the format but the photo does not decode.
+        raise HTTPException(
+            status_code=422,
+            detail={"code": "invalid_menu_image", "message": "Menu photo could not be read."},
+        ) from exc
+    else:
+        mime_type, output, normalized = image.mime_type, image.body, True
+    MENU_IMAGE_STATS.record(
+        bytes_in=len(body),
+        bytes_out=len(output),
+        elapsed_ms=(time.perf_counter() - started) * 1000.0,
+        normalized=normalized,
+    )
+    return mime_type, output
+
+
+async def _normalize_menu_images(decoded: Sequence[tuple[str, bytes]]) -> list[tuple[str, bytes]]:
+    # Phone photos are downscaled and recompressed in the image pipeline's
+    # worker pool before they go anywhere near Gemini.
+    if not MENU_IMAGE_NORMALIZE_ENABLED:
+        return list(decoded)
+    return list(await asyncio.gather(*(_normalize_menu_image(mime_type, body) for mime_type, body in decoded)))
+
+
+async def _prepare_menu_images(images: Sequence[MenuImageInput]) -> List[MenuImageInput]:
+    normalized = await _normalize_menu_images(_decode_menu_images(images))
+    return [
+        MenuImageInput(mime_type=mime_type, data_base64=base64.b64encode(body).decode("ascii"))
+        for mime_type, body in normalized
+    ]
+
+
+def _build_menu_parts(prompt: str, images: Sequence[MenuImageInput]) -> list[dict]:
+    # `images` are already validated, by _decode_menu_images or at menu
+    # session upload.
+    parts: list[dict] = [{"text": prompt}]
+    for image in images:
         parts.append(
             {
                 "inlineData": {
-                    "mimeType": mime_type,
+                    "mimeType": _menu_image_mime(image.mime_type),
                     "data": image.data_base64,
                 }
             }
         )
-
     return parts
 
 
@@ -1059,44 +1477,402 @@ def _has_required_recommendation_styles(items: Sequence[MenuRecommendation]) ->
     return "conservative" in styles and "adventurous" in styles
 
 
-async def _menu_chat_with_gemini(req: MenuChatRequest) -> MenuChatResponse:
-    prompt = _build_menu_prompt(req)
-    parts = _build_menu_parts(req, prompt)
-    payload = {
+def _build_menu_payload(req: MenuChatRequest, menu: MenuSessionContext | None = None) -> dict:
+    if menu is None:
+        _decode_menu_images(req.images)
+        images, dishes = req.images, []
+    else:
+        images, dishes = menu.images, menu.dishes
+    # Once the session has a transcript, plain questions go without photos;
+    # recommendations always look at the menu itself.
+    text_only = bool(dishes) and req.mode == "chat" and MENU_SESSION_TEXT_CHAT
+    prompt = _build_menu_prompt(req, dishes=dishes, with_images=not text_only)
+    parts = _build_menu_parts(prompt, [] if text_only else images)
+    return {
         "contents": [{"role": "user", "parts": parts}],
         "generationConfig": {
             "temperature": 0.35 if req.mode == "recommend" else 0.45,
             "responseMimeType": "application/json",
+            "responseSchema": MENU_RECOMMEND_SCHEMA if req.mode == "recommend" else MENU_CHAT_SCHEMA,
         },
     }
 
-    attempts = 2 if req.mode == "recommend" else 1
-    for attempt in range(1, attempts + 1):
-        raw = await _call_gemini_api(payload, model=GEMINI_MODEL)
-        text = _extract_first_text(raw)
-        data = _extract_json(text)
-        reply = _safe_text(data.get("reply"), max_len=240, fallback="好的，我明白了。")
 
-        if req.mode == "chat":
-            return MenuChatResponse(mode="chat", reply=reply, recommendations=[], source="gemini")
+def _menu_answer_from_text(req: MenuChatRequest, text: str) -> MenuChatResponse:
+    # Parses without judging: a recommend answer may come back short or
+    # without the required styles.
+    data = _extract_json(text)
+    reply = _safe_text(data.get("reply"), max_len=240, fallback="好的，我明白了。")
+    if req.mode == "chat":
+        return MenuChatResponse(mode="chat", reply=reply, recommendations=[], source="gemini")
+    recommendations = _sanitize_menu_recommendations(data.get("recommendations", []))
+    return MenuChatResponse(mode="recommend", reply=reply, recommendations=recommendations, source="gemini")
 
-        recommendations = _sanitize_menu_recommendations(data.get("recommendations", []))
-        if len(recommendations) == 5 and _has_required_recommendation_styles(recommendations):
-            return MenuChatResponse(
-                mode="recommend",
-                reply=reply,
-                recommendations=recommendations,
-                source="gemini",
+
+def _is_complete_recommendation(items: Sequence[MenuRecommendation]) -> bool:
+    return len(items) == 5 and _has_required_recommendation_styles(items)
+
+
+def _menu_response_from_text(req: MenuChatRequest, text: str, *, attempt: int) -> MenuChatResponse | None:
+    # None means a recommend answer failed validation.
+    response = _menu_answer_from_text(req, text)
+    if req.mode == "chat" or _is_complete_recommendation(response.recommendations):
+        return response
+
+    logger.warning(
+        "menu recommend format retry attempt=%s got_count=%s styles_ok=%s",
+        attempt,
+        len(response.recommendations),
+        _has_required_recommendation_styles(response.recommendations),
+    )
+    return None
+
+
+def _record_menu_followup(kind: str, started: float, raw: dict) -> None:
+    prompt_tokens, _, _ = usage_token_counts(raw.get("usageMetadata"))
+    GEMINI_FORMAT_RETRIES.record_followup(
+        "menu_recommend",
+        kind=kind,
+        latency_ms=(time.perf_counter() - started) * 1000.0,
+        prompt_tokens=prompt_tokens,
+    )
+
+
+async def _retry_menu_recommendation(req: MenuChatRequest, payload: dict, *, attempt: int) -> MenuChatResponse | None:
+    # A retry exists to get a better answer, so it must not replay the cache.
+    started = time.perf_counter()
+    raw = await _call_gemini_api(
+        payload,
+        model=GEMINI_MODEL,
+        cache=False,
+        priority=GeminiPriority.INTERACTIVE,
+        hedge="menu_chat",
+    )
+    _record_menu_followup("full_retry", started, raw)
+    return _menu_response_from_text(req, _extract_first_text(raw), attempt=attempt)
+
+
+def _menu_repair_keep(items: Sequence[MenuRecommendation]) -> list[MenuRecommendation]:
+    # The valid items to keep. With 5 items but a required style missing,
+    # the weakest item of a style that can spare one makes room.
+    kept = list(items)
+    needed = {"conservative", "adventurous"} - {item.style for item in kept}
+    while 5 - len(kept) < len(needed):
+        counts = Counter(item.style for item in kept)
+        spare = [item for item in kept if item.style == "balanced" or counts[item.style] > 1]
+        kept.remove(min(spare, key=lambda item: item.match_score))
+    return kept
+
+
+def _build_menu_repair_prompt(kept: Sequence[MenuRecommendation], *, missing: int) -> str:
+    needed = sorted({"conservative", "adventurous"} - {item.style for item in kept})
+    kept_names = "、".join(item.name for item in kept) or "无"
+    style_rule = f"\n- 补充的菜里必须包含 style 为 {' 和 '.join(needed)} 的菜。" if needed else ""
+    return f"""
+上一轮的推荐不完整。已保留：{kept_names}。
+请只补充 {missing} 道推荐，输出 JSON：{{"recommendations": [...]}}，字段格式与上一轮相同。
+
+要求：
+- recommendations 长度必须等于 {missing}。
+- 只能从之前菜单图片里真实存在的菜中选择，不得虚构。
+- 不得重复已保留的菜：{kept_names}。{style_rule}
+- reason 要结合口味画像，不要空话。
+""".strip()
+
+
+def _build_menu_repair_payload(payload: dict, first_text: str, kept: Sequence[MenuRecommendation]) -> dict:
+    # Continues the recommend conversation as text only: the original
+    # instructions and profile without the menu images, the first answer as
+    # the model turn, then a request for just the missing items.
+    missing = 5 - len(kept)
+    text_parts = [part for part in payload["contents"][0]["parts"] if "text" in part]
+    schema = copy.deepcopy(MENU_REPAIR_SCHEMA)
+    schema["properties"]["recommendations"]["minItems"] = missing
+    schema["properties"]["recommendations"]["maxItems"] = missing
+    return {
+        "contents": [
+            {"role": "user", "parts": text_parts},
+            {"role": "model", "parts": [{"text": first_text}]},
+            {"role": "user", "parts": [{"text": _build_menu_repair_prompt(kept, missing=missing)}]},
+        ],
+        "generationConfig": {
+            "temperature": payload["generationConfig"]["temperature"],
+            "responseMimeType": "application/json",
+            "responseSchema": schema,
+        },
+    }
+
+
+async def _repair_menu_recommendation(
+    payload: dict,
+    first_text: str,
+    answer: MenuChatResponse,
+) -> MenuChatResponse | None:
+    kept = _menu_repair_keep(answer.recommendations)
+    if not kept or 5 - len(kept) > MENU_REPAIR_MAX_MISSING:
+        return None
+    started = time.perf_counter()
+    try:
+        raw = await _call_gemini_api(
+            _build_menu_repair_payload(payload, first_text, kept),
+            model=GEMINI_MODEL,
+            cache=False,
+            priority=GeminiPriority.INTERACTIVE,
+        )
+        _record_menu_followup("repair", started, raw)
+        data = _extract_json(_extract_first_text(raw))
+    except Exception as exc:
+        logger.warning("menu recommend repair failed: %s", exc)
+        return None
+    kept_names = {item.name for item in kept}
+    extra = [item for item in _sanitize_menu_recommendations(data.get("recommendations", [])) if item.name not in kept_names]
+    merged = kept + extra[: 5 - len(kept)]
+    if not _is_complete_recommendation(merged):
+        logger.warning("menu recommend repair incomplete got_count=%s", len(merged))
+        return None
+    return answer.model_copy(update={"recommendations": merged})
+
+
+async def _finish_menu_answer(req: MenuChatRequest, payload: dict, text: str) -> MenuChatResponse:
+    # A recommend answer that fails validation is first repaired with a
+    # text-only follow-up for the missing items; only if that does not work
+    # is the whole multimodal call repeated.
+    answer = _menu_answer_from_text(req, text)
+    if req.mode == "chat":
+        return answer
+    if _is_complete_recommendation(answer.recommendations):
+        GEMINI_FORMAT_RETRIES.record("menu_recommend")
+        return answer
+
+    logger.warning(
+        "menu recommend incomplete got_count=%s styles_ok=%s",
+        len(answer.recommendations),
+        _has_required_recommendation_styles(answer.recommendations),
+    )
+    if MENU_REPAIR_ENABLED:
+        repaired = await _repair_menu_recommendation(payload, text, answer)
+        if repaired is not None:
+            GEMINI_FORMAT_RETRIES.record("menu_recommend", repairs=1)
+            return repaired
+    GEMINI_FORMAT_RETRIES.record("menu_recommend", retries=1)
+    response = await _retry_menu_recommendation(req, payload, attempt=2)
+    if response is None:
+        raise ValueError("Gemini did not return a valid 5-item recommendation list")
+    return response
+
+
+async def _menu_chat_with_gemini(req: MenuChatRequest, menu: MenuSessionContext | None = None) -> MenuChatResponse:
+    payload = _build_menu_payload(req, menu)
+    raw = await _call_gemini_api(payload, model=GEMINI_MODEL, priority=GeminiPriority.INTERACTIVE, hedge="menu_chat")
+    return await _finish_menu_answer(req, payload, _extract_first_text(raw))
+
+
+async def _menu_chat_events(
+    req: MenuChatRequest,
+    payload: dict,
+    stream: GeminiTextStream,
+    timer: StreamTimer,
+) -> AsyncIterator[bytes]:
+    fields = JsonFieldStreamer(["reply"])
+    ok = False
+    try:
+        async for text in stream:
+            for field, delta in fields.feed(text):
+                timer.first_token()
+                yield sse_event("delta", {"field": field, "text": delta})
+        # The streamed reply has already gone out; a repaired or retried
+        # answer arrives in the final events.
+        response = await _finish_menu_answer(req, payload, stream.text)
+        if response.mode == "recommend":
+            yield sse_event(
+                "recommendations",
+                {"recommendations": [item.model_dump(mode="json") for item in response.recommendations]},
             )
+        ok = True
+        yield sse_event("done", _stream_done_payload(response, timer))
+    except Exception as exc:
+        logger.exception("menu chat stream failed")
+        yield sse_event("error", {"code": "gemini_stream_failed", "message": f"Gemini menu chat failed: {exc}"})
+    finally:
+        await stream.aclose()
+        _record_stream("menu_chat", timer, ok=ok)
 
-        logger.warning(
-            "menu recommend format retry attempt=%s got_count=%s styles_ok=%s",
-            attempt,
-            len(recommendations),
-            _has_required_recommendation_styles(recommendations),
+
+def _aware_utc(value: datetime) -> datetime:
+    # SQLite hands timezone-aware columns back naive.
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _menu_session_digests(images_json: object) -> set[str]:
+    if not isinstance(images_json, list):
+        return set()
+    return {str(item.get("sha256")) for item in images_json if isinstance(item, dict) and item.get("sha256")}
+
+
+def _menu_session_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=404,
+        detail={"code": "menu_session_not_found", "message": "Menu session not found or expired; upload the menu again"},
+    )
+
+
+def _cache_menu_image(digest: str, mime_type: str, body: bytes) -> MenuImageInput:
+    cached = MENU_IMAGE_CACHE.get(digest)
+    if cached is None:
+        cached = ImagePayload(mime_type=mime_type, body=base64.b64encode(body), etag=f'"{digest}"')
+        MENU_IMAGE_CACHE.put(digest, cached)
+    return MenuImageInput(mime_type=mime_type, data_base64=cached.body.decode("ascii"))
+
+
+def _menu_session_image(item: dict) -> MenuImageInput:
+    digest = str(item["sha256"])
+    mime_type = str(item.get("mime_type") or "image/jpeg")
+    cached = MENU_IMAGE_CACHE.get(digest)
+    if cached is not None:
+        return MenuImageInput(mime_type=mime_type, data_base64=cached.body.decode("ascii"))
+    return _cache_menu_image(digest, mime_type, BLOB_STORE.read(digest))
+
+
+def _build_menu_context_prompt() -> str:
+    return """
+你是菜单整理助手。请把菜单图片上所有可以点的菜整理出来，输出 JSON：
+{"dishes": [{"name": "中文菜名（若菜单是外语请翻译成中文）", "original_name": "菜单原名；若原名就是中文可为空", "price": "价格原文，没有则为空"}]}
+
+要求：
+- 按菜单上的顺序列出，不要遗漏，也不要虚构。
+- 饮品、套餐也要列出；店名、说明文字不算。
+""".strip()
+
+
+def _sanitize_menu_dishes(raw_items: object) -> List[MenuContextDish]:
+    if not isinstance(raw_items, list):
+        return []
+    seen = set()
+    dishes: List[MenuContextDish] = []
+    for item in raw_items:
+        if not isinstance(item, dict):
+            continue
+        name = _safe_text(item.get("name"), max_len=40)
+        if not name or name in seen:
+            continue
+        original_name = _safe_text(item.get("original_name"), max_len=60)
+        dishes.append(
+            MenuContextDish(
+                name=name,
+                original_name="" if original_name == name else original_name,
+                price=_safe_text(item.get("price"), max_len=20),
+            )
         )
+        seen.add(name)
+        if len(dishes) >= MENU_SESSION_MAX_DISHES:
+            break
+    return dishes
 
-    raise ValueError("Gemini did not return a valid 5-item recommendation list")
+
+async def _extract_menu_dishes(images: Sequence[MenuImageInput]) -> List[MenuContextDish]:
+    payload = {
+        "contents": [{"role": "user", "parts": _build_menu_parts(_build_menu_context_prompt(), images)}],
+        "generationConfig": {
+            "temperature": 0.1,
+            "responseMimeType": "application/json",
+            "responseSchema": MENU_CONTEXT_SCHEMA,
+        },
+    }
+    try:
+        raw = await _call_gemini_api(payload, model=GEMINI_MODEL, priority=GeminiPriority.INTERACTIVE)
+        data = _extract_json(_extract_first_text(raw))
+    except Exception as exc:
+        # The session still works without a transcript; every turn then
+        # carries the photos.
+        logger.warning("menu context extraction failed: %s", exc)
+        return []
+    return _sanitize_menu_dishes(data.get("dishes"))
+
+
+def _menu_session_response(menu: MenuSession, *, now: datetime, duplicates: int = 0) -> MenuSessionResponse:
+    expires_at = _aware_utc(menu.expires_at)
+    images = menu.images_json or []
+    return MenuSessionResponse(
+        menu_id=menu.id,
+        expires_at=expires_at,
+        ttl_seconds=max(0, int((expires_at - now).total_seconds())),
+        image_count=len(images),
+        image_bytes=sum(int(item.get("size") or 0) for item in images),
+        duplicate_images=duplicates,
+        context_dishes=len(menu.dishes_json or []),
+    )
+
+
+async def _create_menu_session(req: MenuSessionCreateRequest, device_id: str) -> MenuSessionResponse:
+    decoded = await _normalize_menu_images(_decode_menu_images(req.images))
+    if not decoded:
+        raise ValueError("at least one menu image is required")
+
+    # The blob store is content-addressed, so the same photo is kept once
+    # within an upload and across sessions.
+    images_json: list[dict] = []
+    bodies: list[bytes] = []
+    duplicates = 0
+    for mime_type, body in decoded:
+        digest = blob_digest(body)
+        if any(item["sha256"] == digest for item in images_json):
+            duplicates += 1
+            continue
+        images_json.append({"sha256": digest, "mime_type": mime_type, "size": len(body)})
+        bodies.append(body)
+
+    now = utc_now()
+    menu = MenuSession(
+        device_id=device_id,
+        images_json=images_json,
+        dishes_json=[],
+        created_at=now,
+        expires_at=now + timedelta(seconds=max(60, MENU_SESSION_TTL_SECONDS)),
+    )
+    # The row goes in before the blobs: cleanup keeps every blob a session
+    # row references, so a photo shared with an expiring session cannot be
+    # deleted while this one is still writing or waiting on the transcript.
+    with SessionLocal() as session:
+        session.add(menu)
+        session.commit()
+    images: List[MenuImageInput] = []
+    for item, body in zip(images_json, bodies):
+        BLOB_STORE.put(body)
+        images.append(_cache_menu_image(item["sha256"], item["mime_type"], body))
+
+    dishes = await _extract_menu_dishes(images) if req.extract_context and MENU_SESSION_EXTRACT_CONTEXT else []
+    if dishes:
+        menu.dishes_json = [dish.model_dump() for dish in dishes]
+        with SessionLocal() as session:
+            stored = session.get(MenuSession, menu.id)
+            if stored is not None:
+                stored.dishes_json = menu.dishes_json
+                session.commit()
+    return _menu_session_response(menu, now=now, duplicates=duplicates)
+
+
+def _live_menu_session(session: Session, menu_id: str, device_id: str, *, now: datetime) -> MenuSession:
+    menu = session.get(MenuSession, menu_id)
+    if menu is None or menu.device_id != device_id or _aware_utc(menu.expires_at) <= now:
+        raise _menu_session_not_found()
+    return menu
+
+
+def _load_menu_session(menu_id: str, device_id: str) -> MenuSessionContext:
+    # Every turn pushes the expiry out again, so a session lasts as long as
+    # the conversation plus MENU_SESSION_TTL_SECONDS.
+    now = utc_now()
+    with SessionLocal() as session:
+        menu = _live_menu_session(session, menu_id, device_id, now=now)
+        menu.expires_at = now + timedelta(seconds=max(60, MENU_SESSION_TTL_SECONDS))
+        session.commit()
+    try:
+        images = [_menu_session_image(item) for item in menu.images_json]
+    except BlobNotFoundError as exc:
+        logger.error("menu session blob missing menu_id=%s", menu_id)
+        raise _menu_session_not_found() from exc
+    dishes = [MenuContextDish.model_validate(item) for item in menu.dishes_json or []]
+    return MenuSessionContext(menu_id=menu.id, images=images, dishes=dishes)
 
 
 def _sanitize_dishes(raw_dishes: list) -> List[DeckDish]:
@@ -1132,79 +1908,361 @@ def _sanitize_dishes(raw_dishes: list) -> List[DeckDish]:
     return cleaned
 
 
-async def _call_gemini_api(payload: dict, *, model: str) -> dict:
+def _gemini_cache_key_for(payload: dict, *, model: str, cache: bool | None) -> str | None:
+    # cache=None caches calls at or below GEMINI_CACHE_MAX_TEMPERATURE,
+    # True forces caching and False skips it for this call.
+    if not GEMINI_CACHE_ENABLED or cache is False:
+        return None
+    if cache is None and payload_temperature(payload) > GEMINI_CACHE_MAX_TEMPERATURE:
+        return None
+    return gemini_cache_key(model, payload)
+
+
+async def _call_gemini_api(
+    payload: dict,
+    *,
+    model: str,
+    cache: bool | None = None,
+    priority: GeminiPriority = GeminiPriority.BULK,
+    hedge: str | None = None,
+) -> dict:
+    # `hedge` names the endpoint for GEMINI_HEDGE_ENABLED hedging; bulk
+    # callers leave it unset.
+    cache_key = _gemini_cache_key_for(payload, model=model, cache=cache)
+    if cache_key is None:
+        GEMINI_RESPONSE_CACHE.bypass()
+    else:
+        cached = await GEMINI_RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+    if not GEMINI_SINGLE_FLIGHT_ENABLED:
+        return await _fetch_gemini_response(payload, model=model, cache_key=cache_key, priority=priority, hedge=hedge)
+    # Identical calls already in flight (client retries, several devices sending
+    # the same analyze request) share one upstream request.
+    flight_key = cache_key or gemini_cache_key(model, payload)
+    return await GEMINI_SINGLE_FLIGHT.run(
+        flight_key,
+        lambda: _fetch_gemini_response(payload, model=model, cache_key=cache_key, priority=priority, hedge=hedge),
+    )
+
+
+async def _fetch_gemini_response(
+    payload: dict,
+    *,
+    model: str,
+    cache_key: str | None,
+    priority: GeminiPriority,
+    hedge: str | None = None,
+) -> dict:
+    started = time.perf_counter()
+    if hedge is not None and GEMINI_HEDGE_ENABLED:
+        response = await GEMINI_HEDGER.run(
+            endpoint=hedge,
+            model=model,
+            factory=lambda: _post_gemini_with_retries(payload, model=model, priority=priority),
+        )
+    else:
+        response = await _post_gemini_with_retries(payload, model=model, priority=priority)
+    if cache_key is not None and is_complete_response(payload, response):
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        GEMINI_RESPONSE_CACHE.put(cache_key, model=model, response=response, latency_ms=latency_ms)
+    return response
+
+
+async def _open_gemini_text_stream(
+    payload: dict,
+    *,
+    model: str,
+    cache: bool | None = None,
+    priority: GeminiPriority = GeminiPriority.BULK,
+) -> GeminiTextStream:
+    # Returns once Gemini has accepted the call, so breaker, budget and HTTP
+    # errors surface before the caller commits to a streamed response.
+    cache_key = _gemini_cache_key_for(payload, model=model, cache=cache)
+    if cache_key is None:
+        GEMINI_RESPONSE_CACHE.bypass()
+    else:
+        cached = await GEMINI_RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            return GeminiTextStream.from_response(cached)
+
+    started = time.perf_counter()
+    hold = AsyncExitStack()
+    trace = GeminiCallTrace(model=model, streamed=True)
+    try:
+        resp = await _send_gemini_with_retries(payload, model=model, priority=priority, hold=hold, trace=trace)
+    except BaseException:
+        GEMINI_USAGE.record(trace.finish(ok=False))
+        await hold.aclose()
+        raise
+    # A stream closed before its last chunk is still billed; record it as failed.
+    hold.callback(lambda: GEMINI_USAGE.record(trace.finish(ok=False)))
+
+    def remember(response: dict) -> None:
+        GEMINI_USAGE.record(trace.finish(ok=True, usage=response.get("usageMetadata")))
+        if cache_key is not None and is_complete_response(payload, response):
+            latency_ms = (time.perf_counter() - started) * 1000.0
+            GEMINI_RESPONSE_CACHE.put(cache_key, model=model, response=response, latency_ms=latency_ms)
+
+    return GeminiTextStream(iter_sse_json(resp.aiter_lines()), close=hold.aclose, on_complete=remember)
+
+
+def _stream_done_payload(response: BaseModel, timer: StreamTimer) -> dict[str, Any]:
+    return {
+        "response": response.model_dump(mode="json"),
+        "ttft_ms": round(timer.ttft_ms, 3) if timer.ttft_ms is not None else None,
+        "total_ms": round(timer.elapsed_ms(), 3),
+    }
+
+
+def _record_stream(route: str, timer: StreamTimer, *, ok: bool) -> None:
+    total_ms = timer.elapsed_ms()
+    GEMINI_STREAM_STATS.record(route, ttft_ms=timer.ttft_ms, total_ms=total_ms, ok=ok)
+    logger.info(
+        "gemini stream route=%s ok=%s ttft_ms=%s total_ms=%.1f",
+        route,
+        ok,
+        f"{timer.ttft_ms:.1f}" if timer.ttft_ms is not None else "-",
+        total_ms,
+    )
+
+
+def _sse_response(events: AsyncIterator[bytes]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
+GEMINI_THROTTLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+async def _post_gemini_once(
+    path: str,
+    *,
+    model: str,
+    headers: dict[str, str],
+    payload: dict,
+    priority: GeminiPriority,
+    hold: AsyncExitStack | None = None,
+) -> httpx.Response:
+    # Every upstream attempt holds a slot in the model's adaptive limiter, and
+    # its outcome feeds the limiter's window. A successful streamed response
+    # keeps its slot until the caller closes `hold`.
+    limiter = GEMINI_LIMITERS.for_model(model)
+    slot = await limiter.acquire(priority)
+    outcome: str | None = None
+    started = time.perf_counter()
+    try:
+        if hold is None:
+            resp = await GEMINI_HTTP_CLIENT.post(path, model=model, headers=headers, json=payload)
+        else:
+            resp = await GEMINI_HTTP_CLIENT.post_stream(path, model=model, headers=headers, json=payload)
+        if resp.status_code in GEMINI_THROTTLE_STATUSES:
+            outcome = CallOutcome.THROTTLED
+        elif resp.status_code >= 400:
+            outcome = CallOutcome.ERROR
+        else:
+            outcome = CallOutcome.OK
+        if hold is not None:
+            if outcome == CallOutcome.OK:
+                # Time to headers is what the limiter sees for streamed calls.
+                latency_ms = (time.perf_counter() - started) * 1000.0
+                hold.callback(limiter.release, slot, outcome=outcome, latency_ms=latency_ms)
+                hold.push_async_callback(resp.aclose)
+            else:
+                await resp.aread()
+                await resp.aclose()
+        return resp
+    except httpx.TimeoutException:
+        outcome = CallOutcome.THROTTLED
+        raise
+    except httpx.RequestError:
+        outcome = CallOutcome.ERROR
+        raise
+    finally:
+        if hold is None or outcome != CallOutcome.OK:
+            limiter.release(slot, outcome=outcome, latency_ms=(time.perf_counter() - started) * 1000.0)
+
+
+async def _post_gemini_with_retries(payload: dict, *, model: str, priority: GeminiPriority) -> dict:
+    trace = GeminiCallTrace(model=model)
+    try:
+        resp = await _send_gemini_with_retries(payload, model=model, priority=priority, trace=trace)
+        response = resp.json()
+    except BaseException:
+        GEMINI_USAGE.record(trace.finish(ok=False))
+        raise
+    GEMINI_USAGE.record(trace.finish(ok=True, usage=response.get("usageMetadata")))
+    return response
+
+
+async def _send_gemini_with_retries(
+    payload: dict,
+    *,
+    model: str,
+    priority: GeminiPriority,
+    hold: AsyncExitStack | None = None,
+    trace: GeminiCallTrace | None = None,
+) -> httpx.Response:
+    # With `hold`, the call goes to streamGenerateContent and the successful
+    # response is returned unread; retries only happen before any byte of it
+    # has been consumed. `trace` collects attempts and the last HTTP status
+    # for usage accounting.
     if not GEMINI_API_KEY:
         raise RuntimeError("GEMINI_API_KEY is not set")
 
-    url = f"{GEMINI_API_BASE.rstrip('/')}/v1beta/models/{model}:generateContent"
+    if hold is None:
+        path = f"/v1beta/models/{model}:generateContent"
+    else:
+        path = f"/v1beta/models/{model}:streamGenerateContent?alt=sse"
     headers = {
         "Content-Type": "application/json",
         "x-goog-api-key": GEMINI_API_KEY,
     }
-    timeout = httpx.Timeout(
-        connect=GEMINI_CONNECT_TIMEOUT_SECONDS,
-        read=GEMINI_READ_TIMEOUT_SECONDS,
-        write=30.0,
-        pool=30.0,
-    )
-    retryable_statuses = {408, 429, 500, 502, 503, 504}
+    breaker = GEMINI_BREAKERS.for_model(model)
+    deadline = time.monotonic() + GEMINI_CALL_BUDGET_SECONDS
+    # A registered static prefix goes out as a cachedContent reference.
+    wire_payload = await GEMINI_CONTEXT_CACHE.apply(payload, model=model)
+    backoff = GEMINI_BACKOFF_BASE_SECONDS
     last_error: Exception | None = None
+    max_attempts = GEMINI_MAX_RETRIES
+    attempt = 0
 
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        for attempt in range(1, GEMINI_MAX_RETRIES + 1):
-            try:
-                resp = await client.post(url, headers=headers, json=payload)
-                if resp.status_code in retryable_statuses and attempt < GEMINI_MAX_RETRIES:
-                    wait_seconds = min(8.0, 1.2 * attempt)
-                    logger.warning(
-                        "Gemini transient status=%s model=%s attempt=%s/%s retry=%.1fs",
-                        resp.status_code,
-                        model,
-                        attempt,
-                        GEMINI_MAX_RETRIES,
-                        wait_seconds,
-                    )
-                    await asyncio.sleep(wait_seconds)
-                    continue
-
-                resp.raise_for_status()
-                return resp.json()
-            except httpx.HTTPStatusError as exc:
-                body = exc.response.text[:1200] if exc.response is not None else ""
-                last_error = RuntimeError(
-                    f"Gemini HTTP {exc.response.status_code if exc.response is not None else 'unknown'} model={model}: {body}"
-                )
-                if (
-                    attempt < GEMINI_MAX_RETRIES
-                    and exc.response is not None
-                    and exc.response.status_code in retryable_statuses
-                ):
-                    wait_seconds = min(8.0, 1.2 * attempt)
-                    await asyncio.sleep(wait_seconds)
-                    continue
-                break
-            except httpx.RequestError as exc:
-                last_error = RuntimeError(f"Gemini request error model={model} ({type(exc).__name__}): {exc!r}")
-                if attempt < GEMINI_MAX_RETRIES:
-                    wait_seconds = min(8.0, 1.2 * attempt)
-                    await asyncio.sleep(wait_seconds)
-                    continue
+    while attempt < max_attempts:
+        attempt += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        breaker.before_call()
+        retry_after: float | None = None
+        if trace is not None:
+            trace.attempts = attempt
+            trace.status_code = 0
+        try:
+            resp = await asyncio.wait_for(
+                _post_gemini_once(
+                    path, model=model, headers=headers, payload=wire_payload, priority=priority, hold=hold
+                ),
+                timeout=remaining,
+            )
+        except asyncio.TimeoutError:
+            breaker.record(failed=True)
+            last_error = RuntimeError(
+                f"Gemini call budget of {GEMINI_CALL_BUDGET_SECONDS:.0f}s exhausted model={model} attempt={attempt}"
+            )
+            break
+        except httpx.RequestError as exc:
+            breaker.record(failed=True)
+            last_error = RuntimeError(f"Gemini request error model={model} ({type(exc).__name__}): {exc!r}")
+        except BaseException:
+            # Cancelled or failed before Gemini answered: no verdict for the breaker.
+            breaker.release_probe()
+            raise
+        else:
+            if trace is not None:
+                trace.status_code = resp.status_code
+            retryable = resp.status_code in GEMINI_THROTTLE_STATUSES
+            if retryable:
+                retry_after = parse_retry_after(resp.headers.get("retry-after"))
+            breaker.record(failed=retryable, retry_after=retry_after)
+            if resp.status_code < 400:
+                return resp
+            last_error = RuntimeError(f"Gemini HTTP {resp.status_code} model={model}: {resp.text[:1200]}")
+            if wire_payload is not payload and is_cached_content_miss(resp.status_code, resp.text):
+                # The cached prefix expired or was evicted early. Resend it
+                # inline right away; that extra request is not a retry.
+                GEMINI_CONTEXT_CACHE.invalidate(model, wire_payload)
+                wire_payload = payload
+                max_attempts += 1
+                continue
+            if not retryable:
                 break
 
+        if attempt >= max_attempts:
+            break
+        backoff = decorrelated_jitter(backoff, base=GEMINI_BACKOFF_BASE_SECONDS, cap=GEMINI_BACKOFF_CAP_SECONDS)
+        wait_seconds = max(backoff, retry_after or 0.0)
+        if time.monotonic() + wait_seconds >= deadline:
+            # Waiting would outlive the call budget; fail now instead of holding the caller.
+            break
+        logger.warning(
+            "Gemini transient failure model=%s attempt=%s/%s retry=%.2fs reason=%s",
+            model,
+            attempt,
+            max_attempts,
+            wait_seconds,
+            last_error,
+        )
+        await asyncio.sleep(wait_seconds)
+
     if last_error is not None:
         raise last_error
-    raise RuntimeError("Gemini request failed unexpectedly")
+    raise RuntimeError(f"Gemini call budget of {GEMINI_CALL_BUDGET_SECONDS:.0f}s exhausted model={model}")
 
 
-async def _call_gemini_json(prompt: str, *, temperature: float = 0.4) -> dict:
-    payload = {
+async def _create_gemini_cached_content(model: str, prefix: StaticPrefix, ttl_seconds: float) -> str:
+    if not GEMINI_API_KEY:
+        raise RuntimeError("GEMINI_API_KEY is not set")
+    resp = await GEMINI_HTTP_CLIENT.open().post(
+        "/v1beta/cachedContents",
+        headers={"Content-Type": "application/json", "x-goog-api-key": GEMINI_API_KEY},
+        json={
+            "model": f"models/{model}",
+            "displayName": prefix.key,
+            "systemInstruction": {"parts": [{"text": prefix.text}]},
+            "ttl": f"{int(ttl_seconds)}s",
+        },
+    )
+    if resp.status_code >= 400:
+        raise RuntimeError(f"Gemini cachedContents HTTP {resp.status_code} model={model}: {resp.text[:600]}")
+    name = str(resp.json().get("name") or "")
+    if not name:
+        raise RuntimeError("Gemini cachedContents returned no name")
+    return name
+
+
+async def _delete_gemini_cached_content(name: str) -> None:
+    resp = await GEMINI_HTTP_CLIENT.open().delete(f"/v1beta/{name}", headers={"x-goog-api-key": GEMINI_API_KEY})
+    if resp.status_code >= 400 and resp.status_code != 404:
+        raise RuntimeError(f"Gemini cachedContents delete HTTP {resp.status_code}: {resp.text[:300]}")
+
+
+def _gemini_json_payload(
+    prompt: str,
+    *,
+    temperature: float,
+    system: str | None = None,
+    schema: dict | None = None,
+) -> dict:
+    payload: dict[str, Any] = {
         "contents": [{"role": "user", "parts": [{"text": prompt}]}],
         "generationConfig": {
             "temperature": temperature,
             "responseMimeType": "application/json",
         },
     }
-    return await _call_gemini_api(payload, model=GEMINI_MODEL)
+    if schema is not None:
+        payload["generationConfig"]["responseSchema"] = schema
+    if system is not None:
+        payload["systemInstruction"] = {"parts": [{"text": system}]}
+    return payload
+
+
+async def _call_gemini_json(
+    prompt: str,
+    *,
+    temperature: float = 0.4,
+    cache: bool | None = None,
+    priority: GeminiPriority = GeminiPriority.BULK,
+    hedge: str | None = None,
+    system: str | None = None,
+    schema: dict | None = None,
+) -> dict:
+    payload = _gemini_json_payload(prompt, temperature=temperature, system=system, schema=schema)
+    return await _call_gemini_api(payload, model=GEMINI_MODEL, cache=cache, priority=priority, hedge=hedge)
 
 
 async def _generate_dish_tags_with_gemini(
@@ -1212,8 +2270,26 @@ async def _generate_dish_tags_with_gemini(
     *,
     cuisine_hint: str = "",
 ) -> tuple[str, DishTags, list[CandidateTag], dict, dict]:
-    prompt = build_tagging_prompt(dish_name, cuisine_hint=cuisine_hint)
-    raw = await _call_gemini_json(prompt, temperature=0.25)
+    prompt = build_tagging_suffix(dish_name, cuisine_hint=cuisine_hint)
+    raw = await _call_gemini_json(prompt, temperature=0.25, system=TAGGING_PREFIX.text, schema=TAGGING_SCHEMA)
+    return _tags_from_gemini_response(dish_name, raw, cuisine_hint=cuisine_hint)
+
+
+def _build_dish_tagging_payload(dish_name: str, *, cuisine_hint: str = "") -> dict:
+    return _gemini_json_payload(
+        build_tagging_suffix(dish_name, cuisine_hint=cuisine_hint),
+        temperature=0.25,
+        system=TAGGING_PREFIX.text,
+        schema=TAGGING_SCHEMA,
+    )
+
+
+def _tags_from_gemini_response(
+    dish_name: str,
+    raw: dict,
+    *,
+    cuisine_hint: str = "",
+) -> tuple[str, DishTags, list[CandidateTag], dict, dict]:
     text = _extract_first_text(raw)
     data = _extract_json(text)
     subtitle = _safe_text(
@@ -1230,6 +2306,52 @@ async def _generate_dish_tags_with_gemini(
     return subtitle, tags, candidate_tags, trace, data
 
 
+async def _generate_dish_tags_batch_with_gemini(
+    dishes: Sequence[tuple[str, str]],
+    *,
+    cache: bool | None = None,
+) -> tuple[dict[int, tuple[str, DishTags, list[CandidateTag], dict, dict]], dict[int, str]]:
+    # Tags several (dish_name, cuisine_hint) pairs in one call. Returns the
+    # results and the failure reasons, both keyed by position in `dishes`;
+    # a bad or missing item never sinks the rest of the batch. Retry rounds
+    # pass cache=False so they reach Gemini instead of replaying the answer
+    # they are retrying.
+    prompt = build_batch_tagging_suffix(dishes)
+    raw = await _call_gemini_json(
+        prompt,
+        temperature=0.25,
+        cache=cache,
+        system=TAGGING_PREFIX.text,
+        schema=BATCH_TAGGING_SCHEMA,
+    )
+    data = _extract_json(_extract_first_text(raw))
+    items_by_key: dict[str, object] = {}
+    raw_items = data.get("results")
+    if isinstance(raw_items, list):
+        for item in raw_items:
+            if isinstance(item, dict):
+                items_by_key.setdefault(str(item.get("key", "")).strip(), item)
+
+    tagged: dict[int, tuple[str, DishTags, list[CandidateTag], dict, dict]] = {}
+    failures: dict[int, str] = {}
+    for index, (dish_name, cuisine_hint) in enumerate(dishes):
+        item = items_by_key.get(str(index + 1))
+        if item is None:
+            failures[index] = "missing from batch output"
+            continue
+        try:
+            subtitle, tags, candidate_tags, trace = parse_batch_tagging_item(item, dish_name=dish_name)
+        except ValueError as exc:
+            failures[index] = str(exc)
+            continue
+        subtitle = _safe_text(subtitle, max_len=40, fallback="")
+        if not subtitle:
+            subtitle = build_subtitle(dish_name=dish_name, tags=tags, cuisine_hint=cuisine_hint)
+        raw_output = {key: value for key, value in item.items() if key not in {"key", "dish_name"}}
+        tagged[index] = (subtitle, tags, candidate_tags, trace, raw_output)
+    return tagged, failures
+
+
 def _build_dish_image_prompt(dish_name: str, cuisine: str | None = None) -> str:
     clean_name = str(dish_name).strip()
     clean_cuisine = str(cuisine).strip() if cuisine else ""
@@ -1246,7 +2368,7 @@ def _build_dish_image_prompt(dish_name: str, cuisine: str | None = None) -> str:
     )
 
 
-async def _generate_dish_image_with_gemini(dish_name: str, cuisine: str | None = None) -> tuple[str, str, str]:
+def _build_dish_image_payload(dish_name: str, cuisine: str | None = None) -> tuple[str, dict]:
     prompt = _build_dish_image_prompt(dish_name, cuisine=cuisine)
     payload = {
         "contents": [{"role": "user", "parts": [{"text": prompt}]}],
@@ -1255,13 +2377,23 @@ async def _generate_dish_image_with_gemini(dish_name: str, cuisine: str | None =
             "responseModalities": ["TEXT", "IMAGE"],
         },
     }
-    raw = await _call_gemini_api(payload, model=GEMINI_IMAGE_MODEL)
+    return prompt, payload
+
+
+async def _generate_dish_image_with_gemini(dish_name: str, cuisine: str | None = None) -> tuple[str, str, str]:
+    prompt, payload = _build_dish_image_payload(dish_name, cuisine=cuisine)
+    raw = await _call_gemini_api(payload, model=GEMINI_IMAGE_MODEL, cache=False)
+    mime_type, data_url = _image_from_gemini_response(raw)
+    return prompt, mime_type, data_url
+
+
+def _image_from_gemini_response(raw: dict) -> tuple[str, str]:
     mime_type, base64_data = _extract_first_inline_image(raw)
     raw_bytes = base64.b64decode(base64_data, validate=True)
     if len(raw_bytes) > GEMINI_IMAGE_MAX_BYTES:
         raise ValueError(f"image too large: {len(raw_bytes)} > {GEMINI_IMAGE_MAX_BYTES}")
     data_url = f"data:{mime_type};base64,{base64_data}"
-    return prompt, mime_type, data_url
+    return mime_type, data_url
 
 
 def _build_deck_prompt(req: DeckRequest, needed: int, used_names: Sequence[str]) -> str:
@@ -1270,6 +2402,8 @@ def _build_deck_prompt(req: DeckRequest, needed: int, used_names: Sequence[str])
     if merged_avoid_names:
         used_block = "、".join(merged_avoid_names[:160])
 
+    tag_dictionary = "\n".join(f"  {dimension}: {', '.join(values)}" for dimension, values in CANONICAL_TAGS.items())
+
     return f"""
 你是餐饮推荐系统的数据生成器，请输出 JSON，不要输出任何额外文本。
 
@@ -1282,24 +2416,15 @@ def _build_deck_prompt(req: DeckRequest, needed: int, used_names: Sequence[str])
       {{
         "name": "菜名",
         "subtitle": "简短描述",
-        "signals": {{"featureId": 0.0}},
-        "category_tags": {{
-          "cuisine": ["川菜|粤菜|日式|泰式"],
-          "flavor": ["酸|甜|苦|辣|咸|麻|鲜"],
-          "ingredient": ["鸡肉|鸭肉|猪肉|牛肉|羊肉|海鲜|豆腐|菌菇"]
-        }}
+        "tags": {{"flavor": [], "ingredient": [], "texture": [], "cooking_method": [], "cuisine": [], "course": [], "allergen": []}}
       }}
     ]
   }}
 - dishes 数组长度必须等于 {needed}。
 - name：中文为主，2-10字，不能重复，且不能出现在“禁用菜名”列表里。
 - subtitle：中文为主，8-24字。
-- signals：只允许以下 featureId，值范围 0.2-1.0：
-  {", ".join(FEATURE_IDS)}
-- 每个菜至少 3 个 signals，最多 6 个。
-- category_tags.cuisine：1-2 个标签，从「川菜、粤菜、日式、泰式」中选。
-- category_tags.flavor：1-4 个标签，只能使用单一口味词「酸、甜、苦、辣、咸、麻、鲜」。
-- category_tags.ingredient：1-4 个标签，从「鸡肉、鸭肉、猪肉、牛肉、羊肉、海鲜、豆腐、菌菇」中选。
+- tags：只能使用下列英文规范标签；flavor、ingredient 各 1-4 个，cuisine 1-2 个，course 1 个，其余不确定时留空：
+{tag_dictionary}
 - 结合用户偏好提高多样性，避免全是同一种菜系。
 
 用户画像输入：
@@ -1323,7 +2448,7 @@ async def _generate_deck_with_gemini(req: DeckRequest, *, extra_avoid_names: Seq
         needed = min(remaining, 8)
         prompt = _build_deck_prompt(req, needed=needed, used_names=sorted(used_names))
 
-        raw = await _call_gemini_json(prompt, temperature=0.45)
+        raw = await _call_gemini_json(prompt, temperature=0.45, schema=DECK_SCHEMA)
         text = _extract_first_text(raw)
         data = _extract_json(text)
         cleaned = _sanitize_dishes(data.get("dishes", []))
@@ -1338,6 +2463,9 @@ async def _generate_deck_with_gemini(req: DeckRequest, *, extra_avoid_names: Seq
 
         attempts += 1
 
+    # The first call asks for min(count, 8) dishes; anything beyond the calls
+    # that size needs is a round trip spent on a short or invalid answer.
+    GEMINI_FORMAT_RETRIES.record("deck_generate", retries=max(0, attempts - math.ceil(req.count / 8)))
     if len(collected) < req.count:
         raise ValueError(
             f"Gemini returned insufficient valid dishes after {attempts} attempts: {len(collected)} < {req.count}"
@@ -1356,40 +2484,312 @@ def _count_ready_dishes(session: Session) -> int:
     )
 
 
-def _load_ready_dishes(session: Session, *, count: int, avoid_names: set[str]) -> List[Dish]:
-    rows = session.scalars(
-        select(Dish).where(Dish.status == "ready")
-    ).all()
-    filtered = [row for row in rows if row.name not in avoid_names]
-    random.shuffle(filtered)
-    return filtered[:count]
+def _load_ready_dishes(
+    session: Session,
+    *,
+    count: int,
+    avoid_names: set[str],
+    seen: SeenSet | None = None,
+) -> List[Dish]:
+    return sample_ready_dishes(
+        session,
+        count=count,
+        avoid_names=avoid_names,
+        exclude_ordinals=list(seen.ordinals()) if seen else (),
+        oversample=DECK_SAMPLE_OVERSAMPLE,
+    )
 
 
-def _load_image_map(session: Session, dishes: Sequence[Dish]) -> Dict[str, DishImage]:
+def _load_image_map(
+    session: Session,
+    dishes: Sequence[Dish | CatalogRecord],
+    *,
+    rendition: str = ORIGINAL_RENDITION,
+    image_format: str = "webp",
+) -> Dict[str, DishImage | DishImageRendition]:
     image_ids = [row.image_id for row in dishes if row.image_id]
     if not image_ids:
         return {}
-    rows = session.scalars(
-        select(DishImage).where(DishImage.id.in_(image_ids))
-    ).all()
-    return {row.id: row for row in rows}
 
+    image_map: Dict[str, DishImage | DishImageRendition] = {}
+    if rendition != ORIGINAL_RENDITION:
+        for row in session.scalars(
+            select(DishImageRendition).where(
+                DishImageRendition.image_id.in_(image_ids),
+                DishImageRendition.name == rendition,
+                DishImageRendition.format == image_format,
+            )
+        ).all():
+            image_map[row.image_id] = row
 
-def _to_deck_dish(row: Dish, image: DishImage | None) -> DeckDish:
-    if isinstance(row.tags_json, dict) and row.tags_json:
-        tags, _, _ = normalize_tags_payload(row.tags_json, raw_candidates=row.candidate_tags_json)
-    else:
-        tags = tags_from_legacy_fields(row.category_tags, row.signals)
+    # Images stored before the rendition pipeline fall back to the original.
+    missing = [image_id for image_id in image_ids if image_id not in image_map]
+    if missing:
+        for row in session.scalars(select(DishImage).where(DishImage.id.in_(missing))).all():
+            image_map[row.id] = row
+    return image_map
+
+
+def _record_to_deck_dish(
+    record: CatalogRecord,
+    image: DishImage | DishImageRendition | None,
+    *,
+    image_mode: str = "data_url",
+    rendition: str = ORIGINAL_RENDITION,
+    image_format: str | None = None,
+) -> DeckDish:
+    if image_mode == "url":
+        return DeckDish(
+            name=record.name,
+            subtitle=record.subtitle,
+            tags=record.tags,
+            image_id=record.image_id,
+            image_url=(
+                image_url_for(record.image_id, rendition=rendition, image_format=image_format)
+                if record.image_id
+                else None
+            ),
+        )
 
     return DeckDish(
-        name=row.name,
-        subtitle=row.subtitle,
-        tags=tags,
-        image_data_url=image.data_url if image else None,
+        name=record.name,
+        subtitle=record.subtitle,
+        tags=record.tags,
+        image_data_url=_image_data_url(image) if image else None,
+        image_id=record.image_id if image else None,
     )
 
 
-def _create_generation_job(*, kind: str, target_count: int) -> str:
+def _to_deck_dish(row: Dish, image: DishImage | None, *, image_mode: str = "data_url") -> DeckDish:
+    return _record_to_deck_dish(catalog_record_from_dish(row), image, image_mode=image_mode)
+
+
+def _rank_personalized_records(
+    session: Session,
+    req: DeckRequest,
+    *,
+    avoid_names: set[str],
+    seen: SeenSet | None = None,
+) -> List[CatalogRecord]:
+    snapshot = CATALOG_CACHE.snapshot(session)
+    index = RANKING_INDEX_CACHE.index_for(snapshot)
+    weights = preference_weights(
+        feature_scores=req.feature_scores,
+        top_positive=[(item.id, item.score) for item in req.top_positive],
+        top_negative=[(item.id, item.score) for item in req.top_negative],
+    )
+    columns = rank_deck(
+        index,
+        weights=weights,
+        count=req.count,
+        avoid_names=avoid_names,
+        recent_likes=req.recent_likes,
+        seen=seen,
+        config=DECK_RANKING_CONFIG,
+    )
+    return [snapshot.records[column] for column in columns]
+
+
+def _select_deck_records(
+    session: Session,
+    req: DeckRequest,
+    *,
+    avoid_names: set[str],
+    seen: SeenSet | None = None,
+) -> Sequence[CatalogRecord]:
+    if req.ranking == "personalized":
+        records: Sequence[CatalogRecord] = _rank_personalized_records(
+            session,
+            req,
+            avoid_names=avoid_names,
+            seen=seen,
+        )
+    elif CATALOG_CACHE_ENABLED:
+        snapshot = CATALOG_CACHE.snapshot(session)
+        records = snapshot.sample(count=req.count, avoid_names=avoid_names, seen=seen)
+    else:
+        records = [
+            catalog_record_from_dish(row)
+            for row in _load_ready_dishes(session, count=req.count, avoid_names=avoid_names, seen=seen)
+        ]
+    return records[: req.count]
+
+
+def _build_deck(
+    session: Session,
+    req: DeckRequest,
+    *,
+    avoid_names: set[str],
+    seen: SeenSet | None = None,
+) -> List[DeckDish]:
+    records = _select_deck_records(session, req, avoid_names=avoid_names, seen=seen)
+    image_map = (
+        _load_image_map(session, records, rendition=req.image_rendition, image_format=req.image_format)
+        if req.image_mode == "data_url"
+        else {}
+    )
+    return [
+        _record_to_deck_dish(
+            record,
+            image_map.get(record.image_id or ""),
+            image_mode=req.image_mode,
+            rendition=req.image_rendition,
+            image_format=req.image_format,
+        )
+        for record in records
+    ]
+
+
+def _ndjson_line(payload: dict[str, Any]) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _select_stream_deck_records(
+    req: DeckRequest,
+    *,
+    avoid_names: set[str],
+    user_id: str | None,
+) -> Sequence[CatalogRecord]:
+    with SessionLocal() as session:
+        seen = load_seen_set(session, user_id) if user_id else None
+        records = _select_deck_records(session, req, avoid_names=avoid_names, seen=seen)
+        # load_seen_set may have created the user's row.
+        session.commit()
+    return records
+
+
+def _resolve_deck_dish(req: DeckRequest, record: CatalogRecord) -> DeckDish:
+    image = None
+    if req.image_mode == "data_url" and record.image_id:
+        with SessionLocal() as session:
+            image = _load_image_map(
+                session,
+                [record],
+                rendition=req.image_rendition,
+                image_format=req.image_format,
+            ).get(record.image_id)
+    return _record_to_deck_dish(
+        record,
+        image,
+        image_mode=req.image_mode,
+        rendition=req.image_rendition,
+        image_format=req.image_format,
+    )
+
+
+async def _stream_deck_lines(req: DeckRequest, *, avoid_names: set[str], user_id: str | None) -> AsyncIterator[bytes]:
+    # The DB and blob reads run in the threadpool, so building a card never
+    # blocks the event loop for other requests.
+    started = time.perf_counter()
+    first_dish_ms: float | None = None
+    emitted = 0
+    try:
+        records = await run_in_threadpool(
+            _select_stream_deck_records, req, avoid_names=avoid_names, user_id=user_id
+        )
+        for index, record in enumerate(records):
+            # Resolve one image at a time so the first card does not wait
+            # for the rest of the deck's data URLs.
+            dish = await run_in_threadpool(_resolve_deck_dish, req, record)
+            yield _ndjson_line({"type": "dish", "index": index, "dish": dish.model_dump(mode="json")})
+            emitted += 1
+            if first_dish_ms is None:
+                first_dish_ms = (time.perf_counter() - started) * 1000.0
+    except Exception:
+        logger.exception("streaming deck failed after %s dishes", emitted)
+        yield _ndjson_line(
+            {"type": "error", "code": "deck_stream_failed", "message": "Deck stream interrupted.", "count": emitted}
+        )
+        return
+
+    yield _ndjson_line(
+        {
+            "type": "summary",
+            "count": emitted,
+            "source": "cache",
+            "first_dish_ms": round(first_dish_ms or 0.0, 3),
+            "total_ms": round((time.perf_counter() - started) * 1000.0, 3),
+        }
+    )
+
+
+def _lookup_image_blob(
+    image_id: str,
+    *,
+    rendition: str = ORIGINAL_RENDITION,
+    image_format: str = "webp",
+) -> tuple[str, str] | None:
+    with SessionLocal() as session:
+        source: DishImage | DishImageRendition | None = None
+        if rendition != ORIGINAL_RENDITION:
+            source = session.scalar(
+                select(DishImageRendition).where(
+                    DishImageRendition.image_id == image_id,
+                    DishImageRendition.name == rendition,
+                    DishImageRendition.format == image_format,
+                )
+            )
+        if source is None:
+            source = session.get(DishImage, image_id)
+        if source is None:
+            return None
+        return source.blob_sha256, source.mime_type or "image/png"
+
+
+def _load_blob_payload(digest: str, mime_type: str) -> ImagePayload:
+    # Blobs are content-addressed, so the digest is both cache key and ETag.
+    cached = IMAGE_PAYLOAD_CACHE.get(digest)
+    if cached is not None:
+        return cached
+    payload = ImagePayload(mime_type=mime_type, body=BLOB_STORE.read(digest), etag=f'"{digest}"')
+    IMAGE_PAYLOAD_CACHE.put(digest, payload)
+    return payload
+
+
+def _image_data_url(source: DishImage | DishImageRendition) -> str | None:
+    try:
+        payload = _load_blob_payload(source.blob_sha256, source.mime_type or "image/png")
+    except BlobNotFoundError:
+        logger.error("image blob missing sha256=%s", source.blob_sha256)
+        return None
+    return data_url_from_bytes(payload.mime_type, payload.body)
+
+
+def _store_image_blob(data_url: str, *, fallback_mime: str = "image/png") -> tuple[str, bytes, BlobRef]:
+    mime_type, body = decode_data_url(data_url, fallback_mime=fallback_mime)
+    return mime_type, body, BLOB_STORE.put(body)
+
+
+async def _render_image_renditions(body: bytes | None, *, label: str) -> list[RenderedImage]:
+    if not body:
+        return []
+    try:
+        return await IMAGE_PIPELINE.render(body)
+    except Exception:
+        # A failed transcode only costs the derivatives; the original still ships.
+        logger.exception("image rendition failed image=%s", label)
+        return []
+
+
+def _add_image_renditions(session: Session, image_id: str, renditions: Sequence[RenderedImage]) -> None:
+    for item in renditions:
+        ref = BLOB_STORE.put(item.body)
+        session.add(
+            DishImageRendition(
+                image_id=image_id,
+                name=item.name,
+                format=item.format,
+                mime_type=item.mime_type,
+                width=item.width,
+                height=item.height,
+                blob_sha256=ref.sha256,
+                size_bytes=ref.size,
+                created_at=utc_now(),
+            )
+        )
+
+
+def _create_generation_job(*, kind: str, target_count: int, details: dict | None = None) -> str:
     with SessionLocal() as session:
         job = GenerationJob(
             kind=kind,
@@ -1397,6 +2797,7 @@ def _create_generation_job(*, kind: str, target_count: int) -> str:
             target_count=target_count,
             produced_count=0,
             error="",
+            details_json=details or {},
             created_at=utc_now(),
             started_at=utc_now(),
         )
@@ -1406,13 +2807,21 @@ def _create_generation_job(*, kind: str, target_count: int) -> str:
         return job.id
 
 
-def _finish_generation_job(*, job_id: str, produced_count: int, error: str = "") -> None:
+def _finish_generation_job(
+    *,
+    job_id: str,
+    produced_count: int,
+    error: str = "",
+    details: dict | None = None,
+) -> None:
     with SessionLocal() as session:
         job = session.get(GenerationJob, job_id)
         if not job:
             return
         job.produced_count = produced_count
         job.error = error
+        if details is not None:
+            job.details_json = {**(job.details_json or {}), **details}
         job.status = "done" if not error else "failed"
         job.finished_at = utc_now()
         session.commit()
@@ -1441,24 +2850,27 @@ async def _generate_and_store_dishes(
         extra_avoid_names=extra_avoid_names,
     )
 
-    image_semaphore = asyncio.Semaphore(max(1, IMAGE_GENERATION_CONCURRENCY))
-
-    async def _prepare_dish_with_image(dish: DeckDish) -> tuple[DeckDish, str, str, str | None]:
+    async def _prepare_dish_with_image(
+        dish: DeckDish,
+    ) -> tuple[DeckDish, str, str, BlobRef | None, list[RenderedImage]]:
         primary_cuisine = dish.tags.cuisine[0] if dish.tags.cuisine else None
         image_prompt = _build_dish_image_prompt(dish.name, cuisine=primary_cuisine)
         image_mime = "image/png"
         image_data_url: str | None = None
-        async with image_semaphore:
-            try:
-                image_prompt, image_mime, image_data_url = await _generate_dish_image_with_gemini(
-                    dish.name,
-                    cuisine=primary_cuisine,
-                )
-            except Exception:
-                logger.exception("dish image generation failed dish=%s", dish.name)
-        return (dish, image_prompt, image_mime, image_data_url)
-
-    prepared: list[tuple[DeckDish, str, str, str | None]] = list(
+        try:
+            image_prompt, image_mime, image_data_url = await _generate_dish_image_with_gemini(
+                dish.name,
+                cuisine=primary_cuisine,
+            )
+        except Exception:
+            logger.exception("dish image generation failed dish=%s", dish.name)
+        if not image_data_url:
+            return (dish, image_prompt, image_mime, None, [])
+        image_mime, image_body, image_ref = _store_image_blob(image_data_url, fallback_mime=image_mime)
+        renditions = await _render_image_renditions(image_body, label=dish.name)
+        return (dish, image_prompt, image_mime, image_ref, renditions)
+
+    prepared: list[tuple[DeckDish, str, str, BlobRef | None, list[RenderedImage]]] = list(
         await asyncio.gather(*(_prepare_dish_with_image(dish) for dish in generated))
     )
 
@@ -1469,23 +2881,25 @@ async def _generate_and_store_dishes(
                 select(Dish.name).where(Dish.name.in_([item[0].name for item in prepared]))
             ).all()
         )
-        for dish, image_prompt, image_mime, image_data_url in prepared:
+        for dish, image_prompt, image_mime, image_ref, renditions in prepared:
             if dish.name in existing_names:
                 continue
 
             image_id = None
-            if image_data_url:
+            if image_ref is not None:
                 image = DishImage(
                     provider="gemini",
                     model=GEMINI_IMAGE_MODEL,
                     prompt=image_prompt,
                     mime_type=image_mime,
-                    data_url=image_data_url,
+                    blob_sha256=image_ref.sha256,
+                    size_bytes=image_ref.size,
                     created_at=utc_now(),
                 )
                 session.add(image)
                 session.flush()
                 image_id = image.id
+                _add_image_renditions(session, image_id, renditions)
 
             db_dish = Dish(
                 name=dish.name,
@@ -1507,6 +2921,8 @@ async def _generate_and_store_dishes(
             existing_names.add(dish.name)
             created_count += 1
 
+        if created_count:
+            bump_catalog_version(session)
         session.commit()
     return created_count
 
@@ -1535,17 +2951,65 @@ async def _cleanup_database_once() -> None:
             .outerjoin(Dish, Dish.image_id == DishImage.id)
             .where(Dish.id.is_(None), DishImage.created_at < images_cutoff)
         ).all()
+        orphan_digests: set[str] = set()
         if orphan_image_ids:
+            orphan_digests.update(
+                session.scalars(select(DishImage.blob_sha256).where(DishImage.id.in_(orphan_image_ids))).all()
+            )
+            orphan_digests.update(
+                session.scalars(
+                    select(DishImageRendition.blob_sha256).where(DishImageRendition.image_id.in_(orphan_image_ids))
+                ).all()
+            )
+            session.execute(delete(DishImageRendition).where(DishImageRendition.image_id.in_(orphan_image_ids)))
             session.execute(delete(DishImage).where(DishImage.id.in_(orphan_image_ids)))
 
+        expired_menu_sessions = session.scalars(select(MenuSession).where(MenuSession.expires_at < now)).all()
+        if expired_menu_sessions:
+            for menu in expired_menu_sessions:
+                orphan_digests.update(_menu_session_digests(menu.images_json))
+            session.execute(
+                delete(MenuSession).where(MenuSession.id.in_([menu.id for menu in expired_menu_sessions]))
+            )
+
+        expired_cache_entries = purge_expired_gemini_cache(session, now=now)
+        usage_events = purge_gemini_usage_events(
+            session, before=now - timedelta(days=max(1, GEMINI_USAGE_RETENTION_DAYS))
+        )
         session.commit()
 
-        if old_job_ids or old_client_error_ids or orphan_image_ids:
+        if orphan_digests:
+            # Blobs are shared by content, so only drop the ones no surviving row points at.
+            still_referenced = set(
+                session.scalars(select(DishImage.blob_sha256).where(DishImage.blob_sha256.in_(orphan_digests))).all()
+            )
+            still_referenced.update(
+                session.scalars(
+                    select(DishImageRendition.blob_sha256).where(DishImageRendition.blob_sha256.in_(orphan_digests))
+                ).all()
+            )
+            # Menu photos are deduped across sessions too.
+            for images_json in session.scalars(select(MenuSession.images_json)).all():
+                still_referenced.update(_menu_session_digests(images_json))
+            for digest in orphan_digests - still_referenced:
+                BLOB_STORE.delete(digest)
+
+        if (
+            old_job_ids
+            or old_client_error_ids
+            or orphan_image_ids
+            or expired_menu_sessions
+            or expired_cache_entries
+            or usage_events
+        ):
             logger.info(
-                "cleanup done jobs=%s client_errors=%s orphan_images=%s",
+                "cleanup done jobs=%s client_errors=%s orphan_images=%s menu_sessions=%s gemini_cache=%s gemini_usage=%s",
                 len(old_job_ids),
                 len(old_client_error_ids),
                 len(orphan_image_ids),
+                len(expired_menu_sessions),
+                expired_cache_entries,
+                usage_events,
             )
 
 
@@ -1558,7 +3022,7 @@ async def _cleanup_loop() -> None:
         await asyncio.sleep(max(300, CLEANUP_INTERVAL_SECONDS))
 
 
-async def _analyze_with_gemini(req: AnalyzeRequest) -> AnalyzeResponse:
+def _build_analyze_prompt(req: AnalyzeRequest) -> str:
     event_lines = []
     for event in req.recent_events[:18]:
         feature_names = []
@@ -1591,10 +3055,9 @@ async def _analyze_with_gemini(req: AnalyzeRequest) -> AnalyzeResponse:
 - 结论要可执行，不要空话。
 """.strip()
 
-    raw = await _call_gemini_json(prompt, temperature=0.3)
-    text = _extract_first_text(raw)
-    data = _extract_json(text)
 
+def _analyze_response_from_text(text: str) -> AnalyzeResponse:
+    data = _extract_json(text)
     return AnalyzeResponse(
         summary=str(data.get("summary", ""))[:140] or "Gemini 暂未返回总结。",
         avoid=str(data.get("avoid", ""))[:120] or "Gemini 暂未返回避雷建议。",
@@ -1603,11 +3066,43 @@ async def _analyze_with_gemini(req: AnalyzeRequest) -> AnalyzeResponse:
     )
 
 
+async def _analyze_with_gemini(req: AnalyzeRequest) -> AnalyzeResponse:
+    raw = await _call_gemini_json(
+        _build_analyze_prompt(req),
+        temperature=0.3,
+        schema=ANALYZE_SCHEMA,
+        priority=GeminiPriority.ANALYSIS,
+        hedge="taste_analyze",
+    )
+    return _analyze_response_from_text(_extract_first_text(raw))
+
+
+async def _analyze_events(stream: GeminiTextStream, timer: StreamTimer) -> AsyncIterator[bytes]:
+    fields = JsonFieldStreamer(["summary", "avoid", "strategy"])
+    ok = False
+    try:
+        async for text in stream:
+            for field, delta in fields.feed(text):
+                timer.first_token()
+                yield sse_event("delta", {"field": field, "text": delta})
+        response = _analyze_response_from_text(stream.text)
+        ok = True
+        yield sse_event("done", _stream_done_payload(response, timer))
+    except Exception as exc:
+        logger.exception("taste analysis stream failed")
+        yield sse_event("error", {"code": "gemini_stream_failed", "message": f"Gemini analysis failed: {exc}"})
+    finally:
+        await stream.aclose()
+        _record_stream("taste_analyze", timer, ok=ok)
+
+
 @app.on_event("startup")
 async def startup() -> None:
     _init_monitoring()
     init_db()
     logger.info("database initialized")
+    GEMINI_HTTP_CLIENT.open()
+    GEMINI_USAGE.start()
 
     global CLEANUP_TASK
     if CLEANUP_TASK is None or CLEANUP_TASK.done():
@@ -1617,6 +3112,11 @@ async def startup() -> None:
 @app.on_event("shutdown")
 async def shutdown() -> None:
     global CLEANUP_TASK
+    IMAGE_PIPELINE.close()
+    await GEMINI_CONTEXT_CACHE.aclose()
+    await GEMINI_HTTP_CLIENT.aclose()
+    await GEMINI_USAGE.stop()
+    await GEMINI_RESPONSE_CACHE.flush()
     if CLEANUP_TASK is None:
         return
     CLEANUP_TASK.cancel()
@@ -1637,9 +3137,55 @@ async def health() -> dict:
         "image_model": GEMINI_IMAGE_MODEL,
         "ready_dishes": ready_count,
         "environment": APP_ENV,
+        "catalog_cache": {"enabled": CATALOG_CACHE_ENABLED, **CATALOG_CACHE.describe()},
+        "compression": {"enabled": RESPONSE_COMPRESSION_ENABLED, "routes": COMPRESSION_STATS.describe()},
+        "gemini_pool": GEMINI_HTTP_CLIENT.describe(),
+        "gemini_cache": {"enabled": GEMINI_CACHE_ENABLED, **GEMINI_RESPONSE_CACHE.describe()},
+        "gemini_single_flight": {"enabled": GEMINI_SINGLE_FLIGHT_ENABLED, **GEMINI_SINGLE_FLIGHT.describe()},
+        "gemini_limiters": GEMINI_LIMITERS.describe(),
+        "gemini_breakers": GEMINI_BREAKERS.describe(),
+        "gemini_streaming": GEMINI_STREAM_STATS.describe(),
+        "gemini_format_retries": GEMINI_FORMAT_RETRIES.describe(),
+        "gemini_hedging": {"enabled": GEMINI_HEDGE_ENABLED, **GEMINI_HEDGER.describe()},
+        "gemini_context_cache": {"enabled": GEMINI_CONTEXT_CACHE_ENABLED, **GEMINI_CONTEXT_CACHE.describe()},
+        "gemini_usage": {"enabled": GEMINI_USAGE_ENABLED, **GEMINI_USAGE.describe()},
+        "menu_image_cache": {"entries": len(MENU_IMAGE_CACHE), "bytes": MENU_IMAGE_CACHE.total_bytes},
+        "menu_image_normalize": {
+            "enabled": MENU_IMAGE_NORMALIZE_ENABLED,
+            "long_edge": MENU_IMAGE_LONG_EDGE,
+            "quality": MENU_IMAGE_JPEG_QUALITY,
+            **MENU_IMAGE_STATS.describe(),
+        },
     }
 
 
+def _require_admin_key(request: Request) -> None:
+    if not ADMIN_API_KEY:
+        raise HTTPException(
+            status_code=403,
+            detail={"code": "admin_disabled", "message": "Admin endpoints are disabled; set READYTOORDER_ADMIN_API_KEY."},
+        )
+    provided = request.headers.get(API_KEY_HEADER, "").strip()
+    if not hmac.compare_digest(provided.encode("utf-8"), ADMIN_API_KEY.encode("utf-8")):
+        raise HTTPException(status_code=401, detail={"code": "unauthorized", "message": "Missing or invalid admin key"})
+
+
+@app.get("/admin/gemini/usage")
+async def gemini_usage(
+    request: Request,
+    hours: int = Query(default=24, ge=1, le=24 * 90),
+    group_by: Literal["caller", "model", "both", "none"] = "both",
+    by_hour: bool = False,
+) -> dict:
+    _require_admin_key(request)
+    # Records still in the write buffer would be missing from the rollups.
+    await GEMINI_USAGE.flush()
+    group_columns = {"caller": ["caller"], "model": ["model"], "both": ["model", "caller"], "none": []}[group_by]
+    with SessionLocal() as session:
+        summary = usage_summary(session, since=usage_window(hours), group_by=group_columns, by_hour=by_hour)
+    return {"hours": hours, **summary}
+
+
 @app.post("/v1/client/error")
 async def ingest_client_error_event(req: ClientErrorEventRequest, request: Request) -> dict:
     device_id = request.headers.get(DEVICE_ID_HEADER, "").strip()
@@ -1776,24 +3322,29 @@ async def append_swipe_events(req: SwipeBatchRequest, request: Request) -> Swipe
         ) if event_ids else set()
 
         inserted_count = 0
+        inserted_names: List[str] = []
         for event in req.events:
             if event.id in existing_ids:
                 continue
 
             snapshot = event.dish_snapshot_json or {}
+            dish_name = _safe_text(event.dish_name, max_len=120, fallback="")
             session.add(
                 UserSwipeEvent(
                     id=event.id,
                     user_id=user.id,
-                    dish_name=_safe_text(event.dish_name, max_len=120, fallback=""),
+                    dish_name=dish_name,
                     action=event.action,
                     dish_snapshot_json=snapshot,
                     created_at=event.created_at,
                 )
             )
             inserted_count += 1
+            inserted_names.append(dish_name)
 
         session.flush()
+        if DECK_SEEN_SET_ENABLED and inserted_names:
+            record_seen_names(session, user.id, inserted_names)
         total_count = session.execute(
             select(func.count()).select_from(UserSwipeEvent).where(UserSwipeEvent.user_id == user.id)
         ).scalar_one()
@@ -1806,17 +3357,22 @@ async def append_swipe_events(req: SwipeBatchRequest, request: Request) -> Swipe
 
 
 @app.post("/v1/taste/deck", response_model=DeckResponse)
-async def generate_taste_deck(req: DeckRequest) -> DeckResponse:
+async def generate_taste_deck(req: DeckRequest, request: Request) -> DeckResponse | StreamingResponse:
     avoid_names = _normalized_avoid_names(req.avoid_names)
+    user_id = _optional_session_user_id(request) if DECK_SEEN_SET_ENABLED else None
 
-    with SessionLocal() as session:
-        cached_rows = _load_ready_dishes(
-            session,
-            count=req.count,
-            avoid_names=avoid_names,
+    if req.stream:
+        return StreamingResponse(
+            _stream_deck_lines(req, avoid_names=avoid_names, user_id=user_id),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-store"},
         )
-        image_map = _load_image_map(session, cached_rows)
-    dishes = [_to_deck_dish(row, image_map.get(row.image_id or "")) for row in cached_rows]
+
+    with SessionLocal() as session:
+        seen = load_seen_set(session, user_id) if user_id else None
+        dishes = _build_deck(session, req, avoid_names=avoid_names, seen=seen)
+        # load_seen_set may have created the user's row.
+        session.commit()
 
     return DeckResponse(
         dishes=dishes[: req.count],
@@ -1824,22 +3380,137 @@ async def generate_taste_deck(req: DeckRequest) -> DeckResponse:
     )
 
 
+def _width_hint_from_request(request: Request) -> int | None:
+    for header in ("sec-ch-width", "width"):
+        raw = request.headers.get(header, "").strip()
+        if raw.isdigit():
+            return int(raw)
+    return None
+
+
+@app.get("/v1/images/{image_id}")
+async def get_dish_image(
+    image_id: str,
+    request: Request,
+    rendition: str | None = None,
+    image_format: str | None = Query(default=None, alias="format"),
+) -> Response:
+    width_hint = _width_hint_from_request(request)
+    chosen_rendition = pick_rendition_name(rendition, width_hint=width_hint)
+    chosen_format = pick_rendition_format(image_format, accept=request.headers.get("accept", ""))
+    blob = _lookup_image_blob(image_id, rendition=chosen_rendition, image_format=chosen_format)
+    if blob is None:
+        raise HTTPException(status_code=404, detail={"code": "image_not_found", "message": "Image not found"})
+    digest, mime_type = blob
+
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+    }
+    vary = []
+    if rendition is None:
+        vary.extend(["Sec-CH-Width", "Width"])
+    if image_format is None and chosen_rendition != ORIGINAL_RENDITION:
+        vary.append("Accept")
+    if vary:
+        headers["Vary"] = ", ".join(vary)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # Serve local blobs straight from disk so the server can use sendfile
+    # instead of copying the image through Python.
+    path = BLOB_STORE.local_path(digest)
+    if path is not None:
+        return FileResponse(path, media_type=mime_type, headers=headers)
+    try:
+        payload = _load_blob_payload(digest, mime_type)
+    except BlobNotFoundError as exc:
+        logger.error("image blob missing image_id=%s sha256=%s", image_id, digest)
+        raise HTTPException(
+            status_code=500,
+            detail={"code": "image_blob_missing", "message": "Image data is missing from the blob store"},
+        ) from exc
+    return Response(content=payload.body, media_type=payload.mime_type, headers=headers)
+
+
+def _gemini_unavailable(exc: CircuitOpenError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail={"code": "gemini_unavailable", "message": "Gemini is temporarily unavailable. Please retry later."},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
 @app.post("/v1/taste/analyze", response_model=AnalyzeResponse)
-async def analyze_taste(req: AnalyzeRequest) -> AnalyzeResponse:
+async def analyze_taste(req: AnalyzeRequest) -> AnalyzeResponse | StreamingResponse:
     try:
+        if req.stream:
+            timer = StreamTimer()
+            stream = await _open_gemini_text_stream(
+                _gemini_json_payload(_build_analyze_prompt(req), temperature=0.3, schema=ANALYZE_SCHEMA),
+                model=GEMINI_MODEL,
+                priority=GeminiPriority.ANALYSIS,
+            )
+            return _sse_response(_analyze_events(stream, timer))
         return await _analyze_with_gemini(req)
+    except CircuitOpenError as exc:
+        raise _gemini_unavailable(exc) from exc
     except Exception as exc:
         logger.exception("taste analysis failed")
         raise HTTPException(status_code=502, detail=f"Gemini analysis failed: {exc}") from exc
 
 
+@app.post("/v1/menu/sessions", response_model=MenuSessionResponse)
+async def create_menu_session(req: MenuSessionCreateRequest, request: Request) -> MenuSessionResponse:
+    if not req.images:
+        raise HTTPException(status_code=400, detail={"code": "invalid_request", "message": "at least one menu image is required"})
+    try:
+        return await _create_menu_session(req, request.headers.get(DEVICE_ID_HEADER, "").strip())
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@app.get("/v1/menu/sessions/{menu_id}", response_model=MenuSessionResponse)
+async def get_menu_session(menu_id: str, request: Request) -> MenuSessionResponse:
+    now = utc_now()
+    with SessionLocal() as session:
+        menu = _live_menu_session(session, menu_id, request.headers.get(DEVICE_ID_HEADER, "").strip(), now=now)
+        return _menu_session_response(menu, now=now)
+
+
+@app.delete("/v1/menu/sessions/{menu_id}")
+async def delete_menu_session(menu_id: str, request: Request) -> dict:
+    # Expire now; cleanup drops the row and any blobs nothing else uses.
+    now = utc_now()
+    with SessionLocal() as session:
+        menu = _live_menu_session(session, menu_id, request.headers.get(DEVICE_ID_HEADER, "").strip(), now=now)
+        menu.expires_at = now
+        session.commit()
+    return {"ok": True}
+
+
 @app.post("/v1/menu/chat", response_model=MenuChatResponse)
-async def menu_chat(req: MenuChatRequest) -> MenuChatResponse:
-    if req.mode == "recommend" and not req.images:
+async def menu_chat(req: MenuChatRequest, request: Request) -> MenuChatResponse | StreamingResponse:
+    if req.menu_id and req.images:
+        raise HTTPException(status_code=400, detail="send either menu_id or images, not both")
+    if req.mode == "recommend" and not req.images and not req.menu_id:
         raise HTTPException(status_code=400, detail="recommend mode requires at least one menu image")
+    menu = _load_menu_session(req.menu_id, request.headers.get(DEVICE_ID_HEADER, "").strip()) if req.menu_id else None
 
     try:
-        return await _menu_chat_with_gemini(req)
+        if req.images:
+            menu = MenuSessionContext(images=await _prepare_menu_images(req.images))
+        if req.stream:
+            timer = StreamTimer()
+            payload = _build_menu_payload(req, menu)
+            stream = await _open_gemini_text_stream(payload, model=GEMINI_MODEL, priority=GeminiPriority.INTERACTIVE)
+            return _sse_response(_menu_chat_events(req, payload, stream, timer))
+        return await _menu_chat_with_gemini(req, menu)
+    except HTTPException:
+        raise
+    except CircuitOpenError as exc:
+        raise _gemini_unavailable(exc) from exc
     except ValueError as exc:
         message = str(exc)
         if "too many images" in message or "image too large" in message or "invalid base64" in message:
@@ -1,7 +1,8 @@
+import random
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import DateTime, ForeignKey, Index, JSON, String, Text
+from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Index, Integer, JSON, LargeBinary, String, Text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .db import Base
@@ -23,7 +24,27 @@ class DishImage(Base):
     model: Mapped[str] = mapped_column(String(80), nullable=False, default="")
     prompt: Mapped[str] = mapped_column(Text, nullable=False, default="")
     mime_type: Mapped[str] = mapped_column(String(50), nullable=False, default="image/png")
-    data_url: Mapped[str] = mapped_column(Text, nullable=False)
+    blob_sha256: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    size_bytes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
+
+
+class DishImageRendition(Base):
+    __tablename__ = "dish_image_renditions"
+
+    id: Mapped[str] = mapped_column(
+        String(36),
+        primary_key=True,
+        default=lambda: str(uuid.uuid4()),
+    )
+    image_id: Mapped[str] = mapped_column(String(36), ForeignKey("dish_images.id"), nullable=False, index=True)
+    name: Mapped[str] = mapped_column(String(20), nullable=False)
+    format: Mapped[str] = mapped_column(String(10), nullable=False)
+    mime_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    width: Mapped[int] = mapped_column(Integer, nullable=False)
+    height: Mapped[int] = mapped_column(Integer, nullable=False)
+    blob_sha256: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    size_bytes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
 
 
@@ -47,10 +68,20 @@ class Dish(Base):
     status: Mapped[str] = mapped_column(String(20), nullable=False, default="ready")
     source: Mapped[str] = mapped_column(String(30), nullable=False, default="gemini")
     image_id: Mapped[str | None] = mapped_column(String(36), ForeignKey("dish_images.id"), nullable=True)
+    random_key: Mapped[float] = mapped_column(Float, nullable=False, default=random.random)
+    ordinal: Mapped[int | None] = mapped_column(Integer, nullable=True, unique=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
 
 
+class CatalogState(Base):
+    __tablename__ = "catalog_state"
+
+    key: Mapped[str] = mapped_column(String(40), primary_key=True)
+    version: Mapped[int] = mapped_column(nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
+
+
 class GenerationJob(Base):
     __tablename__ = "generation_jobs"
 
@@ -64,6 +95,7 @@ class GenerationJob(Base):
     target_count: Mapped[int] = mapped_column(nullable=False, default=0)
     produced_count: Mapped[int] = mapped_column(nullable=False, default=0)
     error: Mapped[str] = mapped_column(Text, nullable=False, default="")
+    details_json: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
     started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
     finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -130,8 +162,108 @@ class UserSwipeEvent(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
 
 
+class UserSeenDishes(Base):
+    __tablename__ = "user_seen_dishes"
+
+    user_id: Mapped[str] = mapped_column(
+        String(36),
+        ForeignKey("users.id"),
+        primary_key=True,
+    )
+    bitmap: Mapped[bytes] = mapped_column(LargeBinary, nullable=False, default=b"")
+    seen_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
+
+
+class GeminiResponseCacheEntry(Base):
+    __tablename__ = "gemini_response_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model: Mapped[str] = mapped_column(String(80), nullable=False, default="")
+    response_json: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    latency_ms: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+
+
+class GeminiUsageEvent(Base):
+    __tablename__ = "gemini_usage_events"
+
+    id: Mapped[str] = mapped_column(
+        String(36),
+        primary_key=True,
+        default=lambda: str(uuid.uuid4()),
+    )
+    model: Mapped[str] = mapped_column(String(80), nullable=False, default="")
+    caller: Mapped[str] = mapped_column(String(80), nullable=False, default="unknown")
+    streamed: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    latency_ms: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    status_code: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    ok: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    candidate_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    image_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now, index=True)
+
+
+class GeminiUsageHourly(Base):
+    __tablename__ = "gemini_usage_hourly"
+
+    id: Mapped[str] = mapped_column(
+        String(36),
+        primary_key=True,
+        default=lambda: str(uuid.uuid4()),
+    )
+    hour: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    model: Mapped[str] = mapped_column(String(80), nullable=False, default="")
+    caller: Mapped[str] = mapped_column(String(80), nullable=False, default="unknown")
+    calls: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    errors: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    latency_ms_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    latency_ms_max: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    candidate_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    image_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
+
+
+
+class MenuSession(Base):
+    __tablename__ = "menu_sessions"
+
+    id: Mapped[str] = mapped_column(
+        String(36),
+        primary_key=True,
+        default=lambda: str(uuid.uuid4()),
+    )
+    device_id: Mapped[str] = mapped_column(String(64), nullable=False, default="")
+    # [{"sha256", "mime_type", "size"}]; the bytes live in the blob store.
+    images_json: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    # Dishes read off the menu photos once at upload: [{"name", "original_name", "price"}].
+    dishes_json: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
 Index("ix_dishes_status_created_at", Dish.status, Dish.created_at)
+Index("ix_dishes_status_random_key", Dish.status, Dish.random_key)
 Index("ix_generation_jobs_kind_created_at", GenerationJob.kind, GenerationJob.created_at)
 Index("ix_client_error_events_created_at", ClientErrorEvent.created_at)
 Index("ix_users_last_login_at", User.last_login_at)
 Index("ix_user_swipe_events_user_created_at", UserSwipeEvent.user_id, UserSwipeEvent.created_at)
+Index(
+    "ix_dish_image_renditions_image_name_format",
+    DishImageRendition.image_id,
+    DishImageRendition.name,
+    DishImageRendition.format,
+    unique=True,
+)
+Index(
+    "ix_gemini_usage_hourly_hour_model_caller",
+    GeminiUsageHourly.hour,
+    GeminiUsageHourly.model,
+    GeminiUsageHourly.caller,
+    unique=True,
+)
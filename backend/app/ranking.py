@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Collection, Mapping, Sequence
+
+import numpy as np
+
+from .catalog_cache import CatalogSnapshot
+from .seen_set import SeenSet
+from .tagging import CANONICAL_TAGS, TAG_DIMENSIONS, tag_id
+
+CANONICAL_TAG_IDS: tuple[str, ...] = tuple(
+    tag_id(dimension, key)
+    for dimension in TAG_DIMENSIONS
+    for key in CANONICAL_TAGS[dimension]
+)
+CANONICAL_TAG_INDEX: dict[str, int] = {value: index for index, value in enumerate(CANONICAL_TAG_IDS)}
+
+
+@dataclass(frozen=True)
+class RankingConfig:
+    exploration: float = 0.2
+    novelty_bonus: float = 0.1
+    temperature: float = 0.25
+    candidate_multiplier: int = 4
+    recent_like_weight: float = 0.3
+
+
+@dataclass(frozen=True)
+class RankingIndex:
+    version: int
+    # Tag-major incidence (n_tags x n_dishes). Each dish column is scaled by
+    # 1/sqrt(tag_count) so heavily tagged dishes do not dominate the scores.
+    matrix_t: np.ndarray
+    coverage: np.ndarray
+    name_index: dict[str, int]
+    ordinal_index: dict[int, int]
+
+    @property
+    def size(self) -> int:
+        return int(self.matrix_t.shape[1])
+
+
+def build_ranking_index(snapshot: CatalogSnapshot) -> RankingIndex:
+    records = snapshot.records
+    matrix_t = np.zeros((len(CANONICAL_TAG_IDS), len(records)), dtype=np.float32)
+    for column, record in enumerate(records):
+        for dimension, keys in record.tags.by_dimension().items():
+            for key in keys:
+                row = CANONICAL_TAG_INDEX.get(tag_id(dimension, key))
+                if row is not None:
+                    matrix_t[row, column] = 1.0
+
+    tag_counts = matrix_t.sum(axis=0)
+    scale = np.zeros_like(tag_counts)
+    np.divide(1.0, np.sqrt(tag_counts), out=scale, where=tag_counts > 0)
+    matrix_t *= scale
+    return RankingIndex(
+        version=snapshot.version,
+        matrix_t=np.ascontiguousarray(matrix_t),
+        coverage=matrix_t.sum(axis=0),
+        name_index={record.name: index for index, record in enumerate(records)},
+        ordinal_index={
+            record.ordinal: index for index, record in enumerate(records) if record.ordinal is not None
+        },
+    )
+
+
+class RankingIndexCache:
+    def __init__(self) -> None:
+        self._snapshot: CatalogSnapshot | None = None
+        self._index: RankingIndex | None = None
+        self.rebuilds = 0
+
+    def index_for(self, snapshot: CatalogSnapshot) -> RankingIndex:
+        if self._index is None or self._snapshot is not snapshot:
+            self._index = build_ranking_index(snapshot)
+            self._snapshot = snapshot
+            self.rebuilds += 1
+        return self._index
+
+
+def preference_weights(
+    *,
+    feature_scores: Mapping[str, float],
+    top_positive: Sequence[tuple[str, float]],
+    top_negative: Sequence[tuple[str, float]],
+) -> dict[int, float]:
+    weights: dict[int, float] = {}
+
+    def add(raw_id: str, value: float) -> None:
+        row = CANONICAL_TAG_INDEX.get(str(raw_id).strip())
+        if row is None or not math.isfinite(value) or value == 0:
+            return
+        weights[row] = weights.get(row, 0.0) + value
+
+    for raw_id, score in feature_scores.items():
+        add(raw_id, float(score))
+    for raw_id, score in top_positive:
+        add(raw_id, abs(float(score)))
+    for raw_id, score in top_negative:
+        add(raw_id, -abs(float(score)))
+    return weights
+
+
+def _uniform_pick(
+    size: int,
+    count: int,
+    *,
+    blocked: set[int],
+    rng: np.random.Generator,
+) -> list[int]:
+    available = size - len(blocked)
+    if count <= 0 or available <= 0:
+        return []
+    if available <= count * 4:
+        candidates = [value for value in range(size) if value not in blocked]
+        return rng.permutation(candidates)[:count].tolist()
+
+    picked: list[int] = []
+    while len(picked) < count:
+        for value in rng.integers(0, size, size=count * 2).tolist():
+            if value in blocked:
+                continue
+            blocked.add(value)
+            picked.append(value)
+            if len(picked) >= count:
+                break
+    return picked
+
+
+def rank_deck(
+    index: RankingIndex,
+    *,
+    weights: Mapping[int, float],
+    count: int,
+    avoid_names: Collection[str] = (),
+    recent_likes: Sequence[str] = (),
+    seen: SeenSet | None = None,
+    config: RankingConfig = RankingConfig(),
+    rng: np.random.Generator | None = None,
+) -> list[int]:
+    rng = rng or np.random.default_rng()
+    size = index.size
+    if count <= 0 or size == 0:
+        return []
+
+    blocked: set[int] = set()
+    for name in avoid_names:
+        column = index.name_index.get(name)
+        if column is not None:
+            blocked.add(column)
+    if seen is not None:
+        for ordinal in seen.ordinals():
+            column = index.ordinal_index.get(ordinal)
+            if column is not None:
+                blocked.add(column)
+
+    combined = dict(weights)
+    for name in recent_likes:
+        column = index.name_index.get(name)
+        if column is None:
+            continue
+        for row in np.flatnonzero(index.matrix_t[:, column]).tolist():
+            combined[row] = combined.get(row, 0.0) + config.recent_like_weight
+
+    if not combined:
+        return _uniform_pick(size, count, blocked=blocked, rng=rng)
+
+    rows = np.fromiter(combined.keys(), dtype=np.intp, count=len(combined))
+    values = np.fromiter(combined.values(), dtype=np.float32, count=len(combined))
+    # score = M·w + bonus·(M·unknown). Since M·unknown = coverage − M[:, known]·1,
+    # both terms collapse into one product over the known tag rows only.
+    scores = (values - np.float32(config.novelty_bonus)) @ index.matrix_t[rows]
+    scores += np.float32(config.novelty_bonus) * index.coverage
+    if blocked:
+        scores[list(blocked)] = -np.inf
+
+    available = size - len(blocked)
+    explore_count = min(available, int(round(count * config.exploration)))
+    exploit_count = min(available, count) - explore_count
+
+    picked: list[int] = []
+    if exploit_count > 0:
+        pool_size = min(available, exploit_count * max(1, config.candidate_multiplier))
+        pool = np.argpartition(scores, size - pool_size)[size - pool_size:]
+        keys = scores[pool] / max(config.temperature, 1e-6) + rng.gumbel(size=pool_size)
+        chosen = pool[np.argpartition(keys, pool_size - exploit_count)[pool_size - exploit_count:]]
+        picked = chosen.tolist()
+        blocked.update(picked)
+
+    picked.extend(_uniform_pick(size, explore_count, blocked=blocked, rng=rng))
+    rng.shuffle(picked)
+    return picked
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import random
+from typing import Collection, Sequence
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from .models import Dish
+
+DEFAULT_OVERSAMPLE = 3
+
+
+def _window_ids(
+    session: Session,
+    *,
+    pivot: float,
+    limit: int,
+    avoid_names: Collection[str],
+    exclude_ordinals: Collection[int],
+    wrap: bool,
+) -> list[str]:
+    if limit <= 0:
+        return []
+
+    stmt = select(Dish.id).where(Dish.status == "ready")
+    if wrap:
+        stmt = stmt.where(Dish.random_key < pivot)
+    else:
+        stmt = stmt.where(Dish.random_key >= pivot)
+    if avoid_names:
+        stmt = stmt.where(Dish.name.not_in(list(avoid_names)))
+    if exclude_ordinals:
+        stmt = stmt.where(or_(Dish.ordinal.is_(None), Dish.ordinal.not_in(list(exclude_ordinals))))
+    stmt = stmt.order_by(Dish.random_key).limit(limit)
+    return list(session.scalars(stmt).all())
+
+
+def sample_ready_dish_ids(
+    session: Session,
+    *,
+    count: int,
+    avoid_names: Collection[str] = (),
+    exclude_ordinals: Collection[int] = (),
+    oversample: int = DEFAULT_OVERSAMPLE,
+    rng: random.Random | None = None,
+) -> list[str]:
+    if count <= 0:
+        return []
+
+    rng = rng or random
+    window = count * max(1, oversample)
+    pivot = rng.random()
+
+    # Walk the (status, random_key) index from a random pivot and wrap around to
+    # the start of the key space when the tail holds fewer than `window` rows.
+    ids = _window_ids(
+        session,
+        pivot=pivot,
+        limit=window,
+        avoid_names=avoid_names,
+        exclude_ordinals=exclude_ordinals,
+        wrap=False,
+    )
+    if len(ids) < window:
+        ids.extend(
+            _window_ids(
+                session,
+                pivot=pivot,
+                limit=window - len(ids),
+                avoid_names=avoid_names,
+                exclude_ordinals=exclude_ordinals,
+                wrap=True,
+            )
+        )
+
+    if len(ids) <= count:
+        rng.shuffle(ids)
+        return ids
+    return rng.sample(ids, count)
+
+
+def load_dishes_by_ids(session: Session, dish_ids: Sequence[str]) -> list[Dish]:
+    if not dish_ids:
+        return []
+    rows = session.scalars(select(Dish).where(Dish.id.in_(list(dish_ids)))).all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[dish_id] for dish_id in dish_ids if dish_id in by_id]
+
+
+def sample_ready_dishes(
+    session: Session,
+    *,
+    count: int,
+    avoid_names: Collection[str] = (),
+    exclude_ordinals: Collection[int] = (),
+    oversample: int = DEFAULT_OVERSAMPLE,
+    rng: random.Random | None = None,
+) -> list[Dish]:
+    dish_ids = sample_ready_dish_ids(
+        session,
+        count=count,
+        avoid_names=avoid_names,
+        exclude_ordinals=exclude_ordinals,
+        oversample=oversample,
+        rng=rng,
+    )
+    return load_dishes_by_ids(session, dish_ids)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import Dish, UserSeenDishes, UserSwipeEvent
+
+
+# Bit n is set when the user has swiped the dish whose ordinal is n.
+class SeenSet:
+    __slots__ = ("_bits", "_count")
+
+    def __init__(self, bits: bytes | bytearray = b"") -> None:
+        self._bits = bytearray(bits)
+        self._count = sum(value.bit_count() for value in self._bits)
+
+    def __contains__(self, ordinal: object) -> bool:
+        if not isinstance(ordinal, int) or ordinal < 0:
+            return False
+        byte_index = ordinal >> 3
+        if byte_index >= len(self._bits):
+            return False
+        return bool(self._bits[byte_index] & (1 << (ordinal & 7)))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, ordinal: int) -> bool:
+        if ordinal < 0:
+            raise ValueError("dish ordinals are non-negative")
+        byte_index, mask = ordinal >> 3, 1 << (ordinal & 7)
+        if byte_index >= len(self._bits):
+            self._bits.extend(bytes(byte_index + 1 - len(self._bits)))
+        if self._bits[byte_index] & mask:
+            return False
+        self._bits[byte_index] |= mask
+        self._count += 1
+        return True
+
+    def update(self, ordinals: Iterable[int]) -> int:
+        return sum(1 for ordinal in ordinals if self.add(ordinal))
+
+    def ordinals(self) -> Iterator[int]:
+        for byte_index, value in enumerate(self._bits):
+            while value:
+                low = value & -value
+                yield (byte_index << 3) + low.bit_length() - 1
+                value ^= low
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits).rstrip(b"\x00")
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+
+def dish_ordinals_for_names(session: Session, names: Iterable[str]) -> list[int]:
+    unique = sorted({name for name in names if name})
+    if not unique:
+        return []
+    rows = session.scalars(
+        select(Dish.ordinal).where(Dish.name.in_(unique), Dish.ordinal.is_not(None))
+    ).all()
+    return [int(value) for value in rows]
+
+
+def rebuild_seen_set(session: Session, user_id: str) -> SeenSet:
+    rows = session.scalars(
+        select(Dish.ordinal)
+        .join(UserSwipeEvent, UserSwipeEvent.dish_name == Dish.name)
+        .where(UserSwipeEvent.user_id == user_id, Dish.ordinal.is_not(None))
+        .distinct()
+    ).all()
+    seen = SeenSet()
+    seen.update(int(value) for value in rows)
+    return seen
+
+
+def _store(session: Session, row: UserSeenDishes, seen: SeenSet) -> None:
+    row.bitmap = seen.to_bytes()
+    row.seen_count = len(seen)
+    row.updated_at = datetime.now(timezone.utc)
+
+
+def _create(session: Session, user_id: str, seen: SeenSet, *, lock: bool = False) -> UserSeenDishes | None:
+    # Two first requests from a new user (a deck and a swipe batch, say) can
+    # both try to create the row. The loser's insert only rolls back its
+    # savepoint, and it gets the winner's row back instead of an error.
+    row = UserSeenDishes(user_id=user_id)
+    _store(session, row, seen)
+    try:
+        with session.begin_nested():
+            session.add(row)
+    except IntegrityError:
+        return session.get(UserSeenDishes, user_id, populate_existing=True, with_for_update=lock)
+    return None
+
+
+def load_seen_set(session: Session, user_id: str) -> SeenSet:
+    row = session.get(UserSeenDishes, user_id)
+    if row is not None:
+        return SeenSet(row.bitmap)
+    # First lookup for this user: derive the bitmap from swipe history once and
+    # persist it so later decks only read a single small row.
+    seen = rebuild_seen_set(session, user_id)
+    if len(seen):
+        existing = _create(session, user_id, seen)
+        if existing is not None:
+            return SeenSet(existing.bitmap)
+    return seen
+
+
+def record_seen_names(session: Session, user_id: str, names: Iterable[str]) -> SeenSet:
+    # SELECT ... FOR UPDATE: two swipe batches for the same user otherwise
+    # each write back a bitmap missing the other's bits. The lock is held
+    # until the caller commits.
+    row = session.get(UserSeenDishes, user_id, populate_existing=True, with_for_update=True)
+    if row is None:
+        session.flush()
+        seen = rebuild_seen_set(session, user_id)
+        row = _create(session, user_id, seen, lock=True)
+        if row is None:
+            return seen
+
+    seen = SeenSet(row.bitmap)
+    if seen.update(dish_ordinals_for_names(session, names)):
+        _store(session, row, seen)
+    return seen
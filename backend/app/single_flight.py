@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class SingleFlightStats:
+    leaders: int = 0
+    coalesced: int = 0
+    cancelled_waiters: int = 0
+    abandoned: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "cancelled_waiters": self.cancelled_waiters,
+            "abandoned": self.abandoned,
+        }
+
+
+class SingleFlight(Generic[T]):
+    # Concurrent calls with the same key share one task. The task is owned by
+    # the group rather than by the first caller, so any caller can be
+    # cancelled without affecting the rest; it is only cancelled once every
+    # caller waiting on it has gone away.
+    def __init__(self) -> None:
+        self._inflight: dict[str, asyncio.Task[T]] = {}
+        self._waiters: Counter[str] = Counter()
+        self.stats = SingleFlightStats()
+
+    def _forget(self, key: str, task: asyncio.Task[T]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.stats.leaders += 1
+        else:
+            self.stats.coalesced += 1
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done():
+                self.stats.cancelled_waiters += 1
+                if self._waiters[key] == 1:
+                    self.stats.abandoned += 1
+                    # A task can take a while to unwind after cancel(); new
+                    # callers must start afresh rather than join it.
+                    self._forget(key, task)
+                    task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if self._waiters[key] <= 0:
+                del self._waiters[key]
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def describe(self) -> dict[str, Any]:
+        return {"in_flight": self.in_flight(), **self.stats.as_dict()}
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import re
 from typing import Any, Sequence
@@ -318,6 +319,25 @@ class DishTags(BaseModel):
         return {dimension: list(getattr(self, dimension)) for dimension in TAG_DIMENSIONS}
 
 
+class TaggingAnswer(BaseModel):
+    # What a single tagging call asks Gemini for.
+    subtitle: str
+    tags: DishTags
+    candidate_tags: list[CandidateTag] = Field(default_factory=list)
+
+
+class BatchTaggingItem(BaseModel):
+    key: str
+    dish_name: str
+    subtitle: str
+    tags: DishTags
+    candidate_tags: list[CandidateTag] = Field(default_factory=list)
+
+
+class BatchTaggingAnswer(BaseModel):
+    results: list[BatchTaggingItem]
+
+
 def _ordered_unique(items: Sequence[str]) -> list[str]:
     seen: set[str] = set()
     output: list[str] = []
@@ -510,12 +530,14 @@ def normalize_tags_payload(
     return cleaned, cleaned_candidates, trace
 
 
-def build_tagging_prompt(dish_name: str, *, cuisine_hint: str = "") -> str:
+def tagging_prefix() -> str:
+    # Everything in the tagging prompt except the trailing dish input. It only
+    # changes with TAGGING_VERSION or the canonical dictionary, so it is sent
+    # as a system instruction that Gemini can serve from cached content.
     dictionary_lines = []
     for dimension in TAG_DIMENSIONS:
         dictionary_lines.append(f"{dimension}: {', '.join(CANONICAL_TAGS[dimension])}")
 
-    cuisine_input = cuisine_hint.strip() or ""
     return f"""
 You are a food taxonomy annotator for a restaurant recommendation system.
 
@@ -589,7 +611,66 @@ Input:
 {{"dish_name": "提拉米苏", "cuisine_hint": "italian"}}
 Output:
 {{"subtitle": "绵密奶香的经典意式甜品", "tags": {{"flavor": ["sweet", "creamy", "rich"], "ingredient": ["milk", "egg"], "texture": ["soft"], "cooking_method": ["baked"], "cuisine": ["italian"], "course": ["dessert"], "allergen": ["milk", "egg"]}}, "candidate_tags": []}}
+""".strip()
+
+
+def tagging_prefix_key() -> str:
+    # Names the static prefix: TAGGING_VERSION plus a hash of the canonical
+    # dictionary, so a dictionary edit without a version bump still gets a
+    # new cached content entry.
+    dictionary = json.dumps({dimension: CANONICAL_TAGS[dimension] for dimension in TAG_DIMENSIONS}, sort_keys=True)
+    return f"tagging-{TAGGING_VERSION}-{hashlib.sha256(dictionary.encode('utf-8')).hexdigest()[:12]}"
+
+
+def build_tagging_suffix(dish_name: str, *, cuisine_hint: str = "") -> str:
+    cuisine_input = cuisine_hint.strip() or ""
+    dish_input = json.dumps({"dish_name": dish_name, "cuisine_hint": cuisine_input}, ensure_ascii=False)
+    return f"Input:\n{dish_input}"
+
+
+def build_tagging_prompt(dish_name: str, *, cuisine_hint: str = "") -> str:
+    return f"{tagging_prefix()}\n\n{build_tagging_suffix(dish_name, cuisine_hint=cuisine_hint)}"
+
+
+def build_batch_tagging_suffix(dishes: Sequence[tuple[str, str]]) -> str:
+    # The per-call part for several (dish_name, cuisine_hint) pairs. Items
+    # are keyed "1".."N" in input order so each answer can be matched and
+    # validated on its own.
+    dish_inputs = [
+        {"key": str(index), "dish_name": dish_name, "cuisine_hint": cuisine_hint.strip()}
+        for index, (dish_name, cuisine_hint) in enumerate(dishes, start=1)
+    ]
+    return f"""
+Batch mode:
+The input below is a JSON array of dishes. Annotate every dish independently with the rules above.
+Return one JSON object of this shape, with exactly one result per input dish:
+{{"results": [{{"key": "same key as the input", "dish_name": "same dish_name as the input", "subtitle": "...", "tags": {{...}}, "candidate_tags": []}}]}}
+Do not skip, merge or reorder dishes, and never copy tags from one dish to another.
 
 Input:
-{json.dumps({"dish_name": dish_name, "cuisine_hint": cuisine_input}, ensure_ascii=False)}
+{json.dumps(dish_inputs, ensure_ascii=False)}
 """.strip()
+
+
+def build_batch_tagging_prompt(dishes: Sequence[tuple[str, str]]) -> str:
+    return f"{tagging_prefix()}\n\n{build_batch_tagging_suffix(dishes)}"
+
+
+def parse_batch_tagging_item(
+    item: object,
+    *,
+    dish_name: str,
+) -> tuple[str, DishTags, list[CandidateTag], dict[str, list[str]]]:
+    # Validates one entry of a batch answer; ValueError marks it for retry.
+    if not isinstance(item, dict):
+        raise ValueError("result is not an object")
+    echoed_name = str(item.get("dish_name") or "").strip()
+    if echoed_name and echoed_name != dish_name:
+        raise ValueError(f"result is for {echoed_name!r}")
+    if not isinstance(item.get("tags"), dict):
+        raise ValueError("result has no tags object")
+    tags, candidate_tags, trace = normalize_tags_payload(item["tags"], raw_candidates=item.get("candidate_tags"))
+    if not any(tags.by_dimension().values()):
+        raise ValueError("result has no canonical tags")
+    subtitle = str(item.get("subtitle") or "").strip()
+    return subtitle, tags, candidate_tags, trace
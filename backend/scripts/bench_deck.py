@@ -0,0 +1,756 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Awaitable, Callable, Iterator
+
+import httpx
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Response
+from fastapi.responses import FileResponse
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import Session
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import app.main as backend_main
+from app.compression import available_encoders
+from app.gemini_client import GeminiHttpClient, GeminiTimeout
+from app.blob_store import LocalBlobStore
+from app.catalog_cache import CatalogCache, CatalogRecord, CatalogSnapshot, bump_catalog_version
+from app.db import Base
+from app.images import data_url_from_bytes, decode_data_url
+from app.models import Dish, DishImage
+from app.ranking import build_ranking_index, preference_weights, rank_deck
+from app.sampling import sample_ready_dishes
+from app.seen_set import SeenSet
+from app.tagging import CANONICAL_TAGS, TAG_DIMENSIONS, DishTags
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+
+def _random_tags(rng: random.Random) -> dict[str, list[str]]:
+    return {
+        dimension: rng.sample(CANONICAL_TAGS[dimension], k=min(2, len(CANONICAL_TAGS[dimension])))
+        for dimension in TAG_DIMENSIONS
+    }
+
+
+def _build_catalog(path: Path, size: int, *, seed: int) -> Session:
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    Base.metadata.create_all(engine)
+    rng = random.Random(seed)
+    session = Session(engine)
+    batch: list[dict] = []
+    for index in range(size):
+        tags = _random_tags(rng)
+        batch.append(
+            {
+                "id": str(uuid.uuid4()),
+                "name": f"bench-dish-{index:06d}",
+                "subtitle": "benchmark dish",
+                "signals": {},
+                "category_tags": {"cuisine": [], "flavor": [], "ingredient": []},
+                "tags_json": tags,
+                "raw_tagging_output": {"tags": tags},
+                "candidate_tags_json": [],
+                "tagging_trace_json": {"aliases": [], "decomposed": [], "promoted_allergens": []},
+                "tagging_version": "v1",
+                "status": "ready",
+                "source": "bench",
+                "random_key": rng.random(),
+            }
+        )
+        if len(batch) >= 5_000:
+            session.execute(insert(Dish), batch)
+            batch.clear()
+    if batch:
+        session.execute(insert(Dish), batch)
+    bump_catalog_version(session)
+    session.commit()
+    return session
+
+
+def _full_scan_baseline(session: Session, *, count: int, avoid_names: set[str]) -> list[Dish]:
+    rows = session.scalars(select(Dish).where(Dish.status == "ready")).all()
+    filtered = [row for row in rows if row.name not in avoid_names]
+    random.shuffle(filtered)
+    return filtered[:count]
+
+
+def _time_ms(fn: Callable[[], object], *, repeats: int) -> tuple[float, float]:
+    samples: list[float] = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return statistics.median(samples), p95
+
+
+def run_sampling_benchmark(args: argparse.Namespace) -> int:
+    print(f"{'dishes':>8} {'mode':>10} {'p50_ms':>9} {'p95_ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            session = _build_catalog(Path(tmp) / f"bench_{size}.db", size, seed=args.seed)
+            avoid_names = {f"bench-dish-{index:06d}" for index in range(0, min(size, args.avoid * 2), 2)}
+            modes: list[tuple[str, Callable[[], object]]] = [
+                (
+                    "sampled",
+                    lambda: sample_ready_dishes(session, count=args.count, avoid_names=avoid_names),
+                ),
+            ]
+            if not args.skip_full_scan:
+                modes.append(
+                    (
+                        "full_scan",
+                        lambda: _full_scan_baseline(session, count=args.count, avoid_names=avoid_names),
+                    )
+                )
+            for label, fn in modes:
+                fn()
+                session.expunge_all()
+                repeats = args.repeats if label == "sampled" else max(3, args.repeats // 50)
+                p50, p95 = _time_ms(lambda: (fn(), session.expunge_all()), repeats=repeats)
+                print(f"{size:>8} {label:>10} {p50:>9.2f} {p95:>9.2f}", flush=True)
+            session.close()
+    return 0
+
+
+def run_cache_benchmark(args: argparse.Namespace) -> int:
+    print(f"{'dishes':>8} {'cache':>6} {'req_per_s':>10} {'p50_ms':>9} {'p95_ms':>9}")
+    request = backend_main.DeckRequest(count=args.count, image_mode="url")
+    avoid_names: set[str] = set()
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            session = _build_catalog(Path(tmp) / f"bench_cache_{size}.db", size, seed=args.seed)
+            for enabled in (False, True):
+                backend_main.CATALOG_CACHE_ENABLED = enabled
+                backend_main.CATALOG_CACHE = CatalogCache()
+
+                def build_once() -> None:
+                    backend_main._build_deck(session, request, avoid_names=avoid_names)
+                    session.expunge_all()
+
+                build_once()
+                started = time.perf_counter()
+                p50, p95 = _time_ms(build_once, repeats=args.repeats)
+                elapsed = time.perf_counter() - started
+                print(
+                    f"{size:>8} {'on' if enabled else 'off':>6} {args.repeats / elapsed:>10.1f}"
+                    f" {p50:>9.2f} {p95:>9.2f}",
+                    flush=True,
+                )
+            stats = backend_main.CATALOG_CACHE.describe()
+            print(
+                f"{'':>8} cache stats: hits={stats['hits']} misses={stats['misses']}"
+                f" last_rebuild_ms={stats['last_rebuild_ms']}",
+                flush=True,
+            )
+            session.close()
+    return 0
+
+
+def run_ranking_benchmark(args: argparse.Namespace) -> int:
+    print(f"{'dishes':>8} {'index_build_ms':>15} {'p50_ms':>9} {'p95_ms':>9}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        snapshot = CatalogSnapshot(
+            version=1,
+            records=tuple(
+                CatalogRecord(
+                    id=str(index),
+                    name=f"bench-dish-{index:06d}",
+                    subtitle="",
+                    tags=DishTags(**_random_tags(rng)),
+                    image_id=None,
+                )
+                for index in range(size)
+            ),
+            built_at=0.0,
+            rebuild_ms=0.0,
+        )
+        started = time.perf_counter()
+        index = build_ranking_index(snapshot)
+        build_ms = (time.perf_counter() - started) * 1000.0
+
+        weights = preference_weights(
+            feature_scores={"texture:crispy": 0.4, "cooking_method:stir_fried": 0.3},
+            top_positive=[("flavor:spicy", 0.8), ("ingredient:chicken", 0.6), ("cuisine:sichuan", 0.7)],
+            top_negative=[("ingredient:peanut", 0.7), ("flavor:sweet", 0.5)],
+        )
+        avoid_names = {f"bench-dish-{index:06d}" for index in range(0, min(size, args.avoid * 2), 2)}
+        generator = np.random.default_rng(args.seed)
+
+        def rank_once() -> None:
+            rank_deck(index, weights=weights, count=args.count, avoid_names=avoid_names, rng=generator)
+
+        rank_once()
+        p50, p95 = _time_ms(rank_once, repeats=args.repeats)
+        print(f"{size:>8} {build_ms:>15.1f} {p50:>9.3f} {p95:>9.3f}", flush=True)
+    return 0
+
+
+def _set_memory_bytes(values: set[str]) -> int:
+    return sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+
+
+def run_seen_set_benchmark(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    # Realistic names are 3-8 CJK characters; the bench names are ASCII, which
+    # would understate what clients actually upload.
+    alphabet = "宫保鸡丁麻婆豆腐水煮鱼回锅肉糖醋排骨清蒸鲈鱼酸菜白切鸡叉烧寿司拉面冬阴功咖喱"
+    names = ["".join(rng.choices(alphabet, k=rng.randint(3, 8))) for _ in range(args.catalog)]
+    print(
+        f"{'swiped':>8} {'bitmap_bytes':>13} {'avoid_json_bytes':>17} {'name_set_bytes':>15}"
+        f" {'sample_p50_ms':>14}"
+    )
+    snapshot = CatalogSnapshot(
+        version=1,
+        records=tuple(
+            CatalogRecord(
+                id=str(index),
+                name=names[index],
+                subtitle="",
+                tags=DishTags(),
+                image_id=None,
+                ordinal=index,
+            )
+            for index in range(args.catalog)
+        ),
+        built_at=0.0,
+        rebuild_ms=0.0,
+    )
+    for swiped in args.swiped:
+        ordinals = rng.sample(range(args.catalog), min(swiped, args.catalog))
+        seen = SeenSet()
+        seen.update(ordinals)
+        avoid = {names[ordinal] for ordinal in ordinals}
+        avoid_json = len(json.dumps({"avoid_names": sorted(avoid)}, ensure_ascii=False).encode("utf-8"))
+        stored = SeenSet(seen.to_bytes())
+        p50, _ = _time_ms(lambda: snapshot.sample(count=args.count, seen=stored), repeats=args.repeats)
+        print(
+            f"{swiped:>8} {len(seen.to_bytes()):>13} {avoid_json:>17} {_set_memory_bytes(avoid):>15}"
+            f" {p50:>14.3f}",
+            flush=True,
+        )
+    return 0
+
+
+def _sample_payloads(rng: random.Random) -> dict[str, bytes]:
+    deck = backend_main.DeckResponse(
+        dishes=[
+            backend_main.DeckDish(
+                name=f"招牌菜{index:02d}",
+                subtitle="香辣开胃，适合下饭的家常做法",
+                tags=DishTags(**_random_tags(rng)),
+                image_id=str(uuid.uuid4()),
+                image_url=f"/v1/images/{uuid.uuid4()}",
+            )
+            for index in range(40)
+        ],
+        source="cache",
+    )
+    profile = {
+        "taste_profile_json": {"likeCountByTag": {"flavor:spicy": 12}, "totalSwipes": 200},
+        "analysis_json": None,
+        "preferences_json": {"syncVersion": 3},
+        "swipe_events": [
+            {
+                "id": str(uuid.uuid4()),
+                "dish_name": f"招牌菜{index:03d}",
+                "action": rng.choice(["like", "dislike", "neutral"]),
+                "dish_snapshot_json": {
+                    "name": f"招牌菜{index:03d}",
+                    "subtitle": "香辣开胃，适合下饭的家常做法",
+                    "tags": _random_tags(rng),
+                },
+                "created_at": "2026-04-01T00:00:00Z",
+            }
+            for index in range(200)
+        ],
+        "updated_at": "2026-04-01T00:00:00Z",
+    }
+    return {
+        "deck (40, url)": deck.model_dump_json().encode("utf-8"),
+        "profile (200 swipes)": json.dumps(profile, ensure_ascii=False).encode("utf-8"),
+    }
+
+
+def run_compression_benchmark(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    encoders = available_encoders()
+    print(f"{'payload':>22} {'encoding':>8} {'bytes':>8} {'ratio':>6} {'p50_ms':>8}")
+    for label, body in _sample_payloads(rng).items():
+        print(f"{label:>22} {'identity':>8} {len(body):>8} {1.0:>6.2f} {0.0:>8.3f}")
+        for encoding, encode in encoders.items():
+            encoded = encode(body)
+            p50, _ = _time_ms(lambda: encode(body), repeats=args.repeats)
+            print(
+                f"{label:>22} {encoding:>8} {len(encoded):>8} {len(encoded) / len(body):>6.2f} {p50:>8.3f}",
+                flush=True,
+            )
+    return 0
+
+
+def _image_serving_app(engine, store: LocalBlobStore | None) -> FastAPI:
+    # Mirrors the two versions of GET /v1/images/{id}: decode the data URL out
+    # of the row, or look up the digest and hand the file to the server.
+    bench_app = FastAPI()
+
+    @bench_app.get("/images/{image_id}")
+    def serve(image_id: str) -> Response:
+        with engine.connect() as connection:
+            if store is None:
+                data_url = connection.execute(
+                    text("SELECT data_url FROM inline_images WHERE id = :id"), {"id": image_id}
+                ).scalar_one()
+                mime_type, body = decode_data_url(data_url)
+                return Response(content=body, media_type=mime_type)
+            digest, mime_type = connection.execute(
+                select(DishImage.blob_sha256, DishImage.mime_type).where(DishImage.id == image_id)
+            ).one()
+        return FileResponse(store.path_for(digest), media_type=mime_type)
+
+    return bench_app
+
+
+def run_image_storage_benchmark(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    bodies = [rng.randbytes(args.image_kb * 1024) for _ in range(args.images)]
+    ids = [str(uuid.uuid4()) for _ in bodies]
+    print(f"{'storage':>8} {'db_bytes':>12} {'blob_bytes':>12} {'p50_ms':>8} {'p95_ms':>8} {'req_per_s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("inline", "blob"):
+            db_path = Path(tmp) / f"images_{mode}.db"
+            engine = create_engine(f"sqlite:///{db_path}", future=True)
+            store: LocalBlobStore | None = None
+            with engine.begin() as connection:
+                if mode == "inline":
+                    connection.execute(
+                        text("CREATE TABLE inline_images (id VARCHAR(36) PRIMARY KEY, data_url TEXT NOT NULL)")
+                    )
+                    connection.execute(
+                        text("INSERT INTO inline_images (id, data_url) VALUES (:id, :data_url)"),
+                        [
+                            {"id": image_id, "data_url": data_url_from_bytes("image/png", body)}
+                            for image_id, body in zip(ids, bodies)
+                        ],
+                    )
+                else:
+                    Base.metadata.create_all(connection, tables=[DishImage.__table__])
+                    store = LocalBlobStore(Path(tmp) / "blobs")
+                    rows = []
+                    for image_id, body in zip(ids, bodies):
+                        ref = store.put(body)
+                        rows.append(
+                            {
+                                "id": image_id,
+                                "provider": "bench",
+                                "model": "bench",
+                                "prompt": "",
+                                "mime_type": "image/png",
+                                "blob_sha256": ref.sha256,
+                                "size_bytes": ref.size,
+                            }
+                        )
+                    connection.execute(insert(DishImage), rows)
+            blob_bytes = 0
+            if store is not None:
+                blob_bytes = sum(path.stat().st_size for path in store.root.rglob("*") if path.is_file())
+
+            with TestClient(_image_serving_app(engine, store)) as client:
+                def fetch() -> None:
+                    response = client.get(f"/images/{rng.choice(ids)}")
+                    assert len(response.content) == args.image_kb * 1024
+
+                started = time.perf_counter()
+                p50, p95 = _time_ms(fetch, repeats=args.requests)
+                elapsed = time.perf_counter() - started
+            engine.dispose()
+            print(
+                f"{mode:>8} {db_path.stat().st_size:>12} {blob_bytes:>12} {p50:>8.3f} {p95:>8.3f}"
+                f" {args.requests / elapsed:>10.0f}",
+                flush=True,
+            )
+    return 0
+
+
+class _SimulatedTaggingUpstream:
+    # Stands in for _call_gemini_api. Latency follows a simple Gemini-like
+    # model: fixed overhead, plus prompt prefill per input character, plus
+    # generation per output character. Batch items are dropped at
+    # `drop_rate` to exercise the per-item retry path.
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.calls = 0
+        self.prompt_chars = 0
+        self.output_chars = 0
+        self.simulated_seconds = 0.0
+
+    def _answer(self, dish: dict) -> dict:
+        return {
+            "subtitle": f"{dish['dish_name']}的家常做法",
+            "tags": {"flavor": ["savory"], "ingredient": ["pork"], "cooking_method": ["stir_fried"], "course": ["main"]},
+            "candidate_tags": [],
+        }
+
+    async def __call__(self, payload: dict, *, model: str, **_kwargs) -> dict:
+        prompt = payload["contents"][0]["parts"][0]["text"]
+        dish_input = json.loads(prompt.rsplit("Input:\n", 1)[1])
+        if isinstance(dish_input, list):
+            results = [
+                {"key": dish["key"], "dish_name": dish["dish_name"], **self._answer(dish)}
+                for dish in dish_input
+                if self.rng.random() >= self.args.drop_rate
+            ]
+            output = json.dumps({"results": results}, ensure_ascii=False)
+        else:
+            output = json.dumps(self._answer(dish_input), ensure_ascii=False)
+        seconds = (
+            self.args.base_ms / 1000.0
+            + len(prompt) * self.args.prefill_us_per_char / 1_000_000.0
+            + len(output) * self.args.output_ms_per_char / 1000.0
+        )
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        self.output_chars += len(output)
+        self.simulated_seconds += seconds
+        await asyncio.sleep(seconds * self.args.time_scale)
+        return {"candidates": [{"content": {"parts": [{"text": output}]}, "finishReason": "STOP"}]}
+
+
+def run_tagging_benchmark(args: argparse.Namespace) -> int:
+    import dish_cache_admin
+
+    entries = [dish_cache_admin.ApprovedDishEntry(cuisine="sichuan", name=f"测试菜{index:04d}") for index in range(args.dishes)]
+    print(
+        f"{'batch':>6} {'calls':>6} {'prompt_chars/dish':>18} {'sim_seconds':>12} {'dishes_per_sim_s':>17}"
+        f" {'wall_s':>8}"
+    )
+    original = backend_main._call_gemini_api
+    try:
+        for batch_size in args.batch_sizes:
+            upstream = _SimulatedTaggingUpstream(args)
+            backend_main._call_gemini_api = upstream
+            started = time.perf_counter()
+            records = asyncio.run(dish_cache_admin._generate_tagged_records(entries, batch_size=batch_size))
+            wall = time.perf_counter() - started
+            assert [record.name for record in records] == [entry.name for entry in entries]
+            print(
+                f"{batch_size:>6} {upstream.calls:>6} {upstream.prompt_chars / args.dishes:>18.0f}"
+                f" {upstream.simulated_seconds:>12.1f} {args.dishes / upstream.simulated_seconds:>17.2f}"
+                f" {wall:>8.2f}",
+                flush=True,
+            )
+    finally:
+        backend_main._call_gemini_api = original
+    return 0
+
+
+@contextmanager
+def _serve_in_thread(app: FastAPI) -> Iterator[str]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = int(sock.getsockname()[1])
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+async def _drive(requests: int, concurrency: int, call: Callable[[int], Awaitable[object]]) -> tuple[list[float], int]:
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await call(index)
+            except Exception:
+                errors += 1
+                return
+            latencies.append((time.perf_counter() - started) * 1000.0)
+
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    return latencies, errors
+
+
+def run_gemini_benchmark(args: argparse.Namespace) -> int:
+    # Drives the real Gemini client stack (limiter, breaker, retries, parsing)
+    # against scripts/fake_gemini.py with a fixed upstream latency, so the
+    # p50 above that latency is the backend's own overhead.
+    from fake_gemini import FakeGeminiConfig, LatencyModel, build_app
+
+    upstream = LatencyModel(a=args.latency_ms / 1000.0)
+    fake_app = build_app(
+        FakeGeminiConfig(
+            latency=upstream,
+            image_latency=upstream,
+            rate_429=args.rate_429,
+            rate_5xx=args.rate_5xx,
+            retry_after_seconds=0.0,
+            seed=args.seed,
+        )
+    )
+    saved = {
+        name: getattr(backend_main, name)
+        for name in ("GEMINI_HTTP_CLIENT", "GEMINI_API_KEY", "GEMINI_CACHE_ENABLED", "GEMINI_BACKOFF_BASE_SECONDS")
+    }
+
+    photo = io.BytesIO()
+    Image.effect_noise((960, 1280), 12).convert("RGB").save(photo, format="JPEG", quality=85)
+    menu_image = {"mime_type": "image/jpeg", "data_base64": base64.b64encode(photo.getvalue()).decode("ascii")}
+
+    async def menu(client: httpx.AsyncClient, index: int) -> None:
+        # A fresh device per call keeps the per-device rate limit out of the numbers.
+        headers = {"X-Device-ID": str(uuid.uuid4()), "X-Client-Version": "1.0.0"}
+        body = {"mode": "recommend", "message": f"推荐 {index}", "images": [menu_image]}
+        resp = await client.post("/v1/menu/chat", json=body, headers=headers)
+        resp.raise_for_status()
+
+    print(
+        f"upstream latency {args.latency_ms:.0f} ms, 429 rate {args.rate_429:.2f}, 5xx rate {args.rate_5xx:.2f},"
+        f" {args.requests} requests per pipeline at concurrency {args.concurrency}"
+    )
+    print(f"{'pipeline':>10} {'ok':>5} {'errors':>7} {'p50_ms':>8} {'p95_ms':>8} {'overhead_p50_ms':>16} {'req_per_s':>10}")
+    with _serve_in_thread(fake_app) as base_url:
+        backend_main.GEMINI_HTTP_CLIENT = GeminiHttpClient(
+            base_url=base_url,
+            default_timeout=GeminiTimeout(connect=5.0, read=60.0),
+            max_connections=max(20, args.concurrency),
+        )
+        backend_main.GEMINI_API_KEY = "bench"
+        backend_main.GEMINI_CACHE_ENABLED = False
+        backend_main.GEMINI_BACKOFF_BASE_SECONDS = 0.05
+
+        async def scenario() -> None:
+            transport = httpx.ASGITransport(app=backend_main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                pipelines: dict[str, Callable[[int], Awaitable[object]]] = {
+                    "menu": lambda index: menu(client, index),
+                    "tagging": lambda index: backend_main._generate_dish_tags_with_gemini(f"基准菜{index:04d}"),
+                    "image": lambda index: backend_main._generate_dish_image_with_gemini(f"基准菜{index:04d}"),
+                }
+                for name in args.pipelines:
+                    started = time.perf_counter()
+                    latencies, errors = await _drive(args.requests, args.concurrency, pipelines[name])
+                    elapsed = time.perf_counter() - started
+                    if not latencies:
+                        print(f"{name:>10} {0:>5} {errors:>7}", flush=True)
+                        continue
+                    p50 = statistics.median(latencies)
+                    p95 = float(np.percentile(latencies, 95))
+                    print(
+                        f"{name:>10} {len(latencies):>5} {errors:>7} {p50:>8.1f} {p95:>8.1f}"
+                        f" {p50 - args.latency_ms:>16.1f} {args.requests / elapsed:>10.1f}",
+                        flush=True,
+                    )
+            await backend_main.GEMINI_HTTP_CLIENT.aclose()
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            for name, value in saved.items():
+                setattr(backend_main, name, value)
+    print(f"fake upstream: {json.dumps(fake_app.state.fake.describe(), ensure_ascii=False)}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Deck path micro-benchmarks for readytoorder.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sampling_parser = subparsers.add_parser(
+        "sampling",
+        help="Compare indexed random-key sampling against the legacy full catalog scan.",
+    )
+    sampling_parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_SIZES),
+        help="Catalog sizes to benchmark.",
+    )
+    sampling_parser.add_argument("--count", type=int, default=40, help="Deck size to request.")
+    sampling_parser.add_argument("--avoid", type=int, default=200, help="How many avoided names to send.")
+    sampling_parser.add_argument("--repeats", type=int, default=200, help="Timed runs per catalog size.")
+    sampling_parser.add_argument("--seed", type=int, default=42, help="Seed for catalog generation.")
+    sampling_parser.add_argument(
+        "--skip-full-scan",
+        action="store_true",
+        help="Only time the sampled path.",
+    )
+
+    cache_parser = subparsers.add_parser(
+        "cache",
+        help="Compare deck build throughput with the in-process catalog cache on and off.",
+    )
+    cache_parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1_000, 10_000],
+        help="Catalog sizes to benchmark.",
+    )
+    cache_parser.add_argument("--count", type=int, default=40, help="Deck size to request.")
+    cache_parser.add_argument("--repeats", type=int, default=300, help="Timed deck builds per mode.")
+    cache_parser.add_argument("--seed", type=int, default=42, help="Seed for catalog generation.")
+
+    ranking_parser = subparsers.add_parser(
+        "ranking",
+        help="Time personalized deck ranking over an in-memory catalog.",
+    )
+    ranking_parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10_000, 50_000],
+        help="Catalog sizes to benchmark.",
+    )
+    ranking_parser.add_argument("--count", type=int, default=40, help="Deck size to request.")
+    ranking_parser.add_argument("--avoid", type=int, default=200, help="How many avoided names to send.")
+    ranking_parser.add_argument("--repeats", type=int, default=1000, help="Timed ranking calls per size.")
+    ranking_parser.add_argument("--seed", type=int, default=42, help="Seed for catalog generation.")
+
+    seen_parser = subparsers.add_parser(
+        "seen-set",
+        help="Compare per-user seen-set bitmap size against uploading avoid_names.",
+    )
+    seen_parser.add_argument("--catalog", type=int, default=10_000, help="Catalog size in dishes.")
+    seen_parser.add_argument(
+        "--swiped",
+        type=int,
+        nargs="+",
+        default=[100, 1_000, 5_000, 10_000],
+        help="How many dishes the user has already swiped.",
+    )
+    seen_parser.add_argument("--count", type=int, default=40, help="Deck size to request.")
+    seen_parser.add_argument("--repeats", type=int, default=200, help="Timed samples per row.")
+    seen_parser.add_argument("--seed", type=int, default=42, help="Seed for name generation.")
+
+    compression_parser = subparsers.add_parser(
+        "compression",
+        help="Compressed size and encode time for typical deck and profile payloads.",
+    )
+    compression_parser.add_argument("--repeats", type=int, default=200, help="Timed encodes per payload.")
+    compression_parser.add_argument("--seed", type=int, default=42, help="Seed for payload generation.")
+
+    images_parser = subparsers.add_parser(
+        "images",
+        help="Database size and image serving throughput for inline data URLs versus the blob store.",
+    )
+    images_parser.add_argument("--images", type=int, default=500, help="How many images to store.")
+    images_parser.add_argument("--image-kb", type=int, default=300, help="Size of each image in KiB.")
+    images_parser.add_argument("--requests", type=int, default=500, help="Timed image fetches per mode.")
+    images_parser.add_argument("--seed", type=int, default=42, help="Seed for image bytes.")
+
+    tagging_parser = subparsers.add_parser(
+        "tagging",
+        help="Compare single-dish and batched seed-names tagging against a simulated Gemini.",
+    )
+    tagging_parser.add_argument("--dishes", type=int, default=200, help="How many dish names to tag.")
+    tagging_parser.add_argument(
+        "--batch-sizes",
+        type=int,
+        nargs="+",
+        default=[1, 10, 25],
+        help="Tagging batch sizes to compare (1 = the single-dish path).",
+    )
+    tagging_parser.add_argument("--base-ms", type=float, default=400.0, help="Fixed per-call latency.")
+    tagging_parser.add_argument(
+        "--prefill-us-per-char",
+        type=float,
+        default=20.0,
+        help="Simulated prompt processing time per input character.",
+    )
+    tagging_parser.add_argument(
+        "--output-ms-per-char",
+        type=float,
+        default=1.25,
+        help="Simulated generation time per output character.",
+    )
+    tagging_parser.add_argument("--drop-rate", type=float, default=0.03, help="Share of batch items to drop.")
+    tagging_parser.add_argument(
+        "--time-scale",
+        type=float,
+        default=0.01,
+        help="Multiply simulated latency by this before sleeping, to keep the run short.",
+    )
+    tagging_parser.add_argument("--seed", type=int, default=42, help="Seed for dropped items.")
+
+    gemini_parser = subparsers.add_parser(
+        "gemini",
+        help="Backend overhead on Gemini-backed pipelines against the local fake Gemini server.",
+    )
+    gemini_parser.add_argument(
+        "--pipelines",
+        nargs="+",
+        choices=("menu", "tagging", "image"),
+        default=["menu", "tagging", "image"],
+        help="Pipelines to drive.",
+    )
+    gemini_parser.add_argument("--requests", type=int, default=200, help="Calls per pipeline.")
+    gemini_parser.add_argument("--concurrency", type=int, default=16, help="Calls in flight at once.")
+    gemini_parser.add_argument("--latency-ms", type=float, default=200.0, help="Fixed fake upstream latency.")
+    gemini_parser.add_argument("--rate-429", type=float, default=0.0, help="Share of upstream calls answered with 429.")
+    gemini_parser.add_argument("--rate-5xx", type=float, default=0.0, help="Share of upstream calls answered with 5xx.")
+    gemini_parser.add_argument("--seed", type=int, default=42, help="Seed for fault injection.")
+
+    return parser
+
+
+def main() -> int:
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.command == "sampling":
+        return run_sampling_benchmark(args)
+    if args.command == "cache":
+        return run_cache_benchmark(args)
+    if args.command == "ranking":
+        return run_ranking_benchmark(args)
+    if args.command == "seen-set":
+        return run_seen_set_benchmark(args)
+    if args.command == "compression":
+        return run_compression_benchmark(args)
+    if args.command == "images":
+        return run_image_storage_benchmark(args)
+    if args.command == "tagging":
+        return run_tagging_benchmark(args)
+    if args.command == "gemini":
+        return run_gemini_benchmark(args)
+    print(f"Unknown command: {args.command}", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,6 +4,7 @@ import argparse
 import asyncio
 from dataclasses import dataclass
 import sys
+import time
 from pathlib import Path
 
 from sqlalchemy import delete, func, select
@@ -12,24 +13,58 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+from app.blob_store import BlobNotFoundError
+from app.catalog_cache import bump_catalog_version
 from app.db import SessionLocal, init_db
 from app.main import (
+    BLOB_STORE,
+    GEMINI_API_KEY,
+    GEMINI_BATCH_BACKEND,
+    GEMINI_BATCH_LOCAL_DIR,
+    GEMINI_CONTEXT_CACHE,
+    GEMINI_HTTP_CLIENT,
+    GEMINI_USAGE,
     DeckRequest,
     DeckDish,
     FeatureScore,
     GEMINI_IMAGE_MODEL,
+    GEMINI_MODEL,
+    IMAGE_PIPELINE,
+    _add_image_renditions,
+    _build_dish_image_payload,
+    _build_dish_tagging_payload,
+    _call_gemini_api,
     _create_generation_job,
     _finish_generation_job,
     _generate_and_store_dishes,
     _generate_dish_image_with_gemini,
+    _generate_dish_tags_batch_with_gemini,
     _generate_dish_tags_with_gemini,
+    _image_from_gemini_response,
+    _render_image_renditions,
+    _store_image_blob,
+    _tags_from_gemini_response,
 )
-from app.models import ClientErrorEvent, Dish, DishImage, GenerationJob
+from app.gemini_batch import (
+    BATCH_SUCCEEDED,
+    BatchBackend,
+    BatchJobFile,
+    BatchRequest,
+    BatchResult,
+    BatchStatus,
+    build_batch_backend,
+    read_batch_job_file,
+    write_batch_job_file,
+)
+from app.gemini_usage import gemini_caller
+from app.image_pipeline import RenderedImage
+from app.models import ClientErrorEvent, Dish, DishImage, DishImageRendition, GenerationJob, UserSeenDishes
 from app.tagging import TAGGING_VERSION, CandidateTag, DishTags, build_subtitle, legacy_category_tags_from_tags
 
 MANUAL_METADATA_RETRY_ATTEMPTS = 6
 MANUAL_IMAGE_RETRY_ATTEMPTS = 8
-MANUAL_IMAGE_DELAY_SECONDS = 2.0
+MANUAL_IMAGE_RETRY_BASE_SECONDS = 2.0
+MANUAL_TAGGING_BATCH_ROUNDS = 3
 
 
 @dataclass(frozen=True)
@@ -117,9 +152,14 @@ def clear_app_data() -> dict[str, int]:
         }
 
         session.execute(delete(Dish))
+        session.execute(delete(DishImageRendition))
         session.execute(delete(DishImage))
         session.execute(delete(GenerationJob))
         session.execute(delete(ClientErrorEvent))
+        # Seen-sets point at the deleted dishes; each is rebuilt from swipe
+        # history on the user's next deck.
+        session.execute(delete(UserSeenDishes))
+        bump_catalog_version(session)
         session.commit()
         return counts
 
@@ -145,10 +185,17 @@ def _is_retryable_gemini_error(exc: Exception) -> bool:
         "http 504",
         "request error",
         "timed out",
+        "circuit open",
+        "budget",
     )
     return any(marker in message for marker in retryable_markers)
 
 
+def _retry_wait_seconds(exc: Exception, wait_seconds: float) -> float:
+    # An open circuit knows when it will let calls through again.
+    return max(wait_seconds, float(getattr(exc, "retry_after", 0.0)))
+
+
 async def _tag_entry_with_gemini(entry: ApprovedDishEntry) -> TaggedDishRecord:
     last_error: Exception | None = None
     for attempt in range(1, MANUAL_METADATA_RETRY_ATTEMPTS + 1):
@@ -169,7 +216,7 @@ async def _tag_entry_with_gemini(entry: ApprovedDishEntry) -> TaggedDishRecord:
             last_error = exc
             if attempt >= MANUAL_METADATA_RETRY_ATTEMPTS or not _is_retryable_gemini_error(exc):
                 break
-            wait_seconds = min(18.0, 1.5 * attempt)
+            wait_seconds = _retry_wait_seconds(exc, min(18.0, 1.5 * attempt))
             print(
                 f"Tagging retry for {entry.name}: attempt={attempt}/{MANUAL_METADATA_RETRY_ATTEMPTS}"
                 f" wait={wait_seconds:.1f}s reason={exc}",
@@ -182,8 +229,64 @@ async def _tag_entry_with_gemini(entry: ApprovedDishEntry) -> TaggedDishRecord:
     raise RuntimeError(f"failed to tag dish: {entry.name}")
 
 
-async def _generate_tagged_records(entries: list[ApprovedDishEntry]) -> list[TaggedDishRecord]:
+async def _tag_batch_with_gemini(entries: list[ApprovedDishEntry]) -> list[TaggedDishRecord]:
+    # Each round re-sends only the dishes whose item failed validation or was
+    # missing; whatever is still untagged after the last round falls back to
+    # the single-dish path.
+    records: dict[int, TaggedDishRecord] = {}
+    pending = list(range(len(entries)))
+    for round_number in range(1, MANUAL_TAGGING_BATCH_ROUNDS + 1):
+        batch = [entries[index] for index in pending]
+        try:
+            tagged, failures = await _generate_dish_tags_batch_with_gemini(
+                [(entry.name, entry.cuisine or "") for entry in batch],
+                cache=False if round_number > 1 else None,
+            )
+        except Exception as exc:
+            if not _is_retryable_gemini_error(exc) and not isinstance(exc, ValueError):
+                raise
+            wait_seconds = _retry_wait_seconds(exc, min(18.0, 1.5 * round_number))
+            print(
+                f"Batch tagging retry: round={round_number}/{MANUAL_TAGGING_BATCH_ROUNDS}"
+                f" dishes={len(batch)} wait={wait_seconds:.1f}s reason={exc}",
+                flush=True,
+            )
+            await asyncio.sleep(wait_seconds)
+            continue
+
+        for position, (subtitle, tags, candidate_tags, trace, raw_output) in tagged.items():
+            entry = batch[position]
+            records[pending[position]] = TaggedDishRecord(
+                name=entry.name,
+                subtitle=subtitle,
+                tags=tags,
+                candidate_tags=candidate_tags,
+                raw_tagging_output=raw_output,
+                tagging_trace=trace,
+            )
+        for position, reason in failures.items():
+            print(f"Batch tagging item rejected: {batch[position].name} ({reason})", flush=True)
+        pending = [pending[position] for position in sorted(failures)]
+        if not pending:
+            break
+
+    for index in pending:
+        records[index] = await _tag_entry_with_gemini(entries[index])
+    return [records[index] for index in range(len(entries))]
+
+
+async def _generate_tagged_records(
+    entries: list[ApprovedDishEntry],
+    *,
+    batch_size: int = 1,
+) -> list[TaggedDishRecord]:
     records: list[TaggedDishRecord] = []
+    if batch_size > 1:
+        for start in range(0, len(entries), batch_size):
+            records.extend(await _tag_batch_with_gemini(entries[start : start + batch_size]))
+            print(f"Tagged {len(records)}/{len(entries)} (batch of {batch_size})", flush=True)
+        return records
+
     for entry in entries:
         record = await _tag_entry_with_gemini(entry)
         records.append(record)
@@ -406,7 +509,7 @@ async def _generate_metadata_for_names(entries: list[ApprovedDishEntry], locale:
             except Exception as exc:
                 if attempt >= MANUAL_METADATA_RETRY_ATTEMPTS or not _is_retryable_gemini_error(exc):
                     break
-                wait_seconds = min(18.0, 1.5 * attempt)
+                wait_seconds = _retry_wait_seconds(exc, min(18.0, 1.5 * attempt))
                 print(
                     f"Metadata retry for {entry.name}: attempt={attempt}/{MANUAL_METADATA_RETRY_ATTEMPTS}"
                     f" wait={wait_seconds:.1f}s reason={exc}",
@@ -426,7 +529,6 @@ async def _generate_image_for_seed(
     dish: TaggedDishRecord,
     *,
     cuisine: str | None,
-    image_delay_seconds: float,
     image_max_retries: int,
 ) -> tuple[str, str, str] | tuple[str, str, None]:
     for attempt in range(1, max(1, image_max_retries) + 1):
@@ -435,7 +537,7 @@ async def _generate_image_for_seed(
         except Exception as exc:
             if attempt >= image_max_retries or not _is_retryable_gemini_error(exc):
                 raise
-            wait_seconds = min(45.0, max(1.0, image_delay_seconds) * (2 ** (attempt - 1)))
+            wait_seconds = _retry_wait_seconds(exc, min(45.0, MANUAL_IMAGE_RETRY_BASE_SECONDS * (2 ** (attempt - 1))))
             print(
                 f"Image retry for {dish.name}: attempt={attempt}/{image_max_retries}"
                 f" wait={wait_seconds:.1f}s reason={exc}",
@@ -445,6 +547,22 @@ async def _generate_image_for_seed(
     return "", "image/png", None
 
 
+def _dish_payload(dish: TaggedDishRecord, *, image_id: str | None, source: str) -> dict:
+    return {
+        "subtitle": dish.subtitle,
+        "signals": {},
+        "category_tags": legacy_category_tags_from_tags(dish.tags),
+        "tags_json": dish.tags.by_dimension(),
+        "raw_tagging_output": dish.raw_tagging_output,
+        "candidate_tags_json": [item.model_dump() for item in dish.candidate_tags],
+        "tagging_trace_json": dish.tagging_trace,
+        "tagging_version": TAGGING_VERSION,
+        "status": "ready",
+        "source": source,
+        "image_id": image_id,
+    }
+
+
 async def _store_manual_dishes(
     dishes: list[TaggedDishRecord],
     entries_by_name: dict[str, ApprovedDishEntry] | None = None,
@@ -452,11 +570,13 @@ async def _store_manual_dishes(
     job_id: str | None,
     source: str,
     with_images: bool,
-    image_delay_seconds: float,
     image_max_retries: int,
     refresh_images: bool,
 ) -> int:
     created_count = 0
+    # Transcoding runs in the image pipeline's process pool while the loop
+    # moves on to the next dish; renditions are stored once they finish.
+    pending_renditions: list[tuple[str, asyncio.Task[list[RenderedImage]]]] = []
 
     with SessionLocal() as session:
         for index, dish in enumerate(dishes, start=1):
@@ -479,38 +599,30 @@ async def _store_manual_dishes(
                 image_prompt, image_mime, image_data_url = await _generate_image_for_seed(
                     dish,
                     cuisine=primary_cuisine,
-                    image_delay_seconds=image_delay_seconds,
                     image_max_retries=image_max_retries,
                 )
 
             image_id = None
             if image_data_url:
+                image_mime, image_body, image_ref = _store_image_blob(image_data_url, fallback_mime=image_mime)
                 image = DishImage(
                     provider="gemini",
                     model=GEMINI_IMAGE_MODEL,
                     prompt=image_prompt,
                     mime_type=image_mime,
-                    data_url=image_data_url,
+                    blob_sha256=image_ref.sha256,
+                    size_bytes=image_ref.size,
                 )
                 session.add(image)
                 session.flush()
                 image_id = image.id
+                pending_renditions.append(
+                    (image_id, asyncio.create_task(_render_image_renditions(image_body, label=dish.name)))
+                )
             elif existing_dish is not None:
                 image_id = existing_dish.image_id
 
-            payload = {
-                "subtitle": dish.subtitle,
-                "signals": {},
-                "category_tags": legacy_category_tags_from_tags(dish.tags),
-                "tags_json": dish.tags.by_dimension(),
-                "raw_tagging_output": dish.raw_tagging_output,
-                "candidate_tags_json": [item.model_dump() for item in dish.candidate_tags],
-                "tagging_trace_json": dish.tagging_trace,
-                "tagging_version": TAGGING_VERSION,
-                "status": "ready",
-                "source": source,
-                "image_id": image_id,
-            }
+            payload = _dish_payload(dish, image_id=image_id, source=source)
 
             if existing_dish is None:
                 session.add(
@@ -526,6 +638,7 @@ async def _store_manual_dishes(
                 action_label = "Updated"
 
             created_count += 1
+            bump_catalog_version(session)
             session.commit()
             if job_id:
                 _update_generation_job_progress(job_id=job_id, produced_count=created_count)
@@ -535,12 +648,64 @@ async def _store_manual_dishes(
                 flush=True,
             )
 
-            if with_images and image_delay_seconds > 0 and index < len(dishes):
-                await asyncio.sleep(image_delay_seconds)
+        stored_renditions = 0
+        for image_id, task in pending_renditions:
+            renditions = await task
+            _add_image_renditions(session, image_id, renditions)
+            stored_renditions += len(renditions)
+        if pending_renditions:
+            session.commit()
+            print(f"Stored {stored_renditions} renditions for {len(pending_renditions)} images.", flush=True)
 
     return created_count
 
 
+def _read_image_blob(image_id: str, digest: str) -> bytes | None:
+    try:
+        return BLOB_STORE.read(digest)
+    except BlobNotFoundError:
+        print(f"Image {image_id} is missing blob {digest}; skipping.", flush=True)
+        return None
+
+
+async def backfill_renditions(args: argparse.Namespace) -> int:
+    with SessionLocal() as session:
+        stmt = (
+            select(DishImage.id, DishImage.blob_sha256)
+            .outerjoin(DishImageRendition, DishImageRendition.image_id == DishImage.id)
+            .where(DishImageRendition.id.is_(None))
+            .order_by(DishImage.created_at)
+        )
+        if args.limit:
+            stmt = stmt.limit(args.limit)
+        missing = session.execute(stmt).all()
+
+    if not missing:
+        print("Every stored image already has renditions.")
+        return 0
+
+    batch_size = max(1, args.batch_size)
+    stored_images = 0
+    for offset in range(0, len(missing), batch_size):
+        batch = missing[offset : offset + batch_size]
+        rendered = await asyncio.gather(
+            *(
+                _render_image_renditions(_read_image_blob(image_id, digest), label=image_id)
+                for image_id, digest in batch
+            )
+        )
+        with SessionLocal() as session:
+            for (image_id, _), renditions in zip(batch, rendered):
+                if renditions:
+                    _add_image_renditions(session, image_id, renditions)
+                    stored_images += 1
+            session.commit()
+        print(f"Rendered {min(offset + batch_size, len(missing))}/{len(missing)} images", flush=True)
+
+    print(f"Rendition backfill complete: images={stored_images}, skipped={len(missing) - stored_images}")
+    return 0
+
+
 async def generate_cache(args: argparse.Namespace) -> int:
     if args.clear_first:
         cleared = clear_app_data()
@@ -616,14 +781,13 @@ async def seed_approved_names(args: argparse.Namespace) -> int:
 
     try:
         entries_by_name = {entry.name: entry for entry in approved_entries}
-        tagged_records = await _generate_tagged_records(approved_entries)
+        tagged_records = await _generate_tagged_records(approved_entries, batch_size=args.tagging_batch_size)
         produced_total = await _store_manual_dishes(
             tagged_records,
             entries_by_name=entries_by_name,
             job_id=job_id,
             source="manual_seed",
             with_images=not args.skip_images,
-            image_delay_seconds=args.image_delay_seconds,
             image_max_retries=args.image_max_retries,
             refresh_images=args.refresh_images,
         )
@@ -642,6 +806,294 @@ async def seed_approved_names(args: argparse.Namespace) -> int:
         return 1
 
 
+def _record_generation_job_details(*, job_id: str, details: dict) -> None:
+    with SessionLocal() as session:
+        job = session.get(GenerationJob, job_id)
+        if not job:
+            return
+        job.details_json = {**(job.details_json or {}), **details}
+        session.commit()
+
+
+def _batch_backend(kind: str, *, local_dir: str) -> BatchBackend:
+    # The local stand-in answers each line through the regular client so a
+    # batch can be rehearsed end to end against any GEMINI_API_BASE.
+    async def respond(model: str, request: dict) -> dict:
+        return await _call_gemini_api(request, model=model, cache=False)
+
+    return build_batch_backend(
+        kind,
+        local_dir=local_dir,
+        client=GEMINI_HTTP_CLIENT,
+        api_key=GEMINI_API_KEY,
+        responder=respond,
+    )
+
+
+def _batch_image_prompt(request: dict) -> str:
+    try:
+        return str(request["contents"][0]["parts"][0]["text"])
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+async def batch_submit(args: argparse.Namespace) -> int:
+    entries = _load_name_list(args.input)
+    if not entries:
+        print("No approved dish names were found in the input file.", file=sys.stderr)
+        return 2
+
+    requests: list[BatchRequest] = []
+    for index, entry in enumerate(entries):
+        requests.append(
+            BatchRequest(
+                key=f"tag:{index}",
+                model=GEMINI_MODEL,
+                request=_build_dish_tagging_payload(entry.name, cuisine_hint=entry.cuisine or ""),
+            )
+        )
+        if not args.skip_images:
+            _, payload = _build_dish_image_payload(entry.name, cuisine=entry.cuisine)
+            requests.append(BatchRequest(key=f"image:{index}", model=GEMINI_IMAGE_MODEL, request=payload))
+
+    job_id = _create_generation_job(
+        kind="batch_seed",
+        target_count=len(entries),
+        details={"backend": args.backend, "job_file": str(args.job_file), "requests": len(requests)},
+    )
+    job = BatchJobFile(
+        generation_job_id=job_id,
+        backend=args.backend,
+        entries=[{"cuisine": entry.cuisine or "", "name": entry.name} for entry in entries],
+        requests=requests,
+    )
+    backend = _batch_backend(args.backend, local_dir=args.local_dir)
+    try:
+        for model, items in job.requests_by_model().items():
+            job.batches[model] = await backend.submit(
+                model=model,
+                requests=items,
+                display_name=f"readytoorder-{job_id}-{model}",
+            )
+            print(f"Submitted {len(items)} requests for {model}: {job.batches[model]}", flush=True)
+    except Exception as exc:
+        _finish_generation_job(job_id=job_id, produced_count=0, error=str(exc), details={"batches": job.batches})
+        print(f"Batch submit failed: {exc}", file=sys.stderr)
+        return 1
+
+    write_batch_job_file(args.job_file, job)
+    _record_generation_job_details(job_id=job_id, details={"batches": job.batches})
+    print(f"Batch job {job_id} submitted: dishes={len(entries)}, requests={len(requests)}, job_file={args.job_file}")
+    return 0
+
+
+async def _wait_for_batches(
+    backend: BatchBackend,
+    batches: dict[str, str],
+    *,
+    poll_seconds: float,
+    timeout_seconds: float,
+    wait: bool,
+) -> dict[str, BatchStatus] | None:
+    deadline = time.monotonic() + timeout_seconds
+    statuses: dict[str, BatchStatus] = {}
+    while True:
+        for model, name in batches.items():
+            if model not in statuses or not statuses[model].done:
+                statuses[model] = await backend.status(name)
+        pending = [f"{model}={status.state}" for model, status in statuses.items() if not status.done]
+        if not pending:
+            return statuses
+        if not wait or time.monotonic() >= deadline:
+            print(f"Batches still running: {', '.join(pending)}", flush=True)
+            return None
+        print(f"Waiting for batches: {', '.join(pending)}", flush=True)
+        await asyncio.sleep(max(1.0, poll_seconds))
+
+
+def _batch_response(key: str, results: dict[str, BatchResult], failures: dict[str, str]) -> dict | None:
+    if key in failures:
+        return None
+    result = results.get(key)
+    if result is None:
+        failures[key] = "missing from batch output"
+        return None
+    if result.error or result.response is None:
+        failures[key] = result.error or "empty response"
+        return None
+    return result.response
+
+
+def _parse_batch_results(
+    job: BatchJobFile,
+    results: dict[str, BatchResult],
+    failures: dict[str, str],
+) -> tuple[list[TaggedDishRecord], dict[str, tuple[str, str, str]]]:
+    records: list[TaggedDishRecord] = []
+    images: dict[str, tuple[str, str, str]] = {}
+    prompts = {item.key: _batch_image_prompt(item.request) for item in job.requests if item.key.startswith("image:")}
+    for index, raw_entry in enumerate(job.entries):
+        entry = ApprovedDishEntry(cuisine=raw_entry.get("cuisine") or None, name=raw_entry["name"])
+        tag_response = _batch_response(f"tag:{index}", results, failures)
+        if tag_response is not None:
+            try:
+                subtitle, tags, candidate_tags, trace, raw_output = _tags_from_gemini_response(
+                    entry.name,
+                    tag_response,
+                    cuisine_hint=entry.cuisine or "",
+                )
+            except Exception as exc:
+                failures[f"tag:{index}"] = f"invalid tagging output: {exc}"
+            else:
+                records.append(
+                    TaggedDishRecord(
+                        name=entry.name,
+                        subtitle=subtitle
+                        or build_subtitle(dish_name=entry.name, tags=tags, cuisine_hint=entry.cuisine or ""),
+                        tags=tags,
+                        candidate_tags=candidate_tags,
+                        raw_tagging_output=raw_output,
+                        tagging_trace=trace,
+                    )
+                )
+
+        image_key = f"image:{index}"
+        if image_key not in prompts:
+            continue
+        image_response = _batch_response(image_key, results, failures)
+        if image_response is not None:
+            try:
+                mime_type, data_url = _image_from_gemini_response(image_response)
+            except Exception as exc:
+                failures[image_key] = f"invalid image output: {exc}"
+            else:
+                images[entry.name] = (prompts[image_key], mime_type, data_url)
+    return records, images
+
+
+async def _ingest_batch_records(
+    records: list[TaggedDishRecord],
+    images: dict[str, tuple[str, str, str]],
+    *,
+    source: str,
+) -> tuple[int, int]:
+    # One transaction and one catalog version bump for the whole job, instead
+    # of a commit per dish as in seed-names.
+    pending_renditions: list[tuple[str, asyncio.Task[list[RenderedImage]]]] = []
+    with SessionLocal() as session:
+        names = [record.name for record in records]
+        existing = {dish.name: dish for dish in session.scalars(select(Dish).where(Dish.name.in_(names)))}
+        for record in records:
+            dish = existing.get(record.name)
+            image_id = dish.image_id if dish is not None else None
+            if record.name in images:
+                image_prompt, image_mime, image_data_url = images[record.name]
+                image_mime, image_body, image_ref = _store_image_blob(image_data_url, fallback_mime=image_mime)
+                image = DishImage(
+                    provider="gemini",
+                    model=GEMINI_IMAGE_MODEL,
+                    prompt=image_prompt,
+                    mime_type=image_mime,
+                    blob_sha256=image_ref.sha256,
+                    size_bytes=image_ref.size,
+                )
+                session.add(image)
+                session.flush()
+                image_id = image.id
+                pending_renditions.append(
+                    (image_id, asyncio.create_task(_render_image_renditions(image_body, label=record.name)))
+                )
+
+            payload = _dish_payload(record, image_id=image_id, source=source)
+            if dish is None:
+                session.add(Dish(name=record.name, **payload))
+            else:
+                for key, value in payload.items():
+                    setattr(dish, key, value)
+
+        if records:
+            bump_catalog_version(session)
+        session.commit()
+
+        for image_id, task in pending_renditions:
+            _add_image_renditions(session, image_id, await task)
+        if pending_renditions:
+            session.commit()
+    return len(records), len(pending_renditions)
+
+
+async def batch_collect(args: argparse.Namespace) -> int:
+    job = read_batch_job_file(args.job_file)
+    with SessionLocal() as session:
+        generation_job = session.get(GenerationJob, job.generation_job_id)
+        job_status = generation_job.status if generation_job else ""
+    if job_status != "running":
+        print(
+            f"Generation job {job.generation_job_id} is not awaiting collection (status={job_status or 'missing'}).",
+            file=sys.stderr,
+        )
+        return 2
+
+    backend = _batch_backend(job.backend, local_dir=args.local_dir)
+    statuses = await _wait_for_batches(
+        backend,
+        job.batches,
+        poll_seconds=args.poll_seconds,
+        timeout_seconds=args.timeout_seconds,
+        wait=not args.no_wait,
+    )
+    if statuses is None:
+        return 3
+
+    results: dict[str, BatchResult] = {}
+    failures: dict[str, str] = {}
+    requests_by_model = job.requests_by_model()
+    for model, status in statuses.items():
+        if status.state != BATCH_SUCCEEDED:
+            for item in requests_by_model.get(model, []):
+                failures[item.key] = f"batch {status.state}: {status.error}".rstrip(": ")
+            continue
+        for result in await backend.results(status.name):
+            results[result.key] = result
+
+    produced = stored_images = 0
+    try:
+        records, images = _parse_batch_results(job, results, failures)
+        produced, stored_images = await _ingest_batch_records(records, images, source=job.source)
+    except Exception as exc:
+        _finish_generation_job(
+            job_id=job.generation_job_id,
+            produced_count=produced,
+            error=str(exc),
+            details={"states": {model: status.state for model, status in statuses.items()}, "failures": failures},
+        )
+        print(f"Batch collect failed: {exc}", file=sys.stderr)
+        return 1
+
+    for key, reason in sorted(failures.items()):
+        print(f"Batch item failed: {key} ({reason})", flush=True)
+    error = "" if produced or not job.entries else "every batch item failed"
+    _finish_generation_job(
+        job_id=job.generation_job_id,
+        produced_count=produced,
+        error=error,
+        details={
+            "states": {model: status.state for model, status in statuses.items()},
+            "failures": failures,
+            "images": stored_images,
+        },
+    )
+    print(
+        "Batch collect complete:"
+        f" requested={len(job.entries)},"
+        f" stored={produced},"
+        f" images={stored_images},"
+        f" failed_items={len(failures)},"
+        f" ready_dishes={_count_rows(Dish)}"
+    )
+    return 0 if not error else 1
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Manual dish/image cache admin for readytoorder."
@@ -738,10 +1190,10 @@ def build_parser() -> argparse.ArgumentParser:
         help="How to fill subtitle and tags for approved names. Default uses Gemini tagging with canonical normalization.",
     )
     seed_names_parser.add_argument(
-        "--image-delay-seconds",
-        type=float,
-        default=MANUAL_IMAGE_DELAY_SECONDS,
-        help="Delay between successful image generations to reduce Gemini rate limiting.",
+        "--tagging-batch-size",
+        type=int,
+        default=1,
+        help="Tag this many dishes per Gemini call (1 = one call per dish). Failed items are retried on their own.",
     )
     seed_names_parser.add_argument(
         "--image-max-retries",
@@ -755,12 +1207,103 @@ def build_parser() -> argparse.ArgumentParser:
         help="Regenerate images even when a dish already has an image.",
     )
 
+    renditions_parser = subparsers.add_parser(
+        "renditions",
+        help="Generate card/thumbnail renditions for stored images that do not have them yet.",
+    )
+    renditions_parser.add_argument(
+        "--limit",
+        type=int,
+        default=0,
+        help="Only process this many images (0 = all).",
+    )
+    renditions_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=16,
+        help="Images transcoded concurrently and committed together.",
+    )
+
+    batch_submit_parser = subparsers.add_parser(
+        "batch-submit",
+        help="Submit tagging and image requests for an approved dish-name list as offline Gemini batch jobs.",
+    )
+    batch_submit_parser.add_argument(
+        "--input",
+        required=True,
+        help="UTF-8 text file with one approved dish per line. Format: cuisine|name or plain name.",
+    )
+    batch_submit_parser.add_argument(
+        "--job-file",
+        required=True,
+        help="Where to write the job file that batch-collect reads.",
+    )
+    batch_submit_parser.add_argument(
+        "--skip-images",
+        action="store_true",
+        help="Only submit tagging requests.",
+    )
+    batch_submit_parser.add_argument(
+        "--backend",
+        choices=("gemini", "local"),
+        default=GEMINI_BATCH_BACKEND,
+        help="Batch backend: Gemini batch mode, or a local file-based stand-in.",
+    )
+    batch_submit_parser.add_argument(
+        "--local-dir",
+        default=GEMINI_BATCH_LOCAL_DIR,
+        help="Directory used by the local batch backend.",
+    )
+
+    batch_collect_parser = subparsers.add_parser(
+        "batch-collect",
+        help="Poll a submitted batch job and ingest its results into the database.",
+    )
+    batch_collect_parser.add_argument(
+        "--job-file",
+        required=True,
+        help="Job file written by batch-submit.",
+    )
+    batch_collect_parser.add_argument(
+        "--local-dir",
+        default=GEMINI_BATCH_LOCAL_DIR,
+        help="Directory used by the local batch backend.",
+    )
+    batch_collect_parser.add_argument(
+        "--poll-seconds",
+        type=float,
+        default=30.0,
+        help="Seconds between status polls.",
+    )
+    batch_collect_parser.add_argument(
+        "--timeout-seconds",
+        type=float,
+        default=86400.0,
+        help="Give up waiting after this long; the job stays open for a later batch-collect.",
+    )
+    batch_collect_parser.add_argument(
+        "--no-wait",
+        action="store_true",
+        help="Check once and exit with status 3 if the batches are still running.",
+    )
+
     return parser
 
 
 async def async_main(args: argparse.Namespace) -> int:
     init_db()
+    GEMINI_HTTP_CLIENT.open()
+    GEMINI_USAGE.start()
+    try:
+        with gemini_caller(f"admin:{args.command}"):
+            return await _run_command(args)
+    finally:
+        await GEMINI_USAGE.stop()
+        await GEMINI_CONTEXT_CACHE.aclose()
+        await GEMINI_HTTP_CLIENT.aclose()
 
+
+async def _run_command(args: argparse.Namespace) -> int:
     if args.command == "clear":
         if not args.yes_i_understand:
             print("Refusing to clear data without --yes-i-understand.", file=sys.stderr)
@@ -785,6 +1328,15 @@ async def async_main(args: argparse.Namespace) -> int:
     if args.command == "seed-names":
         return await seed_approved_names(args)
 
+    if args.command == "renditions":
+        return await backfill_renditions(args)
+
+    if args.command == "batch-submit":
+        return await batch_submit(args)
+
+    if args.command == "batch-collect":
+        return await batch_collect(args)
+
     print(f"Unknown command: {args.command}", file=sys.stderr)
     return 2
 
@@ -792,7 +1344,10 @@ async def async_main(args: argparse.Namespace) -> int:
 def main() -> int:
     parser = build_parser()
     args = parser.parse_args()
-    return asyncio.run(async_main(args))
+    try:
+        return asyncio.run(async_main(args))
+    finally:
+        IMAGE_PIPELINE.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,580 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import zlib
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.gemini_cache import gemini_cache_key
+
+MODES = ("synth", "replay", "record")
+DEFAULT_UPSTREAM = "https://generativelanguage.googleapis.com"
+STAT_NAMES = (
+    "replay_hits",
+    "replay_misses",
+    "recorded",
+    "synthesized",
+    "injected_429",
+    "injected_5xx",
+    "cached_contents_created",
+    "cached_content_hits",
+)
+
+
+@dataclass(frozen=True)
+class LatencyModel:
+    # "0.4" or "fixed:0.4", "uniform:LOW,HIGH", "normal:MEAN,SD",
+    # "lognormal:MEDIAN,SIGMA" (seconds), or "recorded" to replay the latency
+    # stored in each cassette.
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        kind, sep, values = spec.strip().partition(":")
+        if not sep:
+            if kind == "recorded":
+                return cls(kind="recorded")
+            return cls(kind="fixed", a=float(kind))
+        numbers = [float(item) for item in values.split(",") if item.strip()]
+        if kind == "fixed" and len(numbers) == 1:
+            return cls(kind=kind, a=numbers[0])
+        if kind in {"uniform", "normal", "lognormal"} and len(numbers) == 2:
+            return cls(kind=kind, a=numbers[0], b=numbers[1])
+        raise ValueError(f"invalid latency spec: {spec!r}")
+
+    def sample(self, rng: random.Random, *, recorded: float | None = None) -> float:
+        if self.kind == "recorded":
+            return recorded or 0.0
+        if self.kind == "uniform":
+            value = rng.uniform(self.a, self.b)
+        elif self.kind == "normal":
+            value = rng.gauss(self.a, self.b)
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(math.log(max(self.a, 1e-6)), self.b)
+        else:
+            value = self.a
+        return max(0.0, value)
+
+
+@dataclass
+class FakeGeminiConfig:
+    mode: str = "synth"
+    cassette_dir: Path | None = None
+    strict: bool = False
+    upstream: str = DEFAULT_UPSTREAM
+    upstream_api_key: str = ""
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    image_latency: LatencyModel = field(default_factory=LatencyModel)
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    retry_after_seconds: float = 1.0
+    image_width: int = 832
+    image_height: int = 1248
+    stream_chunk_chars: int = 48
+    first_chunk_share: float = 0.3
+    cache_min_tokens: int = 0
+    seed: int | None = None
+
+
+class CassetteStore:
+    # One JSON file per request, named by the same model+payload hash the
+    # response cache uses, so a cassette recorded once replays for any
+    # identical call regardless of key order.
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        try:
+            return json.loads(self._path(key).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, entry: dict) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                json.dump(entry, handle, ensure_ascii=False)
+            os.replace(tmp_name, self._path(key))
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def __len__(self) -> int:
+        return len(list(self.root.glob("*.json"))) if self.root.exists() else 0
+
+
+def canned_png(width: int, height: int) -> bytes:
+    # Noise over gradients compresses about as badly as a real food photo, so
+    # an 832x1248 image lands near the ~1.8 MB Gemini returns at that size.
+    noise = Image.effect_noise((width, height), 24)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", (Image.blend(gradient, noise, 0.5), noise, gradient.rotate(180)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def stamp_png(png: bytes, token: str) -> bytes:
+    # Insert a tEXt chunk after IHDR: the pixels stay the same but every
+    # response hashes differently, so the content-addressed blob store cannot
+    # dedupe the benchmark away.
+    data = b"fake-gemini\0" + token.encode("ascii")
+    chunk = len(data).to_bytes(4, "big") + b"tEXt" + data + zlib.crc32(b"tEXt" + data).to_bytes(4, "big")
+    header_end = 8 + 25
+    return png[:header_end] + chunk + png[header_end:]
+
+
+def _payload_text(payload: dict) -> str:
+    texts: list[str] = []
+    instruction = payload.get("systemInstruction")
+    contents = [instruction] if isinstance(instruction, dict) else []
+    for content in contents + list(payload.get("contents") or []):
+        for part in content.get("parts") or []:
+            if isinstance(part, dict) and "text" in part:
+                texts.append(str(part["text"]))
+    return "\n".join(texts)
+
+
+def _project(value: Any, schema: dict) -> Any:
+    # Keeps only what a responseSchema asks for, in its propertyOrdering, the
+    # way a schema-constrained Gemini answer would look.
+    if isinstance(value, dict) and isinstance(schema.get("properties"), dict):
+        properties = schema["properties"]
+        order = schema.get("propertyOrdering") or list(properties)
+        return {key: _project(value[key], properties[key]) for key in order if key in value}
+    if isinstance(value, list) and isinstance(schema.get("items"), dict):
+        return [_project(item, schema["items"]) for item in value]
+    return value
+
+
+def _wants_image(payload: dict) -> bool:
+    modalities = (payload.get("generationConfig") or {}).get("responseModalities") or []
+    return "IMAGE" in modalities
+
+
+def _usage(prompt: str, output: str) -> dict:
+    prompt_tokens = max(1, len(prompt) // 4)
+    output_tokens = max(1, len(output) // 4)
+    return {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": output_tokens,
+        "totalTokenCount": prompt_tokens + output_tokens,
+    }
+
+
+def _error_body(code: int, status: str, message: str) -> dict:
+    return {"error": {"code": code, "message": message, "status": status}}
+
+
+class FakeGemini:
+    def __init__(self, config: FakeGeminiConfig) -> None:
+        if config.mode not in MODES:
+            raise ValueError(f"unknown mode: {config.mode}")
+        if config.mode != "synth" and config.cassette_dir is None:
+            raise ValueError(f"{config.mode} mode needs a cassette directory")
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.cassettes = CassetteStore(config.cassette_dir) if config.cassette_dir else None
+        self.stats: defaultdict[str, int] = defaultdict(int)
+        self.model_requests: defaultdict[str, int] = defaultdict(int)
+        self._serial = 0
+        self._png: bytes | None = None
+        self._upstream: httpx.AsyncClient | None = None
+        self.cached_contents: dict[str, dict] = {}
+
+    def _next_serial(self) -> int:
+        self._serial += 1
+        return self._serial
+
+    def _image_png(self) -> bytes:
+        if self._png is None:
+            self._png = canned_png(self.config.image_width, self.config.image_height)
+        return self._png
+
+    def synthesize(self, payload: dict) -> dict:
+        prompt = _payload_text(payload)
+        if _wants_image(payload):
+            png = stamp_png(self._image_png(), f"{self._next_serial()}")
+            parts: list[dict] = [
+                {"text": "Here is the dish photo."},
+                {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(png).decode("ascii")}},
+            ]
+            output = parts[0]["text"]
+        else:
+            answer = self._synthetic_object(prompt)
+            schema = (payload.get("generationConfig") or {}).get("responseSchema")
+            if isinstance(schema, dict):
+                answer = _project(answer, schema)
+            output = json.dumps(answer, ensure_ascii=False)
+            parts = [{"text": output}]
+        return {
+            "candidates": [{"content": {"role": "model", "parts": parts}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": _usage(prompt, output),
+            "modelVersion": "fake-gemini",
+        }
+
+    def _synthetic_object(self, prompt: str) -> dict:
+        # One object that satisfies every JSON parser in app.main: each
+        # caller reads only its own fields and ignores the rest.
+        serial = self._next_serial()
+        tags = {
+            "flavor": ["savory", "spicy"],
+            "ingredient": ["chicken"],
+            "cooking_method": ["stir_fried"],
+            "course": ["main"],
+        }
+        styles = ["conservative", "balanced", "balanced", "adventurous", "conservative"]
+        answer: dict[str, Any] = {
+            "reply": "这是本地模拟的 Gemini 回复。",
+            "recommendations": [
+                {
+                    "name": f"模拟推荐{serial}-{index + 1}",
+                    "original_name": "",
+                    "reason": "口味匹配度较高。",
+                    "match_score": 90 - index * 5,
+                    "style": style,
+                }
+                for index, style in enumerate(styles)
+            ],
+            "summary": "偏爱咸鲜和香辣，能接受适度麻辣。",
+            "avoid": "暂时避开过甜的菜。",
+            "strategy": "先点一道招牌热菜，再配清爽小菜。",
+            "subtitle": "本地模拟的家常做法",
+            "tags": tags,
+            "candidate_tags": [],
+        }
+        deck = re.search(r"仅生成 (\d+) 个", prompt)
+        if deck:
+            answer["dishes"] = [
+                {
+                    "name": f"模拟菜{serial}-{index + 1}",
+                    "subtitle": "本地模拟生成的菜品卡片",
+                    "tags": tags,
+                }
+                for index in range(int(deck.group(1)))
+            ]
+        if "Input:\n" in prompt:
+            try:
+                items = json.loads(prompt.rsplit("Input:\n", 1)[1])
+            except ValueError:
+                items = None
+            if isinstance(items, list):
+                answer["results"] = [
+                    {
+                        "key": item.get("key"),
+                        "dish_name": item.get("dish_name"),
+                        "subtitle": f"{item.get('dish_name')}的家常做法",
+                        "tags": tags,
+                        "candidate_tags": [],
+                    }
+                    for item in items
+                    if isinstance(item, dict)
+                ]
+        return answer
+
+    async def _record(self, model: str, payload: dict, api_key: str) -> tuple[int, dict, float]:
+        if self._upstream is None:
+            self._upstream = httpx.AsyncClient(base_url=self.config.upstream, timeout=180.0)
+        started = time.perf_counter()
+        resp = await self._upstream.post(
+            f"/v1beta/models/{model}:generateContent",
+            headers={"Content-Type": "application/json", "x-goog-api-key": api_key or self.config.upstream_api_key},
+            json=payload,
+        )
+        elapsed = time.perf_counter() - started
+        try:
+            body = resp.json()
+        except ValueError:
+            body = _error_body(resp.status_code, "UNKNOWN", resp.text[:1200])
+        return resp.status_code, body, elapsed
+
+    async def answer(self, model: str, payload: dict, *, api_key: str) -> tuple[int, dict, float]:
+        # Returns (status, body, seconds still to wait before answering). A
+        # call forwarded upstream has already taken its real latency.
+        key = gemini_cache_key(model, payload)
+        cassette = self.cassettes.get(key) if self.cassettes is not None else None
+        if cassette is not None:
+            self.stats["replay_hits"] += 1
+            recorded = float(cassette.get("latency_ms", 0.0)) / 1000.0
+            return 200, cassette["response"], self._delay(payload, recorded=recorded)
+        if self.config.mode == "record":
+            status, body, elapsed = await self._record(model, payload, api_key)
+            if status == 200:
+                assert self.cassettes is not None
+                self.cassettes.put(
+                    key,
+                    {"model": model, "request": payload, "response": body, "latency_ms": round(elapsed * 1000.0, 1)},
+                )
+                self.stats["recorded"] += 1
+            return status, body, 0.0
+        if self.config.mode == "replay":
+            self.stats["replay_misses"] += 1
+            if self.config.strict:
+                return 404, _error_body(404, "NOT_FOUND", f"no cassette for {model} payload {key}"), 0.0
+        self.stats["synthesized"] += 1
+        return 200, self.synthesize(payload), self._delay(payload)
+
+    def create_cached_content(self, body: dict) -> tuple[int, dict]:
+        # cachedContents.create: stores the system instruction and contents
+        # under a name derived from them, so restarts hand out the same name.
+        model = str(body.get("model") or "").removeprefix("models/")
+        if not model:
+            return 400, _error_body(400, "INVALID_ARGUMENT", "model is required")
+        stored = {key: body[key] for key in ("systemInstruction", "contents") if key in body}
+        tokens = max(1, len(_payload_text(stored)) // 4)
+        if tokens < self.config.cache_min_tokens:
+            message = (
+                f"Cached content is too small. total_token_count={tokens},"
+                f" min_total_token_count={self.config.cache_min_tokens}"
+            )
+            return 400, _error_body(400, "INVALID_ARGUMENT", message)
+        digest = hashlib.sha256(json.dumps([model, stored], sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        name = f"cachedContents/{digest.hexdigest()[:16]}"
+        ttl = float(str(body.get("ttl") or "3600s").removesuffix("s"))
+        self.cached_contents[name] = {"model": model, "tokens": tokens, **stored}
+        self.stats["cached_contents_created"] += 1
+        expire = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        return 200, {
+            "name": name,
+            "model": f"models/{model}",
+            "displayName": str(body.get("displayName") or ""),
+            "usageMetadata": {"totalTokenCount": tokens},
+            "expireTime": expire.isoformat().replace("+00:00", "Z"),
+        }
+
+    def expand_cached_content(self, model: str, payload: dict) -> tuple[dict | None, int]:
+        # Rebuilds the full request from a cachedContent reference, so
+        # cassettes and synthesized answers see the same payload either way.
+        # Returns (None, 0) for an unknown name or another model's entry.
+        name = payload.get("cachedContent")
+        if not name:
+            return payload, 0
+        entry = self.cached_contents.get(str(name))
+        if entry is None or entry["model"] != model:
+            return None, 0
+        self.stats["cached_content_hits"] += 1
+        expanded = {key: value for key, value in payload.items() if key != "cachedContent"}
+        if "systemInstruction" in entry:
+            expanded["systemInstruction"] = entry["systemInstruction"]
+        expanded["contents"] = list(entry.get("contents") or []) + list(payload.get("contents") or [])
+        return expanded, entry["tokens"]
+
+    def _fault(self) -> int | None:
+        roll = self.rng.random()
+        if roll < self.config.rate_429:
+            self.stats["injected_429"] += 1
+            return 429
+        if roll < self.config.rate_429 + self.config.rate_5xx:
+            self.stats["injected_5xx"] += 1
+            return self.rng.choice((500, 503))
+        return None
+
+    def _delay(self, payload: dict, *, recorded: float | None = None) -> float:
+        model = self.config.image_latency if _wants_image(payload) else self.config.latency
+        return model.sample(self.rng, recorded=recorded)
+
+    async def handle(self, model: str, method: str, payload: dict, *, api_key: str) -> JSONResponse | StreamingResponse:
+        self.model_requests[model] += 1
+        fault = self._fault()
+        if fault == 429:
+            return JSONResponse(
+                _error_body(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (injected)."),
+                status_code=429,
+                headers={"Retry-After": f"{self.config.retry_after_seconds:g}"},
+            )
+        payload, cached_tokens = self.expand_cached_content(model, payload)
+        if payload is None:
+            return JSONResponse(_error_body(404, "NOT_FOUND", "CachedContent not found"), status_code=404)
+        status, body, delay = await self.answer(model, payload, api_key=api_key)
+        if status == 200 and cached_tokens and isinstance(body.get("usageMetadata"), dict):
+            body = {**body, "usageMetadata": {**body["usageMetadata"], "cachedContentTokenCount": cached_tokens}}
+        if fault is not None:
+            # Server errors tend to arrive late, after the call has hung a while.
+            await asyncio.sleep(delay)
+            message = "Internal error (injected)." if fault == 500 else "The model is overloaded (injected)."
+            return JSONResponse(
+                _error_body(fault, "INTERNAL" if fault == 500 else "UNAVAILABLE", message),
+                status_code=fault,
+            )
+        if status != 200 or method == "generateContent":
+            await asyncio.sleep(delay)
+            return JSONResponse(body, status_code=status)
+        return StreamingResponse(self._stream(body, delay), media_type="text/event-stream")
+
+    async def _stream(self, body: dict, delay: float) -> AsyncIterator[bytes]:
+        candidate = (body.get("candidates") or [{}])[0]
+        parts = (candidate.get("content") or {}).get("parts") or []
+        text = "".join(str(part.get("text", "")) for part in parts if isinstance(part, dict))
+        size = max(1, self.config.stream_chunk_chars)
+        pieces = [text[start : start + size] for start in range(0, len(text), size)] or [""]
+        first_wait = delay * self.config.first_chunk_share
+        step = (delay - first_wait) / max(1, len(pieces) - 1) if len(pieces) > 1 else 0.0
+        await asyncio.sleep(first_wait)
+        for index, piece in enumerate(pieces):
+            if index:
+                await asyncio.sleep(step)
+            streamed: dict[str, Any] = {"content": {"role": "model", "parts": [{"text": piece}]}, "index": 0}
+            chunk: dict[str, Any] = {"candidates": [streamed]}
+            if index == len(pieces) - 1:
+                streamed["finishReason"] = candidate.get("finishReason", "STOP")
+                if "usageMetadata" in body:
+                    chunk["usageMetadata"] = body["usageMetadata"]
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "mode": self.config.mode,
+            "cassettes": len(self.cassettes) if self.cassettes is not None else 0,
+            "requests": dict(sorted(self.model_requests.items())),
+            **{name: self.stats.get(name, 0) for name in STAT_NAMES},
+        }
+
+    async def aclose(self) -> None:
+        client, self._upstream = self._upstream, None
+        if client is not None:
+            await client.aclose()
+
+
+def build_app(config: FakeGeminiConfig) -> FastAPI:
+    fake = FakeGemini(config)
+
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+        yield
+        await fake.aclose()
+
+    app = FastAPI(title="fake-gemini", lifespan=lifespan)
+    app.state.fake = fake
+
+    @app.post("/v1beta/models/{target}")
+    async def generate(target: str, request: Request):
+        model, _, method = target.partition(":")
+        if method not in {"generateContent", "streamGenerateContent"}:
+            return JSONResponse(_error_body(404, "NOT_FOUND", f"unsupported method: {method}"), status_code=404)
+        try:
+            payload = await request.json()
+        except ValueError:
+            return JSONResponse(_error_body(400, "INVALID_ARGUMENT", "request body is not JSON"), status_code=400)
+        return await fake.handle(model, method, payload, api_key=request.headers.get("x-goog-api-key", ""))
+
+    @app.post("/v1beta/cachedContents")
+    async def create_cached_content(request: Request) -> JSONResponse:
+        try:
+            body = await request.json()
+        except ValueError:
+            return JSONResponse(_error_body(400, "INVALID_ARGUMENT", "request body is not JSON"), status_code=400)
+        status, answer = fake.create_cached_content(body)
+        return JSONResponse(answer, status_code=status)
+
+    @app.delete("/v1beta/cachedContents/{cache_id}")
+    async def delete_cached_content(cache_id: str) -> JSONResponse:
+        if fake.cached_contents.pop(f"cachedContents/{cache_id}", None) is None:
+            return JSONResponse(_error_body(404, "NOT_FOUND", "CachedContent not found"), status_code=404)
+        return JSONResponse({})
+
+    @app.get("/fake/stats")
+    async def stats() -> dict[str, Any]:
+        return fake.describe()
+
+    return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for the Gemini generateContent API. Point GEMINI_API_BASE at it."
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument(
+        "--mode",
+        choices=MODES,
+        default="synth",
+        help="synth: answer every call locally. replay: answer from cassettes, synthesizing misses unless --strict."
+        " record: replay cassettes, forward misses upstream and save them.",
+    )
+    parser.add_argument("--cassettes", help="Cassette directory for replay and record modes.")
+    parser.add_argument("--strict", action="store_true", help="In replay mode, answer cassette misses with 404.")
+    parser.add_argument("--upstream", default=DEFAULT_UPSTREAM, help="Real Gemini base URL used in record mode.")
+    parser.add_argument(
+        "--latency",
+        default="lognormal:1.2,0.35",
+        help="Text call latency in seconds: N, fixed:N, uniform:LOW,HIGH, normal:MEAN,SD,"
+        " lognormal:MEDIAN,SIGMA or recorded.",
+    )
+    parser.add_argument("--image-latency", default="lognormal:9,0.3", help="Image call latency, same format.")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of calls answered with 429.")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Share of calls answered with 500 or 503.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with injected 429s.")
+    parser.add_argument("--image-size", default="832x1248", help="Canned image size, WIDTHxHEIGHT.")
+    parser.add_argument("--stream-chunk-chars", type=int, default=48, help="Characters per streamed chunk.")
+    parser.add_argument(
+        "--cache-min-tokens",
+        type=int,
+        default=0,
+        help="Refuse cachedContents smaller than this many (chars/4) tokens, like the real minimum.",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Seed for latency and fault injection.")
+    return parser
+
+
+def config_from_args(args: argparse.Namespace) -> FakeGeminiConfig:
+    width, _, height = args.image_size.lower().partition("x")
+    return FakeGeminiConfig(
+        mode=args.mode,
+        cassette_dir=Path(args.cassettes) if args.cassettes else None,
+        strict=args.strict,
+        upstream=args.upstream,
+        upstream_api_key=os.getenv("GEMINI_API_KEY", ""),
+        latency=LatencyModel.parse(args.latency),
+        image_latency=LatencyModel.parse(args.image_latency),
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        retry_after_seconds=args.retry_after,
+        image_width=int(width),
+        image_height=int(height),
+        stream_chunk_chars=args.stream_chunk_chars,
+        cache_min_tokens=args.cache_min_tokens,
+        seed=args.seed,
+    )
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    uvicorn.run(build_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
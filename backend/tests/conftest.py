@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+import pytest
+
+import app.main as backend_main
+from app.blob_store import LocalBlobStore
+
+
+@pytest.fixture(autouse=True)
+def isolated_blob_store(tmp_path, monkeypatch) -> LocalBlobStore:
+    # Keep image blobs written by tests out of the dev blob store directory.
+    store = LocalBlobStore(tmp_path / "blobs")
+    monkeypatch.setattr(backend_main, "BLOB_STORE", store)
+    backend_main.IMAGE_PAYLOAD_CACHE.clear()
+    return store
@@ -4,13 +4,16 @@ from fastapi.testclient import TestClient
 from sqlalchemy import delete
 
 import app.main as backend_main
+from app.catalog_cache import bump_catalog_version
 from app.models import (
     ClientErrorEvent,
     Dish,
     DishImage,
+    DishImageRendition,
     GenerationJob,
     User,
     UserProfile,
+    UserSeenDishes,
     UserSwipeEvent,
 )
 
@@ -20,6 +23,11 @@ CLIENT_VERSION = "1.0.0"
 MOCK_IDENTITY_TOKEN = "mock.identity.token.with.sufficient.length"
 
 
+def _blob_columns(body: bytes) -> dict[str, object]:
+    ref = backend_main.BLOB_STORE.put(body)
+    return {"blob_sha256": ref.sha256, "size_bytes": ref.size}
+
+
 def default_headers() -> dict[str, str]:
     return {
         "X-Device-ID": DEVICE_ID,
@@ -131,7 +139,7 @@ def test_taste_deck_returns_cached_dishes_without_auto_generation(monkeypatch) -
             model="test",
             prompt="seed image",
             mime_type="image/png",
-            data_url="data:image/png;base64,AAAA",
+            **_blob_columns(b"\x00\x00\x00"),
         )
         session.add(image)
         session.flush()
@@ -176,6 +184,7 @@ def test_taste_deck_returns_cached_dishes_without_auto_generation(monkeypatch) -
                 ),
             ]
         )
+        bump_catalog_version(session)
         session.commit()
 
     with TestClient(backend_main.app) as client:
@@ -194,6 +203,155 @@ def test_taste_deck_returns_cached_dishes_without_auto_generation(monkeypatch) -
     assert image_payloads["缓存菜一号"] == "data:image/png;base64,AAAA"
     assert image_payloads["缓存菜二号"] is None
 
+    with TestClient(backend_main.app) as client:
+        ranked = client.post(
+            "/v1/taste/deck",
+            json={
+                "count": 6,
+                "ranking": "personalized",
+                "top_positive": [{"id": "flavor:spicy", "score": 0.9}],
+                "avoid_names": ["缓存菜二号"],
+            },
+            headers=default_headers(),
+        )
+
+    assert ranked.status_code == 200
+    assert [dish["name"] for dish in ranked.json()["dishes"]] == ["缓存菜一号"]
+
+
+def test_taste_deck_url_mode_and_image_endpoint_serve_binary_with_etag(monkeypatch) -> None:
+    backend_main.RATE_LIMIT_BUCKETS.clear()
+    backend_main.IMAGE_PAYLOAD_CACHE.clear()
+    monkeypatch.setattr(backend_main, "RATE_LIMIT_REQUESTS", 20)
+
+    png_bytes = b"\x89PNG\r\n\x1a\nfake-image-bytes"
+    with backend_main.SessionLocal() as session:
+        session.execute(delete(Dish))
+        session.execute(delete(DishImage))
+        image = DishImage(
+            provider="seed",
+            model="test",
+            prompt="seed image",
+            mime_type="image/png",
+            **_blob_columns(png_bytes),
+        )
+        session.add(image)
+        session.flush()
+        image_id = image.id
+        session.add(
+            Dish(
+                name="图片菜",
+                subtitle="已有库存",
+                signals={},
+                tags_json={"flavor": ["umami"]},
+                status="ready",
+                source="seed",
+                image_id=image_id,
+            )
+        )
+        bump_catalog_version(session)
+        session.commit()
+
+    with TestClient(backend_main.app) as client:
+        deck = client.post(
+            "/v1/taste/deck",
+            json={"count": 6, "image_mode": "url"},
+            headers=default_headers(),
+        )
+        assert deck.status_code == 200
+        dish = deck.json()["dishes"][0]
+        assert dish["image_data_url"] is None
+        assert dish["image_id"] == image_id
+        assert dish["image_url"] == f"/v1/images/{image_id}"
+
+        first = client.get(dish["image_url"], headers=default_headers())
+        assert first.status_code == 200
+        assert first.content == png_bytes
+        assert first.headers["content-type"] == "image/png"
+        assert "immutable" in first.headers["cache-control"]
+        etag = first.headers["etag"]
+        assert etag.startswith('"') and not etag.startswith('W/')
+
+        revalidate_headers = default_headers()
+        revalidate_headers["If-None-Match"] = etag
+        second = client.get(dish["image_url"], headers=revalidate_headers)
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["etag"] == etag
+
+        missing = client.get("/v1/images/does-not-exist", headers=default_headers())
+        assert missing.status_code == 404
+        assert missing.json()["code"] == "image_not_found"
+
+
+def test_image_renditions_are_chosen_from_client_hints(monkeypatch) -> None:
+    backend_main.RATE_LIMIT_BUCKETS.clear()
+    backend_main.IMAGE_PAYLOAD_CACHE.clear()
+    monkeypatch.setattr(backend_main, "RATE_LIMIT_REQUESTS", 20)
+
+    png_bytes = b"\x89PNG\r\n\x1a\noriginal"
+    thumb_bytes = b"RIFF....WEBPthumb"
+    with backend_main.SessionLocal() as session:
+        session.execute(delete(Dish))
+        session.execute(delete(DishImageRendition))
+        session.execute(delete(DishImage))
+        image = DishImage(
+            provider="seed",
+            model="test",
+            prompt="seed image",
+            mime_type="image/png",
+            **_blob_columns(png_bytes),
+        )
+        session.add(image)
+        session.flush()
+        image_id = image.id
+        session.add(
+            DishImageRendition(
+                image_id=image_id,
+                name="thumb",
+                format="webp",
+                mime_type="image/webp",
+                width=240,
+                height=360,
+                **_blob_columns(thumb_bytes),
+            )
+        )
+        session.add(
+            Dish(name="缩略图菜", subtitle="已有库存", signals={}, tags_json={}, status="ready", image_id=image_id)
+        )
+        bump_catalog_version(session)
+        session.commit()
+
+    with TestClient(backend_main.app) as client:
+        url_deck = client.post(
+            "/v1/taste/deck",
+            json={"count": 6, "image_mode": "url", "image_rendition": "thumb"},
+            headers=default_headers(),
+        )
+        inline_deck = client.post(
+            "/v1/taste/deck",
+            json={"count": 6, "image_rendition": "thumb"},
+            headers=default_headers(),
+        )
+        card_deck = client.post(
+            "/v1/taste/deck",
+            json={"count": 6, "image_rendition": "card"},
+            headers=default_headers(),
+        )
+        hinted_headers = default_headers()
+        hinted_headers.update({"Sec-CH-Width": "200", "Accept": "image/webp,*/*"})
+        hinted = client.get(f"/v1/images/{image_id}", headers=hinted_headers)
+        original = client.get(f"/v1/images/{image_id}", headers=default_headers())
+
+    assert url_deck.json()["dishes"][0]["image_url"] == f"/v1/images/{image_id}?rendition=thumb&format=webp"
+    assert inline_deck.json()["dishes"][0]["image_data_url"].startswith("data:image/webp;base64,")
+    assert card_deck.json()["dishes"][0]["image_data_url"].startswith("data:image/png;base64,")
+    assert hinted.status_code == 200
+    assert hinted.content == thumb_bytes
+    assert hinted.headers["content-type"] == "image/webp"
+    assert "Sec-CH-Width" in hinted.headers["vary"]
+    assert original.content == png_bytes
+
 
 def test_apple_sign_in_creates_or_reuses_same_user(monkeypatch) -> None:
     backend_main.RATE_LIMIT_BUCKETS.clear()
@@ -327,3 +485,52 @@ def test_swipe_batch_is_idempotent(monkeypatch) -> None:
     swipe_events = profile.json()["swipe_events"]
     assert len(swipe_events) == 1
     assert swipe_events[0]["dish_name"] == "宫保鸡丁"
+
+
+def test_taste_deck_skips_dishes_the_signed_in_user_already_swiped(monkeypatch) -> None:
+    backend_main.RATE_LIMIT_BUCKETS.clear()
+    monkeypatch.setattr(backend_main, "RATE_LIMIT_REQUESTS", 20)
+    monkeypatch.setattr(backend_main, "_verify_apple_identity_token", lambda _token: {"sub": "apple-user-seen"})
+
+    with backend_main.SessionLocal() as session:
+        session.execute(delete(UserSeenDishes))
+        session.execute(delete(Dish))
+        session.add_all(
+            [
+                Dish(name=name, subtitle="已有库存", signals={}, tags_json={}, status="ready", source="seed")
+                for name in ("已看过的菜", "还没看的菜")
+            ]
+        )
+        bump_catalog_version(session)
+        session.commit()
+
+    event = {
+        "id": "0b8e7c4e-3f0c-4f5e-9d1a-6f0e7d0f2c11",
+        "dish_name": "已看过的菜",
+        "action": "dislike",
+        "created_at": "2026-04-01T00:00:00Z",
+    }
+
+    with TestClient(backend_main.app) as client:
+        token = client.post(
+            "/v1/auth/apple/sign-in",
+            json={"identity_token": MOCK_IDENTITY_TOKEN},
+            headers=default_headers(),
+        ).json()["session_token"]
+        swipes = client.post("/v1/me/swipes/batch", json={"events": [event]}, headers=auth_headers(token))
+        signed_in = client.post("/v1/taste/deck", json={"count": 6}, headers=auth_headers(token))
+        ranked = client.post(
+            "/v1/taste/deck",
+            json={"count": 6, "ranking": "personalized"},
+            headers=auth_headers(token),
+        )
+        expired = client.post("/v1/taste/deck", json={"count": 6}, headers=auth_headers("not-a-session"))
+        monkeypatch.setattr(backend_main, "CATALOG_CACHE_ENABLED", False)
+        uncached = client.post("/v1/taste/deck", json={"count": 6}, headers=auth_headers(token))
+
+    assert swipes.status_code == 200
+    assert [dish["name"] for dish in signed_in.json()["dishes"]] == ["还没看的菜"]
+    assert [dish["name"] for dish in ranked.json()["dishes"]] == ["还没看的菜"]
+    assert [dish["name"] for dish in uncached.json()["dishes"]] == ["还没看的菜"]
+    assert expired.status_code == 200
+    assert {dish["name"] for dish in expired.json()["dishes"]} == {"已看过的菜", "还没看的菜"}
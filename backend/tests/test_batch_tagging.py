@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+
+import app.main as backend_main
+from app.gemini_cache import GeminiResponseCache
+from app.tagging import build_batch_tagging_prompt, parse_batch_tagging_item
+from scripts.dish_cache_admin import ApprovedDishEntry, _generate_tagged_records
+
+
+def _response(payload: dict) -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": json.dumps(payload, ensure_ascii=False)}]}}]}
+
+
+def _batch_input(payload: dict) -> list[dict]:
+    prompt = payload["contents"][0]["parts"][0]["text"]
+    return json.loads(prompt.rsplit("Input:\n", 1)[1])
+
+
+def test_batch_items_are_validated_independently() -> None:
+    prompt = build_batch_tagging_prompt([("宫保鸡丁", "sichuan"), ("提拉米苏", "")])
+    assert '"key": "2", "dish_name": "提拉米苏"' in prompt
+    good = {"dish_name": "宫保鸡丁", "tags": {"flavor": ["mala"], "ingredient": ["chicken"]}, "subtitle": "川味鸡丁"}
+
+    subtitle, tags, _, trace = parse_batch_tagging_item(good, dish_name="宫保鸡丁")
+    assert subtitle == "川味鸡丁"
+    assert tags.flavor == ["numbing", "spicy"]
+    assert trace["decomposed"]
+    with pytest.raises(ValueError, match="result is for"):
+        parse_batch_tagging_item(good, dish_name="提拉米苏")
+    with pytest.raises(ValueError, match="no canonical tags"):
+        parse_batch_tagging_item({"tags": {"flavor": ["zesty_cloud"]}}, dish_name="提拉米苏")
+    with pytest.raises(ValueError, match="no tags object"):
+        parse_batch_tagging_item({"subtitle": "x"}, dish_name="提拉米苏")
+
+
+def test_seed_names_batches_retry_only_failed_items(monkeypatch) -> None:
+    entries = [
+        ApprovedDishEntry(cuisine="sichuan", name="宫保鸡丁"),
+        ApprovedDishEntry(cuisine="", name="提拉米苏"),
+        ApprovedDishEntry(cuisine="thai", name="冬阴功虾汤"),
+        ApprovedDishEntry(cuisine="", name="麻婆豆腐"),
+    ]
+    batches: list[list[str]] = []
+
+    async def fake_call(payload: dict, *, model: str, **_kwargs) -> dict:
+        dishes = _batch_input(payload)
+        batches.append([dish["dish_name"] for dish in dishes])
+        results = []
+        for dish in dishes:
+            name = dish["dish_name"]
+            if len(batches) == 1 and name == "提拉米苏":
+                results.append({"key": dish["key"], "dish_name": name, "tags": {"flavor": ["mystery"]}})
+                continue
+            if len(batches) == 1 and name == "冬阴功虾汤":
+                continue
+            results.append(
+                {
+                    "key": dish["key"],
+                    "dish_name": name,
+                    "subtitle": f"{name}简介",
+                    "tags": {"flavor": ["spicy"], "course": ["main"]},
+                    "candidate_tags": [{"dimension": "texture", "value": f"batch{len(batches)}"}],
+                }
+            )
+        return _response({"results": results})
+
+    monkeypatch.setattr(backend_main, "_call_gemini_api", fake_call)
+
+    records = asyncio.run(_generate_tagged_records(entries, batch_size=3))
+
+    assert batches == [["宫保鸡丁", "提拉米苏", "冬阴功虾汤"], ["提拉米苏", "冬阴功虾汤"], ["麻婆豆腐"]]
+    assert [record.name for record in records] == [entry.name for entry in entries]
+    assert [record.subtitle for record in records] == [f"{entry.name}简介" for entry in entries]
+    assert records[0].raw_tagging_output["candidate_tags"][0]["value"] == "batch1"
+    assert records[1].raw_tagging_output["candidate_tags"][0]["value"] == "batch2"
+    assert "key" not in records[2].raw_tagging_output
+    assert records[1].tags.flavor == ["spicy"]
+
+
+def test_batch_retry_rounds_reach_upstream_instead_of_the_cache(monkeypatch) -> None:
+    entries = [ApprovedDishEntry(cuisine="", name="提拉米苏"), ApprovedDishEntry(cuisine="", name="麻婆豆腐")]
+    upstream: list[list[str]] = []
+
+    async def fake_post(payload: dict, *, model: str, **_kwargs) -> dict:
+        dishes = _batch_input(payload)
+        upstream.append([dish["dish_name"] for dish in dishes])
+        # The first answer parses, so it is cacheable, but every item fails validation.
+        flavor = ["mystery"] if len(upstream) == 1 else ["sweet"]
+        results = [{"key": dish["key"], "dish_name": dish["dish_name"], "tags": {"flavor": flavor}} for dish in dishes]
+        return _response({"results": results})
+
+    cache = GeminiResponseCache(max_bytes=1 << 20, ttl_seconds=60)
+    monkeypatch.setattr(backend_main, "_post_gemini_with_retries", fake_post)
+    monkeypatch.setattr(backend_main, "GEMINI_RESPONSE_CACHE", cache)
+    monkeypatch.setattr(backend_main, "GEMINI_CACHE_ENABLED", True)
+    monkeypatch.setattr(backend_main, "GEMINI_HEDGE_ENABLED", False)
+
+    records = asyncio.run(_generate_tagged_records(entries, batch_size=2))
+
+    assert upstream == [["提拉米苏", "麻婆豆腐"], ["提拉米苏", "麻婆豆腐"]]
+    assert [record.tags.flavor for record in records] == [["sweet"], ["sweet"]]
+    assert cache.describe()["bypassed"] == 1
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import pytest
+
+from app.blob_store import (
+    BlobNotFoundError,
+    DirectoryS3Client,
+    LocalBlobStore,
+    S3BlobStore,
+    blob_digest,
+    build_blob_store,
+)
+
+
+def test_local_blob_store_is_content_addressed_and_idempotent(tmp_path) -> None:
+    store = LocalBlobStore(tmp_path)
+    first = store.put(b"dish-image")
+    second = store.put(b"dish-image")
+
+    assert first == second
+    assert first.sha256 == blob_digest(b"dish-image")
+    assert first.size == len(b"dish-image")
+    path = store.local_path(first.sha256)
+    assert path == tmp_path / first.sha256[:2] / first.sha256[2:4] / first.sha256
+    assert store.read(first.sha256) == b"dish-image"
+    assert not any(item.name.startswith(".tmp-") for item in path.parent.iterdir())
+
+    store.delete(first.sha256)
+    assert not store.exists(first.sha256)
+    assert store.local_path(first.sha256) is None
+    with pytest.raises(BlobNotFoundError):
+        store.read(first.sha256)
+    with pytest.raises(ValueError):
+        store.read("../../etc/passwd")
+
+
+def test_s3_blob_store_round_trips_through_directory_stand_in(tmp_path) -> None:
+    store = build_blob_store(backend="s3", s3_bucket="images", s3_endpoint_url=f"file://{tmp_path}")
+    assert isinstance(store, S3BlobStore)
+    assert isinstance(store.client, DirectoryS3Client)
+
+    ref = store.put(b"\x89PNG-bytes")
+    assert (tmp_path / "images" / "blobs" / ref.sha256[:2] / ref.sha256).is_file()
+    assert store.exists(ref.sha256)
+    assert store.read(ref.sha256) == b"\x89PNG-bytes"
+    assert store.local_path(ref.sha256) is None
+
+    missing = blob_digest(b"never stored")
+    assert not store.exists(missing)
+    with pytest.raises(BlobNotFoundError):
+        store.read(missing)
+    with pytest.raises(ValueError):
+        build_blob_store(backend="s3")
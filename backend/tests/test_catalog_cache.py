@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import random
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.catalog_cache import CatalogCache, bump_catalog_version, read_catalog_version
+from app.db import Base
+from app.models import Dish
+
+
+def _session_with_dishes(count: int) -> Session:
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    for index in range(count):
+        session.add(
+            Dish(
+                name=f"菜{index:02d}",
+                subtitle="测试",
+                signals={},
+                tags_json={"flavor": ["Mala"], "ingredient": ["prawns"]},
+                status="ready",
+            )
+        )
+    bump_catalog_version(session)
+    session.commit()
+    return session
+
+
+def test_catalog_cache_hits_until_version_is_bumped() -> None:
+    session = _session_with_dishes(4)
+    cache = CatalogCache()
+
+    first = cache.snapshot(session)
+    second = cache.snapshot(session)
+    assert first is second
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+    assert first.records[0].tags.flavor == ["numbing", "spicy"]
+    assert first.records[0].tags.ingredient == ["shrimp"]
+    assert first.records[0].tags.allergen == ["shellfish"]
+
+    session.add(Dish(name="新菜", subtitle="测试", signals={}, tags_json={}, status="ready"))
+    bump_catalog_version(session)
+    session.commit()
+
+    third = cache.snapshot(session)
+    assert third is not first
+    assert third.version == read_catalog_version(session)
+    assert len(third.records) == 5
+    assert cache.stats.rebuilds == 2
+    assert cache.describe()["records"] == 5
+
+
+def test_catalog_cache_expires_after_max_age() -> None:
+    session = _session_with_dishes(2)
+    cache = CatalogCache(max_age_seconds=0.0)
+
+    cache.snapshot(session)
+    cache.snapshot(session)
+
+    assert cache.stats.hits == 0
+    assert cache.stats.rebuilds == 2
+
+
+def test_snapshot_sample_skips_avoided_names() -> None:
+    session = _session_with_dishes(12)
+    snapshot = CatalogCache().snapshot(session)
+    avoid = {f"菜{index:02d}" for index in range(6)}
+
+    picked = snapshot.sample(count=6, avoid_names=avoid, rng=random.Random(5))
+
+    assert len(picked) == 6
+    assert {record.name for record in picked} == {f"菜{index:02d}" for index in range(6, 12)}
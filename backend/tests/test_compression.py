@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import gzip
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, CompressionStats, negotiate_encoding
+
+PAYLOAD = {"dishes": [{"name": f"菜{index}", "subtitle": "香辣开胃，适合下饭"} for index in range(200)]}
+
+
+def _app(*, budget_ms: float = 250.0) -> tuple[FastAPI, CompressionStats]:
+    stats = CompressionStats()
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=512, cpu_budget_ms_per_second=budget_ms, stats=stats)
+
+    @app.get("/big")
+    async def big() -> dict:
+        return PAYLOAD
+
+    @app.post("/big")
+    async def big_post() -> dict:
+        return PAYLOAD
+
+    @app.get("/small")
+    async def small() -> dict:
+        return {"ok": True}
+
+    @app.get("/image")
+    async def image() -> Response:
+        return Response(content=b"\x89PNG" * 1000, media_type="image/png")
+
+    @app.get("/encoded")
+    async def encoded() -> Response:
+        body = gzip.compress(b"x" * 4000)
+        return Response(content=body, media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+    return app, stats
+
+
+def test_negotiate_encoding_respects_quality_and_server_preference() -> None:
+    available = {"zstd": bytes, "br": bytes, "gzip": bytes}
+    assert negotiate_encoding("gzip, br", available) == "br"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", available) == "gzip"
+    assert negotiate_encoding("br;q=0, *;q=0.1", available) == "zstd"
+    assert negotiate_encoding("identity", available) is None
+    assert negotiate_encoding("", available) is None
+
+
+def test_middleware_compresses_large_json_and_caches_get_bodies() -> None:
+    app, stats = _app()
+    with TestClient(app) as client:
+        first = client.get("/big", headers={"Accept-Encoding": "gzip"})
+        second = client.get("/big", headers={"Accept-Encoding": "gzip"})
+        posted = client.post("/big", headers={"Accept-Encoding": "gzip"})
+        plain = client.get("/big", headers={"Accept-Encoding": "identity"})
+
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["vary"] == "Accept-Encoding"
+    assert first.json() == PAYLOAD
+    assert second.json() == PAYLOAD
+    assert posted.headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in plain.headers
+
+    get_stats = stats.describe()["GET /big"]
+    assert get_stats["compressed"] == 2
+    assert get_stats["cache_hits"] == 1
+    assert get_stats["bytes_saved"] > get_stats["bytes_out"]
+    assert stats.describe()["POST /big"]["cache_hits"] == 0
+
+
+def test_middleware_skips_small_binary_encoded_and_over_budget_bodies() -> None:
+    app, stats = _app()
+    with TestClient(app) as client:
+        small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+        image = client.get("/image", headers={"Accept-Encoding": "gzip"})
+        encoded = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in image.headers
+    assert encoded.headers["content-encoding"] == "gzip"
+    routes = stats.describe()
+    assert routes["GET /small"]["skipped"]["below_threshold"] == 1
+    assert routes["GET /image"]["skipped"]["not_compressible"] == 1
+    assert routes["GET /encoded"]["skipped"]["already_encoded"] == 1
+
+    starved, starved_stats = _app(budget_ms=0)
+    with TestClient(starved) as client:
+        response = client.post("/big", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == PAYLOAD
+    assert starved_stats.describe()["POST /big"]["skipped"]["cpu_budget"] == 1
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import json
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import httpx
+import uvicorn
+from sqlalchemy import delete
+
+import app.main as backend_main
+from app.catalog_cache import bump_catalog_version
+from app.models import Dish, DishImage
+
+DECK_SIZE = 30
+GATE_TIMEOUT_SECONDS = 10
+DISH_DELAY_SECONDS = 0.05
+HEADERS = {
+    "X-Device-ID": "9f2f89f1-45f9-4d45-9249-7e0d67f8d5e1",
+    "X-Client-Version": "1.0.0",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+@contextmanager
+def _running_server() -> Iterator[str]:
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(backend_main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def _seed_catalog() -> None:
+    with backend_main.SessionLocal() as session:
+        session.execute(delete(Dish))
+        session.execute(delete(DishImage))
+        blob = backend_main.BLOB_STORE.put(b"\x00\x00\x00")
+        for index in range(DECK_SIZE):
+            image = DishImage(
+                provider="seed",
+                model="test",
+                prompt="seed image",
+                mime_type="image/png",
+                blob_sha256=blob.sha256,
+                size_bytes=blob.size,
+            )
+            session.add(image)
+            session.flush()
+            session.add(
+                Dish(
+                    name=f"流式菜{index:02d}",
+                    subtitle="测试",
+                    signals={},
+                    tags_json={"flavor": ["spicy"]},
+                    status="ready",
+                    source="seed",
+                    image_id=image.id,
+                )
+            )
+        bump_catalog_version(session)
+        session.commit()
+
+
+def test_streaming_deck_sends_first_dish_before_the_rest_are_built(monkeypatch) -> None:
+    backend_main.RATE_LIMIT_BUCKETS.clear()
+    monkeypatch.setattr(backend_main, "RATE_LIMIT_REQUESTS", 20)
+    _seed_catalog()
+
+    # Every dish after the first waits until the client has seen a line. A
+    # response that buffered the deck would hold the first line back until the
+    # gate times out.
+    gate = threading.Event()
+    calls: list[int] = []
+    timed_out: list[int] = []
+    original = backend_main._record_to_deck_dish
+
+    def gated_record_to_deck_dish(*args, **kwargs):
+        calls.append(len(calls))
+        if len(calls) > 1 and not gate.wait(timeout=GATE_TIMEOUT_SECONDS):
+            timed_out.append(len(calls))
+            gate.set()
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(backend_main, "_record_to_deck_dish", gated_record_to_deck_dish)
+
+    payload = {"count": DECK_SIZE}
+    with _running_server() as base_url, httpx.Client(base_url=base_url, timeout=30) as client:
+        with client.stream("POST", "/v1/taste/deck", json={**payload, "stream": True}, headers=HEADERS) as response:
+            assert response.status_code == 200
+            lines_iter = response.iter_lines()
+            first = json.loads(next(lines_iter))
+            # Only the first dish has been built when its line arrives.
+            assert not gate.is_set() and len(calls) <= 2
+            # A card being built must not hold up other requests.
+            with httpx.Client(base_url=base_url, timeout=30) as other:
+                assert other.get("/health").status_code == 200
+            assert not gate.is_set()
+            gate.set()
+            rest = [json.loads(line) for line in lines_iter if line]
+        buffered = client.post("/v1/taste/deck", json=payload, headers=HEADERS)
+
+    assert not timed_out
+    lines = [first, *rest]
+    assert [line["type"] for line in lines] == ["dish"] * DECK_SIZE + ["summary"]
+    assert [line["index"] for line in lines[:-1]] == list(range(DECK_SIZE))
+    assert lines[0]["dish"]["image_data_url"] == "data:image/png;base64,AAAA"
+    assert lines[-1]["count"] == DECK_SIZE
+    assert len(buffered.json()["dishes"]) == DECK_SIZE
+
+
+def _time_to_first_byte(client: httpx.Client, body: dict) -> float:
+    started = time.perf_counter()
+    with client.stream("POST", "/v1/taste/deck", json=body, headers=HEADERS) as response:
+        assert response.status_code == 200
+        next(response.iter_bytes())
+        return time.perf_counter() - started
+
+
+def test_streaming_deck_first_byte_beats_the_buffered_deck(monkeypatch) -> None:
+    backend_main.RATE_LIMIT_BUCKETS.clear()
+    monkeypatch.setattr(backend_main, "RATE_LIMIT_REQUESTS", 20)
+    _seed_catalog()
+    original = backend_main._record_to_deck_dish
+
+    def slow_record_to_deck_dish(*args, **kwargs):
+        # A fixed per-dish cost, like a slow image lookup.
+        time.sleep(DISH_DELAY_SECONDS)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(backend_main, "_record_to_deck_dish", slow_record_to_deck_dish)
+
+    payload = {"count": DECK_SIZE}
+    with _running_server() as base_url, httpx.Client(base_url=base_url, timeout=30) as client:
+        buffered = _time_to_first_byte(client, payload)
+        streamed = _time_to_first_byte(client, {**payload, "stream": True})
+
+    # Buffered mode cannot answer before every dish is built. The stream sends
+    # its first line after one dish; half the deck is a generous bound.
+    assert buffered >= DECK_SIZE * DISH_DELAY_SECONDS
+    assert streamed < DECK_SIZE * DISH_DELAY_SECONDS / 2
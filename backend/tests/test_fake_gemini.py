@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import pytest
+import uvicorn
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.main as backend_main
+from app.gemini_cache import GeminiResponseCache
+from app.gemini_client import GeminiHttpClient, GeminiTimeout
+from app.gemini_limiter import GeminiLimiters, LimiterConfig
+from app.gemini_resilience import BreakerConfig, GeminiBreakers
+from scripts.fake_gemini import FakeGeminiConfig, LatencyModel, build_app
+
+TEXT_PAYLOAD = {
+    "contents": [{"role": "user", "parts": [{"text": "你好"}]}],
+    "generationConfig": {"temperature": 0.2, "responseMimeType": "application/json"},
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+@contextmanager
+def _running(app: FastAPI) -> Iterator[str]:
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def test_synthetic_answers_satisfy_backend_pipelines(monkeypatch) -> None:
+    fake_app = build_app(FakeGeminiConfig(image_width=320, image_height=480, seed=1))
+    with _running(fake_app) as base_url:
+        client = GeminiHttpClient(base_url=base_url, default_timeout=GeminiTimeout(connect=2.0, read=10.0))
+        monkeypatch.setattr(backend_main, "GEMINI_HTTP_CLIENT", client)
+        monkeypatch.setattr(backend_main, "GEMINI_BREAKERS", GeminiBreakers(BreakerConfig()))
+        monkeypatch.setattr(backend_main, "GEMINI_LIMITERS", GeminiLimiters(LimiterConfig()))
+        monkeypatch.setattr(backend_main, "GEMINI_RESPONSE_CACHE", GeminiResponseCache(max_bytes=1 << 20, ttl_seconds=60))
+        monkeypatch.setattr(backend_main, "GEMINI_CACHE_ENABLED", False)
+        monkeypatch.setattr(backend_main, "GEMINI_API_KEY", "test-key")
+
+        async def scenario() -> None:
+            try:
+                deck = await backend_main._generate_deck_with_gemini(backend_main.DeckRequest(count=10))
+                assert len(deck) == 10 and len({dish.name for dish in deck}) == 10
+
+                menu = await backend_main._menu_chat_with_gemini(
+                    backend_main.MenuChatRequest(mode="recommend", message="推荐几道")
+                )
+                assert len(menu.recommendations) == 5
+
+                _, tags, _, _, _ = await backend_main._generate_dish_tags_with_gemini("宫保鸡丁")
+                assert tags.flavor
+
+                tagged, failures = await backend_main._generate_dish_tags_batch_with_gemini(
+                    [("宫保鸡丁", "sichuan"), ("提拉米苏", "")]
+                )
+                assert sorted(tagged) == [0, 1] and not failures
+
+                _, _, first = await backend_main._generate_dish_image_with_gemini("宫保鸡丁")
+                _, _, second = await backend_main._generate_dish_image_with_gemini("宫保鸡丁")
+                assert first != second
+                assert len(base64.b64decode(first.split(",", 1)[1])) > 100_000
+            finally:
+                await client.aclose()
+
+        asyncio.run(scenario())
+        assert fake_app.state.fake.describe()["synthesized"] >= 6
+
+
+def test_record_then_replay_by_payload_hash(tmp_path) -> None:
+    upstream_app = build_app(FakeGeminiConfig())
+    cassettes = tmp_path / "cassettes"
+    with _running(upstream_app) as upstream_url:
+        recorder = build_app(FakeGeminiConfig(mode="record", cassette_dir=cassettes, upstream=upstream_url))
+        with TestClient(recorder) as client:
+            first = client.post("/v1beta/models/m:generateContent", json=TEXT_PAYLOAD)
+            reordered = {"generationConfig": TEXT_PAYLOAD["generationConfig"], "contents": TEXT_PAYLOAD["contents"]}
+            second = client.post("/v1beta/models/m:generateContent", json=reordered)
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert upstream_app.state.fake.describe()["requests"] == {"m": 1}
+    assert recorder.state.fake.describe()["recorded"] == 1
+    assert len(list(cassettes.glob("*.json"))) == 1
+
+    replayer = build_app(FakeGeminiConfig(mode="replay", cassette_dir=cassettes, strict=True))
+    with TestClient(replayer) as client:
+        replayed = client.post("/v1beta/models/m:generateContent", json=TEXT_PAYLOAD)
+        streamed = client.post("/v1beta/models/m:streamGenerateContent?alt=sse", json=TEXT_PAYLOAD)
+        other_model = client.post("/v1beta/models/other:generateContent", json=TEXT_PAYLOAD)
+    assert replayed.json() == first.json()
+    assert streamed.status_code == 200 and streamed.text.count("data: ") >= 1
+    assert other_model.status_code == 404
+    assert other_model.json()["error"]["status"] == "NOT_FOUND"
+
+
+def test_fault_injection_and_latency_models() -> None:
+    rng = random.Random(3)
+    assert LatencyModel.parse("0.25").sample(rng) == 0.25
+    assert 0.1 <= LatencyModel.parse("uniform:0.1,0.2").sample(rng) <= 0.2
+    assert LatencyModel.parse("recorded").sample(rng, recorded=1.5) == 1.5
+    with pytest.raises(ValueError):
+        LatencyModel.parse("uniform:1")
+
+    with TestClient(build_app(FakeGeminiConfig(rate_429=1.0, retry_after_seconds=7))) as client:
+        throttled = client.post("/v1beta/models/m:generateContent", json=TEXT_PAYLOAD)
+    assert throttled.status_code == 429
+    assert throttled.headers["retry-after"] == "7"
+
+    fake_app = build_app(FakeGeminiConfig(rate_5xx=1.0))
+    with TestClient(fake_app) as client:
+        failed = client.post("/v1beta/models/m:generateContent", json=TEXT_PAYLOAD)
+    assert failed.status_code in {500, 503}
+    assert fake_app.state.fake.describe()["injected_5xx"] == 1
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import io
+import json
+
+from PIL import Image
+from sqlalchemy import delete, select
+
+import app.main as backend_main
+import scripts.dish_cache_admin as admin
+from app.db import init_db
+from app.gemini_batch import (
+    BATCH_PENDING,
+    BATCH_SUCCEEDED,
+    BatchJobFile,
+    BatchRequest,
+    LocalBatchBackend,
+    read_batch_job_file,
+    write_batch_job_file,
+)
+from app.models import Dish, DishImage, GenerationJob
+
+DISHES = ["批处理宫保鸡丁", "批处理提拉米苏"]
+
+
+def _text_response(payload: dict) -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": json.dumps(payload, ensure_ascii=False)}]}}]}
+
+
+def _png_response() -> dict:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 80, 40)).save(buffer, format="PNG")
+    data = base64.b64encode(buffer.getvalue()).decode("ascii")
+    return {"candidates": [{"content": {"parts": [{"inlineData": {"mimeType": "image/png", "data": data}}]}}]}
+
+
+def test_local_backend_round_trip(tmp_path) -> None:
+    async def responder(model: str, request: dict) -> dict:
+        if request["n"] == 2:
+            raise RuntimeError("quota exhausted")
+        return {"echo": request["n"], "model": model}
+
+    async def scenario() -> None:
+        idle = LocalBatchBackend(tmp_path)
+        name = await idle.submit(
+            model="m",
+            requests=[BatchRequest(key="a", model="m", request={"n": 1})],
+            display_name="idle",
+        )
+        assert (await idle.status(name)).state == BATCH_PENDING
+
+        backend = LocalBatchBackend(tmp_path, responder=responder)
+        name = await backend.submit(
+            model="m",
+            requests=[
+                BatchRequest(key="a", model="m", request={"n": 1}),
+                BatchRequest(key="b", model="m", request={"n": 2}),
+            ],
+            display_name="test",
+        )
+        status = await backend.status(name)
+        assert status.state == BATCH_SUCCEEDED and status.done
+        results = {item.key: item for item in await backend.results(name)}
+        assert results["a"].response == {"echo": 1, "model": "m"}
+        assert results["b"].response is None and results["b"].error == "quota exhausted"
+
+    asyncio.run(scenario())
+
+    job = BatchJobFile(
+        generation_job_id="job-1",
+        backend="local",
+        entries=[{"cuisine": "", "name": "x"}],
+        requests=[BatchRequest(key="tag:0", model="m", request={"contents": []})],
+        batches={"m": "batches/local-1"},
+    )
+    write_batch_job_file(tmp_path / "job.json", job)
+    loaded = read_batch_job_file(tmp_path / "job.json")
+    assert loaded == job
+    assert loaded.requests_by_model() == {"m": job.requests}
+
+
+def _cleanup() -> None:
+    with backend_main.SessionLocal() as session:
+        image_ids = session.scalars(select(Dish.image_id).where(Dish.name.in_(DISHES))).all()
+        session.execute(delete(Dish).where(Dish.name.in_(DISHES)))
+        session.execute(delete(DishImage).where(DishImage.id.in_([item for item in image_ids if item])))
+        session.execute(delete(GenerationJob).where(GenerationJob.kind == "batch_seed"))
+        session.commit()
+
+
+def test_batch_submit_and_collect_ingest_results(monkeypatch, tmp_path) -> None:
+    init_db()
+    _cleanup()
+    calls: list[str] = []
+
+    async def fake_call(payload: dict, *, model: str, **_kwargs) -> dict:
+        prompt = payload["contents"][0]["parts"][0]["text"]
+        calls.append(model)
+        if model == backend_main.GEMINI_IMAGE_MODEL:
+            if DISHES[1] in prompt:
+                raise RuntimeError("Gemini HTTP 500")
+            return _png_response()
+        return _text_response({"subtitle": "批处理简介", "tags": {"flavor": ["spicy"], "course": ["main"]}})
+
+    monkeypatch.setattr(admin, "_call_gemini_api", fake_call)
+    names_file = tmp_path / "names.txt"
+    names_file.write_text(f"sichuan|{DISHES[0]}\n{DISHES[1]}\n", encoding="utf-8")
+    job_file = tmp_path / "job.json"
+    parser = admin.build_parser()
+    common = ["--job-file", str(job_file), "--local-dir", str(tmp_path / "batches")]
+
+    try:
+        submit_args = parser.parse_args(["batch-submit", "--input", str(names_file), "--backend", "local", *common])
+        assert asyncio.run(admin.batch_submit(submit_args)) == 0
+        assert calls == []
+        job = read_batch_job_file(job_file)
+        assert [item.key for item in job.requests] == ["tag:0", "image:0", "tag:1", "image:1"]
+        assert set(job.batches) == {backend_main.GEMINI_MODEL, backend_main.GEMINI_IMAGE_MODEL}
+
+        collect_args = parser.parse_args(["batch-collect", "--poll-seconds", "0", *common])
+        assert asyncio.run(admin.batch_collect(collect_args)) == 0
+        assert sorted(calls) == sorted([backend_main.GEMINI_MODEL] * 2 + [backend_main.GEMINI_IMAGE_MODEL] * 2)
+
+        with backend_main.SessionLocal() as session:
+            dishes = {dish.name: dish for dish in session.scalars(select(Dish).where(Dish.name.in_(DISHES)))}
+            assert dishes[DISHES[0]].subtitle == "批处理简介"
+            assert dishes[DISHES[0]].tags_json["flavor"] == ["spicy"]
+            assert dishes[DISHES[0]].source == "batch_seed"
+            assert dishes[DISHES[0]].image_id
+            assert dishes[DISHES[1]].image_id is None
+            image = session.get(DishImage, dishes[DISHES[0]].image_id)
+            assert DISHES[0] in image.prompt
+            generation_job = session.get(GenerationJob, job.generation_job_id)
+            assert generation_job.status == "done"
+            assert generation_job.produced_count == 2
+            assert generation_job.details_json["batches"] == job.batches
+            assert generation_job.details_json["images"] == 1
+            assert list(generation_job.details_json["failures"]) == ["image:1"]
+
+        assert asyncio.run(admin.batch_collect(collect_args)) == 2
+    finally:
+        _cleanup()
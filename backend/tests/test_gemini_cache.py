@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.main as backend_main
+from app.db import Base
+from app.gemini_cache import GeminiResponseCache, gemini_cache_key, is_complete_response
+from app.models import GeminiResponseCacheEntry
+
+
+def _response(text: str) -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": text}]}, "finishReason": "STOP"}]}
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_cache_key_is_stable_across_key_order_and_model() -> None:
+    first = {"contents": [{"parts": [{"text": "宫保鸡丁"}]}], "generationConfig": {"temperature": 0.2, "topK": 1}}
+    reordered = {"generationConfig": {"topK": 1, "temperature": 0.2}, "contents": [{"parts": [{"text": "宫保鸡丁"}]}]}
+
+    assert gemini_cache_key("m", first) == gemini_cache_key("m", reordered)
+    assert gemini_cache_key("m", first) != gemini_cache_key("other", first)
+    json_payload = {"generationConfig": {"responseMimeType": "application/json"}}
+    assert is_complete_response(json_payload, _response('{"ok": true}'))
+    assert not is_complete_response(json_payload, _response("not json"))
+    assert not is_complete_response({}, {"candidates": [{"finishReason": "MAX_TOKENS", "content": {"parts": []}}]})
+
+
+def test_cache_expires_evicts_and_survives_restart_through_table(tmp_path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}", future=True)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+    clock = FakeClock()
+    cache = GeminiResponseCache(max_bytes=4096, ttl_seconds=60, session_factory=session_factory, clock=clock)
+
+    cache.put("a", model="m", response=_response("first"), latency_ms=800.0)
+    reader_threads: list[int] = []
+
+    def tracking_factory():
+        reader_threads.append(threading.get_ident())
+        return session_factory()
+
+    restarted = GeminiResponseCache(max_bytes=4096, ttl_seconds=60, session_factory=tracking_factory, clock=clock)
+
+    async def lookups() -> list[dict | None]:
+        found = [await cache.get("a"), await restarted.get("a"), await restarted.get("a")]
+        clock.now += 61
+        return [*found, await restarted.get("a"), await cache.get("a")]
+
+    assert asyncio.run(lookups()) == [_response("first")] * 3 + [None, None]
+    # Only the database lookups ran, both off the event loop's thread.
+    assert len(reader_threads) == 2 and threading.get_ident() not in reader_threads
+    stats = restarted.describe()
+    assert (stats["db_hits"], stats["memory_hits"], stats["lookups"]) == (1, 1, 3)
+    assert stats["saved_latency_ms"] == 1600.0
+    # The expired row is a miss, but deleting it is the cleanup job's work.
+    with session_factory() as session:
+        assert session.get(GeminiResponseCacheEntry, "a") is not None
+
+    small = GeminiResponseCache(max_bytes=150, ttl_seconds=60, clock=clock)
+    small.put("x", model="m", response=_response("x" * 20), latency_ms=1.0)
+    small.put("y", model="m", response=_response("y" * 20), latency_ms=1.0)
+    assert asyncio.run(small.get("x")) is None
+    assert asyncio.run(small.get("y")) is not None
+
+
+def test_cache_writes_happen_off_the_loop_and_never_fail_the_caller(tmp_path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}", future=True)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+    GeminiResponseCache(max_bytes=4096, ttl_seconds=60, session_factory=session_factory).put(
+        "a", model="m", response=_response("stale"), latency_ms=1.0
+    )
+    raced: list[bool] = []
+
+    def racing_factory():
+        # The first session misses the row another worker already stored.
+        session = session_factory()
+        if not raced:
+            raced.append(True)
+            session.get = lambda *_args, **_kwargs: None
+        return session
+
+    def broken_factory():
+        raise RuntimeError("database is down")
+
+    async def scenario() -> tuple[GeminiResponseCache, GeminiResponseCache]:
+        racing = GeminiResponseCache(max_bytes=4096, ttl_seconds=60, session_factory=racing_factory)
+        broken = GeminiResponseCache(max_bytes=4096, ttl_seconds=60, session_factory=broken_factory)
+        racing.put("a", model="m", response=_response("fresh"), latency_ms=2.0)
+        broken.put("b", model="m", response=_response("kept"), latency_ms=2.0)
+        assert await broken.get("b") == _response("kept")
+        await racing.flush()
+        await broken.flush()
+        return racing, broken
+
+    racing, broken = asyncio.run(scenario())
+    assert racing.describe()["write_errors"] == 0
+    assert broken.describe()["write_errors"] == 1
+    restarted = GeminiResponseCache(max_bytes=4096, ttl_seconds=60, session_factory=session_factory)
+    assert asyncio.run(restarted.get("a")) == _response("fresh")
+
+
+def test_call_gemini_api_caches_low_temperature_calls_only(monkeypatch) -> None:
+    cache = GeminiResponseCache(max_bytes=4096, ttl_seconds=60)
+    monkeypatch.setattr(backend_main, "GEMINI_RESPONSE_CACHE", cache)
+    monkeypatch.setattr(backend_main, "GEMINI_CACHE_ENABLED", True)
+    calls: list[dict] = []
+
+    async def fake_post(payload: dict, *, model: str, **_kwargs) -> dict:
+        calls.append(payload)
+        return _response('{"subtitle": "ok"}')
+
+    monkeypatch.setattr(backend_main, "_post_gemini_with_retries", fake_post)
+
+    async def run() -> None:
+        for _ in range(3):
+            await backend_main._call_gemini_json("tag 宫保鸡丁", temperature=0.25)
+        await backend_main._call_gemini_json("tag 宫保鸡丁", temperature=0.25, cache=False)
+        await backend_main._call_gemini_json("new deck", temperature=0.45)
+        await backend_main._call_gemini_json("new deck", temperature=0.45)
+        await backend_main._call_gemini_json("forced", temperature=0.9, cache=True)
+        await backend_main._call_gemini_json("forced", temperature=0.9, cache=True)
+
+    asyncio.run(run())
+
+    assert len(calls) == 5
+    stats = cache.describe()
+    assert stats["hits"] == 3
+    assert stats["bypassed"] == 3
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import uvicorn
+from fastapi import FastAPI
+
+import app.main as backend_main
+from app.gemini_client import GeminiHttpClient, GeminiTimeout, parse_model_timeouts
+
+DEFAULT_TIMEOUT = GeminiTimeout(connect=5.0, read=10.0)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+@contextmanager
+def _fake_gemini() -> Iterator[str]:
+    fake = FastAPI()
+
+    @fake.post("/v1beta/models/{model_action}")
+    async def generate(model_action: str) -> dict:
+        return {"candidates": [{"content": {"parts": [{"text": model_action}]}}]}
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(fake, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def test_parse_model_timeouts_overrides_read_and_connect() -> None:
+    profiles = parse_model_timeouts("image-model=120,20; text-model=15;broken=abc;", default=DEFAULT_TIMEOUT)
+
+    assert profiles == {
+        "image-model": GeminiTimeout(connect=20.0, read=120.0),
+        "text-model": GeminiTimeout(connect=5.0, read=15.0),
+    }
+    client = GeminiHttpClient(
+        base_url="http://example.invalid",
+        default_timeout=DEFAULT_TIMEOUT,
+        model_timeouts=profiles,
+    )
+    assert client.timeout_for("image-model").read == 120.0
+    assert client.timeout_for("other-model") == DEFAULT_TIMEOUT
+
+
+def test_shared_client_reuses_connections_for_gemini_calls(monkeypatch) -> None:
+    with _fake_gemini() as base_url:
+        client = GeminiHttpClient(base_url=base_url, default_timeout=DEFAULT_TIMEOUT, max_connections=2)
+        monkeypatch.setattr(backend_main, "GEMINI_HTTP_CLIENT", client)
+        monkeypatch.setattr(backend_main, "GEMINI_API_KEY", "test-key")
+
+        async def run() -> list[dict]:
+            try:
+                return [await backend_main._call_gemini_api({"contents": []}, model="fake-model") for _ in range(4)]
+            finally:
+                await client.aclose()
+
+        responses = asyncio.run(run())
+
+    assert backend_main._extract_first_text(responses[0]) == "fake-model:generateContent"
+    stats = client.describe()
+    assert stats["open"] is False
+    model_stats = stats["models"]["fake-model"]
+    assert model_stats["requests"] == 4
+    assert model_stats["new_connections"] == 1
+    assert model_stats["reused_connections"] == 3
+    assert model_stats["reuse_rate"] == 0.75
+    assert model_stats["checkout_wait_ms_max"] >= 0.0
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import httpx
+import pytest
+import uvicorn
+from fastapi import FastAPI
+
+import app.main as backend_main
+from app.gemini_cache import GeminiResponseCache
+from app.gemini_client import GeminiHttpClient, GeminiTimeout
+from app.gemini_context_cache import GeminiContextCache, is_cached_content_miss
+from app.gemini_limiter import GeminiLimiters, LimiterConfig
+from app.gemini_resilience import BreakerConfig, GeminiBreakers
+from app.gemini_usage import GeminiUsageRecorder
+from app.tagging import TAGGING_VERSION, build_tagging_prompt, tagging_prefix, tagging_prefix_key
+from scripts.fake_gemini import FakeGeminiConfig, build_app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+@contextmanager
+def _running(app: FastAPI) -> Iterator[str]:
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+@pytest.fixture
+def gemini_against(monkeypatch):
+    def configure(base_url: str) -> GeminiContextCache:
+        monkeypatch.setattr(
+            backend_main,
+            "GEMINI_HTTP_CLIENT",
+            GeminiHttpClient(base_url=base_url, default_timeout=GeminiTimeout(connect=2.0, read=5.0)),
+        )
+        monkeypatch.setattr(backend_main, "GEMINI_BREAKERS", GeminiBreakers(BreakerConfig()))
+        monkeypatch.setattr(backend_main, "GEMINI_LIMITERS", GeminiLimiters(LimiterConfig()))
+        monkeypatch.setattr(backend_main, "GEMINI_RESPONSE_CACHE", GeminiResponseCache(max_bytes=1 << 20, ttl_seconds=60))
+        monkeypatch.setattr(backend_main, "GEMINI_CACHE_ENABLED", False)
+        monkeypatch.setattr(backend_main, "GEMINI_USAGE", GeminiUsageRecorder(session_factory=None))
+        monkeypatch.setattr(backend_main, "GEMINI_API_KEY", "test-key")
+        context_cache = GeminiContextCache(
+            create=backend_main._create_gemini_cached_content,
+            delete=backend_main._delete_gemini_cached_content,
+        )
+        context_cache.register(tagging_prefix_key(), tagging_prefix())
+        monkeypatch.setattr(backend_main, "GEMINI_CONTEXT_CACHE", context_cache)
+        return context_cache
+
+    return configure
+
+
+def test_tagging_prompt_splits_into_static_prefix_and_dish_suffix() -> None:
+    key = tagging_prefix_key()
+    assert key.startswith(f"tagging-{TAGGING_VERSION}-") and key == tagging_prefix_key()
+    payload = backend_main._build_dish_tagging_payload("宫保鸡丁", cuisine_hint="sichuan")
+    suffix = payload["contents"][0]["parts"][0]["text"]
+    assert payload["systemInstruction"]["parts"][0]["text"] == tagging_prefix()
+    assert f"{tagging_prefix()}\n\n{suffix}" == build_tagging_prompt("宫保鸡丁", cuisine_hint="sichuan")
+    assert len(suffix) < 80 < 3000 < len(tagging_prefix())
+
+
+def test_tagging_calls_reference_one_cached_prefix(gemini_against) -> None:
+    fake_app = build_app(FakeGeminiConfig())
+    fake = fake_app.state.fake
+    with _running(fake_app) as base_url:
+        context_cache = gemini_against(base_url)
+
+        async def scenario() -> None:
+            try:
+                _, tags, _, _, _ = await backend_main._generate_dish_tags_with_gemini("宫保鸡丁")
+                assert tags.flavor
+                await backend_main._generate_dish_tags_with_gemini("提拉米苏")
+                tagged, failures = await backend_main._generate_dish_tags_batch_with_gemini(
+                    [("麻婆豆腐", "sichuan"), ("冬阴功虾汤", "thai")]
+                )
+                assert sorted(tagged) == [0, 1] and not failures
+                assert fake.describe()["cached_contents_created"] == 1
+                assert fake.describe()["cached_content_hits"] == 3
+
+                # An entry evicted upstream is resent inline once, then registered again.
+                fake.cached_contents.clear()
+                await backend_main._generate_dish_tags_with_gemini("鱼香肉丝")
+                await backend_main._generate_dish_tags_with_gemini("回锅肉")
+                await context_cache.aclose()
+            finally:
+                await backend_main.GEMINI_HTTP_CLIENT.aclose()
+
+        asyncio.run(scenario())
+
+    stats = context_cache.describe()
+    assert stats["created"] == 2 and stats["invalidated"] == 1
+    assert stats["hits"] == 5
+    assert stats["chars_saved"] == 4 * len(tagging_prefix())
+    assert fake.describe()["synthesized"] == 5
+    assert fake.cached_contents == {}
+
+
+def test_refused_prefix_falls_back_to_inline_prompt(gemini_against) -> None:
+    fake_app = build_app(FakeGeminiConfig(cache_min_tokens=100_000))
+    with _running(fake_app) as base_url:
+        context_cache = gemini_against(base_url)
+
+        async def scenario() -> None:
+            try:
+                for name in ("宫保鸡丁", "提拉米苏"):
+                    _, tags, _, _, _ = await backend_main._generate_dish_tags_with_gemini(name)
+                    assert tags.flavor
+            finally:
+                await backend_main.GEMINI_HTTP_CLIENT.aclose()
+
+        asyncio.run(scenario())
+
+    stats = context_cache.describe()
+    assert stats["create_failures"] == 1 and stats["fallbacks"] == 2 and stats["hits"] == 0
+    assert fake_app.state.fake.describe()["cached_content_hits"] == 0
+
+
+def test_only_a_missing_cached_content_is_resent_inline(gemini_against, monkeypatch) -> None:
+    fake_app = build_app(FakeGeminiConfig())
+    fake = fake_app.state.fake
+    with _running(fake_app) as base_url:
+        context_cache = gemini_against(base_url)
+        # No retries left: the inline resend must still happen.
+        monkeypatch.setattr(backend_main, "GEMINI_MAX_RETRIES", 1)
+        real_post = backend_main._post_gemini_once
+        sent: list[dict] = []
+
+        async def rejecting_post(path: str, **kwargs) -> httpx.Response:
+            sent.append(kwargs["payload"])
+            body = {"error": {"code": 400, "message": "Invalid JSON payload received.", "status": "INVALID_ARGUMENT"}}
+            return httpx.Response(400, json=body)
+
+        async def scenario() -> None:
+            try:
+                await backend_main._generate_dish_tags_with_gemini("宫保鸡丁")
+                fake.cached_contents.clear()
+                _, tags, _, _, _ = await backend_main._generate_dish_tags_with_gemini("鱼香肉丝")
+                assert tags.flavor
+
+                monkeypatch.setattr(backend_main, "_post_gemini_once", rejecting_post)
+                with pytest.raises(RuntimeError, match="HTTP 400"):
+                    await backend_main._generate_dish_tags_with_gemini("回锅肉")
+                monkeypatch.setattr(backend_main, "_post_gemini_once", real_post)
+                await context_cache.aclose()
+            finally:
+                await backend_main.GEMINI_HTTP_CLIENT.aclose()
+
+        asyncio.run(scenario())
+
+    assert [("cachedContent" in payload) for payload in sent] == [True]
+    stats = context_cache.describe()
+    assert stats["created"] == 2 and stats["invalidated"] == 1
+    assert is_cached_content_miss(404, '{"error": {"message": "CachedContent not found", "status": "NOT_FOUND"}}')
+    assert not is_cached_content_miss(404, '{"error": {"message": "models/x is not found", "status": "NOT_FOUND"}}')
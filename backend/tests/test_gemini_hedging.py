@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+import app.main as backend_main
+from app.gemini_cache import GeminiResponseCache
+from app.gemini_hedging import GeminiHedger, HedgeConfig
+
+
+def _response(text: str) -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": text}]}, "finishReason": "STOP"}]}
+
+
+class ScriptedCalls:
+    # Each call sleeps for the next scripted delay, then answers or raises.
+    def __init__(self, delays: list[float], *, fail: set[int] = frozenset()) -> None:
+        self.delays = list(delays)
+        self.fail = fail
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self) -> str:
+        index = self.started
+        self.started += 1
+        try:
+            await asyncio.sleep(self.delays[index])
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if index in self.fail:
+            raise RuntimeError(f"call {index} failed")
+        return f"answer-{index}"
+
+
+async def _warm_up(hedger: GeminiHedger, endpoint: str, count: int) -> None:
+    calls = ScriptedCalls([0.005] * count)
+    for _ in range(count):
+        await hedger.run(endpoint=endpoint, model="m", factory=calls)
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled() -> None:
+    hedger = GeminiHedger(HedgeConfig(percentile=0.9, min_samples=5, budget_per_minute=5, min_delay_seconds=0.02))
+
+    async def run() -> tuple[str, ScriptedCalls]:
+        await _warm_up(hedger, "menu_chat", 5)
+        calls = ScriptedCalls([1.0, 0.01])
+        result = await hedger.run(endpoint="menu_chat", model="m", factory=calls)
+        await asyncio.sleep(0)
+        return result, calls
+
+    result, calls = asyncio.run(run())
+
+    assert result == "answer-1"
+    assert (calls.started, calls.cancelled) == (2, 1)
+    stats = hedger.describe()["endpoints"]["menu_chat"]
+    assert (stats["calls"], stats["cold"], stats["hedged"], stats["hedge_wins"]) == (6, 5, 1, 1)
+    assert stats["win_rate"] == 1.0
+    assert hedger.describe()["budget_remaining"] == 4
+    # The cancelled primary counts with its time until the hedge won
+    # (the 20 ms hedge delay plus the hedge's 10 ms), not the hedge's own.
+    assert hedger.describe()["delays_ms"]["menu_chat:m"] >= 30.0
+
+
+def test_budget_caps_hedges_and_failed_hedge_falls_back_to_primary() -> None:
+    hedger = GeminiHedger(HedgeConfig(percentile=0.5, min_samples=3, budget_per_minute=1, min_delay_seconds=0.01))
+
+    async def run() -> tuple[list[str], ScriptedCalls, ScriptedCalls]:
+        await _warm_up(hedger, "taste_analyze", 3)
+        hedged = ScriptedCalls([0.1, 0.01], fail={1})
+        first = await hedger.run(endpoint="taste_analyze", model="m", factory=hedged)
+        denied = ScriptedCalls([0.1])
+        second = await hedger.run(endpoint="taste_analyze", model="m", factory=denied)
+        failing = ScriptedCalls([0.05], fail={0})
+        with pytest.raises(RuntimeError, match="call 0 failed"):
+            await hedger.run(endpoint="taste_analyze", model="m", factory=failing)
+        return [first, second], hedged, denied
+
+    results, hedged, denied = asyncio.run(run())
+
+    assert results == ["answer-0", "answer-0"]
+    assert hedged.started == 2
+    assert denied.started == 1
+    stats = hedger.describe()["endpoints"]["taste_analyze"]
+    assert (stats["hedged"], stats["hedge_wins"], stats["budget_denied"]) == (1, 0, 2)
+    assert stats["hedge_rate"] == pytest.approx(1 / 6, abs=1e-4)
+
+
+def test_call_gemini_api_hedges_named_endpoints_once_for_coalesced_callers(monkeypatch) -> None:
+    hedger = GeminiHedger(HedgeConfig(percentile=0.9, min_samples=2, budget_per_minute=5, min_delay_seconds=0.02))
+    monkeypatch.setattr(backend_main, "GEMINI_HEDGER", hedger)
+    monkeypatch.setattr(backend_main, "GEMINI_HEDGE_ENABLED", True)
+    monkeypatch.setattr(backend_main, "GEMINI_RESPONSE_CACHE", GeminiResponseCache(max_bytes=4096, ttl_seconds=60))
+    delays = [0.005, 0.005, 1.0, 0.01, 1.0]
+    upstream_calls: list[float] = []
+
+    async def fake_post(payload: dict, *, model: str, **_kwargs) -> dict:
+        delay = delays[len(upstream_calls)]
+        upstream_calls.append(delay)
+        await asyncio.sleep(delay)
+        return _response(f'{{"reply": "{delay}"}}')
+
+    monkeypatch.setattr(backend_main, "_post_gemini_with_retries", fake_post)
+
+    async def run() -> list[dict]:
+        for index in range(2):
+            payload = {"contents": [{"parts": [{"text": f"warm {index}"}]}], "generationConfig": {"temperature": 0.9}}
+            await backend_main._call_gemini_api(payload, model="m", hedge="menu_chat")
+        slow = {"contents": [{"parts": [{"text": "slow"}]}], "generationConfig": {"temperature": 0.9}}
+        results = await asyncio.gather(
+            *(backend_main._call_gemini_api(slow, model="m", hedge="menu_chat") for _ in range(3))
+        )
+        # Bulk callers never hedge, even for a model the hedger has learned.
+        await backend_main._call_gemini_api(slow, model="m")
+        return results
+
+    results = asyncio.run(run())
+
+    assert all(backend_main._extract_first_text(raw) == '{"reply": "0.01"}' for raw in results)
+    assert upstream_calls == delays
+    stats = hedger.describe()["endpoints"]["menu_chat"]
+    assert (stats["calls"], stats["hedged"], stats["hedge_wins"]) == (3, 1, 1)
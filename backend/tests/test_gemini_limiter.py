@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.gemini_limiter import AdaptiveLimiter, CallOutcome, GeminiPriority, LimiterConfig
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_waiters_are_served_by_priority_then_arrival() -> None:
+    limiter = AdaptiveLimiter("m", LimiterConfig(initial=1, maximum=1))
+    order: list[str] = []
+
+    async def worker(label: str, priority: GeminiPriority) -> None:
+        slot = await limiter.acquire(priority)
+        order.append(label)
+        limiter.release(slot, outcome=CallOutcome.OK)
+
+    async def run() -> None:
+        held = await limiter.acquire(GeminiPriority.BULK)
+        tasks = [
+            asyncio.create_task(worker("bulk-1", GeminiPriority.BULK)),
+            asyncio.create_task(worker("analysis", GeminiPriority.ANALYSIS)),
+            asyncio.create_task(worker("bulk-2", GeminiPriority.BULK)),
+            asyncio.create_task(worker("menu", GeminiPriority.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert limiter.queue_depth() == 4
+        assert limiter.queue_depth(GeminiPriority.BULK) == 2
+        limiter.release(held, outcome=CallOutcome.OK)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    assert order == ["menu", "analysis", "bulk-1", "bulk-2"]
+    stats = limiter.describe()["priorities"]
+    assert stats["bulk"]["acquired"] == 3
+    assert stats["interactive"]["waited"] == 1
+
+
+def test_window_grows_additively_and_halves_once_per_window() -> None:
+    clock = FakeClock()
+    limiter = AdaptiveLimiter("m", LimiterConfig(initial=4, maximum=8, latency_warmup=3), clock=clock)
+
+    async def run() -> None:
+        for _ in range(4):
+            limiter.release(await limiter.acquire(), outcome=CallOutcome.OK, latency_ms=100.0)
+        assert limiter.limit == pytest.approx(4.92, abs=0.01)
+
+        window = [await limiter.acquire() for _ in range(3)]
+        clock.now += 1
+        for slot in window:
+            limiter.release(slot, outcome=CallOutcome.THROTTLED)
+        assert limiter.decreases == 1
+        assert limiter.limit == pytest.approx(2.46, abs=0.01)
+
+        clock.now += 1
+        slot = await limiter.acquire()
+        limiter.release(slot, outcome=CallOutcome.OK, latency_ms=5_000.0)
+
+    asyncio.run(run())
+
+    assert limiter.decreases == 2
+    assert limiter.limit == pytest.approx(1.23, abs=0.01)
+    assert limiter.describe()["throttled"] == 3
+
+
+def test_cancelled_waiter_leaves_the_queue_without_leaking_a_slot() -> None:
+    limiter = AdaptiveLimiter("m", LimiterConfig(initial=1, maximum=1))
+
+    async def run() -> None:
+        held = await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire(GeminiPriority.INTERACTIVE))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.queue_depth() == 0
+        limiter.release(held, outcome=CallOutcome.OK)
+        assert limiter.in_flight == 0
+        limiter.release(await limiter.acquire(), outcome=CallOutcome.OK)
+
+    asyncio.run(run())
+
+    assert limiter.in_flight == 0
+    assert limiter.describe()["priorities"]["interactive"]["cancelled"] == 1
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator
+
+import pytest
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+import app.main as backend_main
+from app.gemini_client import GeminiHttpClient, GeminiTimeout
+from app.gemini_limiter import GeminiLimiters, LimiterConfig
+from app.gemini_resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    BreakerConfig,
+    CircuitBreaker,
+    CircuitOpenError,
+    GeminiBreakers,
+    decorrelated_jitter,
+    parse_retry_after,
+)
+
+HEADERS = {
+    "X-Device-ID": "9f2f89f1-45f9-4d45-9249-7e0d67f8d5e1",
+    "X-Client-Version": "1.0.0",
+}
+ANALYSIS_TEXT = '{"summary": "偏爱辣味", "avoid": "少油", "strategy": "先点招牌"}'
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FlakyUpstream:
+    # Serves scripted failures first, then healthy Gemini responses.
+    def __init__(self) -> None:
+        self.failures: list[tuple[int, dict[str, str]]] = []
+        self.always_fail: int | None = None
+        self.hits = 0
+        self.app = FastAPI()
+        self.app.post("/v1beta/models/{model_action}")(self.generate)
+
+    async def generate(self, model_action: str) -> JSONResponse:
+        self.hits += 1
+        if self.always_fail is not None:
+            return JSONResponse({"error": "degraded"}, status_code=self.always_fail)
+        if self.failures:
+            status, headers = self.failures.pop(0)
+            return JSONResponse({"error": "injected"}, status_code=status, headers=headers)
+        return JSONResponse({"candidates": [{"content": {"parts": [{"text": ANALYSIS_TEXT}]}}]})
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+@contextmanager
+def _running(upstream: FlakyUpstream) -> Iterator[str]:
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(upstream.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+@pytest.fixture
+def gemini_against(monkeypatch):
+    def configure(base_url: str, *, breaker: BreakerConfig) -> GeminiBreakers:
+        breakers = GeminiBreakers(breaker)
+        monkeypatch.setattr(
+            backend_main,
+            "GEMINI_HTTP_CLIENT",
+            GeminiHttpClient(base_url=base_url, default_timeout=GeminiTimeout(connect=2.0, read=5.0)),
+        )
+        monkeypatch.setattr(backend_main, "GEMINI_BREAKERS", breakers)
+        monkeypatch.setattr(backend_main, "GEMINI_LIMITERS", GeminiLimiters(LimiterConfig()))
+        monkeypatch.setattr(backend_main, "GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(backend_main, "GEMINI_CACHE_ENABLED", False)
+        monkeypatch.setattr(backend_main, "GEMINI_BACKOFF_BASE_SECONDS", 0.01)
+        monkeypatch.setattr(backend_main, "GEMINI_BACKOFF_CAP_SECONDS", 0.02)
+        backend_main.RATE_LIMIT_BUCKETS.clear()
+        return breakers
+
+    return configure
+
+
+def test_breaker_opens_on_error_rate_and_recovers_through_half_open() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker("m", BreakerConfig(min_requests=4, failure_rate=0.5, open_seconds=10), clock=clock)
+    for failed in (False, False, True):
+        breaker.before_call()
+        breaker.record(failed=failed)
+    assert breaker.state == CLOSED
+
+    breaker.before_call()
+    breaker.record(failed=True, retry_after=20)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after == pytest.approx(20)
+
+    clock.now += 20
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(failed=False)
+    assert breaker.state == CLOSED
+    assert breaker.describe()["opened"] == 1
+
+
+def test_retry_after_parsing_and_decorrelated_jitter_bounds() -> None:
+    now = datetime(2026, 10, 17, 12, 0, 0, tzinfo=timezone.utc)
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("Sat, 17 Oct 2026 12:00:30 GMT", now=now) == 30.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+    rng = random.Random(7)
+    delay = 0.5
+    for _ in range(50):
+        delay = decorrelated_jitter(delay, base=0.5, cap=8.0, rng=rng)
+        assert 0.5 <= delay <= 8.0
+
+
+def test_retries_wait_for_upstream_retry_after(gemini_against) -> None:
+    upstream = FlakyUpstream()
+    upstream.failures = [(503, {"Retry-After": "0.3"})]
+    with _running(upstream) as base_url:
+        gemini_against(base_url, breaker=BreakerConfig(min_requests=10))
+
+        async def run() -> tuple[dict, float]:
+            started = time.perf_counter()
+            try:
+                raw = await backend_main._call_gemini_json("analyze", temperature=0.9)
+            finally:
+                await backend_main.GEMINI_HTTP_CLIENT.aclose()
+            return raw, time.perf_counter() - started
+
+        raw, elapsed = asyncio.run(run())
+
+    assert backend_main._extract_first_text(raw) == ANALYSIS_TEXT
+    assert upstream.hits == 2
+    assert elapsed >= 0.3
+
+
+def test_call_budget_stops_retries_that_would_outlive_it(gemini_against, monkeypatch) -> None:
+    upstream = FlakyUpstream()
+    upstream.failures = [(429, {"Retry-After": "30"})]
+    with _running(upstream) as base_url:
+        gemini_against(base_url, breaker=BreakerConfig(min_requests=10))
+        monkeypatch.setattr(backend_main, "GEMINI_CALL_BUDGET_SECONDS", 5.0)
+
+        async def run() -> float:
+            started = time.perf_counter()
+            try:
+                with pytest.raises(RuntimeError, match="HTTP 429"):
+                    await backend_main._call_gemini_json("analyze", temperature=0.9)
+            finally:
+                await backend_main.GEMINI_HTTP_CLIENT.aclose()
+            return time.perf_counter() - started
+
+        elapsed = asyncio.run(run())
+
+    assert upstream.hits == 1
+    assert elapsed < 1.0
+
+
+def test_open_circuit_fails_fast_with_503_and_retry_after(gemini_against, monkeypatch) -> None:
+    upstream = FlakyUpstream()
+    upstream.always_fail = 500
+    monkeypatch.setattr(backend_main, "GEMINI_MAX_RETRIES", 2)
+    with _running(upstream) as base_url:
+        breakers = gemini_against(base_url, breaker=BreakerConfig(min_requests=3, failure_rate=0.5, open_seconds=0.5))
+        with TestClient(backend_main.app) as client:
+            first = client.post("/v1/taste/analyze", json={}, headers=HEADERS)
+            assert first.status_code == 502
+
+            second = client.post("/v1/taste/analyze", json={}, headers=HEADERS)
+            assert second.status_code == 503
+            assert second.json()["code"] == "gemini_unavailable"
+            assert second.headers["retry-after"] == "1"
+            hits_when_open = upstream.hits
+            assert hits_when_open == 3
+
+            started = time.perf_counter()
+            third = client.post("/v1/taste/analyze", json={}, headers=HEADERS)
+            assert third.status_code == 503
+            assert time.perf_counter() - started < 0.2
+            assert upstream.hits == hits_when_open
+
+            upstream.always_fail = None
+            time.sleep(0.55)
+            recovered = client.post("/v1/taste/analyze", json={}, headers=HEADERS)
+            assert recovered.status_code == 200
+            assert recovered.json()["summary"] == "偏爱辣味"
+
+    breaker = breakers.for_model(backend_main.GEMINI_MODEL).describe()
+    assert breaker["state"] == CLOSED
+    assert breaker["opened"] == 1
+    assert breaker["rejected"] == 2
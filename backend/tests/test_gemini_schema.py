@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import app.main as backend_main
+from app.gemini_schema import FormatRetryStats
+from app.tagging import CANONICAL_TAGS
+
+
+def _keys(node: object) -> set[str]:
+    if isinstance(node, dict):
+        return set(node) | {key for value in node.values() for key in _keys(value)}
+    if isinstance(node, list):
+        return {key for value in node for key in _keys(value)}
+    return set()
+
+
+def _response(payload: dict) -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": json.dumps(payload, ensure_ascii=False)}]}}]}
+
+
+def test_response_schemas_follow_the_pydantic_models() -> None:
+    menu = backend_main.MENU_RECOMMEND_SCHEMA
+    assert menu["propertyOrdering"] == ["reply", "recommendations"]
+    recommendations = menu["properties"]["recommendations"]
+    assert recommendations["minItems"] == recommendations["maxItems"] == 5
+    item = recommendations["items"]
+    assert item["properties"]["style"] == {"type": "STRING", "enum": ["conservative", "balanced", "adventurous"]}
+    assert item["properties"]["match_score"] == {"type": "INTEGER", "minimum": 0, "maximum": 100}
+    assert set(item["required"]) == set(item["properties"])
+
+    assert backend_main.ANALYZE_SCHEMA["propertyOrdering"] == ["summary", "avoid", "strategy"]
+    tags = backend_main.TAGGING_SCHEMA["properties"]["tags"]["properties"]
+    assert tags["cuisine"]["items"]["enum"] == CANONICAL_TAGS["cuisine"]
+    deck_tags = backend_main.DECK_SCHEMA["properties"]["dishes"]["items"]["properties"]["tags"]
+    assert deck_tags["properties"]["flavor"]["items"]["enum"] == CANONICAL_TAGS["flavor"]
+
+    schemas = [backend_main.MENU_CHAT_SCHEMA, menu, backend_main.DECK_SCHEMA, backend_main.BATCH_TAGGING_SCHEMA]
+    assert not _keys(schemas) & {"$ref", "$defs", "title", "default", "additionalProperties"}
+
+
+def test_extract_json_prefers_plain_json() -> None:
+    assert backend_main._extract_json('{"reply": "花括号 } 在字符串里"}') == {"reply": "花括号 } 在字符串里"}
+    assert backend_main._extract_json('好的：\n```json\n{"reply": "x"}\n```') == {"reply": "x"}
+
+
+def test_menu_recommend_counts_format_retries(monkeypatch) -> None:
+    stats = FormatRetryStats()
+    monkeypatch.setattr(backend_main, "GEMINI_FORMAT_RETRIES", stats)
+    styles = ["conservative", "balanced", "balanced", "adventurous", "conservative"]
+    good = {
+        "reply": "推荐这些",
+        "recommendations": [
+            {"name": f"菜{index}", "original_name": "", "reason": "合口味", "match_score": 80, "style": style}
+            for index, style in enumerate(styles)
+        ],
+    }
+    short = {"reply": "推荐这些", "recommendations": good["recommendations"][:4]}
+    answers = [good, short, good]
+    payloads: list[dict] = []
+
+    async def fake_call(payload: dict, *, model: str, **_kwargs) -> dict:
+        payloads.append(payload)
+        return _response(answers.pop(0))
+
+    monkeypatch.setattr(backend_main, "_call_gemini_api", fake_call)
+    req = backend_main.MenuChatRequest(mode="recommend", message="推荐", images=[{"data_base64": "aGVsbG8="}])
+
+    async def scenario() -> None:
+        first = await backend_main._menu_chat_with_gemini(req)
+        second = await backend_main._menu_chat_with_gemini(req)
+        assert len(first.recommendations) == len(second.recommendations) == 5
+        await backend_main._menu_chat_with_gemini(backend_main.MenuChatRequest(mode="chat", message="辣吗"))
+
+    answers.append({"reply": "不辣"})
+    asyncio.run(scenario())
+
+    assert len(payloads) == 4
+    assert payloads[0]["generationConfig"]["responseSchema"] == backend_main.MENU_RECOMMEND_SCHEMA
+    assert payloads[3]["generationConfig"]["responseSchema"] == backend_main.MENU_CHAT_SCHEMA
+    # The short answer is repaired with a text-only follow-up rather than retried.
+    assert "inlineData" not in json.dumps(payloads[2])
+    described = stats.describe()["menu_recommend"]
+    assert (described["calls"], described["retries"], described["repairs"]) == (2, 0, 1)
+    assert set(described["followups"]) == {"repair"}
+
+
+def _recommendation(name: str, style: str, score: int = 80) -> dict:
+    return {"name": name, "original_name": "", "reason": "合口味", "match_score": score, "style": style}
+
+
+def test_menu_recommend_repair_asks_only_for_the_missing_style(monkeypatch) -> None:
+    stats = FormatRetryStats()
+    monkeypatch.setattr(backend_main, "GEMINI_FORMAT_RETRIES", stats)
+    # Five items but nothing adventurous: the weakest balanced one makes room.
+    first = {
+        "reply": "推荐这些",
+        "recommendations": [
+            _recommendation("宫保鸡丁", "conservative", 90),
+            _recommendation("麻婆豆腐", "conservative", 85),
+            _recommendation("鱼香肉丝", "balanced", 70),
+            _recommendation("回锅肉", "balanced", 60),
+            _recommendation("水煮鱼", "balanced", 75),
+        ],
+    }
+    complete = {
+        "reply": "推荐这些",
+        "recommendations": first["recommendations"][:4] + [_recommendation("毛血旺", "adventurous")],
+    }
+    answers = [
+        _response(first),
+        # The first repair repeats a kept dish, so the full call is retried.
+        {**_response({"recommendations": [_recommendation("宫保鸡丁", "adventurous")]}), "usageMetadata": {"promptTokenCount": 300}},
+        {**_response(complete), "usageMetadata": {"promptTokenCount": 1500}},
+        _response(first),
+        _response({"recommendations": [_recommendation("毛血旺", "adventurous")]}),
+    ]
+    payloads: list[dict] = []
+
+    async def fake_call(payload: dict, *, model: str, **_kwargs) -> dict:
+        payloads.append(payload)
+        return answers.pop(0)
+
+    monkeypatch.setattr(backend_main, "_call_gemini_api", fake_call)
+    req = backend_main.MenuChatRequest(mode="recommend", message="推荐", images=[{"data_base64": "aGVsbG8="}])
+
+    async def scenario() -> tuple:
+        retried = await backend_main._menu_chat_with_gemini(req)
+        repaired = await backend_main._menu_chat_with_gemini(req)
+        return retried, repaired
+
+    retried, repaired = asyncio.run(scenario())
+
+    assert len(retried.recommendations) == 5
+    assert [item.name for item in repaired.recommendations] == ["宫保鸡丁", "麻婆豆腐", "鱼香肉丝", "水煮鱼", "毛血旺"]
+    repair = payloads[4]
+    assert [content["role"] for content in repair["contents"]] == ["user", "model", "user"]
+    assert "inlineData" not in json.dumps(repair) and "inlineData" in json.dumps(payloads[0])
+    instruction = repair["contents"][2]["parts"][0]["text"]
+    assert "只补充 1 道" in instruction and "adventurous" in instruction and "鱼香肉丝" in instruction
+    assert "回锅肉" not in instruction
+    assert repair["generationConfig"]["responseSchema"]["properties"]["recommendations"]["maxItems"] == 1
+
+    described = stats.describe()["menu_recommend"]
+    assert (described["calls"], described["retries"], described["repairs"]) == (2, 1, 1)
+    followups = described["followups"]
+    assert followups["repair"]["calls"] == 2 and followups["full_retry"]["calls"] == 1
+    assert followups["full_retry"]["avg_prompt_tokens"] == 1500
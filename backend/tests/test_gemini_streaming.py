@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import pytest
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import app.main as backend_main
+from app.gemini_cache import GeminiResponseCache
+from app.gemini_client import GeminiHttpClient, GeminiTimeout
+from app.gemini_limiter import GeminiLimiters, LimiterConfig
+from app.gemini_resilience import BreakerConfig, GeminiBreakers
+from app.gemini_stream import JsonFieldStreamer, StreamingStats
+
+HEADERS = {
+    "X-Device-ID": "9f2f89f1-45f9-4d45-9249-7e0d67f8d5e1",
+    "X-Client-Version": "1.0.0",
+}
+MENU_ANSWER = {
+    "reply": "推荐这五道，\"招牌\"优先 😀",
+    "recommendations": [
+        {"name": f"菜{index}", "reason": "口味匹配", "match_score": 80, "style": style}
+        for index, style in enumerate(["conservative", "balanced", "balanced", "adventurous", "conservative"])
+    ],
+}
+ANALYSIS_ANSWER = {"summary": "偏爱辣味", "avoid": "少油", "strategy": "先点招牌"}
+
+
+class StreamingUpstream:
+    # Streams the answer JSON (escaped to ASCII, so \\u sequences get split
+    # across events) in small pieces with a pause before the last one.
+    def __init__(self, answer: dict, *, final_pause: float = 0.3) -> None:
+        self.text = json.dumps(answer, ensure_ascii=True)
+        self.final_pause = final_pause
+        self.hits = 0
+        self.app = FastAPI()
+        self.app.post("/v1beta/models/{model_action}")(self.generate)
+
+    async def generate(self, model_action: str, request: Request) -> StreamingResponse:
+        assert model_action.endswith(":streamGenerateContent")
+        assert request.query_params.get("alt") == "sse"
+        self.hits += 1
+        pieces = [self.text[index : index + 7] for index in range(0, len(self.text), 7)]
+
+        async def events():
+            for index, piece in enumerate(pieces):
+                chunk: dict = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}]}
+                if index == len(pieces) - 1:
+                    await asyncio.sleep(self.final_pause)
+                    chunk["candidates"][0]["finishReason"] = "STOP"
+                    chunk["usageMetadata"] = {"promptTokenCount": 12, "candidatesTokenCount": 34}
+                yield f"data: {json.dumps(chunk)}\r\n\r\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+@contextmanager
+def _running(upstream: StreamingUpstream) -> Iterator[str]:
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(upstream.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def _read_events(response) -> list[tuple[str, dict]]:
+    events = []
+    for block in response.text.split("\n\n"):
+        if not block.strip():
+            continue
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def gemini_against(monkeypatch):
+    def configure(base_url: str) -> None:
+        monkeypatch.setattr(
+            backend_main,
+            "GEMINI_HTTP_CLIENT",
+            GeminiHttpClient(base_url=base_url, default_timeout=GeminiTimeout(connect=2.0, read=5.0)),
+        )
+        monkeypatch.setattr(backend_main, "GEMINI_BREAKERS", GeminiBreakers(BreakerConfig()))
+        monkeypatch.setattr(backend_main, "GEMINI_LIMITERS", GeminiLimiters(LimiterConfig()))
+        monkeypatch.setattr(backend_main, "GEMINI_RESPONSE_CACHE", GeminiResponseCache(max_bytes=1 << 20, ttl_seconds=60))
+        monkeypatch.setattr(backend_main, "GEMINI_CACHE_ENABLED", True)
+        monkeypatch.setattr(backend_main, "GEMINI_STREAM_STATS", StreamingStats())
+        monkeypatch.setattr(backend_main, "GEMINI_API_KEY", "test-key")
+        backend_main.RATE_LIMIT_BUCKETS.clear()
+
+    return configure
+
+
+def test_json_field_streamer_decodes_split_escapes_and_ignores_nested_keys() -> None:
+    text = json.dumps(
+        {"items": [{"reply": "nested"}], "reply": "第一行\n\"引号\" 😀", "other": "x"},
+        ensure_ascii=True,
+    )
+    streamer = JsonFieldStreamer(["reply"])
+    deltas = []
+    for char in text:
+        deltas.extend(streamer.feed(char))
+
+    assert {field for field, _ in deltas} == {"reply"}
+    assert "".join(delta for _, delta in deltas) == "第一行\n\"引号\" 😀"
+    assert JsonFieldStreamer(["reply"]).feed('{"reply": "a\\u4e2') == [("reply", "a")]
+
+
+def test_menu_chat_streams_reply_then_validated_recommendations(gemini_against) -> None:
+    upstream = StreamingUpstream(MENU_ANSWER)
+    with _running(upstream) as base_url:
+        gemini_against(base_url)
+        with TestClient(backend_main.app) as client:
+            response = client.post(
+                "/v1/menu/chat",
+                json={"mode": "recommend", "message": "推荐", "images": [{"data_base64": "aGVsbG8="}], "stream": True},
+                headers=HEADERS,
+            )
+            health = client.get("/health").json()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _read_events(response)
+    names = [name for name, _ in events]
+    assert names[-2:] == ["recommendations", "done"]
+    assert set(names[:-2]) == {"delta"}
+    assert len(names) > 3
+    assert "".join(data["text"] for name, data in events if name == "delta") == MENU_ANSWER["reply"]
+
+    recommendations = events[-2][1]["recommendations"]
+    assert [item["name"] for item in recommendations] == [f"菜{index}" for index in range(5)]
+    done = events[-1][1]
+    assert done["response"]["reply"] == MENU_ANSWER["reply"]
+    assert done["response"]["mode"] == "recommend"
+    # The reply was forwarded well before the upstream's final pause ended.
+    assert done["ttft_ms"] + 200 < done["total_ms"]
+    assert health["gemini_streaming"]["menu_chat"]["completed"] == 1
+    assert health["gemini_limiters"][backend_main.GEMINI_MODEL]["in_flight"] == 0
+
+
+def test_analyze_stream_caches_the_assembled_answer(gemini_against) -> None:
+    upstream = StreamingUpstream(ANALYSIS_ANSWER, final_pause=0.0)
+    with _running(upstream) as base_url:
+        gemini_against(base_url)
+        with TestClient(backend_main.app) as client:
+            first = client.post("/v1/taste/analyze", json={"stream": True}, headers=HEADERS)
+            second = client.post("/v1/taste/analyze", json={"stream": True}, headers=HEADERS)
+            plain = client.post("/v1/taste/analyze", json={}, headers=HEADERS)
+
+    first_events = _read_events(first)
+    fields = {data["field"] for name, data in first_events if name == "delta"}
+    assert fields == {"summary", "avoid", "strategy"}
+    assert first_events[-1][0] == "done"
+    assert first_events[-1][1]["response"]["summary"] == "偏爱辣味"
+
+    second_events = _read_events(second)
+    assert second_events[-1][1]["response"] == first_events[-1][1]["response"]
+    assert plain.json()["strategy"] == "先点招牌"
+    assert upstream.hits == 1
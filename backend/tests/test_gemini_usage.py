@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import pytest
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.orm import sessionmaker
+
+import app.main as backend_main
+from app.gemini_cache import GeminiResponseCache
+from app.gemini_client import GeminiHttpClient, GeminiTimeout
+from app.gemini_limiter import GeminiLimiters, LimiterConfig
+from app.gemini_resilience import BreakerConfig, GeminiBreakers
+from app.db import Base
+from app.gemini_usage import (
+    GeminiUsageRecord,
+    GeminiUsageRecorder,
+    gemini_caller,
+    usage_token_counts,
+    write_usage_records,
+)
+from app.models import GeminiUsageEvent, GeminiUsageHourly
+
+HEADERS = {
+    "X-Device-ID": "9f2f89f1-45f9-4d45-9249-7e0d67f8d5e1",
+    "X-Client-Version": "1.0.0",
+}
+ANALYSIS_ANSWER = {"summary": "偏爱辣味", "avoid": "少油", "strategy": "先点招牌"}
+USAGE = {
+    "promptTokenCount": 1300,
+    "candidatesTokenCount": 40,
+    "promptTokensDetails": [{"modality": "TEXT", "tokenCount": 10}, {"modality": "IMAGE", "tokenCount": 1290}],
+    "candidatesTokensDetails": [{"modality": "TEXT", "tokenCount": 40}],
+}
+
+
+def _upstream() -> FastAPI:
+    upstream = FastAPI()
+
+    @upstream.post("/v1beta/models/{model_action}")
+    async def generate(model_action: str, request: Request):
+        model, action = model_action.split(":", 1)
+        if model == "broken":
+            return JSONResponse({"error": {"message": "bad request"}}, status_code=400)
+        body = {
+            "candidates": [{"content": {"parts": [{"text": json.dumps(ANALYSIS_ANSWER)}]}, "finishReason": "STOP"}],
+            "usageMetadata": USAGE,
+        }
+        if action == "streamGenerateContent":
+
+            async def events():
+                yield f"data: {json.dumps(body)}\r\n\r\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+        return body
+
+    return upstream
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+@contextmanager
+def _running(app: FastAPI) -> Iterator[str]:
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def _clear_usage() -> None:
+    with backend_main.SessionLocal() as session:
+        session.execute(delete(GeminiUsageEvent))
+        session.execute(delete(GeminiUsageHourly))
+        session.commit()
+
+
+@pytest.fixture
+def usage_against(monkeypatch):
+    recorder = GeminiUsageRecorder(session_factory=backend_main.SessionLocal, flush_interval_seconds=60)
+
+    def configure(base_url: str) -> GeminiUsageRecorder:
+        monkeypatch.setattr(
+            backend_main,
+            "GEMINI_HTTP_CLIENT",
+            GeminiHttpClient(base_url=base_url, default_timeout=GeminiTimeout(connect=2.0, read=5.0)),
+        )
+        monkeypatch.setattr(backend_main, "GEMINI_BREAKERS", GeminiBreakers(BreakerConfig()))
+        monkeypatch.setattr(backend_main, "GEMINI_LIMITERS", GeminiLimiters(LimiterConfig()))
+        monkeypatch.setattr(backend_main, "GEMINI_RESPONSE_CACHE", GeminiResponseCache(max_bytes=1 << 20, ttl_seconds=60))
+        monkeypatch.setattr(backend_main, "GEMINI_CACHE_ENABLED", False)
+        monkeypatch.setattr(backend_main, "GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(backend_main, "GEMINI_USAGE", recorder)
+        monkeypatch.setattr(backend_main, "ADMIN_API_KEY", "admin-secret")
+        backend_main.RATE_LIMIT_BUCKETS.clear()
+        return recorder
+
+    backend_main.init_db()
+    _clear_usage()
+    yield configure
+    _clear_usage()
+
+
+def test_usage_token_counts_split_out_image_tokens() -> None:
+    assert usage_token_counts(USAGE) == (1300, 40, 1290)
+    assert usage_token_counts({"candidatesTokenCount": "7"}) == (0, 7, 0)
+    assert usage_token_counts(None) == (0, 0, 0)
+
+
+def test_calls_are_recorded_and_rolled_up_per_caller(usage_against) -> None:
+    with _running(_upstream()) as base_url:
+        recorder = usage_against(base_url)
+
+        async def scenario() -> None:
+            try:
+                with gemini_caller("admin:seed-names"):
+                    await backend_main._call_gemini_json("你好", temperature=0.2)
+                    await backend_main._call_gemini_json("再来", temperature=0.2)
+                    with pytest.raises(RuntimeError):
+                        await backend_main._call_gemini_api({"contents": []}, model="broken", cache=False)
+                await recorder.flush()
+            finally:
+                await backend_main.GEMINI_HTTP_CLIENT.aclose()
+
+        asyncio.run(scenario())
+
+        with TestClient(backend_main.app) as client:
+            plain = client.post("/v1/taste/analyze", json={}, headers=HEADERS)
+            streamed = client.post("/v1/taste/analyze", json={"stream": True}, headers=HEADERS)
+            denied = client.get("/admin/gemini/usage", headers={"X-API-Key": "wrong"})
+            summary = client.get("/admin/gemini/usage", params={"hours": 2}, headers={"X-API-Key": "admin-secret"})
+            by_model = client.get("/admin/gemini/usage", params={"group_by": "model"}, headers={"X-API-Key": "admin-secret"})
+
+    assert plain.status_code == 200 and streamed.status_code == 200
+    assert denied.status_code == 401
+
+    with backend_main.SessionLocal() as session:
+        events = session.scalars(select(GeminiUsageEvent)).all()
+        hourly = session.scalars(select(GeminiUsageHourly)).all()
+    assert len(events) == 5
+    failed = [event for event in events if not event.ok]
+    assert [(event.model, event.status_code, event.attempts) for event in failed] == [("broken", 400, 1)]
+    assert sorted(event.streamed for event in events) == [False, False, False, False, True]
+    assert {event.caller for event in events} == {"admin:seed-names", "/v1/taste/analyze"}
+    # One rollup row per (hour, model, caller), whatever the number of calls.
+    assert len(hourly) <= 6
+
+    groups = {(group["model"], group["caller"]): group for group in summary.json()["groups"]}
+    seed = groups[(backend_main.GEMINI_MODEL, "admin:seed-names")]
+    assert seed["calls"] == 2 and seed["errors"] == 0
+    assert seed["prompt_tokens"] == 2600 and seed["candidate_tokens"] == 80 and seed["image_tokens"] == 2580
+    assert groups[("broken", "admin:seed-names")]["errors"] == 1
+    assert groups[(backend_main.GEMINI_MODEL, "/v1/taste/analyze")]["calls"] == 2
+    assert summary.json()["totals"]["calls"] == 5
+
+    models = {group["model"]: group for group in by_model.json()["groups"]}
+    assert models[backend_main.GEMINI_MODEL]["calls"] == 4
+    assert set(models[backend_main.GEMINI_MODEL]) >= {"avg_latency_ms", "max_latency_ms", "error_rate"}
+
+
+def _record(latency_ms: float, *, ok: bool = True) -> GeminiUsageRecord:
+    return GeminiUsageRecord(
+        model="m",
+        caller="admin:seed-names",
+        streamed=False,
+        attempts=1,
+        latency_ms=latency_ms,
+        status_code=200 if ok else 500,
+        ok=ok,
+        prompt_tokens=100,
+        candidate_tokens=10,
+        image_tokens=0,
+        created_at=datetime(2026, 10, 17, 9, 30, tzinfo=timezone.utc),
+    )
+
+
+def test_concurrent_writers_add_to_the_same_hourly_bucket(tmp_path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'usage.db'}", future=True)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+    with session_factory() as session:
+        write_usage_records(session, [_record(100.0)])
+        session.commit()
+
+    # The first worker has read the bucket before the second one commits.
+    with session_factory() as first:
+        seen = first.scalars(select(GeminiUsageHourly)).one()
+        assert seen.calls == 1
+        with session_factory() as second:
+            write_usage_records(second, [_record(900.0), _record(50.0, ok=False)])
+            second.commit()
+        write_usage_records(first, [_record(300.0)])
+        first.commit()
+
+    with session_factory() as session:
+        row = session.scalars(select(GeminiUsageHourly)).one()
+    assert (row.calls, row.errors, row.prompt_tokens) == (4, 1, 400)
+    assert (row.latency_ms_sum, row.latency_ms_max) == (1350.0, 900.0)
+
+
+def test_a_failed_flush_keeps_its_batch_for_the_next_one(tmp_path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'usage.db'}", future=True)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+    outage = [True]
+
+    def flaky_factory():
+        if outage[0]:
+            raise RuntimeError("database is down")
+        return session_factory()
+
+    recorder = GeminiUsageRecorder(session_factory=flaky_factory, batch_size=2, max_buffer=3)
+    for latency in (10.0, 20.0):
+        recorder.record(_record(latency))
+    assert asyncio.run(recorder.flush()) == 0
+    recorder.record(_record(30.0))
+    recorder.record(_record(40.0))
+    stats = recorder.describe()
+    assert (stats["buffered"], stats["dropped"], stats["write_errors"]) == (3, 1, 1)
+
+    outage[0] = False
+    assert asyncio.run(recorder.flush()) == 3
+    with session_factory() as session:
+        events = session.scalars(select(GeminiUsageEvent)).all()
+    assert sorted(event.latency_ms for event in events) == [20.0, 30.0, 40.0]
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from app.image_pipeline import (
+    ImagePipeline,
+    MenuImageTooLargeError,
+    NormalizeStats,
+    normalize_menu_image,
+    pick_rendition_format,
+    pick_rendition_name,
+    render_renditions,
+)
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 80, 40)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_render_renditions_produces_card_and_thumb_in_each_format() -> None:
+    rendered = render_renditions(_png(1024, 1536))
+
+    by_key = {(item.name, item.format): item for item in rendered}
+    assert set(by_key) == {("card", "webp"), ("card", "jpeg"), ("thumb", "webp"), ("thumb", "jpeg")}
+    assert (by_key["card", "webp"].width, by_key["card", "webp"].height) == (720, 1080)
+    assert (by_key["thumb", "jpeg"].width, by_key["thumb", "jpeg"].height) == (240, 360)
+    with Image.open(io.BytesIO(by_key["thumb", "webp"].body)) as decoded:
+        assert decoded.format == "WEBP"
+        assert decoded.size == (240, 360)
+    assert by_key["card", "jpeg"].mime_type == "image/jpeg"
+
+
+def test_render_renditions_crops_to_two_by_three_without_upscaling() -> None:
+    rendered = render_renditions(_png(300, 300), formats=("jpeg",))
+    sizes = {item.name: (item.width, item.height) for item in rendered}
+    assert sizes == {"card": (200, 300), "thumb": (200, 300)}
+
+
+def test_rendition_hints_and_process_pool_round_trip() -> None:
+    assert pick_rendition_name("thumb") == "thumb"
+    assert pick_rendition_name(None, width_hint=200) == "thumb"
+    assert pick_rendition_name(None, width_hint=600) == "card"
+    assert pick_rendition_name(None, width_hint=2000) == "original"
+    assert pick_rendition_name(None) == "original"
+    assert pick_rendition_format(None, accept="image/avif,image/webp,*/*") == "webp"
+    assert pick_rendition_format(None, accept="image/jpeg") == "jpeg"
+    assert pick_rendition_format("jpeg", accept="image/webp") == "jpeg"
+
+    pipeline = ImagePipeline(workers=1)
+    try:
+        rendered = asyncio.run(pipeline.render(_png(480, 720)))
+    finally:
+        pipeline.close()
+    assert len(rendered) == 4
+
+
+def _phone_jpeg(width: int, height: int) -> bytes:
+    # Stored landscape with "rotate 90° clockwise to view" and a GPS tag, the
+    # way phone cameras write portrait shots.
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x8825] = {2: (31.0, 14.0, 0.0)}
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (240, 230, 210)).save(buffer, format="JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def test_normalize_menu_image_uprights_downscales_and_strips_metadata() -> None:
+    body = _phone_jpeg(3000, 2000)
+    normalized = normalize_menu_image(body, long_edge=1536, quality=80)
+
+    assert (normalized.width, normalized.height) == (1024, 1536)
+    assert normalized.mime_type == "image/jpeg"
+    with Image.open(io.BytesIO(normalized.body)) as decoded:
+        assert decoded.size == (1024, 1536)
+        assert not decoded.getexif()
+    assert len(normalized.body) < len(body)
+
+    # Small images are re-encoded but never upscaled.
+    small = normalize_menu_image(_png(300, 200), long_edge=1536, quality=80)
+    assert (small.width, small.height) == (300, 200)
+
+    stats = NormalizeStats()
+    stats.record(bytes_in=1000, bytes_out=400, elapsed_ms=12.0, normalized=True)
+    stats.record(bytes_in=500, bytes_out=500, elapsed_ms=2.0, normalized=False)
+    assert stats.describe() == {
+        "images": 2,
+        "passthrough": 1,
+        "bytes_in": 1500,
+        "bytes_out": 900,
+        "bytes_saved": 600,
+        "avg_ms": 7.0,
+        "max_ms": 12.0,
+    }
+
+
+def test_normalize_menu_image_caps_decoded_pixels_and_shrinks_before_converting() -> None:
+    # A PNG cannot be decoded at reduced scale, so its full size counts.
+    with pytest.raises(MenuImageTooLargeError):
+        normalize_menu_image(_png(3000, 2000), long_edge=1536, quality=80, max_pixels=4_000_000)
+    # A JPEG is checked at its draft size: 4000x3000 decodes at 1/2.
+    drafted = normalize_menu_image(_phone_jpeg(4000, 3000), long_edge=1536, quality=80, max_pixels=4_000_000)
+    assert max(drafted.width, drafted.height) == 1536
+
+    buffer = io.BytesIO()
+    Image.new("RGBA", (4000, 1000), (0, 0, 255, 0)).save(buffer, format="PNG")
+    flattened = normalize_menu_image(buffer.getvalue(), long_edge=1536, quality=80)
+    assert (flattened.width, flattened.height) == (1536, 384)
+    with Image.open(io.BytesIO(flattened.body)) as decoded:
+        assert decoded.mode == "RGB"
+        assert decoded.getpixel((10, 10))[2] > 240 and decoded.getpixel((10, 10))[0] > 240
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import pytest
+
+from app.images import ImagePayload, ImagePayloadCache, decode_data_url, etag_matches
+
+
+def test_decode_data_url_returns_mime_and_bytes() -> None:
+    mime_type, body = decode_data_url("data:image/webp;base64,AAEC")
+    assert mime_type == "image/webp"
+    assert body == b"\x00\x01\x02"
+
+    with pytest.raises(ValueError):
+        decode_data_url("https://example.com/a.png")
+
+
+def test_etag_matches_handles_lists_and_wildcards() -> None:
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches("*", '"b"')
+    assert not etag_matches('W/"b"', '"b"')
+    assert not etag_matches(None, '"b"')
+
+
+def test_payload_cache_evicts_least_recently_used_by_bytes() -> None:
+    cache = ImagePayloadCache(max_bytes=10)
+    cache.put("a", ImagePayload(mime_type="image/png", body=b"aaaa", etag='"a"'))
+    cache.put("b", ImagePayload(mime_type="image/png", body=b"bbbb", etag='"b"'))
+    assert cache.get("a") is not None
+
+    cache.put("c", ImagePayload(mime_type="image/png", body=b"cccc", etag='"c"'))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.total_bytes == 8
+    cache.put("huge", ImagePayload(mime_type="image/png", body=b"x" * 11, etag='"h"'))
+    assert cache.get("huge") is None
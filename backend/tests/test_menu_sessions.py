@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import io
+import json
+import uuid
+from datetime import timedelta
+
+import pytest
+from PIL import Image, ImageFilter
+from fastapi.testclient import TestClient
+
+import app.main as backend_main
+from app.blob_store import blob_digest
+from app.gemini_schema import FormatRetryStats
+from app.gemini_usage import GeminiUsageRecorder
+
+HEADERS = {
+    "X-Device-ID": "9f2f89f1-45f9-4d45-9249-7e0d67f8d5e1",
+    "X-Client-Version": "1.0.0",
+}
+OTHER_DEVICE = {**HEADERS, "X-Device-ID": "0b8d6a52-64a4-4a8e-9c55-3d0c2f1e7a10"}
+PHOTO_A = base64.b64encode(b"menu page one" * 1000).decode("ascii")
+PHOTO_B = base64.b64encode(b"menu page two" * 1000).decode("ascii")
+PHOTO_C = base64.b64encode(b"menu page three" * 1000).decode("ascii")
+PHOTO_D = base64.b64encode(b"menu page four" * 1000).decode("ascii")
+STYLES = ["conservative", "balanced", "balanced", "adventurous", "conservative"]
+
+
+def _response(payload: dict) -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": json.dumps(payload, ensure_ascii=False)}]}}]}
+
+
+@pytest.fixture
+def gemini_calls(monkeypatch) -> list[dict]:
+    calls: list[dict] = []
+
+    async def fake_call(payload: dict, *, model: str, **_kwargs) -> dict:
+        calls.append(payload)
+        config = payload["generationConfig"]["responseSchema"]
+        if config == backend_main.MENU_CONTEXT_SCHEMA:
+            return _response({"dishes": [{"name": "宫保鸡丁", "original_name": "Kung Pao Chicken", "price": "$18"}]})
+        if config == backend_main.MENU_CHAT_SCHEMA:
+            return _response({"reply": "不太辣"})
+        return _response(
+            {
+                "reply": "推荐这些",
+                "recommendations": [
+                    {"name": f"菜{index}", "original_name": "", "reason": "合口味", "match_score": 80, "style": style}
+                    for index, style in enumerate(STYLES)
+                ],
+            }
+        )
+
+    monkeypatch.setattr(backend_main, "_call_gemini_api", fake_call)
+    monkeypatch.setattr(backend_main, "GEMINI_USAGE", GeminiUsageRecorder(session_factory=None))
+    monkeypatch.setattr(backend_main, "GEMINI_FORMAT_RETRIES", FormatRetryStats())
+    backend_main.MENU_IMAGE_CACHE.clear()
+    backend_main.RATE_LIMIT_BUCKETS.clear()
+    return calls
+
+
+def test_menu_session_turns_reference_stored_images(gemini_calls, isolated_blob_store) -> None:
+    with TestClient(backend_main.app) as client:
+        created = client.post(
+            "/v1/menu/sessions",
+            json={"images": [{"data_base64": PHOTO_A}, {"data_base64": PHOTO_B}, {"data_base64": PHOTO_A}]},
+            headers=HEADERS,
+        )
+        assert created.status_code == 200
+        menu = created.json()
+        assert (menu["image_count"], menu["duplicate_images"], menu["context_dishes"]) == (2, 1, 1)
+        assert menu["ttl_seconds"] > 0
+
+        chat_body = {"mode": "chat", "message": "宫保鸡丁辣吗", "menu_id": menu["menu_id"]}
+        chat = client.post("/v1/menu/chat", json=chat_body, headers=HEADERS)
+        recommend = client.post(
+            "/v1/menu/chat",
+            json={"mode": "recommend", "message": "推荐", "menu_id": menu["menu_id"]},
+            headers=HEADERS,
+        )
+        assert chat.json()["reply"] == "不太辣"
+        assert len(recommend.json()["recommendations"]) == 5
+        assert len(json.dumps(chat_body).encode()) < 200
+
+        assert client.get(f"/v1/menu/sessions/{menu['menu_id']}", headers=OTHER_DEVICE).status_code == 404
+        both = client.post("/v1/menu/chat", json={**chat_body, "images": [{"data_base64": PHOTO_A}]}, headers=HEADERS)
+        assert both.status_code == 400
+
+    extract, chat_payload, recommend_payload = gemini_calls
+    assert len(extract["contents"][0]["parts"]) == 3
+    # With a transcript a plain question goes without the photos.
+    assert "inlineData" not in json.dumps(chat_payload)
+    assert "宫保鸡丁（Kung Pao Chicken） $18" in chat_payload["contents"][0]["parts"][0]["text"]
+    images = [part["inlineData"]["data"] for part in recommend_payload["contents"][0]["parts"][1:]]
+    assert images == [PHOTO_A, PHOTO_B]
+
+
+def test_deleted_menu_session_is_cleaned_up(gemini_calls, isolated_blob_store) -> None:
+    # Photos no other test uploads: blobs shared with a live session must stay.
+    with TestClient(backend_main.app) as client:
+        created = client.post(
+            "/v1/menu/sessions",
+            json={"images": [{"data_base64": PHOTO_C}], "extract_context": False},
+            headers=HEADERS,
+        ).json()
+        assert created["context_dishes"] == 0
+        kept = client.post("/v1/menu/sessions", json={"images": [{"data_base64": PHOTO_D}]}, headers=HEADERS).json()
+        assert client.delete(f"/v1/menu/sessions/{created['menu_id']}", headers=HEADERS).json() == {"ok": True}
+
+        gone = client.post(
+            "/v1/menu/chat",
+            json={"mode": "recommend", "message": "推荐", "menu_id": created["menu_id"]},
+            headers=HEADERS,
+        )
+        assert gone.status_code == 404
+        assert gone.json()["code"] == "menu_session_not_found"
+
+        asyncio.run(backend_main._cleanup_database_once())
+        with backend_main.SessionLocal() as session:
+            assert session.get(backend_main.MenuSession, created["menu_id"]) is None
+            assert session.get(backend_main.MenuSession, kept["menu_id"]) is not None
+
+    assert not isolated_blob_store.exists(blob_digest(base64.b64decode(PHOTO_C)))
+    assert isolated_blob_store.exists(blob_digest(base64.b64decode(PHOTO_D)))
+
+
+def test_cleanup_during_extraction_keeps_a_photo_shared_with_an_expired_session(
+    gemini_calls, isolated_blob_store, monkeypatch
+) -> None:
+    # The test database outlives a run, so the photo must be new every time.
+    photo = base64.b64encode(f"menu page {uuid.uuid4()}".encode() * 300).decode("ascii")
+    digest = blob_digest(base64.b64decode(photo))
+    seen_during_extraction: list[bool] = []
+
+    async def extract_with_cleanup(payload: dict, *, model: str, **_kwargs) -> dict:
+        # The cleanup job runs while this session waits on its transcript.
+        await backend_main._cleanup_database_once()
+        seen_during_extraction.append(isolated_blob_store.exists(digest))
+        return _response({"dishes": [{"name": "提拉米苏", "original_name": "Tiramisu", "price": "$9"}]})
+
+    with TestClient(backend_main.app) as client:
+        old = client.post(
+            "/v1/menu/sessions", json={"images": [{"data_base64": photo}], "extract_context": False}, headers=HEADERS
+        ).json()
+        with backend_main.SessionLocal() as session:
+            expired = session.get(backend_main.MenuSession, old["menu_id"])
+            expired.expires_at = backend_main.utc_now() - timedelta(seconds=1)
+            session.commit()
+
+        monkeypatch.setattr(backend_main, "_call_gemini_api", extract_with_cleanup)
+        created = client.post("/v1/menu/sessions", json={"images": [{"data_base64": photo}]}, headers=HEADERS)
+        fetched = client.get(f"/v1/menu/sessions/{created.json()['menu_id']}", headers=HEADERS)
+
+    assert seen_during_extraction == [True]
+    assert created.json()["context_dishes"] == 1 and fetched.json()["context_dishes"] == 1
+    assert isolated_blob_store.exists(digest)
+    with backend_main.SessionLocal() as session:
+        assert session.get(backend_main.MenuSession, old["menu_id"]) is None
+
+
+def test_menu_photos_are_normalized_before_going_upstream(gemini_calls, isolated_blob_store, monkeypatch) -> None:
+    monkeypatch.setattr(backend_main, "MENU_IMAGE_STATS", backend_main.NormalizeStats())
+    buffer = io.BytesIO()
+    # Sensor noise keeps the JPEG near a real phone photo's size (~2.7 MB).
+    noise = Image.effect_noise((4000, 3000), 40).convert("RGB").filter(ImageFilter.GaussianBlur(1.2))
+    noise.save(buffer, format="JPEG", quality=90)
+    photo = base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    with TestClient(backend_main.app) as client:
+        inline = client.post(
+            "/v1/menu/chat",
+            json={"mode": "recommend", "message": "推荐", "images": [{"data_base64": photo}]},
+            headers=HEADERS,
+        )
+        created = client.post(
+            "/v1/menu/sessions",
+            json={"images": [{"data_base64": photo}, {"data_base64": PHOTO_A}], "extract_context": False},
+            headers=HEADERS,
+        )
+        health = client.get("/health").json()["menu_image_normalize"]
+
+    assert inline.status_code == 200 and created.status_code == 200
+    sent = gemini_calls[0]["contents"][0]["parts"][1]["inlineData"]
+    assert sent["mimeType"] == "image/jpeg"
+    assert len(sent["data"]) < len(photo) // 4
+    with Image.open(io.BytesIO(base64.b64decode(sent["data"]))) as decoded:
+        assert decoded.format == "JPEG" and decoded.size == (1536, 1152)
+    # The stored session photo is the normalized one too.
+    assert created.json()["image_bytes"] < len(buffer.getvalue()) // 4
+
+    # PHOTO_A is not an image Pillow can read, so it goes through as sent.
+    assert (health["images"], health["passthrough"]) == (3, 1)
+    assert health["bytes_saved"] > len(buffer.getvalue())
+    assert health["avg_ms"] > 0
+
+
+def test_oversized_and_broken_photos_are_rejected_not_forwarded(gemini_calls, isolated_blob_store, monkeypatch) -> None:
+    monkeypatch.setattr(backend_main, "MENU_IMAGE_MAX_PIXELS", 10_000)
+    big = io.BytesIO()
+    Image.new("RGB", (200, 100), (200, 80, 40)).save(big, format="PNG")
+    broken = io.BytesIO()
+    Image.effect_noise((80, 60), 40).convert("RGB").save(broken, format="JPEG")
+    oversized = base64.b64encode(big.getvalue()).decode("ascii")
+    truncated = base64.b64encode(broken.getvalue()[: len(broken.getvalue()) // 2]).decode("ascii")
+
+    with TestClient(backend_main.app) as client:
+        inline = client.post(
+            "/v1/menu/chat",
+            json={"mode": "recommend", "message": "推荐", "images": [{"data_base64": oversized}]},
+            headers=HEADERS,
+        )
+        session = client.post("/v1/menu/sessions", json={"images": [{"data_base64": oversized}]}, headers=HEADERS)
+        unreadable = client.post("/v1/menu/sessions", json={"images": [{"data_base64": truncated}]}, headers=HEADERS)
+
+    assert (inline.status_code, inline.json()["code"]) == (413, "menu_image_too_large")
+    assert (session.status_code, session.json()["code"]) == (413, "menu_image_too_large")
+    assert (unreadable.status_code, unreadable.json()["code"]) == (422, "invalid_menu_image")
+    assert gemini_calls == []
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.catalog_cache import CatalogRecord, CatalogSnapshot
+from app.ranking import (
+    CANONICAL_TAG_INDEX,
+    RankingConfig,
+    RankingIndexCache,
+    build_ranking_index,
+    preference_weights,
+    rank_deck,
+)
+from app.tagging import DishTags
+
+
+def _snapshot(version: int = 1) -> CatalogSnapshot:
+    records = []
+    for index in range(60):
+        records.append(
+            CatalogRecord(
+                id=f"spicy-{index}",
+                name=f"辣菜{index:02d}",
+                subtitle="",
+                tags=DishTags(flavor=["spicy"], ingredient=["chicken"]),
+                image_id=None,
+            )
+        )
+        records.append(
+            CatalogRecord(
+                id=f"sweet-{index}",
+                name=f"甜菜{index:02d}",
+                subtitle="",
+                tags=DishTags(flavor=["sweet"], course=["dessert"]),
+                image_id=None,
+            )
+        )
+    return CatalogSnapshot(version=version, records=tuple(records), built_at=0.0, rebuild_ms=0.0)
+
+
+def test_preference_weights_merge_scores_and_skip_unknown_ids() -> None:
+    weights = preference_weights(
+        feature_scores={"flavor:spicy": 0.5, "spicy": 1.0, "flavor:not_a_tag": 1.0},
+        top_positive=[("flavor:spicy", 0.25)],
+        top_negative=[("flavor:sweet", 0.8)],
+    )
+
+    assert weights == {
+        CANONICAL_TAG_INDEX["flavor:spicy"]: 0.75,
+        CANONICAL_TAG_INDEX["flavor:sweet"]: -0.8,
+    }
+
+
+def test_rank_deck_prefers_liked_tags_and_skips_avoided_names() -> None:
+    index = build_ranking_index(_snapshot())
+    weights = preference_weights(
+        feature_scores={},
+        top_positive=[("flavor:spicy", 0.9)],
+        top_negative=[("flavor:sweet", 0.9)],
+    )
+    avoid = {f"辣菜{index:02d}" for index in range(10)}
+
+    columns = rank_deck(
+        index,
+        weights=weights,
+        count=20,
+        avoid_names=avoid,
+        config=RankingConfig(exploration=0.0),
+        rng=np.random.default_rng(11),
+    )
+
+    names = [_snapshot().records[column].name for column in columns]
+    assert len(set(names)) == 20
+    assert all(name.startswith("辣菜") for name in names)
+    assert not set(names) & avoid
+
+
+def test_rank_deck_reserves_exploration_slots_and_falls_back_to_uniform() -> None:
+    snapshot = _snapshot()
+    index = build_ranking_index(snapshot)
+    weights = preference_weights(feature_scores={}, top_positive=[("flavor:spicy", 1.0)], top_negative=[])
+
+    columns = rank_deck(
+        index,
+        weights=weights,
+        count=20,
+        config=RankingConfig(exploration=0.5, temperature=0.01),
+        rng=np.random.default_rng(3),
+    )
+    assert len(set(columns)) == 20
+
+    uniform = rank_deck(index, weights={}, count=120, rng=np.random.default_rng(3))
+    assert sorted(uniform) == list(range(120))
+
+
+def test_ranking_index_cache_rebuilds_only_for_new_snapshots() -> None:
+    cache = RankingIndexCache()
+    first = _snapshot(1)
+
+    assert cache.index_for(first) is cache.index_for(first)
+    cache.index_for(_snapshot(2))
+
+    assert cache.rebuilds == 2
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import random
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db import Base
+from app.models import Dish
+from app.sampling import sample_ready_dish_ids, sample_ready_dishes
+
+
+class FixedPivotRandom(random.Random):
+    def __init__(self, pivot: float) -> None:
+        super().__init__(7)
+        self._pivot = pivot
+
+    def random(self) -> float:
+        return self._pivot
+
+
+def _seed_session(total: int, *, hidden: int = 0) -> Session:
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    for index in range(total):
+        session.add(
+            Dish(
+                name=f"菜{index:03d}",
+                subtitle="测试",
+                signals={},
+                tags_json={},
+                status="ready",
+                random_key=index / total,
+            )
+        )
+    for index in range(hidden):
+        session.add(
+            Dish(
+                name=f"草稿{index:03d}",
+                subtitle="测试",
+                signals={},
+                tags_json={},
+                status="draft",
+                random_key=index / max(1, hidden),
+            )
+        )
+    session.commit()
+    return session
+
+
+def test_sample_returns_distinct_ready_dishes_and_skips_avoided_names() -> None:
+    session = _seed_session(50, hidden=10)
+    avoid = {f"菜{index:03d}" for index in range(0, 50, 2)}
+
+    rows = sample_ready_dishes(session, count=20, avoid_names=avoid, rng=random.Random(3))
+
+    names = [row.name for row in rows]
+    assert len(names) == 20
+    assert len(set(names)) == 20
+    assert not set(names) & avoid
+    assert all(row.status == "ready" for row in rows)
+
+
+def test_sample_wraps_around_key_space_when_pivot_is_near_the_end() -> None:
+    session = _seed_session(30)
+
+    ids = sample_ready_dish_ids(session, count=10, oversample=1, rng=FixedPivotRandom(0.95))
+
+    keys = sorted(session.get(Dish, dish_id).random_key for dish_id in ids)
+    assert len(ids) == 10
+    assert sum(1 for key in keys if key >= 0.95) == 1
+    assert keys[:9] == [index / 30 for index in range(9)]
+
+
+def test_sample_returns_everything_left_when_catalog_is_smaller_than_count() -> None:
+    session = _seed_session(5)
+
+    rows = sample_ready_dishes(session, count=20, avoid_names={"菜000"}, rng=random.Random(1))
+
+    assert sorted(row.name for row in rows) == ["菜001", "菜002", "菜003", "菜004"]
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import random
+import uuid
+
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.orm import Session
+
+from app.catalog_cache import CatalogCache, bump_catalog_version
+from app.db import Base
+from app.models import Dish, User, UserSeenDishes, UserSwipeEvent
+from app import seen_set
+from app.seen_set import SeenSet, load_seen_set, record_seen_names
+
+
+def _session_with_catalog(count: int) -> tuple[Session, str]:
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    for index in range(count):
+        session.add(Dish(name=f"菜{index:02d}", subtitle="测试", signals={}, tags_json={}, status="ready"))
+    user = User(apple_user_id="apple-seen-set")
+    session.add(user)
+    bump_catalog_version(session)
+    session.commit()
+    return session, user.id
+
+
+def _swipe(session: Session, user_id: str, name: str) -> None:
+    session.add(UserSwipeEvent(id=str(uuid.uuid4()), user_id=user_id, dish_name=name, action="like"))
+
+
+def test_seen_set_bitmap_round_trips_ordinals() -> None:
+    seen = SeenSet()
+    assert seen.add(0)
+    assert seen.add(9_999)
+    assert not seen.add(9_999)
+    assert seen.update([3, 3, 17]) == 2
+
+    restored = SeenSet(seen.to_bytes())
+    assert len(restored) == 4
+    assert list(restored.ordinals()) == [0, 3, 17, 9_999]
+    assert 17 in restored and 18 not in restored and -1 not in restored
+    assert restored.nbytes == 1_250
+
+
+def test_bump_assigns_dense_ordinals_to_new_dishes() -> None:
+    session, _ = _session_with_catalog(3)
+    assert sorted(session.scalars(select(Dish.ordinal)).all()) == [0, 1, 2]
+
+    session.add(Dish(name="新菜", subtitle="测试", signals={}, tags_json={}, status="ready"))
+    bump_catalog_version(session)
+    session.commit()
+    assert session.scalar(select(Dish.ordinal).where(Dish.name == "新菜")) == 3
+
+    # Deleting dishes never frees their ordinals for new ones.
+    session.execute(delete(Dish))
+    session.add(Dish(name="清空后的菜", subtitle="测试", signals={}, tags_json={}, status="ready"))
+    bump_catalog_version(session)
+    session.commit()
+    assert session.scalar(select(Dish.ordinal).where(Dish.name == "清空后的菜")) == 4
+
+
+def test_seen_set_is_derived_from_swipes_and_filters_samples() -> None:
+    session, user_id = _session_with_catalog(12)
+    for name in ("菜00", "菜05", "不在目录里的菜"):
+        _swipe(session, user_id, name)
+    session.commit()
+
+    seen = load_seen_set(session, user_id)
+    session.commit()
+    assert len(seen) == 2
+    assert session.get(UserSeenDishes, user_id).seen_count == 2
+
+    _swipe(session, user_id, "菜07")
+    session.flush()
+    updated = record_seen_names(session, user_id, ["菜07"])
+    session.commit()
+    assert len(updated) == 3
+
+    snapshot = CatalogCache().snapshot(session)
+    for seed in range(10):
+        names = {record.name for record in snapshot.sample(count=9, seen=updated, rng=random.Random(seed))}
+        assert names.isdisjoint({"菜00", "菜05", "菜07"})
+        assert len(names) == 9
+
+
+def test_concurrent_first_lookup_keeps_the_winning_row(tmp_path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'seen.db'}", future=True)
+    Base.metadata.create_all(engine)
+    with Session(engine) as setup:
+        for index in range(4):
+            setup.add(Dish(name=f"菜{index:02d}", subtitle="测试", signals={}, tags_json={}, status="ready"))
+        user = User(apple_user_id="apple-seen-race")
+        setup.add(user)
+        bump_catalog_version(setup)
+        setup.commit()
+        user_id = user.id
+        _swipe(setup, user_id, "菜01")
+        setup.commit()
+
+    with Session(engine) as winner:
+        record_seen_names(winner, user_id, ["菜01"])
+        winner.commit()
+
+    with Session(engine) as loser:
+        # The loser looked before the winner committed, so it tries to insert too.
+        existing = seen_set._create(loser, user_id, SeenSet(b"\x01"))
+        assert existing is not None and list(SeenSet(existing.bitmap).ordinals()) == [1]
+        _swipe(loser, user_id, "菜03")
+        loser.flush()
+        seen = record_seen_names(loser, user_id, ["菜03"])
+        loser.commit()
+
+    assert list(seen.ordinals()) == [1, 3]
+    with Session(engine) as check:
+        assert check.get(UserSeenDishes, user_id).seen_count == 2
+
+
+def test_overlapping_swipe_batches_keep_each_others_bits(tmp_path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'seen.db'}", future=True)
+    Base.metadata.create_all(engine)
+    with Session(engine) as setup:
+        for index in range(4):
+            setup.add(Dish(name=f"菜{index:02d}", subtitle="测试", signals={}, tags_json={}, status="ready"))
+        user = User(apple_user_id="apple-seen-overlap")
+        setup.add(user)
+        bump_catalog_version(setup)
+        setup.commit()
+        user_id = user.id
+        _swipe(setup, user_id, "菜00")
+        setup.flush()
+        record_seen_names(setup, user_id, ["菜00"])
+        setup.commit()
+
+    with Session(engine) as first:
+        # The first batch has already read the row when the second commits.
+        held = first.get(UserSeenDishes, user_id)
+        assert held.seen_count == 1
+        with Session(engine) as second:
+            record_seen_names(second, user_id, ["菜02"])
+            second.commit()
+        seen = record_seen_names(first, user_id, ["菜03"])
+        first.commit()
+
+    assert list(seen.ordinals()) == [0, 2, 3]
+    with Session(engine) as check:
+        assert check.get(UserSeenDishes, user_id).seen_count == 3
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+import app.main as backend_main
+from app.gemini_cache import GeminiResponseCache
+from app.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call_and_its_error() -> None:
+    group: SingleFlight[str] = SingleFlight()
+    calls = 0
+
+    async def upstream() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def failing() -> str:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Gemini HTTP 500")
+
+    async def run() -> tuple[list[str], list[BaseException]]:
+        results = await asyncio.gather(*(group.run("k", upstream) for _ in range(5)))
+        errors = await asyncio.gather(*(group.run("k", failing) for _ in range(3)), return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.run(run())
+
+    assert results == ["result"] * 5
+    assert calls == 1
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert group.describe() == {
+        "in_flight": 0,
+        "leaders": 2,
+        "coalesced": 6,
+        "cancelled_waiters": 0,
+        "abandoned": 0,
+    }
+
+
+def test_cancelling_one_caller_leaves_the_others_and_the_last_one_cancels_upstream() -> None:
+    group: SingleFlight[str] = SingleFlight()
+
+    async def run() -> tuple[str, bool]:
+        release = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def upstream() -> str:
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "shared"
+
+        first = asyncio.create_task(group.run("k", upstream))
+        second = asyncio.create_task(group.run("k", upstream))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        shared = await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        release.clear()
+        lonely = asyncio.create_task(group.run("k2", upstream))
+        await asyncio.sleep(0)
+        lonely.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await lonely
+        await asyncio.sleep(0)
+        return shared, cancelled.is_set()
+
+    shared, upstream_was_cancelled = asyncio.run(run())
+
+    assert shared == "shared"
+    assert upstream_was_cancelled
+    stats = group.describe()
+    assert stats["cancelled_waiters"] == 2
+    assert stats["abandoned"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_a_caller_after_the_last_cancellation_starts_a_fresh_call() -> None:
+    group: SingleFlight[str] = SingleFlight()
+
+    async def run() -> tuple[str, int]:
+        async def slow_to_unwind() -> str:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                # Closing the upstream connection takes a moment.
+                await asyncio.sleep(0.05)
+                raise
+            return "stale"
+
+        async def fresh() -> str:
+            return "fresh"
+
+        abandoned = asyncio.create_task(group.run("k", slow_to_unwind))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await abandoned
+        in_flight = group.in_flight()
+        return await group.run("k", fresh), in_flight
+
+    result, in_flight_after_cancel = asyncio.run(run())
+
+    assert result == "fresh"
+    assert in_flight_after_cancel == 0
+    assert group.describe()["leaders"] == 2
+
+
+def test_call_gemini_api_coalesces_identical_in_flight_requests(monkeypatch) -> None:
+    group: SingleFlight[dict] = SingleFlight()
+    monkeypatch.setattr(backend_main, "GEMINI_SINGLE_FLIGHT", group)
+    monkeypatch.setattr(backend_main, "GEMINI_RESPONSE_CACHE", GeminiResponseCache(max_bytes=0, ttl_seconds=0))
+    calls = 0
+
+    async def fake_post(payload: dict, *, model: str, **_kwargs) -> dict:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"candidates": [{"content": {"parts": [{"text": "{}"}]}}]}
+
+    monkeypatch.setattr(backend_main, "_post_gemini_with_retries", fake_post)
+
+    async def run() -> None:
+        await asyncio.gather(
+            *(backend_main._call_gemini_json("menu 1", temperature=0.45) for _ in range(4)),
+            backend_main._call_gemini_json("menu 2", temperature=0.45),
+        )
+
+    asyncio.run(run())
+
+    assert calls == 2
+    assert group.stats.coalesced == 3